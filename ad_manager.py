@@ -11,7 +11,102 @@ from tkinter import ttk, messagebox, filedialog
 import mysql.connector
 from datetime import datetime, date
 import os
-import shutil
+import queue
+
+from admedia import IngestWorker, MediaIngestor
+
+# 列表每次向資料庫取回的筆數，捲動接近底部時再取下一頁
+AD_PAGE_SIZE = 100
+AD_LIST_COLUMNS = (
+    'ad_id, title, target_category, target_gender, target_age_group, is_active, '
+    'image_path, video_path, priority, created_date'
+)
+AD_FILTER_COLUMNS = {
+    'category': 'target_category',
+    'gender': 'target_gender',
+    'age_group': 'target_age_group',
+    'is_active': 'is_active'
+}
+# 列表排序欄位（與 idx_listing 索引相同）；欄位為 NOT NULL，keyset 條件才不會漏列
+LISTING_ORDER = 'priority DESC, created_date DESC, ad_id DESC'
+STATUS_FILTERS = {'啟用': True, '停用': False}
+ALL_FILTER = '全部'
+# 表單寫入 advertisements 的欄位順序
+AD_FORM_COLUMNS = (
+    'title', 'content', 'target_category', 'target_gender', 'target_age_group',
+    'priority', 'image_path', 'video_path', 'start_date', 'end_date', 'is_active'
+)
+
+
+def build_ad_list_query(filters, after=None, ad_id=None, limit=AD_PAGE_SIZE):
+    '''依篩選條件建立列表查詢；after 為上一頁最後一列的 (priority, created_date, ad_id)
+
+    以 keyset 分頁取代 OFFSET，排序與條件都直接使用 idx_listing 的原始欄位，
+    每頁都沿索引從上次停下的位置繼續讀取。
+    '''
+    conditions = []
+    params = []
+    for key, column in AD_FILTER_COLUMNS.items():
+        value = filters.get(key)
+        if value is not None and value != '':
+            conditions.append(f"{column} = %s")
+            params.append(value)
+    if ad_id is not None:
+        conditions.append("ad_id = %s")
+        params.append(ad_id)
+    if after is not None:
+        priority, created_date, last_id = after
+        conditions.append(
+            "(priority < %s OR (priority = %s AND "
+            "(created_date < %s OR (created_date = %s AND ad_id < %s))))"
+        )
+        params.extend([priority, priority, created_date, created_date, last_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f'''
+        SELECT {AD_LIST_COLUMNS}
+        FROM advertisements
+        {where}
+        ORDER BY {LISTING_ORDER}
+        LIMIT %s
+    '''
+    params.append(limit)
+    return query, tuple(params)
+
+
+def ensure_listing_schema(cursor):
+    '''舊資料庫補齊列表排序所需的結構，有變更時回傳 True
+
+    priority、created_date 的 NULL 以欄位預設值補上並改為 NOT NULL，
+    再補上 idx_listing 索引。
+    '''
+    changed = False
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = 'advertisements' "
+        "AND column_name IN ('priority', 'created_date') AND is_nullable = 'YES'"
+    )
+    nullable = {row[0].lower() for row in cursor.fetchall()}
+    if 'priority' in nullable:
+        cursor.execute("UPDATE advertisements SET priority = 1 WHERE priority IS NULL")
+        cursor.execute("ALTER TABLE advertisements MODIFY priority INT NOT NULL DEFAULT 1")
+        changed = True
+    if 'created_date' in nullable:
+        cursor.execute("UPDATE advertisements SET created_date = CURRENT_TIMESTAMP WHERE created_date IS NULL")
+        cursor.execute(
+            "ALTER TABLE advertisements MODIFY created_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"
+        )
+        changed = True
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'advertisements' AND index_name = 'idx_listing'"
+    )
+    if cursor.fetchone()[0]:
+        return changed
+    cursor.execute("ALTER TABLE advertisements ADD INDEX idx_listing (priority, created_date, ad_id)")
+    return True
+
 
 class AdManagerTool:
     def __init__(self):
@@ -26,8 +121,21 @@ class AdManagerTool:
         # 廣告目錄
         self.ad_images_dir = "advertisements/images"
         self.ad_videos_dir = "advertisements/videos"
-        os.makedirs(self.ad_images_dir, exist_ok=True)
-        os.makedirs(self.ad_videos_dir, exist_ok=True)
+        self.ad_thumbs_dir = "advertisements/thumbs"
+
+        # 媒體於儲存時在背景轉為顯示解析度並產生縮圖，相同內容只處理一次
+        self.ingestor = MediaIngestor(self.ad_images_dir, self.ad_videos_dir, self.ad_thumbs_dir)
+        self.ingest_worker = IngestWorker(self.ingestor)
+        self.ingest_job = None
+        self.ingest_form = None
+        self.thumbnails = {}
+
+        # 列表分頁狀態：row_keys 為已載入列的排序鍵，page_cursor 為最後一列的鍵
+        self.filters = {}
+        self.row_keys = {}
+        self.page_cursor = None
+        self.has_more_pages = False
+        self.loading_page = False
 
         self.setup_gui()
         self.load_advertisements()
@@ -42,6 +150,17 @@ class AdManagerTool:
             )
         except mysql.connector.Error as err:
             messagebox.showerror("資料庫錯誤", f"無法連接資料庫: {err}")
+            return
+
+        cursor = self.db_connection.cursor()
+        try:
+            if ensure_listing_schema(cursor):
+                self.db_connection.commit()
+        except mysql.connector.Error as err:
+            # 沒有 ALTER 權限時仍可使用，但列表較慢，且排序欄位為 NULL 的廣告不會列出
+            print(f"無法更新列表排序欄位與索引 idx_listing: {err}")
+        finally:
+            cursor.close()
 
     def setup_gui(self):
         # 主要框架
@@ -52,28 +171,53 @@ class AdManagerTool:
         list_frame = ttk.LabelFrame(main_frame, text="廣告列表", padding="10")
         list_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0,10))
 
+        # 篩選條件於資料庫端套用
+        filter_frame = ttk.Frame(list_frame)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+
+        self.filter_vars = {}
+        filter_options = (
+            ('category', "分類:", ('electronics', 'fashion', 'sports', 'beauty', 'food', 'appliances', 'books', 'general')),
+            ('gender', "性別:", ('ALL', 'M', 'F')),
+            ('age_group', "年齡:", ('18-25', '26-35', '36-45', '46-55', '56-65', '65+', 'ALL')),
+            ('status', "狀態:", tuple(STATUS_FILTERS)),
+        )
+        for key, label, values in filter_options:
+            ttk.Label(filter_frame, text=label).pack(side=tk.LEFT)
+            var = tk.StringVar(value=ALL_FILTER)
+            combo = ttk.Combobox(filter_frame, textvariable=var, values=(ALL_FILTER,) + values, width=10, state='readonly')
+            combo.pack(side=tk.LEFT, padx=(0, 5))
+            combo.bind('<<ComboboxSelected>>', lambda event: self.apply_filters())
+            self.filter_vars[key] = var
+
         # 樹狀檢視
         columns = ('ID', '標題', '目標分類', '性別', '年齡', '狀態')
-        self.ad_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
+        ttk.Style().configure('Ads.Treeview', rowheight=58)
+        self.ad_tree = ttk.Treeview(list_frame, columns=columns, show='tree headings', height=9, style='Ads.Treeview')
+        self.ad_tree.column('#0', width=104, stretch=False)
 
         for col in columns:
             self.ad_tree.heading(col, text=col)
             self.ad_tree.column(col, width=80)
 
-        # 捲軸
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.ad_tree.yview)
-        self.ad_tree.configure(yscrollcommand=scrollbar.set)
+        # 捲軸；捲動接近底部時載入下一頁
+        self.ad_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.ad_tree.yview)
+        self.ad_tree.configure(yscrollcommand=self.on_tree_scroll)
 
-        self.ad_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.ad_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.ad_scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
 
         # 按鈕
         button_frame = ttk.Frame(list_frame)
-        button_frame.grid(row=1, column=0, columnspan=2, pady=10)
-
-        ttk.Button(button_frame, text="新增廣告", command=self.add_advertisement).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="編輯", command=self.edit_advertisement).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="刪除", command=self.delete_advertisement).pack(side=tk.LEFT, padx=5)
+        button_frame.grid(row=2, column=0, columnspan=2, pady=10)
+
+        # 媒體轉檔期間停用的元件，避免表單與寫入資料庫的內容不一致
+        self.form_widgets = []
+        for text, command in (("新增廣告", self.add_advertisement), ("編輯", self.edit_advertisement),
+                              ("刪除", self.delete_advertisement)):
+            button = ttk.Button(button_frame, text=text, command=command)
+            button.pack(side=tk.LEFT, padx=5)
+            self.form_widgets.append(button)
         ttk.Button(button_frame, text="重新載入", command=self.load_advertisements).pack(side=tk.LEFT, padx=5)
 
         # 編輯區域
@@ -83,7 +227,9 @@ class AdManagerTool:
         # 基本資訊
         ttk.Label(edit_frame, text="廣告標題:").grid(row=0, column=0, sticky=tk.W, pady=2)
         self.title_var = tk.StringVar()
-        ttk.Entry(edit_frame, textvariable=self.title_var, width=40).grid(row=0, column=1, pady=2)
+        title_entry = ttk.Entry(edit_frame, textvariable=self.title_var, width=40)
+        title_entry.grid(row=0, column=1, pady=2)
+        self.form_widgets.append(title_entry)
 
         ttk.Label(edit_frame, text="廣告內容:").grid(row=1, column=0, sticky=(tk.W, tk.N), pady=2)
         self.content_text = tk.Text(edit_frame, width=40, height=5)
@@ -98,22 +244,27 @@ class AdManagerTool:
         category_combo = ttk.Combobox(target_frame, textvariable=self.category_var, width=15)
         category_combo['values'] = ('electronics', 'fashion', 'sports', 'beauty', 'food', 'appliances', 'books', 'general')
         category_combo.grid(row=0, column=1, padx=5)
+        self.form_widgets.append(category_combo)
 
         ttk.Label(target_frame, text="目標性別:").grid(row=0, column=2, sticky=tk.W)
         self.target_gender_var = tk.StringVar()
         gender_combo = ttk.Combobox(target_frame, textvariable=self.target_gender_var, width=10)
         gender_combo['values'] = ('ALL', 'M', 'F')
         gender_combo.grid(row=0, column=3, padx=5)
+        self.form_widgets.append(gender_combo)
 
         ttk.Label(target_frame, text="年齡層:").grid(row=1, column=0, sticky=tk.W)
         self.target_age_var = tk.StringVar()
         age_combo = ttk.Combobox(target_frame, textvariable=self.target_age_var, width=15)
         age_combo['values'] = ('18-25', '26-35', '36-45', '46-55', '56-65', '65+', 'ALL')
         age_combo.grid(row=1, column=1, padx=5)
+        self.form_widgets.append(age_combo)
 
         ttk.Label(target_frame, text="優先順序:").grid(row=1, column=2, sticky=tk.W)
         self.priority_var = tk.IntVar()
-        ttk.Spinbox(target_frame, from_=1, to=10, textvariable=self.priority_var, width=10).grid(row=1, column=3, padx=5)
+        priority_spin = ttk.Spinbox(target_frame, from_=1, to=10, textvariable=self.priority_var, width=10)
+        priority_spin.grid(row=1, column=3, padx=5)
+        self.form_widgets.append(priority_spin)
 
         # 媒體檔案
         media_frame = ttk.LabelFrame(edit_frame, text="媒體檔案")
@@ -121,13 +272,19 @@ class AdManagerTool:
 
         ttk.Label(media_frame, text="圖片:").grid(row=0, column=0, sticky=tk.W)
         self.image_path_var = tk.StringVar()
-        ttk.Entry(media_frame, textvariable=self.image_path_var, width=30).grid(row=0, column=1, padx=5)
-        ttk.Button(media_frame, text="瀏覽", command=self.browse_image).grid(row=0, column=2)
+        image_entry = ttk.Entry(media_frame, textvariable=self.image_path_var, width=30)
+        image_entry.grid(row=0, column=1, padx=5)
+        image_button = ttk.Button(media_frame, text="瀏覽", command=self.browse_image)
+        image_button.grid(row=0, column=2)
+        self.form_widgets.extend((image_entry, image_button))
 
         ttk.Label(media_frame, text="影片:").grid(row=1, column=0, sticky=tk.W)
         self.video_path_var = tk.StringVar()
-        ttk.Entry(media_frame, textvariable=self.video_path_var, width=30).grid(row=1, column=1, padx=5)
-        ttk.Button(media_frame, text="瀏覽", command=self.browse_video).grid(row=1, column=2)
+        video_entry = ttk.Entry(media_frame, textvariable=self.video_path_var, width=30)
+        video_entry.grid(row=1, column=1, padx=5)
+        video_button = ttk.Button(media_frame, text="瀏覽", command=self.browse_video)
+        video_button.grid(row=1, column=2)
+        self.form_widgets.extend((video_entry, video_button))
 
         # 時間設定
         time_frame = ttk.LabelFrame(edit_frame, text="投放時間")
@@ -135,22 +292,37 @@ class AdManagerTool:
 
         ttk.Label(time_frame, text="開始日期:").grid(row=0, column=0, sticky=tk.W)
         self.start_date_var = tk.StringVar()
-        ttk.Entry(time_frame, textvariable=self.start_date_var, width=15).grid(row=0, column=1, padx=5)
+        start_entry = ttk.Entry(time_frame, textvariable=self.start_date_var, width=15)
+        start_entry.grid(row=0, column=1, padx=5)
+        self.form_widgets.append(start_entry)
 
         ttk.Label(time_frame, text="結束日期:").grid(row=0, column=2, sticky=tk.W)
         self.end_date_var = tk.StringVar()
-        ttk.Entry(time_frame, textvariable=self.end_date_var, width=15).grid(row=0, column=3, padx=5)
+        end_entry = ttk.Entry(time_frame, textvariable=self.end_date_var, width=15)
+        end_entry.grid(row=0, column=3, padx=5)
+        self.form_widgets.append(end_entry)
 
         # 狀態
         self.is_active_var = tk.BooleanVar()
-        ttk.Checkbutton(time_frame, text="啟用廣告", variable=self.is_active_var).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=5)
+        active_check = ttk.Checkbutton(time_frame, text="啟用廣告", variable=self.is_active_var)
+        active_check.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=5)
+        self.form_widgets.append(active_check)
 
         # 操作按鈕
         action_frame = ttk.Frame(edit_frame)
         action_frame.grid(row=5, column=0, columnspan=2, pady=20)
 
-        ttk.Button(action_frame, text="儲存", command=self.save_advertisement).pack(side=tk.LEFT, padx=5)
-        ttk.Button(action_frame, text="清除", command=self.clear_form).pack(side=tk.LEFT, padx=5)
+        self.save_button = ttk.Button(action_frame, text="儲存", command=self.save_advertisement)
+        self.save_button.pack(side=tk.LEFT, padx=5)
+        clear_button = ttk.Button(action_frame, text="清除", command=self.clear_form)
+        clear_button.pack(side=tk.LEFT, padx=5)
+        self.form_widgets.extend((self.save_button, clear_button))
+
+        # 媒體轉檔進度
+        self.ingest_progress = ttk.Progressbar(edit_frame, maximum=1.0, length=300)
+        self.ingest_progress.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        self.ingest_status_var = tk.StringVar()
+        ttk.Label(edit_frame, textvariable=self.ingest_status_var).grid(row=7, column=0, columnspan=2, sticky=tk.W)
 
         # 綁定樹狀檢視選取事件
         self.ad_tree.bind('<<TreeviewSelect>>', self.on_select)
@@ -164,11 +336,8 @@ class AdManagerTool:
             filetypes=[("圖片檔案", "*.jpg *.jpeg *.png *.gif *.bmp")]
         )
         if filename:
-            # 複製檔案到廣告目錄
-            basename = os.path.basename(filename)
-            dest_path = os.path.join(self.ad_images_dir, basename)
-            shutil.copy2(filename, dest_path)
-            self.image_path_var.set(dest_path)
+            # 儲存時才轉檔並複製到廣告目錄
+            self.image_path_var.set(filename)
 
     def browse_video(self):
         filename = filedialog.askopenfilename(
@@ -176,36 +345,112 @@ class AdManagerTool:
             filetypes=[("影片檔案", "*.mp4 *.avi *.mov *.mkv")]
         )
         if filename:
-            basename = os.path.basename(filename)
-            dest_path = os.path.join(self.ad_videos_dir, basename)
-            shutil.copy2(filename, dest_path)
-            self.video_path_var.set(dest_path)
+            self.video_path_var.set(filename)
+
+    def thumbnail_image(self, image_path, video_path):
+        thumbnail = self.ingestor.thumbnail_for(image_path) or self.ingestor.thumbnail_for(video_path)
+        if not thumbnail:
+            return ''
+        if thumbnail not in self.thumbnails:
+            self.thumbnails[thumbnail] = tk.PhotoImage(file=thumbnail)
+        return self.thumbnails[thumbnail]
+
+    def apply_filters(self):
+        self.filters = {}
+        for key, var in self.filter_vars.items():
+            value = var.get()
+            if value == ALL_FILTER:
+                continue
+            if key == 'status':
+                self.filters['is_active'] = STATUS_FILTERS[value]
+            else:
+                self.filters[key] = value
+        self.load_advertisements()
 
     def load_advertisements(self):
-        # 清空樹狀檢視
-        for item in self.ad_tree.get_children():
-            self.ad_tree.delete(item)
-
-        if not self.db_connection:
+        '''重新載入列表：清空後只取第一頁'''
+        self.ad_tree.delete(*self.ad_tree.get_children())
+        self.row_keys.clear()
+        self.page_cursor = None
+        self.has_more_pages = True
+        self.load_next_page()
+
+    def load_next_page(self):
+        '''取下一頁；loading_page 於排入時（on_tree_scroll）即設定，完成後清除'''
+        if not self.db_connection or not self.has_more_pages:
+            self.loading_page = False
             return
 
+        self.loading_page = True
+        try:
+            cursor = self.db_connection.cursor()
+            cursor.execute(*build_ad_list_query(self.filters, after=self.page_cursor))
+            rows = cursor.fetchall()
+            cursor.close()
+
+            for row in rows:
+                self.insert_row(row)
+            if rows:
+                self.page_cursor = self.row_key(rows[-1])
+            self.has_more_pages = len(rows) == AD_PAGE_SIZE
+        finally:
+            self.loading_page = False
+
+    def on_tree_scroll(self, first, last):
+        self.ad_scrollbar.set(first, last)
+        if self.has_more_pages and not self.loading_page and float(last) >= 0.9:
+            # 捲動事件連續觸發時只排入一次載入
+            self.loading_page = True
+            self.root.after_idle(self.load_next_page)
+
+    @staticmethod
+    def row_key(row):
+        return (row[8], row[9], row[0])
+
+    def row_values(self, row):
+        ad_id, title, category, gender, age_group, is_active = row[:6]
+        status = "啟用" if is_active else "停用"
+        return (ad_id, title, category, gender, age_group, status)
+
+    def insert_row(self, row, index='end'):
+        iid = str(row[0])
+        self.ad_tree.insert('', index, iid=iid, image=self.thumbnail_image(row[6], row[7]),
+                            values=self.row_values(row))
+        self.row_keys[iid] = self.row_key(row)
+
+    def remove_row(self, ad_id):
+        iid = str(ad_id)
+        if self.row_keys.pop(iid, None) is not None:
+            self.ad_tree.delete(iid)
+
+    def refresh_row(self, ad_id):
+        '''儲存後只更新該列：不符篩選則移除，排序改變則移到新位置'''
         cursor = self.db_connection.cursor()
-        query = '''
-            SELECT ad_id, title, target_category, target_gender, 
-                   target_age_group, is_active 
-            FROM advertisements 
-            ORDER BY priority DESC, created_date DESC
-        '''
-        cursor.execute(query)
+        cursor.execute(*build_ad_list_query(self.filters, ad_id=ad_id, limit=1))
+        row = cursor.fetchone()
+        cursor.close()
 
-        for row in cursor:
-            ad_id, title, category, gender, age_group, is_active = row
-            status = "啟用" if is_active else "停用"
-            self.ad_tree.insert('', 'end', values=(ad_id, title, category, gender, age_group, status))
+        iid = str(ad_id)
+        if row is None:
+            self.remove_row(ad_id)
+            return
 
-        cursor.close()
+        key = self.row_key(row)
+        if self.row_keys.get(iid) == key:
+            self.ad_tree.item(iid, image=self.thumbnail_image(row[6], row[7]), values=self.row_values(row))
+            return
+
+        self.remove_row(ad_id)
+        # 排在已載入範圍之後的列等捲動到該頁時再載入
+        if self.has_more_pages and self.page_cursor is not None and key < self.page_cursor:
+            return
+        index = sum(1 for other in self.row_keys.values() if other > key)
+        self.insert_row(row, index)
 
     def on_select(self, event):
+        # 轉檔期間表單已停用，不載入其他廣告
+        if self.ingest_job is not None:
+            return
         selection = self.ad_tree.selection()
         if selection:
             item = self.ad_tree.item(selection[0])
@@ -267,16 +512,92 @@ class AdManagerTool:
         ad_id = item['values'][0]
         self.load_advertisement(ad_id)
 
+    def form_values(self):
+        '''按下儲存當下的表單內容，依 AD_FORM_COLUMNS 的欄位命名'''
+        return {
+            'title': self.title_var.get().strip(),
+            'content': self.content_text.get(1.0, tk.END).strip(),
+            'target_category': self.category_var.get() or None,
+            'target_gender': self.target_gender_var.get(),
+            'target_age_group': self.target_age_var.get() or None,
+            'priority': self.priority_var.get(),
+            'image_path': self.image_path_var.get() or None,
+            'video_path': self.video_path_var.get() or None,
+            'start_date': self.start_date_var.get() or None,
+            'end_date': self.end_date_var.get() or None,
+            'is_active': self.is_active_var.get(),
+        }
+
+    def set_form_enabled(self, enabled):
+        for widget in self.form_widgets:
+            widget.state(['!disabled'] if enabled else ['disabled'])
+        self.content_text.configure(state=tk.NORMAL if enabled else tk.DISABLED)
+
     def save_advertisement(self):
         # 驗證輸入
         if not self.title_var.get().strip():
             messagebox.showerror("錯誤", "請輸入廣告標題")
             return
 
+        if self.ingest_job is not None:
+            return
+
+        # 先保存表單與廣告ID，轉檔完成後寫入的是按下儲存當下的內容
+        form = self.form_values()
+        ad_id = self.current_ad_id
+
+        # 尚未匯入的媒體先在背景轉檔，完成後再寫入資料庫
+        pending = [
+            form[key] for key in ('image_path', 'video_path')
+            if form[key] and not self.ingestor.is_ingested(form[key])
+        ]
+        if pending:
+            self.set_form_enabled(False)
+            self.ingest_form = (ad_id, form)
+            self.ingest_job = self.ingest_worker.submit(pending)
+            self.root.after(100, self.poll_ingest)
+            return
+
+        self.write_advertisement(form, ad_id)
+
+    def poll_ingest(self):
+        while True:
+            try:
+                event = self.ingest_worker.events.get_nowait()
+            except queue.Empty:
+                break
+            kind, job_id = event[0], event[1]
+            if job_id != self.ingest_job:
+                continue
+            if kind == 'progress':
+                self.ingest_progress['value'] = event[2]
+                self.ingest_status_var.set(event[3])
+                continue
+            ad_id, form = self.ingest_form
+            self.ingest_job = None
+            self.ingest_form = None
+            self.set_form_enabled(True)
+            if kind == 'error':
+                self.ingest_status_var.set("")
+                messagebox.showerror("媒體錯誤", f"媒體轉檔失敗: {event[2]}")
+                return
+            for result in event[2]:
+                for key, var in (('image_path', self.image_path_var), ('video_path', self.video_path_var)):
+                    if form[key] == result.source:
+                        form[key] = result.path
+                        var.set(result.path)
+                if result.reused:
+                    self.ingest_status_var.set(f"{os.path.basename(result.source)} 與既有媒體相同，已沿用")
+            self.write_advertisement(form, ad_id)
+            return
+        self.root.after(100, self.poll_ingest)
+
+    def write_advertisement(self, form, ad_id=None):
+        params = tuple(form[column] for column in AD_FORM_COLUMNS)
         try:
             cursor = self.db_connection.cursor()
 
-            if self.current_ad_id:
+            if ad_id:
                 # 更新現有廣告
                 query = '''
                     UPDATE advertisements 
@@ -285,20 +606,7 @@ class AdManagerTool:
                         start_date=%s, end_date=%s, is_active=%s
                     WHERE ad_id=%s
                 '''
-                params = (
-                    self.title_var.get().strip(),
-                    self.content_text.get(1.0, tk.END).strip(),
-                    self.category_var.get() or None,
-                    self.target_gender_var.get(),
-                    self.target_age_var.get() or None,
-                    self.priority_var.get(),
-                    self.image_path_var.get() or None,
-                    self.video_path_var.get() or None,
-                    self.start_date_var.get() or None,
-                    self.end_date_var.get() or None,
-                    self.is_active_var.get(),
-                    self.current_ad_id
-                )
+                params += (ad_id,)
             else:
                 # 新增廣告
                 query = '''
@@ -307,26 +615,14 @@ class AdManagerTool:
                      priority, image_path, video_path, start_date, end_date, is_active)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 '''
-                params = (
-                    self.title_var.get().strip(),
-                    self.content_text.get(1.0, tk.END).strip(),
-                    self.category_var.get() or None,
-                    self.target_gender_var.get(),
-                    self.target_age_var.get() or None,
-                    self.priority_var.get(),
-                    self.image_path_var.get() or None,
-                    self.video_path_var.get() or None,
-                    self.start_date_var.get() or None,
-                    self.end_date_var.get() or None,
-                    self.is_active_var.get()
-                )
 
             cursor.execute(query, params)
+            ad_id = ad_id or cursor.lastrowid
             self.db_connection.commit()
             cursor.close()
 
             messagebox.showinfo("成功", "廣告儲存成功！")
-            self.load_advertisements()
+            self.refresh_row(ad_id)
 
         except mysql.connector.Error as err:
             messagebox.showerror("資料庫錯誤", f"儲存失敗: {err}")
@@ -348,7 +644,7 @@ class AdManagerTool:
                 cursor.close()
 
                 messagebox.showinfo("成功", "廣告刪除成功！")
-                self.load_advertisements()
+                self.remove_row(ad_id)
                 self.clear_form()
 
             except mysql.connector.Error as err:
@@ -356,6 +652,7 @@ class AdManagerTool:
 
     def run(self):
         self.root.mainloop()
+        self.ingest_worker.close()
 
 if __name__ == '__main__':
     app = AdManagerTool()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""addisplay.py - 全螢幕廣告顯示與預先解碼的媒體快取
+
+``display_ad`` 原本只印出廣告標題與內容。本模組提供實際的顯示層：
+
+* :class:`MediaCache` - 依路徑快取已解碼、已縮放至螢幕解析度（等比例置中、
+  黑邊補齊）的 BGR 影像，依位元組數上限以 LRU 淘汰。圖片直接解碼，影片
+  （``video_path``）取第一張影格作為封面。:meth:`MediaCache.preload` 在背景
+  執行緒預先載入所有上架廣告的媒體。
+* :class:`AdDisplay` - 全螢幕 OpenCV 視窗。切換廣告時只從快取複製到預先
+  配置的畫布後 ``imshow``，解碼與磁碟讀取不在關鍵路徑上；未預載的媒體才
+  同步載入並計為 miss。每次切換的耗時記錄於 ``face_ad_switch_seconds``。
+  影片廣告先顯示快取的封面，再交由 :mod:`advideo` 在背景解碼，主迴圈每次
+  迭代呼叫 :meth:`AdDisplay.tick` 顯示已到時間的影格。
+
+沒有媒體的廣告以標題與內容產生文字畫面，同樣放入快取。
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from facemetrics import AD_MEDIA_CACHE, AD_SWITCH_LATENCY
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_NAME = "Advertisement"
+DEFAULT_CACHE_MB = 256
+# 常見的 CJK 字型位置（樹莓派 OS 安裝 fonts-noto-cjk 後）
+DEFAULT_FONT_PATHS = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+)
+VIDEO_SUFFIXES = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+
+
+def fit_to_screen(image: np.ndarray, width: int, height: int) -> np.ndarray:
+    """等比例縮放至 ``width``×``height`` 並置中，其餘補黑。"""
+
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    source_height, source_width = image.shape[:2]
+    scale = min(width / source_width, height / source_height)
+    target = (max(1, int(source_width * scale)), max(1, int(source_height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, target, interpolation=interpolation)
+    top = (height - target[1]) // 2
+    left = (width - target[0]) // 2
+    canvas[top : top + target[1], left : left + target[0]] = resized
+    return canvas
+
+
+def decode_media(path: str) -> Optional[np.ndarray]:
+    """解碼圖片，影片則取第一張影格。"""
+
+    if Path(path).suffix.lower() in VIDEO_SUFFIXES:
+        capture = cv2.VideoCapture(path)
+        try:
+            ok, frame = capture.read()
+        finally:
+            capture.release()
+        return frame if ok else None
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def _load_font(size: int, font_path: Optional[str] = None):
+    for candidate in ([font_path] if font_path else []) + list(DEFAULT_FONT_PATHS):
+        if candidate and Path(candidate).exists():
+            try:
+                return ImageFont.truetype(candidate, size)
+            except OSError:
+                continue
+    return ImageFont.load_default()
+
+
+def render_text_slide(
+    title: str,
+    content: Optional[str],
+    width: int,
+    height: int,
+    font_path: Optional[str] = None,
+) -> np.ndarray:
+    """沒有媒體的廣告：黑底白字的標題與內容。"""
+
+    image = Image.new("RGB", (width, height), (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    title_font = _load_font(max(24, height // 12), font_path)
+    body_font = _load_font(max(16, height // 24), font_path)
+    margin = width // 12
+    draw.text((margin, height // 4), title or "", fill=(255, 255, 255), font=title_font)
+    y = height // 4 + height // 8
+    for line in (content or "").splitlines():
+        draw.text((margin, y), line, fill=(220, 220, 220), font=body_font)
+        y += height // 18
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+class MediaCache:
+    """依位元組數上限以 LRU 淘汰、已縮放至螢幕解析度的媒體快取。"""
+
+    def __init__(self, screen_size: Tuple[int, int], max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024) -> None:
+        self.width, self.height = screen_size
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._preload_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                AD_MEDIA_CACHE.inc(result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        AD_MEDIA_CACHE.inc(result="hit")
+        return image
+
+    def put(self, key: str, image: np.ndarray) -> None:
+        if image.nbytes > self.max_bytes:
+            LOGGER.warning("媒體 %s 大於快取上限，不快取", key)
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            self._entries[key] = image
+            self.bytes += image.nbytes
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def load(self, path: str) -> Optional[np.ndarray]:
+        """解碼並縮放後放入快取；無法讀取時回傳 ``None``。"""
+
+        decoded = decode_media(path)
+        if decoded is None:
+            LOGGER.warning("無法解碼廣告媒體 %s", path)
+            return None
+        image = fit_to_screen(decoded, self.width, self.height)
+        self.put(path, image)
+        return image
+
+    def preload(self, paths: Iterable[str], background: bool = True) -> None:
+        """預先載入尚未快取的媒體；``background`` 時於背景執行緒進行。"""
+
+        pending = [path for path in dict.fromkeys(paths) if path and path not in self]
+
+        def _run() -> None:
+            started = time.perf_counter()
+            loaded = sum(1 for path in pending if self.load(path) is not None)
+            LOGGER.info(
+                "預載 %d/%d 個廣告媒體，耗時 %.1f 秒，快取 %.1f MB",
+                loaded, len(pending), time.perf_counter() - started, self.bytes / 1e6,
+            )
+
+        if not pending:
+            return
+        if not background:
+            _run()
+            return
+        self._preload_thread = threading.Thread(target=_run, name="ad-media-preload", daemon=True)
+        self._preload_thread.start()
+
+    def summary(self) -> str:
+        return (
+            f"entries={len(self._entries)} bytes={self.bytes} hits={self.hits} "
+            f"misses={self.misses} evictions={self.evictions}"
+        )
+
+
+class AdDisplay:
+    """全螢幕廣告視窗；切換廣告只做快取影像的複製與顯示。"""
+
+    def __init__(
+        self,
+        screen_size: Tuple[int, int] = (1920, 1080),
+        fullscreen: bool = True,
+        cache_mb: int = DEFAULT_CACHE_MB,
+        window_name: str = DEFAULT_WINDOW_NAME,
+        font_path: Optional[str] = None,
+        video_queue: int = 8,
+        video_gstreamer: bool = True,
+    ) -> None:
+        self.width, self.height = screen_size
+        self.fullscreen = fullscreen
+        self.window_name = window_name
+        self.font_path = font_path
+        self.cache = MediaCache(screen_size, cache_mb * 1024 * 1024)
+        # 顯示用的畫布在第一次切換時配置，之後重複使用
+        self.canvas: Optional[np.ndarray] = None
+        self.current_ad: Optional[int] = None
+        self.shown_at: Optional[float] = None
+        self.switches = 0
+        self.last_switch_seconds = 0.0
+        self.video_queue = video_queue
+        self.video_gstreamer = video_gstreamer
+        self.playback = None
+        self._window_open = False
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "AdDisplay":
+        """依設定檔 ``display`` 區段建立。"""
+
+        return cls(
+            screen_size=(int(config.get("screen_width", 1920)), int(config.get("screen_height", 1080))),
+            fullscreen=bool(config.get("fullscreen", True)),
+            cache_mb=int(config.get("cache_mb", DEFAULT_CACHE_MB)),
+            font_path=config.get("font") or None,
+            video_queue=int(config.get("video_queue", 8)),
+            video_gstreamer=bool(config.get("video_gstreamer", True)),
+        )
+
+    def open(self) -> None:
+        if self._window_open:
+            return
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        if self.fullscreen:
+            cv2.setWindowProperty(self.window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        else:
+            cv2.resizeWindow(self.window_name, self.width, self.height)
+        self._window_open = True
+
+    def close(self) -> None:
+        self.stop_video()
+        if self._window_open:
+            cv2.destroyWindow(self.window_name)
+            self._window_open = False
+
+    def media_key(self, ad_id: int, media_path: Optional[str]) -> str:
+        return media_path or f"text:{ad_id}"
+
+    def preload(self, ads: Iterable[Tuple[int, str, Optional[str], Optional[str]]]) -> None:
+        """預載 (ad_id, title, content, media_path)；沒有媒體的廣告預先產生文字畫面。"""
+
+        paths = []
+        for ad_id, title, content, media_path in ads:
+            if media_path:
+                paths.append(media_path)
+            elif self.media_key(ad_id, None) not in self.cache:
+                self.cache.put(self.media_key(ad_id, None), self._text_slide(title, content))
+        self.cache.preload(paths)
+
+    def _text_slide(self, title: str, content: Optional[str]) -> np.ndarray:
+        return render_text_slide(title, content, self.width, self.height, self.font_path)
+
+    def prepare(self, ad_id: int, title: str, content: Optional[str], media_path: Optional[str]) -> None:
+        """預先將廣告畫面放入快取（可於背景執行緒呼叫），不計入命中率。"""
+
+        key = self.media_key(ad_id, media_path)
+        if key in self.cache:
+            return
+        if media_path and self.cache.load(media_path) is not None:
+            return
+        self.cache.put(key, self._text_slide(title, content))
+
+    def frame_for(self, ad_id: int, title: str, content: Optional[str], media_path: Optional[str]) -> np.ndarray:
+        key = self.media_key(ad_id, media_path)
+        image = self.cache.get(key)
+        if image is None and media_path:
+            image = self.cache.load(media_path)
+        if image is None:
+            image = self._text_slide(title, content)
+            self.cache.put(key, image)
+        return image
+
+    def show(self, ad_id: int, title: str, content: Optional[str], media_path: Optional[str]) -> float:
+        """切換至指定廣告，回傳切換耗時（秒）。"""
+
+        started = time.perf_counter()
+        self.stop_video()
+        self.open()
+        self._present(self.frame_for(ad_id, title, content, media_path))
+        elapsed = time.perf_counter() - started
+        if media_path and Path(media_path).suffix.lower() in VIDEO_SUFFIXES:
+            self.start_video(media_path)
+        self.current_ad = ad_id
+        self.shown_at = time.monotonic()
+        self.switches += 1
+        self.last_switch_seconds = elapsed
+        AD_SWITCH_LATENCY.observe(elapsed)
+        return elapsed
+
+    def _present(self, frame: np.ndarray) -> None:
+        if self.canvas is None:
+            self.canvas = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        np.copyto(self.canvas, frame)
+        cv2.imshow(self.window_name, self.canvas)
+
+    def start_video(self, path: str) -> bool:
+        """在背景解碼影片；封面已在畫面上，之後由 :meth:`tick` 接續顯示。"""
+
+        # advideo 匯入本模組的 fit_to_screen，於此延後匯入避免循環
+        from advideo import VideoPlayback
+
+        playback = VideoPlayback(
+            path,
+            (self.width, self.height),
+            queue_size=self.video_queue,
+            prefer_gstreamer=self.video_gstreamer,
+        )
+        if not playback.start():
+            return False
+        self.playback = playback
+        return True
+
+    def stop_video(self) -> None:
+        if self.playback is not None:
+            self.playback.stop()
+            LOGGER.info("廣告影片 %s：%s", self.playback.path, self.playback.summary())
+            self.playback = None
+
+    def tick(self) -> bool:
+        """主迴圈每次迭代呼叫；有已到時間的影片影格時顯示並回傳 ``True``。"""
+
+        if self.playback is None:
+            return False
+        frame = self.playback.next_frame()
+        if frame is None:
+            if self.playback.done:
+                self.stop_video()
+            return False
+        self._present(frame)
+        return True
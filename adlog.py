@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""adlog.py - 廣告曝光紀錄的背景批次寫入
+
+原本每次顯示廣告都在主迴圈內 ``INSERT`` 一筆 ``ad_display_log`` 並立即
+``commit``，資料庫稍慢就會拖住辨識迴圈；``display_duration`` 也一律使用
+預設的 10 秒。本模組改為 write-behind：
+
+* :class:`Impression` 於廣告上螢幕時建立，下架時以實際經過時間填入
+  ``display_duration``。
+* :class:`ImpressionWriter` 以有界佇列接收曝光紀錄，背景執行緒累積到
+  ``batch_size`` 筆或 ``flush_interval`` 秒後以單一多列 ``INSERT`` 寫入。
+* 佇列已滿時最多等待 ``put_timeout`` 秒（背壓），仍無空位則直接寫入本地
+  暫存檔；資料庫中斷時整批寫入暫存檔，恢復連線後優先補寫。
+
+暫存檔為每行一筆 JSON，可直接檢視::
+
+    tail ad_display_spool.jsonl
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from facemetrics import AD_LOG_ROWS
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_PATH = Path("ad_display_spool.jsonl")
+INSERT_PREFIX = (
+    "INSERT INTO ad_display_log (member_id, ad_id, display_time, display_location, display_duration) VALUES "
+)
+ROW_PLACEHOLDER = "(%s, %s, %s, %s, %s)"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 喚醒背景執行緒用的佇列標記
+_WAKE = object()
+
+
+@dataclass
+class Impression:
+    """一次廣告曝光；``display_duration`` 為實際顯示秒數。"""
+
+    member_id: Optional[int]
+    ad_id: int
+    display_time: str = field(default_factory=lambda: datetime.now().strftime(TIME_FORMAT))
+    display_location: str = "main_screen"
+    display_duration: Optional[int] = None
+    started: float = field(default_factory=time.monotonic, repr=False, compare=False)
+
+    def finish(self, now: Optional[float] = None) -> "Impression":
+        """廣告下架時記錄實際顯示秒數（四捨五入，至少 0）。"""
+
+        now = time.monotonic() if now is None else now
+        self.display_duration = max(0, int(round(now - self.started)))
+        return self
+
+    def to_row(self) -> tuple:
+        return (self.member_id, self.ad_id, self.display_time, self.display_location, self.display_duration)
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data.pop("started")
+        return json.dumps(data, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> "Impression":
+        return cls(**json.loads(line))
+
+
+def build_insert(impressions: Sequence[Impression]):
+    """組成多列 ``INSERT`` 與展開後的參數。"""
+
+    query = INSERT_PREFIX + ", ".join([ROW_PLACEHOLDER] * len(impressions))
+    params: List = []
+    for impression in impressions:
+        params.extend(impression.to_row())
+    return query, params
+
+
+class ImpressionWriter:
+    """以背景執行緒批次寫入 ``ad_display_log``。
+
+    Args:
+        connect: 建立資料庫連線的函式；寫入執行緒使用自己的連線，不與主迴圈共用。
+        batch_size: 累積筆數達到此值即寫入。
+        flush_interval: 最早一筆等待超過此秒數即寫入。
+        max_pending: 佇列上限。
+        put_timeout: 佇列已滿時 :meth:`submit` 最多等待的秒數。
+        spool_path: 無法寫入資料庫時的本地暫存檔。
+        retry_interval: 連線失敗後重試的間隔秒數。
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], object],
+        batch_size: int = 50,
+        flush_interval: float = 5.0,
+        max_pending: int = 1000,
+        put_timeout: float = 0.05,
+        spool_path: Path = DEFAULT_SPOOL_PATH,
+        retry_interval: float = 30.0,
+    ) -> None:
+        self.connect = connect
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.spool_path = Path(spool_path)
+        self.retry_interval = retry_interval
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=max(1, max_pending))
+        self.written = 0
+        self.spooled = 0
+        self.batches = 0
+        self._connection = None
+        self._next_retry = 0.0
+        self._spool_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # 主迴圈呼叫
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ad-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, impression: Impression) -> bool:
+        """排入一筆曝光；佇列已滿時寫入暫存檔並回傳 ``False``。"""
+
+        try:
+            self.queue.put(impression, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            LOGGER.warning("曝光紀錄佇列已滿，改寫入暫存檔 %s", self.spool_path)
+            self._spool([impression])
+            return False
+
+    @property
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    def flush(self) -> None:
+        """要求背景執行緒立即寫入目前累積的紀錄。"""
+
+        self._flush_requested.set()
+        self._wake()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """寫完佇列中的紀錄後停止；逾時未完成的紀錄留在暫存檔。"""
+
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            LOGGER.warning("曝光紀錄寫入執行緒未在 %.1f 秒內結束", timeout)
+        else:
+            leftover = self._drain_nowait()
+            if leftover:
+                self._spool(leftover)
+            self._close_connection()
+        self._thread = None
+
+    def _wake(self) -> None:
+        try:
+            self.queue.put_nowait(_WAKE)
+        except queue.Full:
+            # 佇列已滿時背景執行緒不會閒置，稍後自然會檢查旗標
+            pass
+
+    # ------------------------------------------------------------------
+    # 背景執行緒
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        batch: List[Impression] = []
+        deadline: Optional[float] = None
+        while True:
+            # 閒置時每隔 retry_interval 醒來補寫暫存檔
+            wait = self.retry_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=wait)
+            except queue.Empty:
+                item = _WAKE
+            if item is not _WAKE:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if self._stopping.is_set():
+                batch.extend(self._drain_nowait())
+                self._write(batch)
+                return
+            if not batch:
+                self._flush_requested.clear()
+                self._replay_spool()
+                continue
+            if (
+                len(batch) >= self.batch_size
+                or time.monotonic() >= deadline
+                or self._flush_requested.is_set()
+            ):
+                self._flush_requested.clear()
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _drain_nowait(self) -> List[Impression]:
+        items: List[Impression] = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _WAKE:
+                items.append(item)
+
+    def _write(self, batch: List[Impression]) -> None:
+        if not batch:
+            return
+        self._replay_spool()
+        if not self._insert(batch):
+            self._spool(batch)
+
+    def _insert(self, batch: Sequence[Impression]) -> bool:
+        connection = self._ensure_connection()
+        if connection is None:
+            return False
+        try:
+            cursor = connection.cursor()
+            try:
+                for start in range(0, len(batch), self.batch_size):
+                    query, params = build_insert(batch[start : start + self.batch_size])
+                    cursor.execute(query, params)
+                connection.commit()
+            finally:
+                cursor.close()
+        except Exception as exc:
+            LOGGER.error("寫入 ad_display_log 失敗，改寫入暫存檔: %s", exc)
+            self._close_connection()
+            return False
+        self.written += len(batch)
+        self.batches += 1
+        AD_LOG_ROWS.inc(len(batch), result="written")
+        return True
+
+    def _ensure_connection(self):
+        if self._connection is not None:
+            return self._connection
+        if time.monotonic() < self._next_retry:
+            return None
+        try:
+            self._connection = self.connect()
+        except Exception as exc:
+            LOGGER.error("曝光紀錄寫入連線失敗，%.0f 秒後重試: %s", self.retry_interval, exc)
+            self._next_retry = time.monotonic() + self.retry_interval
+            self._connection = None
+        return self._connection
+
+    def _close_connection(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:  # pragma: no cover - 連線已中斷
+                pass
+            self._connection = None
+            self._next_retry = time.monotonic() + self.retry_interval
+
+    # ------------------------------------------------------------------
+    # 本地暫存
+    # ------------------------------------------------------------------
+    def _spool(self, impressions: Sequence[Impression]) -> None:
+        try:
+            with self._spool_lock, self.spool_path.open("a", encoding="utf-8") as fp:
+                for impression in impressions:
+                    fp.write(impression.to_json() + "\n")
+        except OSError as exc:
+            LOGGER.error("無法寫入曝光暫存檔，遺失 %d 筆: %s", len(impressions), exc)
+            AD_LOG_ROWS.inc(len(impressions), result="dropped")
+            return
+        self.spooled += len(impressions)
+        AD_LOG_ROWS.inc(len(impressions), result="spooled")
+
+    def _replay_spool(self) -> None:
+        if not self.spool_path.exists() or self._ensure_connection() is None:
+            return
+        with self._spool_lock:
+            try:
+                lines = self.spool_path.read_text(encoding="utf-8").splitlines()
+            except OSError:
+                return
+            impressions = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    impressions.append(Impression.from_json(line))
+                except (TypeError, ValueError):
+                    LOGGER.warning("略過無法解析的暫存紀錄: %s", line)
+            if impressions and not self._insert(impressions):
+                return
+            self.spool_path.unlink()
+        if impressions:
+            LOGGER.info("已補寫 %d 筆暫存的曝光紀錄", len(impressions))
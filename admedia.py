@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""admedia.py - 廣告媒體匯入：轉檔、縮圖與內容雜湊去重
+
+``ad_manager`` 原本直接把操作者挑選的檔案複製進廣告目錄，8K 圖片或大型 MOV
+影片要到顯示端切換廣告時才付出解碼成本。本模組在儲存廣告時先處理媒體：
+
+* 圖片縮小至不超過顯示解析度並存成 JPEG（JPEG 來源以 ``Image.draft`` 直接
+  以縮小比例解碼，8K 圖片不必完整展開）。
+* 影片以 ``ffmpeg`` 轉為 H.264／yuv420p、不超過顯示解析度的 MP4
+  （樹莓派可硬體解碼，``+faststart`` 讓播放端不必讀到檔尾）；找不到
+  ``ffmpeg`` 時僅複製原檔並記錄警告。
+* 每個媒體另產生列表用的 PNG 縮圖（Tk 的 ``PhotoImage`` 可直接讀取）。
+* 輸出檔名為來源內容的 SHA-256 前綴，相同內容只處理一次，後續直接沿用。
+
+:class:`IngestWorker` 在背景執行緒依序處理，進度與結果放入佇列，
+由 Tk 主執行緒以 ``after`` 輪詢取出。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import cv2
+from PIL import Image
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SCREEN_SIZE = (1920, 1080)
+DEFAULT_THUMB_SIZE = (96, 54)
+JPEG_QUALITY = 90
+HASH_PREFIX = 16
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
+VIDEO_SUFFIXES = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+
+ProgressCallback = Callable[[float, str], None]
+
+
+def content_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """檔案內容的 SHA-256（十六進位）。"""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def media_kind(path: str) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix in VIDEO_SUFFIXES:
+        return "video"
+    if suffix in IMAGE_SUFFIXES:
+        return "image"
+    raise ValueError(f"不支援的媒體格式: {path}")
+
+
+def transcode_command(source: str, destination: str, width: int, height: int, ffmpeg: str = "ffmpeg") -> List[str]:
+    """轉為不超過 ``width``×``height`` 的 H.264 MP4；進度輸出至 stdout。"""
+
+    scale = (
+        f"scale='min({width},iw)':'min({height},ih)':force_original_aspect_ratio=decrease,"
+        "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    )
+    return [
+        ffmpeg, "-y", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+        "-i", source,
+        "-vf", scale,
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+        "-profile:v", "high", "-level", "4.1", "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart", "-an",
+        destination,
+    ]
+
+
+def parse_progress(line: str, duration: float) -> Optional[float]:
+    """解析 ``-progress`` 的 ``out_time_us=`` 行，回傳 0～1 的進度。"""
+
+    key, _, value = line.strip().partition("=")
+    if key not in ("out_time_us", "out_time_ms") or duration <= 0:
+        return None
+    try:
+        # ffmpeg 的 out_time_ms 實際上也是微秒
+        seconds = int(value) / 1_000_000
+    except ValueError:
+        return None
+    return max(0.0, min(1.0, seconds / duration))
+
+
+def video_duration(path: str) -> float:
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+    finally:
+        capture.release()
+    return frames / fps if fps > 0 else 0.0
+
+
+@dataclass
+class IngestResult:
+    source: str
+    path: str
+    thumbnail: Optional[str]
+    digest: str
+    reused: bool
+
+
+class MediaIngestor:
+    """將來源媒體轉為顯示用格式並產生縮圖，以內容雜湊命名去重。"""
+
+    def __init__(
+        self,
+        images_dir: str = "advertisements/images",
+        videos_dir: str = "advertisements/videos",
+        thumbs_dir: str = "advertisements/thumbs",
+        screen_size: Tuple[int, int] = DEFAULT_SCREEN_SIZE,
+        thumb_size: Tuple[int, int] = DEFAULT_THUMB_SIZE,
+        ffmpeg: Optional[str] = None,
+    ) -> None:
+        self.images_dir = Path(images_dir)
+        self.videos_dir = Path(videos_dir)
+        self.thumbs_dir = Path(thumbs_dir)
+        self.screen_size = screen_size
+        self.thumb_size = thumb_size
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        for directory in (self.images_dir, self.videos_dir, self.thumbs_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def is_ingested(self, path: str) -> bool:
+        """路徑已位於廣告目錄內（先前匯入過）則不再處理。"""
+
+        resolved = Path(path).resolve()
+        return any(directory.resolve() in resolved.parents for directory in (self.images_dir, self.videos_dir))
+
+    def thumbnail_for(self, media_path: Optional[str]) -> Optional[str]:
+        if not media_path:
+            return None
+        thumbnail = self.thumbs_dir / f"{Path(media_path).stem}.png"
+        return str(thumbnail) if thumbnail.exists() else None
+
+    def ingest(self, source: str, progress: Optional[ProgressCallback] = None) -> IngestResult:
+        progress = progress or (lambda fraction, message: None)
+        kind = media_kind(source)
+        progress(0.0, f"計算雜湊 {Path(source).name}")
+        digest = content_hash(source)
+        stem = digest[:HASH_PREFIX]
+        if kind == "image":
+            destination = self.images_dir / f"{stem}.jpg"
+        else:
+            destination = self.videos_dir / f"{stem}{'.mp4' if self.ffmpeg else Path(source).suffix.lower()}"
+        thumbnail = self.thumbs_dir / f"{stem}.png"
+
+        reused = destination.exists()
+        if reused:
+            LOGGER.info("%s 與既有媒體 %s 內容相同，直接沿用", source, destination)
+        elif kind == "image":
+            self._transcode_image(source, destination)
+        else:
+            self._transcode_video(source, destination, progress)
+
+        if not thumbnail.exists():
+            progress(0.95, "產生縮圖")
+            self._write_thumbnail(str(destination), kind, thumbnail)
+        progress(1.0, "完成")
+        return IngestResult(
+            source=source,
+            path=str(destination),
+            thumbnail=str(thumbnail) if thumbnail.exists() else None,
+            digest=digest,
+            reused=reused,
+        )
+
+    # ------------------------------------------------------------------
+    def _transcode_image(self, source: str, destination: Path) -> None:
+        with Image.open(source) as image:
+            # JPEG 可在解碼時直接縮小（1/2、1/4、1/8），大幅減少記憶體與時間
+            image.draft("RGB", self.screen_size)
+            image = image.convert("RGB")
+            image.thumbnail(self.screen_size, Image.LANCZOS)
+            partial = destination.with_suffix(".part")
+            image.save(partial, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        os.replace(partial, destination)
+
+    def _transcode_video(self, source: str, destination: Path, progress: ProgressCallback) -> None:
+        partial = destination.with_name(f"{destination.stem}.part{destination.suffix}")
+        if not self.ffmpeg:
+            LOGGER.warning("找不到 ffmpeg，影片 %s 不轉檔直接複製", source)
+            shutil.copy2(source, partial)
+            os.replace(partial, destination)
+            return
+        duration = video_duration(source)
+        width, height = self.screen_size
+        # stderr 寫入暫存檔而非管線：逐行讀取 stdout 進度時，ffmpeg 若寫滿
+        # stderr 管線會卡住，雙方互相等待
+        with tempfile.TemporaryFile(mode="w+", encoding="utf-8", errors="replace") as errors:
+            process = subprocess.Popen(
+                transcode_command(source, str(partial), width, height, self.ffmpeg),
+                stdout=subprocess.PIPE,
+                stderr=errors,
+                text=True,
+            )
+            for line in process.stdout:
+                fraction = parse_progress(line, duration)
+                if fraction is not None:
+                    progress(0.9 * fraction, f"轉檔 {Path(source).name}")
+            if process.wait() != 0:
+                partial.unlink(missing_ok=True)
+                errors.seek(0)
+                raise RuntimeError(f"影片轉檔失敗: {errors.read().strip()}")
+        os.replace(partial, destination)
+
+    def _write_thumbnail(self, media_path: str, kind: str, thumbnail: Path) -> None:
+        if kind == "video":
+            capture = cv2.VideoCapture(media_path)
+            try:
+                ok, frame = capture.read()
+            finally:
+                capture.release()
+            if not ok:
+                LOGGER.warning("無法讀取影片 %s 產生縮圖", media_path)
+                return
+            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        else:
+            with Image.open(media_path) as source:
+                source.draft("RGB", self.thumb_size)
+                image = source.convert("RGB")
+        image.thumbnail(self.thumb_size, Image.LANCZOS)
+        image.save(thumbnail, "PNG")
+
+
+class IngestWorker:
+    """背景依序匯入媒體；進度與結果以事件放入 :attr:`events` 供 GUI 輪詢。
+
+    事件為 ``("progress", job_id, fraction, message)``、
+    ``("done", job_id, results)`` 或 ``("error", job_id, message)``。
+    """
+
+    def __init__(self, ingestor: MediaIngestor) -> None:
+        self.ingestor = ingestor
+        self.events: "queue.Queue[tuple]" = queue.Queue()
+        self._jobs: "queue.Queue[Optional[Tuple[int, Sequence[str]]]]" = queue.Queue()
+        self._next_job = 0
+        self._thread = threading.Thread(target=self._run, name="ad-media-ingest", daemon=True)
+        self._thread.start()
+
+    def submit(self, sources: Sequence[str]) -> int:
+        self._next_job += 1
+        self._jobs.put((self._next_job, list(sources)))
+        return self._next_job
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            job_id, sources = job
+            results = []
+            try:
+                for index, source in enumerate(sources):
+                    def _progress(fraction: float, message: str, index: int = index) -> None:
+                        self.events.put(("progress", job_id, (index + fraction) / len(sources), message))
+
+                    results.append(self.ingestor.ingest(source, _progress))
+            except Exception as exc:  # 轉檔失敗回報給 GUI，不中斷 worker
+                LOGGER.exception("媒體匯入失敗")
+                self.events.put(("error", job_id, str(exc)))
+                continue
+            self.events.put(("done", job_id, results))
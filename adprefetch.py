@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""adprefetch.py - 身分確認前預先決定廣告
+
+原本的流程要等軌跡累積足夠票數確認身分後，才依序查詢會員偏好、挑選
+廣告，再載入媒體；這些都落在「人臉出現 → 廣告上螢幕」的關鍵路徑上。
+
+:class:`AdPrefetcher` 在軌跡一出現領先的已知身分時（``IdentityTracker.leaders``）
+就於背景執行緒以獨立的資料庫連線查詢該會員的偏好與廣告，並預先解碼媒體：
+
+* 身分確認且與預測相同 → :meth:`AdPrefetcher.commit` 直接取用結果（hit）。
+* 尚未完成、預測不同或查詢失敗 → 立即回傳 ``None``，由呼叫端同步查詢（miss）。
+* 領先身分改變或軌跡消失 → 捨棄（discarded），仍在佇列中的查詢會被取消。
+
+已在執行中的查詢無法取消，會保留到完成為止；期間同一會員再次被預測時
+直接沿用，不會在背景佇列中重複排入相同的查詢。
+
+結果計入 ``face_ad_prefetch_total{result}``。
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, Dict, Optional
+
+from facemetrics import AD_PREFETCH
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Speculation:
+    """某條軌跡的預先決定；``result`` 於 commit 成功後填入。"""
+
+    track_id: int
+    member_id: int
+    started: float
+    future: Future
+    result: Any = None
+
+
+class AdPrefetcher:
+    """以單一背景執行緒與獨立連線預先決定廣告。
+
+    Args:
+        connect: 建立資料庫連線的函式，只在背景執行緒中呼叫。
+        decide: ``decide(connection, member_id)`` 回傳廣告資料（可為 ``None``）。
+        prepare: ``prepare(ad)`` 預先載入廣告媒體，可省略。
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        decide: Callable[[Any, int], Any],
+        prepare: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self.connect = connect
+        self.decide = decide
+        self.prepare = prepare
+        self.speculations: Dict[int, Speculation] = {}
+        # 已無軌跡使用但仍在執行中的查詢，依會員編號保留供之後沿用
+        self.running: Dict[int, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self._connection = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ad-prefetch")
+
+    # ------------------------------------------------------------------
+    # 背景執行緒
+    # ------------------------------------------------------------------
+    def _run(self, member_id: int) -> Any:
+        if self._connection is None:
+            self._connection = self.connect()
+        try:
+            ad = self.decide(self._connection, member_id)
+        except Exception:
+            # 連線可能已中斷，下次重新建立
+            self._close_connection()
+            raise
+        if ad is not None and self.prepare is not None:
+            self.prepare(ad)
+        return ad
+
+    def _close_connection(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:  # pragma: no cover - 關閉失敗不影響結束
+                pass
+            self._connection = None
+
+    # ------------------------------------------------------------------
+    # 主執行緒
+    # ------------------------------------------------------------------
+    def speculate(self, track_id: int, member_id: int) -> Speculation:
+        """軌跡目前領先的身分為 ``member_id``；尚未預先決定時排入背景查詢。"""
+
+        current = self.speculations.get(track_id)
+        if current is not None:
+            if current.member_id == member_id:
+                return current
+            self._discard(track_id)
+        future = self.running.pop(member_id, None)
+        if future is None:
+            future = self._executor.submit(self._run, member_id)
+        speculation = Speculation(track_id, member_id, time.monotonic(), future)
+        self.speculations[track_id] = speculation
+        return speculation
+
+    def commit(self, track_id: int, member_id: int) -> Optional[Speculation]:
+        """身分已確認：預測相符且已完成時回傳該預先決定，否則立即回傳 ``None``。
+
+        尚未完成的查詢不等待也不取消，保留在 :attr:`running` 供同一會員之後沿用。
+        """
+
+        speculation = self.speculations.pop(track_id, None)
+        if speculation is not None and speculation.member_id != member_id:
+            self._release(speculation)
+            self._count("discarded")
+            speculation = None
+        if speculation is None:
+            self._count("miss")
+            return None
+        if not speculation.future.done():
+            LOGGER.debug("軌跡 %s 的預先決定尚未完成，改為同步查詢", track_id)
+            self._release(speculation)
+            self._count("miss")
+            return None
+        try:
+            speculation.result = speculation.future.result()
+        except Exception:
+            LOGGER.exception("預先決定廣告失敗")
+            self._count("miss")
+            return None
+        self._count("hit")
+        return speculation
+
+    def retain(self, track_ids: Collection[int]) -> None:
+        """捨棄不在 ``track_ids`` 中（軌跡消失或不再領先已知身分）的預先決定。"""
+
+        for track_id in [track_id for track_id in self.speculations if track_id not in track_ids]:
+            self._discard(track_id)
+        # 保留的查詢完成後結果可能已過時，下次預測時重新查詢
+        for member_id in [member_id for member_id, future in self.running.items() if future.done()]:
+            del self.running[member_id]
+
+    def close(self) -> None:
+        self.retain(())
+        self.running.clear()
+        self._executor.submit(self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    def summary(self) -> str:
+        return f"hits={self.hits} misses={self.misses} discarded={self.discarded}"
+
+    def _discard(self, track_id: int) -> None:
+        self._release(self.speculations.pop(track_id))
+        self._count("discarded")
+
+    def _release(self, speculation: Speculation) -> None:
+        """取消仍在佇列中的查詢；已在執行中的保留給同一會員之後沿用。"""
+
+        if not speculation.future.cancel() and not speculation.future.done():
+            self.running[speculation.member_id] = speculation.future
+
+    def _count(self, result: str) -> None:
+        if result == "hit":
+            self.hits += 1
+        elif result == "miss":
+            self.misses += 1
+        else:
+            self.discarded += 1
+        AD_PREFETCH.inc(result=result)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""advideo.py - 廣告影片的背景解碼與播放
+
+``advertisements.video_path`` 的影片由專屬的解碼執行緒讀取，解碼後的影格
+放入有界佇列；主迴圈（同時負責攝影機辨識）只在每次迭代呼叫
+:meth:`VideoPlayback.next_frame` 取出「已到播放時間」的影格顯示，
+解碼再慢也不會拖住辨識。
+
+* 解碼優先使用 GStreamer 管線（``cv2.CAP_GSTREAMER``，與
+  ``facecam._create_capture`` 相同的後端）：``decodebin`` 會自動選用
+  樹莓派的 V4L2 硬體解碼器，縮放與補黑邊也在管線內完成。
+* OpenCV 未編入 GStreamer 或管線無法開啟時，改用預設後端軟體解碼，
+  並在解碼執行緒內縮放至螢幕解析度。
+* 主迴圈取影格時，已落後超過一個影格間隔且後面還有影格的會被丟棄，
+  次數記錄於 ``face_ad_video_frames_total{result="dropped"}``；每張影格的
+  解碼耗時記錄於 ``face_ad_video_decode_seconds``。
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from addisplay import fit_to_screen
+from facemetrics import AD_VIDEO_DECODE_LATENCY, AD_VIDEO_FRAMES
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FPS = 30.0
+DEFAULT_QUEUE_SIZE = 8
+_GSTREAMER_AVAILABLE: Optional[bool] = None
+
+
+def gstreamer_available() -> bool:
+    """OpenCV 是否編入 GStreamer 後端（結果會快取）。"""
+
+    global _GSTREAMER_AVAILABLE
+    if _GSTREAMER_AVAILABLE is None:
+        try:
+            info = cv2.getBuildInformation()
+        except Exception:  # pragma: no cover - 極舊版本 OpenCV
+            info = ""
+        _GSTREAMER_AVAILABLE = any(
+            "GStreamer" in line and "YES" in line for line in str(info).splitlines()
+        )
+    return _GSTREAMER_AVAILABLE
+
+
+def gstreamer_pipeline(path: str, width: int, height: int) -> str:
+    """解碼並等比例縮放（補黑邊）至螢幕解析度的 GStreamer 管線。
+
+    caps 固定 ``pixel-aspect-ratio=1/1``：未指定時 ``videoscale`` 可改變像素
+    長寬比來符合寬高，畫面會被拉伸而不會補黑邊。
+    """
+
+    location = path.replace("\\", "\\\\").replace('"', '\\"')
+    return (
+        f'filesrc location="{location}" ! decodebin ! videoconvert ! '
+        f"videoscale add-borders=true ! video/x-raw,format=BGR,width={width},height={height},pixel-aspect-ratio=1/1 ! "
+        "appsink drop=false max-buffers=2 sync=false"
+    )
+
+
+def open_video(path: str, width: int, height: int, prefer_gstreamer: bool = True) -> Tuple[Optional[cv2.VideoCapture], str]:
+    """開啟影片，回傳 ``(capture, backend)``；無法開啟時 capture 為 ``None``。"""
+
+    if prefer_gstreamer and gstreamer_available():
+        capture = cv2.VideoCapture(gstreamer_pipeline(path, width, height), cv2.CAP_GSTREAMER)
+        if capture.isOpened():
+            return capture, "gstreamer"
+        capture.release()
+        LOGGER.info("GStreamer 無法開啟 %s，改用軟體解碼", path)
+    capture = cv2.VideoCapture(path)
+    if capture.isOpened():
+        return capture, "software"
+    capture.release()
+    return None, "none"
+
+
+class VideoPlayback:
+    """單一影片的背景解碼與依時間戳記取出影格。
+
+    Args:
+        path: 影片路徑。
+        screen_size: 輸出影格的 (寬, 高)。
+        loop: 播放結束後是否從頭重播（廣告持續顯示直到被切換）。
+        queue_size: 已解碼影格佇列上限，滿時解碼執行緒等待。
+        prefer_gstreamer: 是否優先使用 GStreamer 管線。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        screen_size: Tuple[int, int],
+        loop: bool = True,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        prefer_gstreamer: bool = True,
+    ) -> None:
+        self.path = path
+        self.width, self.height = screen_size
+        self.loop = loop
+        self.prefer_gstreamer = prefer_gstreamer
+        self.backend = "none"
+        self.fps = DEFAULT_FPS
+        self.frames: "queue.Queue[Tuple[float, np.ndarray]]" = queue.Queue(maxsize=max(1, queue_size))
+        self.decoded = 0
+        self.shown = 0
+        self.dropped = 0
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending: Optional[Tuple[float, np.ndarray]] = None
+        self._clock_start: Optional[float] = None
+
+    @property
+    def frame_interval(self) -> float:
+        return 1.0 / self.fps
+
+    def start(self) -> bool:
+        """開啟影片並啟動解碼執行緒；無法開啟時回傳 ``False``。"""
+
+        capture, self.backend = open_video(self.path, self.width, self.height, self.prefer_gstreamer)
+        if capture is None:
+            LOGGER.warning("無法開啟廣告影片 %s", self.path)
+            return False
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        if fps and 1.0 <= fps <= 240.0:
+            self.fps = float(fps)
+        self._thread = threading.Thread(target=self._decode_loop, args=(capture,), name="ad-video-decode", daemon=True)
+        self._thread.start()
+        LOGGER.info("播放廣告影片 %s（%s，%.1f fps）", self.path, self.backend, self.fps)
+        return True
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stop.set()
+        # 取出佇列中的影格，讓等待空位的解碼執行緒結束
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    def _decode_loop(self, capture: cv2.VideoCapture) -> None:
+        pts_offset = 0.0
+        last_pts = 0.0
+        index = 0
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                ok, frame = capture.read()
+                if not ok:
+                    if not self.loop or index == 0:
+                        break
+                    # 重播：時間戳記接續上一輪
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    pts_offset = last_pts + self.frame_interval
+                    index = 0
+                    continue
+                if frame.shape[1] != self.width or frame.shape[0] != self.height:
+                    frame = fit_to_screen(frame, self.width, self.height)
+                AD_VIDEO_DECODE_LATENCY.observe(time.perf_counter() - started, backend=self.backend)
+                last_pts = pts_offset + index / self.fps
+                index += 1
+                self.decoded += 1
+                while not self._stop.is_set():
+                    try:
+                        self.frames.put((last_pts, frame), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        finally:
+            capture.release()
+            self.finished.set()
+
+    # ------------------------------------------------------------------
+    def next_frame(self, now: Optional[float] = None) -> Optional[np.ndarray]:
+        """取出已到播放時間的影格；尚未到時間或佇列為空時回傳 ``None``。
+
+        主迴圈跟不上影片速度時，落後超過一個影格間隔、且後面已有影格的會被丟棄。
+        """
+
+        now = time.monotonic() if now is None else now
+        while True:
+            if self._pending is None:
+                try:
+                    self._pending = self.frames.get_nowait()
+                except queue.Empty:
+                    return None
+            pts, frame = self._pending
+            if self._clock_start is None:
+                self._clock_start = now - pts
+            due = self._clock_start + pts
+            if now < due:
+                return None
+            self._pending = None
+            if now - due > self.frame_interval and not self.frames.empty():
+                self.dropped += 1
+                AD_VIDEO_FRAMES.inc(result="dropped")
+                continue
+            self.shown += 1
+            AD_VIDEO_FRAMES.inc(result="shown")
+            return frame
+
+    @property
+    def done(self) -> bool:
+        """解碼結束且所有影格都已取出。"""
+
+        return self.finished.is_set() and self._pending is None and self.frames.empty()
+
+    def summary(self) -> str:
+        return (
+            f"backend={self.backend} fps={self.fps:.1f} decoded={self.decoded} "
+            f"shown={self.shown} dropped={self.dropped}"
+        )
@@ -0,0 +1,6 @@
+"""辨識流程的可重現效能基準測試。
+
+執行方式::
+
+    python -m bench.recognition_bench --sizes 1000,10000,100000 --output bench.json
+"""
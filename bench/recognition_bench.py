@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""bench/recognition_bench.py - 辨識流程基準測試
+
+以 :mod:`bench.synthetic` 產生的固定資料量測下列項目，結果輸出為 JSON，
+可用 ``git/tests/ci_summary.py`` 與基準檔比較不同版本：
+
+* ``load.csv`` / ``load.binary``：載入 facegen CSV 與 facegallery 映射檔
+* ``match.per_face`` / ``match.batched``：逐張與矩陣批次的全量比對
+* ``match.templates`` / ``match.ivf`` / ``match.hnsw``：身分樣板與近似最近鄰
+  （``hnsw`` 需安裝選用套件 ``hnswlib``）
+* ``frame.recognize``：``FaceRecognitionCamera.recognize_frame`` 端對端
+* ``db.log_attendance``：``DatabaseManager.log_attendance`` 寫入 SQLite 替身
+
+使用方式::
+
+    python -m bench.recognition_bench --sizes 1000,10000,100000 --output bench.json
+    python -m bench.recognition_bench --sizes 1000 --only match --repeat 3
+    python -m bench.recognition_bench --frames recorded.mp4 --only frame
+
+每個項目重複 ``--repeat`` 次，JSON 中保留每次的吞吐量與延遲百分位數，
+供回歸比較計算中位數與信賴區間。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from bench.synthetic import (  # noqa: E402 - 需先設定匯入路徑
+    UNKNOWN_LABEL,
+    attendance_sqlite,
+    load_frames,
+    make_gallery,
+    make_queries,
+    synthetic_frames,
+    write_encodings_csv,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+GROUPS = ("load", "match", "frame", "db")
+
+# (預測標籤, 距離) 的批次比對函式
+MatchFn = Callable[["np.ndarray"], Tuple[List[Optional[str]], "np.ndarray"]]
+
+
+@dataclass
+class BenchResult:
+    """單一基準項目的結果，每個列表元素對應一次重複。"""
+
+    name: str
+    size: int
+    unit: str
+    throughput: List[float] = field(default_factory=list)
+    p50_ms: List[float] = field(default_factory=list)
+    p95_ms: List[float] = field(default_factory=list)
+    peak_rss_mb: float = 0.0
+    extra: Dict[str, float] = field(default_factory=dict)
+    skipped: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}/{self.size}"
+
+    def to_dict(self) -> dict:
+        data = {
+            "name": self.name,
+            "size": self.size,
+            "unit": self.unit,
+            "throughput": [round(value, 3) for value in self.throughput],
+            "p50_ms": [round(value, 4) for value in self.p50_ms],
+            "p95_ms": [round(value, 4) for value in self.p95_ms],
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "extra": self.extra,
+        }
+        if self.skipped:
+            data["skipped"] = self.skipped
+        return data
+
+
+# ----------------------------------------------------------------------
+# 量測工具
+# ----------------------------------------------------------------------
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """最近秩法百分位數。"""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    """目前行程的最高常駐記憶體（MB）。"""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以 byte 回報
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def measure(
+    name: str,
+    size: int,
+    unit: str,
+    repeat: int,
+    run_once: Callable[[], Tuple[int, List[float]]],
+) -> BenchResult:
+    """重複執行 ``run_once``（回傳處理數量與每次呼叫的延遲秒數）。"""
+
+    result = BenchResult(name=name, size=size, unit=unit)
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        items, latencies = run_once()
+        elapsed = time.perf_counter() - start
+        result.throughput.append(items / elapsed if elapsed > 0 else 0.0)
+        result.p50_ms.append(percentile(latencies, 50) * 1000.0)
+        result.p95_ms.append(percentile(latencies, 95) * 1000.0)
+    result.peak_rss_mb = peak_rss_mb()
+    LOGGER.info(
+        "%-22s size=%-7d %10.1f %s  p95=%.3fms",
+        name,
+        size,
+        percentile(result.throughput, 50),
+        unit,
+        percentile(result.p95_ms, 50),
+    )
+    return result
+
+
+def skipped(name: str, size: int, unit: str, reason: str) -> BenchResult:
+    LOGGER.warning("略過 %s/%d: %s", name, size, reason)
+    return BenchResult(name=name, size=size, unit=unit, skipped=reason, peak_rss_mb=peak_rss_mb())
+
+
+# ----------------------------------------------------------------------
+# 資料庫載入
+# ----------------------------------------------------------------------
+
+def bench_gallery_load(
+    size: int,
+    encodings: np.ndarray,
+    labels: List[str],
+    workdir: Path,
+    repeat: int,
+) -> List[BenchResult]:
+    try:
+        from facecam import KnownFacesStore
+        from facegallery import GalleryPublisher, SharedGallery
+    except ImportError as exc:
+        return [skipped(name, size, "rows/s", str(exc)) for name in ("load.csv", "load.binary")]
+
+    csv_path = write_encodings_csv(workdir / f"gallery_{size}.csv", encodings, labels)
+    binary_path = workdir / f"gallery_{size}.bin"
+    GalleryPublisher(binary_path).publish(encodings, labels)
+
+    def load_csv() -> Tuple[int, List[float]]:
+        start = time.perf_counter()
+        store = KnownFacesStore()
+        store.load_from_csv(csv_path)
+        return len(store.labels), [time.perf_counter() - start]
+
+    def load_binary() -> Tuple[int, List[float]]:
+        start = time.perf_counter()
+        gallery = SharedGallery(binary_path)
+        gallery.attach()
+        # 觸碰所有分頁，與 CSV 一樣量到「可開始比對」為止
+        float(np.asarray(gallery.encodings).sum())
+        elapsed = time.perf_counter() - start
+        count = len(gallery)
+        gallery.close()
+        return count, [elapsed]
+
+    csv_result = measure("load.csv", size, "rows/s", repeat, load_csv)
+    csv_result.extra["file_mb"] = round(csv_path.stat().st_size / 1e6, 2)
+    binary_result = measure("load.binary", size, "rows/s", repeat, load_binary)
+    binary_result.extra["file_mb"] = round(binary_path.stat().st_size / 1e6, 2)
+    return [csv_result, binary_result]
+
+
+# ----------------------------------------------------------------------
+# 比對
+# ----------------------------------------------------------------------
+
+class IVFIndex:
+    """以 k-means 粗分群的倒排索引，僅掃描最接近的 ``nprobe`` 個群。"""
+
+    def __init__(self, encodings: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8, seed: int = 0) -> None:
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        count = len(self.encodings)
+        self.nlist = max(1, min(count, nlist or int(4 * math.sqrt(count))))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        rng = np.random.default_rng(seed)
+        sample = self.encodings[rng.choice(count, size=min(count, 50 * self.nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(10):
+            assignment = _nearest(sample, centroids)
+            for index in range(self.nlist):
+                members = sample[assignment == index]
+                if len(members):
+                    centroids[index] = members.mean(axis=0)
+        self.centroids = centroids
+        assignment = _nearest(self.encodings, centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.order = order
+        self.offsets = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+        self.sorted_encodings = self.encodings[order]
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """回傳每個查詢最近鄰的原始索引與距離。"""
+
+        coarse = _squared_distances(queries, self.centroids)
+        probes = np.argpartition(coarse, self.nprobe - 1, axis=1)[:, : self.nprobe]
+        indices = np.empty(len(queries), dtype=np.int64)
+        distances = np.empty(len(queries), dtype=np.float32)
+        for row, query in enumerate(queries):
+            spans = [np.arange(self.offsets[probe], self.offsets[probe + 1]) for probe in probes[row]]
+            candidates = np.concatenate(spans)
+            if len(candidates) == 0:
+                indices[row], distances[row] = 0, np.inf
+                continue
+            local = np.linalg.norm(self.sorted_encodings[candidates] - query, axis=1)
+            best = int(np.argmin(local))
+            indices[row] = self.order[candidates[best]]
+            distances[row] = local[best]
+        return indices, distances
+
+
+def _squared_distances(queries: np.ndarray, gallery: np.ndarray, gallery_sq: Optional[np.ndarray] = None) -> np.ndarray:
+    if gallery_sq is None:
+        gallery_sq = np.einsum("ij,ij->i", gallery, gallery)
+    query_sq = np.einsum("ij,ij->i", queries, queries)
+    squared = query_sq[:, None] + gallery_sq[None, :] - 2.0 * queries @ gallery.T
+    return np.maximum(squared, 0.0)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    result = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), 4096):
+        result[start : start + 4096] = np.argmin(_squared_distances(vectors[start : start + 4096], centroids), axis=1)
+    return result
+
+
+def build_matchers(encodings: np.ndarray, labels: List[str]) -> Dict[str, Tuple[MatchFn, Dict[str, float]]]:
+    """建立各種比對方式，回傳 ``{名稱: (批次比對函式, 額外資訊)}``。"""
+
+    gallery = np.ascontiguousarray(encodings, dtype=np.float32)
+    gallery_sq = np.einsum("ij,ij->i", gallery, gallery)
+    label_array = np.asarray(labels, dtype=object)
+    matchers: Dict[str, Tuple[MatchFn, Dict[str, float]]] = {}
+
+    def per_face(queries: np.ndarray) -> Tuple[List[Optional[str]], np.ndarray]:
+        # 與 face_recognition.face_distance 相同的逐張計算
+        names: List[Optional[str]] = []
+        distances = np.empty(len(queries), dtype=np.float32)
+        for row, query in enumerate(queries):
+            local = np.linalg.norm(gallery - query, axis=1)
+            best = int(np.argmin(local))
+            names.append(labels[best])
+            distances[row] = local[best]
+        return names, distances
+
+    def batched(queries: np.ndarray) -> Tuple[List[Optional[str]], np.ndarray]:
+        squared = _squared_distances(queries, gallery, gallery_sq)
+        best = np.argmin(squared, axis=1)
+        return list(label_array[best]), np.sqrt(squared[np.arange(len(queries)), best])
+
+    matchers["match.per_face"] = (per_face, {"rows_per_query": float(len(gallery))})
+    matchers["match.batched"] = (batched, {"rows_per_query": float(len(gallery))})
+
+    try:
+        from facegallery import TemplateGallery
+    except ImportError as exc:
+        LOGGER.warning("無法匯入 facegallery，略過身分樣板比對: %s", exc)
+    else:
+        start = time.perf_counter()
+        templates = TemplateGallery(max_exemplars=5, shortlist=3).build(gallery, labels)
+        build_seconds = time.perf_counter() - start
+
+        def template_match(queries: np.ndarray) -> Tuple[List[Optional[str]], np.ndarray]:
+            pairs = [templates.match(query) for query in queries]
+            return [label for label, _ in pairs], np.asarray([distance for _, distance in pairs], dtype=np.float32)
+
+        matchers["match.templates"] = (
+            template_match,
+            {"rows_per_query": templates.rows_per_query, "build_s": round(build_seconds, 3)},
+        )
+
+    start = time.perf_counter()
+    ivf = IVFIndex(gallery)
+    build_seconds = time.perf_counter() - start
+
+    def ivf_match(queries: np.ndarray) -> Tuple[List[Optional[str]], np.ndarray]:
+        indices, distances = ivf.search(queries)
+        return list(label_array[indices]), distances
+
+    matchers["match.ivf"] = (
+        ivf_match,
+        {
+            "rows_per_query": float(ivf.nlist + ivf.nprobe * len(gallery) / ivf.nlist),
+            "build_s": round(build_seconds, 3),
+            "nlist": float(ivf.nlist),
+            "nprobe": float(ivf.nprobe),
+        },
+    )
+
+    try:
+        import hnswlib
+    except ImportError:
+        LOGGER.info("未安裝 hnswlib，略過 match.hnsw")
+    else:
+        start = time.perf_counter()
+        index = hnswlib.Index(space="l2", dim=gallery.shape[1])
+        index.init_index(max_elements=len(gallery), ef_construction=100, M=16)
+        index.add_items(gallery, np.arange(len(gallery)))
+        index.set_ef(64)
+        build_seconds = time.perf_counter() - start
+
+        def hnsw_match(queries: np.ndarray) -> Tuple[List[Optional[str]], np.ndarray]:
+            indices, squared = index.knn_query(queries, k=1)
+            return list(label_array[indices[:, 0]]), np.sqrt(squared[:, 0])
+
+        matchers["match.hnsw"] = (hnsw_match, {"build_s": round(build_seconds, 3), "ef": 64.0})
+    return matchers
+
+
+def bench_matching(
+    size: int,
+    encodings: np.ndarray,
+    labels: List[str],
+    queries: np.ndarray,
+    expected: List[str],
+    repeat: int,
+    batch_size: int = 16,
+    tolerance: float = 0.6,
+) -> List[BenchResult]:
+    """比較各比對方式的吞吐量、延遲與正確率。
+
+    ``per_face`` 逐張查詢；其餘方式一次送入 ``batch_size`` 個查詢，
+    每個查詢的延遲即為整批的耗時。
+    """
+
+    results: List[BenchResult] = []
+    reference: Optional[List[Optional[str]]] = None
+    for name, (match, extra) in build_matchers(encodings, labels).items():
+        step = 1 if name == "match.per_face" else max(1, batch_size)
+        predictions: List[Optional[str]] = []
+
+        def run_once() -> Tuple[int, List[float]]:
+            predictions.clear()
+            latencies: List[float] = []
+            for start in range(0, len(queries), step):
+                chunk = queries[start : start + step]
+                began = time.perf_counter()
+                names, distances = match(chunk)
+                elapsed = time.perf_counter() - began
+                latencies.extend([elapsed] * len(chunk))
+                predictions.extend(
+                    label if distance <= tolerance else UNKNOWN_LABEL for label, distance in zip(names, distances)
+                )
+            return len(queries), latencies
+
+        result = measure(name, size, "queries/s", repeat, run_once)
+        result.extra.update(extra)
+        result.extra["batch"] = float(step)
+        result.extra["accuracy"] = round(
+            sum(1 for got, want in zip(predictions, expected) if got == want) / max(1, len(expected)), 4
+        )
+        if reference is None:
+            reference = list(predictions)
+        else:
+            result.extra["agreement"] = round(
+                sum(1 for got, want in zip(predictions, reference) if got == want) / max(1, len(reference)), 4
+            )
+        results.append(result)
+    return results
+
+
+# ----------------------------------------------------------------------
+# 端對端與資料庫
+# ----------------------------------------------------------------------
+
+def bench_recognize_frame(
+    size: int,
+    encodings: np.ndarray,
+    labels: List[str],
+    frames: Sequence[np.ndarray],
+    repeat: int,
+    scale: float = 0.25,
+) -> BenchResult:
+    try:
+        from facecam import FaceRecognitionCamera, KnownFacesStore
+    except ImportError as exc:
+        return skipped("frame.recognize", size, "frames/s", str(exc))
+
+    store = KnownFacesStore()
+    store.encodings = list(encodings)
+    store.labels = list(labels)
+    camera = FaceRecognitionCamera(store, scale=scale)
+    faces = [0]
+
+    def run_once() -> Tuple[int, List[float]]:
+        latencies: List[float] = []
+        faces[0] = 0
+        for frame in frames:
+            began = time.perf_counter()
+            faces[0] += len(camera.recognize_frame(frame))
+            latencies.append(time.perf_counter() - began)
+        return len(frames), latencies
+
+    result = measure("frame.recognize", size, "frames/s", repeat, run_once)
+    result.extra["faces_per_frame"] = round(faces[0] / max(1, len(frames)), 3)
+    result.extra["frame_pixels"] = float(frames[0].shape[0] * frames[0].shape[1]) if len(frames) else 0.0
+    return result
+
+
+def bench_log_attendance(workdir: Path, records: int, repeat: int) -> BenchResult:
+    try:
+        from rollcall_edge import AttendanceRecord, DatabaseManager
+    except ImportError as exc:
+        return skipped("db.log_attendance", 0, "rows/s", str(exc))
+
+    manager = DatabaseManager({"device": {"id": "bench"}})
+    # 使用檔案型 SQLite，每次 commit 都會寫入磁碟，較接近實際資料庫
+    manager.connection = attendance_sqlite(str(workdir / "attendance.sqlite3"))
+    timestamp = datetime(2024, 1, 1, 8, 0, 0)
+    batch = [
+        AttendanceRecord(
+            name=f"person_{index % 1000:06d}",
+            confidence=0.9,
+            timestamp=timestamp,
+            member_id=index % 1000,
+            device_id="bench-cam0",
+        )
+        for index in range(records)
+    ]
+
+    def run_once() -> Tuple[int, List[float]]:
+        latencies: List[float] = []
+        for record in batch:
+            began = time.perf_counter()
+            manager.log_attendance(record)
+            latencies.append(time.perf_counter() - began)
+        return len(batch), latencies
+
+    result = measure("db.log_attendance", 0, "rows/s", repeat, run_once)
+    manager.close()
+    return result
+
+
+# ----------------------------------------------------------------------
+# 執行與輸出
+# ----------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def run_suite(
+    sizes: Sequence[int],
+    groups: Sequence[str] = GROUPS,
+    repeat: int = 5,
+    per_identity: int = 1,
+    queries: int = 256,
+    match_batch: int = 16,
+    frames_path: Optional[Path] = None,
+    frame_count: int = 30,
+    records: int = 500,
+    workdir: Optional[Path] = None,
+    seed: int = 0,
+    tolerance: float = 0.6,
+) -> dict:
+    """執行基準測試並回傳可序列化為 JSON 的報告。"""
+
+    temporary = None
+    if workdir is None:
+        temporary = tempfile.TemporaryDirectory(prefix="face-bench-")
+        workdir = Path(temporary.name)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    results: List[BenchResult] = []
+    try:
+        frames: List[np.ndarray] = []
+        if "frame" in groups:
+            frames = load_frames(frames_path, frame_count) if frames_path else synthetic_frames(frame_count, seed=seed + 2)
+
+        for size in sizes:
+            encodings, labels, centres = make_gallery(size, per_identity=per_identity, seed=seed)
+            if "load" in groups:
+                results.extend(bench_gallery_load(size, encodings, labels, workdir, repeat))
+            if "match" in groups:
+                query_matrix, expected = make_queries(centres, queries, seed=seed + 1)
+                results.extend(
+                    bench_matching(size, encodings, labels, query_matrix, expected, repeat, match_batch, tolerance)
+                )
+            if "frame" in groups and frames:
+                results.append(bench_recognize_frame(size, encodings, labels, frames, repeat))
+        if "db" in groups:
+            results.append(bench_log_attendance(workdir, records, repeat))
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "numpy": np.__version__,
+        },
+        "config": {
+            "sizes": list(sizes),
+            "groups": list(groups),
+            "repeat": repeat,
+            "per_identity": per_identity,
+            "queries": queries,
+            "match_batch": match_batch,
+            "frames": str(frames_path) if frames_path else f"synthetic:{frame_count}",
+            "records": records,
+            "seed": seed,
+            "tolerance": tolerance,
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "benchmarks": {result.key: result.to_dict() for result in results},
+    }
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="人臉辨識流程基準測試")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="資料庫人數，以逗號分隔")
+    parser.add_argument("--only", help=f"只執行指定項目，以逗號分隔：{','.join(GROUPS)}")
+    parser.add_argument("--repeat", type=int, default=5, help="每個項目的重複次數")
+    parser.add_argument("--per-identity", type=int, default=1, help="每位人員的註冊樣本數")
+    parser.add_argument("--queries", type=int, default=256, help="比對查詢數")
+    parser.add_argument("--match-batch", type=int, default=16, help="批次比對每批的查詢數")
+    parser.add_argument("--frames", help="錄製的影格序列（影片檔或影像資料夾），預設使用合成影格")
+    parser.add_argument("--frame-count", type=int, default=30, help="端對端測試的影格數")
+    parser.add_argument("--records", type=int, default=500, help="考勤寫入筆數")
+    parser.add_argument("--workdir", help="暫存檔資料夾，預設使用系統暫存區")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--tolerance", type=float, default=0.6, help="辨識容忍度")
+    parser.add_argument("--output", help="輸出 JSON 路徑，未指定時輸出至標準輸出")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO), stream=sys.stderr)
+
+    groups = tuple(group.strip() for group in args.only.split(",")) if args.only else GROUPS
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"未知的項目: {', '.join(sorted(unknown))}")
+    # 各模組的載入訊息不列入基準輸出
+    for name in ("facecam", "facegallery", "facegen"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = run_suite(
+        sizes=[int(size) for size in args.sizes.split(",") if size.strip()],
+        groups=groups,
+        repeat=args.repeat,
+        per_identity=args.per_identity,
+        queries=args.queries,
+        match_batch=args.match_batch,
+        frames_path=Path(args.frames) if args.frames else None,
+        frame_count=args.frame_count,
+        records=args.records,
+        workdir=Path(args.workdir) if args.workdir else None,
+        seed=args.seed,
+        tolerance=args.tolerance,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        LOGGER.info("結果已寫入 %s", args.output)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
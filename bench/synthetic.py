@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""bench/synthetic.py - 基準測試用的合成資料
+
+以固定亂數種子產生 128 維人臉編碼資料庫、查詢向量與影格序列，
+相同參數在任何機器上都會得到相同資料，方便比較不同版本的效能。
+
+合成編碼模擬 dlib 編碼的距離分布：同一人的樣本彼此距離約 0.3~0.4，
+不同人之間約 1.0 以上，因此在預設容忍度 0.6 下可以正確區分。
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import math
+import sqlite3
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ENCODING_DIM = 128
+# 每個維度的雜訊標準差，使同一人兩個樣本的距離約為 0.35
+SAMPLE_NOISE = 0.35 / math.sqrt(2 * ENCODING_DIM)
+UNKNOWN_LABEL = "Unknown"
+
+
+def make_gallery(
+    identities: int,
+    per_identity: int = 1,
+    seed: int = 0,
+) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """產生人臉資料庫。
+
+    Returns:
+        ``(encodings, labels, centres)``；``encodings`` 為
+        ``identities * per_identity`` 筆 float32 向量，``centres`` 為各人員的中心。
+    """
+
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(identities, ENCODING_DIM))
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True) / np.sqrt(0.5)
+    centres = centres.astype(np.float32)
+
+    samples = np.repeat(centres, per_identity, axis=0)
+    samples += rng.normal(scale=SAMPLE_NOISE, size=samples.shape).astype(np.float32)
+    labels = [f"person_{index:06d}" for index in range(identities) for _ in range(per_identity)]
+    return samples, labels, centres
+
+
+def make_uneven_gallery(
+    identities: int,
+    min_per_identity: int = 2,
+    max_per_identity: int = 20,
+    seed: int = 0,
+) -> Tuple[np.ndarray, List[str]]:
+    """產生每人註冊樣本數介於 ``min_per_identity``～``max_per_identity`` 的資料庫。"""
+
+    rng = np.random.default_rng(seed)
+    _, _, centres = make_gallery(identities, seed=seed)
+    counts = rng.integers(min_per_identity, max_per_identity + 1, size=identities)
+    samples = np.repeat(centres, counts, axis=0)
+    samples += rng.normal(scale=SAMPLE_NOISE, size=samples.shape).astype(np.float32)
+    labels = [f"person_{index:06d}" for index, count in enumerate(counts) for _ in range(count)]
+    return samples, labels
+
+
+def make_queries(
+    centres: np.ndarray,
+    count: int,
+    unknown_ratio: float = 0.2,
+    seed: int = 1,
+) -> Tuple[np.ndarray, List[str]]:
+    """產生查詢向量與預期標籤，``unknown_ratio`` 比例為資料庫外的人。"""
+
+    rng = np.random.default_rng(seed)
+    unknown = int(round(count * unknown_ratio))
+    known = count - unknown
+    picks = rng.integers(0, len(centres), size=known)
+    queries = centres[picks] + rng.normal(scale=SAMPLE_NOISE, size=(known, centres.shape[1]))
+    expected = [f"person_{index:06d}" for index in picks]
+
+    strangers = rng.normal(size=(unknown, centres.shape[1]))
+    strangers /= np.linalg.norm(strangers, axis=1, keepdims=True) / np.sqrt(0.5)
+
+    order = rng.permutation(count)
+    matrix = np.concatenate([queries, strangers]).astype(np.float32)[order]
+    labels = expected + [UNKNOWN_LABEL] * unknown
+    return matrix, [labels[index] for index in order]
+
+
+def write_encodings_csv(path: Path, encodings: np.ndarray, labels: Sequence[str]) -> Path:
+    """以 :mod:`facegen` 的 CSV 格式（label, file_path, encoding）寫出資料庫。"""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["label", "file_path", "encoding"])
+        for label, encoding in zip(labels, encodings):
+            writer.writerow([label, "synthetic", json.dumps([round(float(x), 6) for x in encoding])])
+    return path
+
+
+def synthetic_frames(count: int, width: int = 640, height: int = 480, seed: int = 2) -> List[np.ndarray]:
+    """產生固定的 BGR 影格序列（雜訊背景加上移動的色塊）。"""
+
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    frames: List[np.ndarray] = []
+    for index in range(count):
+        frame = np.roll(base, shift=index * 4, axis=1)
+        top = (index * 7) % max(1, height - 120)
+        left = (index * 11) % max(1, width - 100)
+        frame[top : top + 120, left : left + 100] = (60 + index % 120, 120, 200)
+        frames.append(frame)
+    return frames
+
+
+def load_frames(path: Path, limit: Optional[int] = None) -> List[np.ndarray]:
+    """讀取錄製的影格序列：影片檔、``.frec`` 錄製檔或影像資料夾（依檔名排序）。"""
+
+    import cv2
+
+    frames: List[np.ndarray] = []
+    for frame in _iter_recorded(path, cv2):
+        frames.append(frame)
+        if limit is not None and len(frames) >= limit:
+            break
+    return frames
+
+
+def _iter_recorded(path: Path, cv2) -> Iterator[np.ndarray]:
+    if path.is_dir():
+        for image_path in sorted(path.iterdir()):
+            if image_path.suffix.lower() in {".jpg", ".jpeg", ".png", ".bmp"}:
+                frame = cv2.imread(str(image_path))
+                if frame is not None:
+                    yield frame
+        return
+    if path.suffix.lower() == ".frec":
+        from framerec import ReplayCapture
+
+        capture = ReplayCapture(path, pacing="fast")
+    else:
+        capture = cv2.VideoCapture(str(path))
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+# ----------------------------------------------------------------------
+# 本機資料庫替身
+# ----------------------------------------------------------------------
+
+class SQLiteConnection:
+    """以 SQLite 模擬 mysql.connector 連線，將 ``%s`` 佔位字元轉為 ``?``。"""
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self) -> "_SQLiteCursor":
+        return _SQLiteCursor(self._connection.cursor())
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = cursor
+
+    def execute(self, query: str, params: Sequence = ()) -> None:
+        self._cursor.execute(query.replace("%s", "?"), tuple(params))
+
+    def executemany(self, query: str, rows: Sequence[Sequence]) -> None:
+        self._cursor.executemany(query.replace("%s", "?"), [tuple(row) for row in rows])
+
+    def fetchall(self) -> list:
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+ATTENDANCE_SQLITE_DDL = """
+CREATE TABLE IF NOT EXISTS attendance_log (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    member_id INTEGER NULL,
+    name VARCHAR(100) NOT NULL,
+    confidence FLOAT,
+    status VARCHAR(20) DEFAULT 'present',
+    device_id VARCHAR(100),
+    captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def attendance_sqlite(path: str = ":memory:") -> SQLiteConnection:
+    """建立含 ``attendance_log`` 資料表的 SQLite 替身。"""
+
+    connection = SQLiteConnection(path)
+    cursor = connection.cursor()
+    cursor.execute(ATTENDANCE_SQLITE_DDL)
+    connection.commit()
+    cursor.close()
+    return connection
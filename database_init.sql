@@ -15,8 +15,22 @@ CREATE TABLE IF NOT EXISTS members (
     registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     face_encoding TEXT,
     is_active BOOLEAN DEFAULT TRUE,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_name (name),
-    INDEX idx_active (is_active)
+    INDEX idx_active (is_active),
+    INDEX idx_updated (updated_at)
+);
+
+-- 人臉編碼表（128 維 float32，little-endian；每位會員可有多筆）
+CREATE TABLE IF NOT EXISTS face_encodings (
+    encoding_id INT PRIMARY KEY AUTO_INCREMENT,
+    member_id INT NOT NULL,
+    model_version VARCHAR(64) NOT NULL DEFAULT 'dlib_resnet_v1',
+    encoding VARBINARY(512) NOT NULL,
+    source VARCHAR(20) DEFAULT 'register',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (member_id) REFERENCES members(member_id) ON DELETE CASCADE,
+    INDEX idx_model_member (model_version, member_id)
 );
 
 -- 消費記錄表
@@ -46,27 +60,52 @@ CREATE TABLE IF NOT EXISTS advertisements (
     target_category VARCHAR(50),
     target_gender ENUM('M', 'F', 'ALL') DEFAULT 'ALL',
     target_age_group VARCHAR(20),
-    priority INT DEFAULT 1,
+    priority INT NOT NULL DEFAULT 1,
     is_active BOOLEAN DEFAULT TRUE,
     start_date DATE,
     end_date DATE,
-    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_target (target_category, target_gender, target_age_group),
-    INDEX idx_active_date (is_active, start_date, end_date)
+    INDEX idx_active_date (is_active, start_date, end_date),
+    INDEX idx_listing (priority, created_date, ad_id)  -- ad_manager 列表的 keyset 分頁
 );
 
 -- 廣告推播記錄表
+-- 依 display_time 每月分割；分割表不支援外鍵，主鍵須包含分割欄位。
+-- 月分割區由 logpartition.py maintain 自 pmax 切出並移除過期月份。
 CREATE TABLE IF NOT EXISTS ad_display_log (
-    log_id INT PRIMARY KEY AUTO_INCREMENT,
+    log_id INT AUTO_INCREMENT,
     member_id INT,
     ad_id INT,
-    display_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    display_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     display_location VARCHAR(100) DEFAULT 'main_screen',
     display_duration INT DEFAULT 10,  -- 顯示秒數
-    FOREIGN KEY (member_id) REFERENCES members(member_id) ON DELETE CASCADE,
-    FOREIGN KEY (ad_id) REFERENCES advertisements(ad_id) ON DELETE CASCADE,
+    PRIMARY KEY (log_id, display_time),
     INDEX idx_member_time (member_id, display_time),
     INDEX idx_ad_time (ad_id, display_time)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(display_time)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- 廣告曝光每日彙總（由 logpartition.py maintain 增量更新）
+CREATE TABLE IF NOT EXISTS ad_display_daily (
+    display_date DATE NOT NULL,
+    ad_id INT NOT NULL,
+    display_count INT NOT NULL,
+    unique_viewers INT NOT NULL,
+    duration_total BIGINT NOT NULL DEFAULT 0,
+    duration_samples INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (display_date, ad_id),
+    INDEX idx_ad_date (ad_id, display_date)
+);
+
+-- 每日彙總的處理水位
+CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup_name VARCHAR(64) PRIMARY KEY,
+    last_day DATE NOT NULL,
+    last_log_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
 -- 系統設定表
@@ -427,7 +466,7 @@ LEFT JOIN purchase_history ph ON m.member_id = ph.member_id
 WHERE m.is_active = TRUE
 GROUP BY m.member_id;
 
--- 建立檢視表：廣告效果統計
+-- 建立檢視表：廣告效果統計（讀取每日彙總，不掃描 ad_display_log）
 CREATE OR REPLACE VIEW ad_performance AS
 SELECT 
     a.ad_id,
@@ -435,13 +474,12 @@ SELECT
     a.target_category,
     a.target_gender,
     a.target_age_group,
-    COUNT(adl.log_id) as display_count,
-    COUNT(DISTINCT adl.member_id) as unique_viewers,
-    AVG(adl.display_duration) as avg_display_duration,
-    DATE(adl.display_time) as display_date
+    COALESCE(d.display_count, 0) as display_count,
+    COALESCE(d.unique_viewers, 0) as unique_viewers,
+    d.duration_total / NULLIF(d.duration_samples, 0) as avg_display_duration,
+    d.display_date
 FROM advertisements a
-LEFT JOIN ad_display_log adl ON a.ad_id = adl.ad_id
-WHERE a.is_active = TRUE
-GROUP BY a.ad_id, DATE(adl.display_time);
+LEFT JOIN ad_display_daily d ON a.ad_id = d.ad_id
+WHERE a.is_active = TRUE;
 
 COMMIT;
@@ -11,7 +11,6 @@ import face_recognition
 import numpy as np
 import mysql.connector
 from datetime import datetime
-import json
 import math
 import os
 import pickle
@@ -22,21 +21,66 @@ from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import ttk
 
+from addisplay import AdDisplay
+from adlog import Impression, ImpressionWriter
+from adprefetch import AdPrefetcher
+from facemetrics import (
+    AD_FACE_TO_SCREEN, FRAMES_CAPTURED, FRAMES_PROCESSED, GALLERY_SIZE, QUEUE_DEPTH, record_recognitions,
+    start_metrics_server
+)
+from facecrop import detection_frame, encode_crops, scale_location
+from faceencodings import DEFAULT_MODEL_VERSION, GallerySync, apply_gallery_changes, insert_encodings
+from faceprof import PROFILER
+from facetrack import IdentityTracker
+from faceunknown import UnknownFaceStore
+from framepool import FrameBufferPool, ScratchBuffers
+from framerec import open_capture
+
 class FaceRecognitionAdSystem:
     def __init__(self):
         self.known_face_encodings = []
         self.known_face_names = []
+        self.known_face_member_ids = []
         self.member_data = {}
+        self.gallery_sync = None
+        self.next_gallery_sync = 0.0
         self.camera = None
         self.db_connection = None
+        self.db_connection_config = None
+        # 曝光紀錄由背景執行緒批次寫入，display_duration 為實際顯示秒數
+        self.impression_writer = None
+        self.current_impression = None
+        self.ad_display = None
+        # 軌跡出現領先身分時即在背景預先決定廣告，確認後直接取用
+        self.ad_prefetcher = None
         self.env_file_path = None
         self.env_settings = {}
+        self.metrics_server = None
+        # 影格與縮放／RGB 緩衝區重複使用，避免每張影格重新配置
+        self.frame_pool = FrameBufferPool(count=2, name='ad-camera')
+        self.scratch = ScratchBuffers('ad-camera')
+        self.tracker = None
+        self.unknown_store = None
 
         # 載入設定
         self.load_config()
 
+        # 同一條人臉軌跡累積足夠票數後只推播一次廣告
+        self.tracker = IdentityTracker.from_config(self.config['tracking'])
+
+        # 設定未知訪客資料夾時，將確認為未知的人臉分群保存供日後升級為會員
+        if self.config['unknowns']['dir']:
+            self.unknown_store = UnknownFaceStore(Path(self.config['unknowns']['dir']))
+
+        # 全螢幕廣告視窗，媒體預先解碼並縮放至螢幕解析度
+        if self.config['display']['enabled']:
+            self.ad_display = AdDisplay.from_config(self.config['display'])
+
         # 連接資料庫
         self.connect_database()
+        self.start_impression_writer()
+        self.start_ad_prefetcher()
+        self.preload_ad_media()
 
         # 載入已知人臉資料
         self.load_face_data()
@@ -63,7 +107,41 @@ class FaceRecognitionAdSystem:
             },
             'recognition': {
                 'tolerance': 0.6,
-                'model': 'hog'  # 或 'cnn' (需要GPU)
+                'model': 'hog',  # 或 'cnn' (需要GPU)
+                'model_version': DEFAULT_MODEL_VERSION,  # face_encodings 的模型版本標記
+                'sync_interval': 30,  # 增量同步人臉庫的間隔秒數，0 表示停用
+                'sync_overlap': 60,  # 增量同步時往回重查的秒數，補上較晚提交的變動
+                'fetch_size': 1024  # 啟動載入時每批自資料庫串流的編碼筆數
+            },
+            'metrics': {
+                'port': 0  # 大於 0 時開啟 Prometheus /metrics 端點
+            },
+            'unknowns': {
+                'dir': ''  # 未知訪客分群資料夾，空字串表示停用
+            },
+            'display': {
+                'enabled': True,
+                'fullscreen': True,
+                'screen_width': 1920,
+                'screen_height': 1080,
+                'cache_mb': 256,  # 預先解碼媒體的快取上限
+                'font': '',  # 文字廣告使用的字型檔，空字串表示自動尋找
+                'video_queue': 8,  # 背景解碼的影片影格佇列長度
+                'video_gstreamer': True  # 優先以 GStreamer（硬體解碼）播放影片
+            },
+            'ad_log': {
+                'batch_size': 50,  # 累積筆數達到此值即寫入
+                'flush_interval': 5.0,  # 最早一筆等待超過此秒數即寫入
+                'spool': 'ad_display_spool.jsonl'  # 資料庫中斷時的本地暫存檔
+            },
+            'ad_prefetch': {
+                'enabled': True
+            },
+            'tracking': {
+                'votes': 3,  # 同一身分累積此票數才確認
+                'window': 5,  # 每條軌跡保留的最近比對次數
+                'iou': 0.3,  # 偵測框重疊達此比例視為同一條軌跡
+                'max_age': 1.0  # 軌跡超過此秒數未出現即移除
             }
         }
         self._apply_env_overrides()
@@ -155,6 +233,15 @@ class FaceRecognitionAdSystem:
 
         return default
 
+    def _parse_bool(self, value):
+        '''將 1/0、true/false、yes/no、on/off 轉為布林值'''
+        normalized = str(value).strip().lower()
+        if normalized in ('1', 'true', 'yes', 'on'):
+            return True
+        if normalized in ('0', 'false', 'no', 'off'):
+            return False
+        raise ValueError(value)
+
     def _convert_camera_source(self, value):
         '''將攝影機來源字串轉換為適當型別'''
         if isinstance(value, str):
@@ -191,6 +278,112 @@ class FaceRecognitionAdSystem:
             ('FACE_AD_RECOGNITION_MODEL', 'RECOGNITION_MODEL'),
             default=recognition_conf['model']
         )
+        recognition_conf['model_version'] = self._get_env_override(
+            ('FACE_AD_MODEL_VERSION', 'FACE_MODEL_VERSION'),
+            default=recognition_conf['model_version']
+        )
+        recognition_conf['sync_interval'] = self._get_env_override(
+            ('FACE_AD_GALLERY_SYNC_INTERVAL', 'GALLERY_SYNC_INTERVAL'),
+            cast=float,
+            default=recognition_conf['sync_interval']
+        )
+        recognition_conf['sync_overlap'] = self._get_env_override(
+            ('FACE_AD_GALLERY_SYNC_OVERLAP', 'GALLERY_SYNC_OVERLAP'),
+            cast=float,
+            default=recognition_conf['sync_overlap']
+        )
+        recognition_conf['fetch_size'] = self._get_env_override(
+            ('FACE_AD_GALLERY_FETCH_SIZE', 'GALLERY_FETCH_SIZE'),
+            cast=int,
+            default=recognition_conf['fetch_size']
+        )
+
+        metrics_conf = self.config['metrics']
+        metrics_conf['port'] = self._get_env_override(
+            ('FACE_AD_METRICS_PORT', 'METRICS_PORT'),
+            cast=int,
+            default=metrics_conf['port']
+        )
+
+        unknowns_conf = self.config['unknowns']
+        unknowns_conf['dir'] = self._get_env_override(
+            ('FACE_AD_UNKNOWN_DIR', 'UNKNOWN_FACES_DIR'),
+            default=unknowns_conf['dir']
+        )
+
+        display_conf = self.config['display']
+        display_conf['enabled'] = self._get_env_override(
+            ('FACE_AD_DISPLAY_ENABLED', 'AD_DISPLAY_ENABLED'),
+            cast=self._parse_bool,
+            default=display_conf['enabled']
+        )
+        display_conf['fullscreen'] = self._get_env_override(
+            ('FACE_AD_DISPLAY_FULLSCREEN', 'AD_DISPLAY_FULLSCREEN'),
+            cast=self._parse_bool,
+            default=display_conf['fullscreen']
+        )
+        display_conf['screen_width'] = self._get_env_override(
+            ('FACE_AD_SCREEN_WIDTH', 'SCREEN_WIDTH'), cast=int, default=display_conf['screen_width']
+        )
+        display_conf['screen_height'] = self._get_env_override(
+            ('FACE_AD_SCREEN_HEIGHT', 'SCREEN_HEIGHT'), cast=int, default=display_conf['screen_height']
+        )
+        display_conf['cache_mb'] = self._get_env_override(
+            ('FACE_AD_MEDIA_CACHE_MB', 'AD_MEDIA_CACHE_MB'), cast=int, default=display_conf['cache_mb']
+        )
+        display_conf['font'] = self._get_env_override(
+            ('FACE_AD_DISPLAY_FONT', 'AD_DISPLAY_FONT'), default=display_conf['font']
+        )
+        display_conf['video_gstreamer'] = self._get_env_override(
+            ('FACE_AD_VIDEO_GSTREAMER', 'AD_VIDEO_GSTREAMER'),
+            cast=self._parse_bool,
+            default=display_conf['video_gstreamer']
+        )
+
+        ad_log_conf = self.config['ad_log']
+        ad_log_conf['batch_size'] = self._get_env_override(
+            ('FACE_AD_LOG_BATCH_SIZE', 'AD_LOG_BATCH_SIZE'),
+            cast=int,
+            default=ad_log_conf['batch_size']
+        )
+        ad_log_conf['flush_interval'] = self._get_env_override(
+            ('FACE_AD_LOG_FLUSH_INTERVAL', 'AD_LOG_FLUSH_INTERVAL'),
+            cast=float,
+            default=ad_log_conf['flush_interval']
+        )
+        ad_log_conf['spool'] = self._get_env_override(
+            ('FACE_AD_LOG_SPOOL', 'AD_LOG_SPOOL'),
+            default=ad_log_conf['spool']
+        )
+
+        prefetch_conf = self.config['ad_prefetch']
+        prefetch_conf['enabled'] = self._get_env_override(
+            ('FACE_AD_PREFETCH', 'AD_PREFETCH'),
+            cast=self._parse_bool,
+            default=prefetch_conf['enabled']
+        )
+
+        tracking_conf = self.config['tracking']
+        tracking_conf['votes'] = self._get_env_override(
+            ('FACE_AD_TRACK_VOTES', 'TRACK_VOTES'),
+            cast=int,
+            default=tracking_conf['votes']
+        )
+        tracking_conf['window'] = self._get_env_override(
+            ('FACE_AD_TRACK_WINDOW', 'TRACK_WINDOW'),
+            cast=int,
+            default=tracking_conf['window']
+        )
+        tracking_conf['iou'] = self._get_env_override(
+            ('FACE_AD_TRACK_IOU', 'TRACK_IOU'),
+            cast=float,
+            default=tracking_conf['iou']
+        )
+        tracking_conf['max_age'] = self._get_env_override(
+            ('FACE_AD_TRACK_MAX_AGE', 'TRACK_MAX_AGE'),
+            cast=float,
+            default=tracking_conf['max_age']
+        )
 
     def connect_database(self):
         '''連接MySQL資料庫'''
@@ -206,16 +399,79 @@ class FaceRecognitionAdSystem:
             if port:
                 connection_config['port'] = port
 
+            self.db_connection_config = connection_config
             self.db_connection = mysql.connector.connect(**connection_config)
             print("資料庫連接成功")
         except mysql.connector.Error as err:
             print(f"資料庫連接失敗: {err}")
 
+    def start_impression_writer(self):
+        '''啟動曝光紀錄的背景寫入執行緒（使用獨立的資料庫連線）'''
+        if not self.db_connection_config:
+            return
+        ad_log_conf = self.config['ad_log']
+        self.impression_writer = ImpressionWriter(
+            lambda: mysql.connector.connect(**self.db_connection_config),
+            batch_size=ad_log_conf['batch_size'],
+            flush_interval=ad_log_conf['flush_interval'],
+            spool_path=Path(ad_log_conf['spool'])
+        )
+        self.impression_writer.start()
+
+    def start_ad_prefetcher(self):
+        '''啟動預先決定廣告的背景執行緒（使用獨立的資料庫連線）'''
+        if not self.db_connection_config or not self.config['ad_prefetch']['enabled']:
+            return
+        self.ad_prefetcher = AdPrefetcher(
+            lambda: mysql.connector.connect(**self.db_connection_config),
+            self.decide_ad,
+            prepare=self.prepare_ad_media
+        )
+
+    def decide_ad(self, connection, member_id):
+        '''查詢會員偏好並挑選廣告'''
+        member_info, purchase_history = self.get_member_preferences(member_id, connection)
+        return self.get_targeted_ad(member_id, member_info, purchase_history, connection)
+
+    def prepare_ad_media(self, ad_info):
+        '''預先解碼廣告媒體並放入快取'''
+        if not self.ad_display:
+            return
+        ad_id, title, content, image_path, video_path = ad_info
+        self.ad_display.prepare(ad_id, title, content, image_path or video_path)
+
+    def preload_ad_media(self):
+        '''啟動時於背景預先解碼所有上架廣告的媒體'''
+        if not self.ad_display or not self.db_connection:
+            return
+        cursor = self.db_connection.cursor()
+        cursor.execute('''
+        SELECT ad_id, title, content, COALESCE(NULLIF(image_path, ''), NULLIF(video_path, ''))
+        FROM advertisements
+        WHERE is_active = TRUE
+        ORDER BY priority DESC
+        ''')
+        ads = [
+            (ad_id, title, content, path if path and os.path.exists(path) else None)
+            for ad_id, title, content, path in cursor.fetchall()
+        ]
+        cursor.close()
+        self.ad_display.preload(ads)
+
+    def end_impression(self):
+        '''目前的廣告下架，以實際顯示秒數送出曝光紀錄'''
+        if self.current_impression is None:
+            return
+        impression = self.current_impression.finish()
+        self.current_impression = None
+        if self.impression_writer:
+            self.impression_writer.submit(impression)
+
     def init_camera(self):
         '''初始化攝影機'''
         try:
             source = self.config['camera'].get('source', 0)
-            self.camera = cv2.VideoCapture(source)
+            self.camera = open_capture(source)
             self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.config['camera']['width'])
             self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config['camera']['height'])
             self.camera.set(cv2.CAP_PROP_FPS, self.config['camera']['fps'])
@@ -228,20 +484,50 @@ class FaceRecognitionAdSystem:
         if not self.db_connection:
             return
 
-        cursor = self.db_connection.cursor()
-        query = "SELECT member_id, name, face_encoding FROM members WHERE is_active = TRUE"
-        cursor.execute(query)
+        # 以不緩衝的游標分批串流編碼，直接解碼進預先配置的矩陣；之後只以水位同步變動
+        recognition_conf = self.config['recognition']
+        self.gallery_sync = GallerySync(
+            self.db_connection, recognition_conf['model_version'], max(1, recognition_conf['fetch_size']),
+            overlap_seconds=recognition_conf['sync_overlap']
+        )
+        encodings, names, member_ids = self.gallery_sync.load()
+        self.known_face_encodings = list(encodings)
+        self.known_face_names = names
+        self.known_face_member_ids = member_ids
+        for name, member_id in zip(names, member_ids):
+            self.member_data[name] = member_id
+        self.next_gallery_sync = time.monotonic() + recognition_conf['sync_interval']
 
-        for (member_id, name, face_encoding) in cursor:
-            if face_encoding:
-                # 將字串轉換回numpy陣列
-                encoding = np.array(json.loads(face_encoding))
-                self.known_face_encodings.append(encoding)
-                self.known_face_names.append(name)
-                self.member_data[name] = member_id
+        print(f"載入了 {len(self.known_face_encodings)} 個人臉資料（{len(self.member_data)} 位會員）")
 
-        cursor.close()
-        print(f"載入了 {len(self.known_face_encodings)} 個人臉資料")
+    def sync_face_data(self):
+        '''定期套用會員新增、更新與停用，不重新載入整個人臉庫'''
+        interval = self.config['recognition']['sync_interval']
+        if not self.gallery_sync or interval <= 0 or time.monotonic() < self.next_gallery_sync:
+            return
+        self.next_gallery_sync = time.monotonic() + interval
+
+        try:
+            changes = self.gallery_sync.poll()
+        except mysql.connector.Error as err:
+            print(f"同步人臉資料失敗: {err}")
+            return
+        if not changes:
+            return
+
+        (self.known_face_encodings,
+         self.known_face_names,
+         self.known_face_member_ids) = apply_gallery_changes(
+            self.known_face_encodings, self.known_face_names, self.known_face_member_ids, changes
+        )
+        self.member_data = {
+            name: member_id for name, member_id in self.member_data.items()
+            if member_id not in changes.affected
+        }
+        for member_id, (name, _) in changes.upserts.items():
+            self.member_data[name] = member_id
+        print(f"人臉庫已同步: 更新 {len(changes.upserts)} 位、移除 {len(changes.removed)} 位，"
+              f"共 {len(self.known_face_encodings)} 筆編碼")
 
     def register_new_face(self, name, image):
         '''註冊新人臉'''
@@ -252,18 +538,17 @@ class FaceRecognitionAdSystem:
 
             # 儲存到資料庫
             cursor = self.db_connection.cursor()
-            encoding_str = json.dumps(face_encoding.tolist())
-
-            query = '''INSERT INTO members (name, face_encoding) VALUES (%s, %s)'''
-            cursor.execute(query, (name, encoding_str))
-            self.db_connection.commit()
-
+            query = '''INSERT INTO members (name) VALUES (%s)'''
+            cursor.execute(query, (name,))
             member_id = cursor.lastrowid
+            insert_encodings(cursor, member_id, [face_encoding], self.config['recognition']['model_version'])
+            self.db_connection.commit()
             cursor.close()
 
             # 更新記憶體資料
             self.known_face_encodings.append(face_encoding)
             self.known_face_names.append(name)
+            self.known_face_member_ids.append(member_id)
             self.member_data[name] = member_id
 
             return True
@@ -271,38 +556,43 @@ class FaceRecognitionAdSystem:
 
     def recognize_face(self, frame):
         '''辨識人臉'''
-        # 縮小影像以加快處理速度
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = small_frame[:, :, ::-1]
-
-        # 尋找人臉
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        # 在縮小的灰階影像上尋找人臉，再回到原始影像裁切人臉區域計算編碼
+        gray_small_frame = detection_frame(frame, 0.25, 'hog', self.scratch)
+        with PROFILER.span('detect'):
+            face_locations = face_recognition.face_locations(gray_small_frame)
+        face_locations = [scale_location(location, 0.25, frame.shape) for location in face_locations]
+        with PROFILER.span('encode'):
+            face_encodings = encode_crops(frame, face_locations)
 
         face_names = []
+        face_match_distances = []
         for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings, face_encoding, 
-                tolerance=self.config['recognition']['tolerance']
-            )
-            name = "Unknown"
-
-            # 使用最相似的人臉
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings, face_encoding
-            )
-            best_match_index = np.argmin(face_distances)
-
-            if matches[best_match_index]:
-                name = self.known_face_names[best_match_index]
+            with PROFILER.span('match'):
+                matches = face_recognition.compare_faces(
+                    self.known_face_encodings, face_encoding, 
+                    tolerance=self.config['recognition']['tolerance']
+                )
+                name = "Unknown"
+                distance = 1.0
+
+                # 使用最相似的人臉
+                face_distances = face_recognition.face_distance(
+                    self.known_face_encodings, face_encoding
+                )
+                if len(face_distances):
+                    best_match_index = np.argmin(face_distances)
+                    distance = float(face_distances[best_match_index])
+                    if matches[best_match_index]:
+                        name = self.known_face_names[best_match_index]
 
             face_names.append(name)
+            face_match_distances.append(distance)
 
-        return face_locations, face_names
+        return face_locations, face_names, face_match_distances, face_encodings
 
-    def get_member_preferences(self, member_id):
+    def get_member_preferences(self, member_id, connection=None):
         '''取得會員偏好和消費記錄'''
-        cursor = self.db_connection.cursor()
+        cursor = (connection or self.db_connection).cursor()
 
         # 取得會員基本資料
         query = '''SELECT gender, age_group FROM members WHERE member_id = %s'''
@@ -325,9 +615,9 @@ class FaceRecognitionAdSystem:
 
         return member_info, purchase_history
 
-    def get_targeted_ad(self, member_id, member_info, purchase_history):
+    def get_targeted_ad(self, member_id, member_info, purchase_history, connection=None):
         '''根據會員資料取得目標廣告'''
-        cursor = self.db_connection.cursor()
+        cursor = (connection or self.db_connection).cursor()
 
         gender, age_group = member_info if member_info else (None, None)
 
@@ -351,7 +641,7 @@ class FaceRecognitionAdSystem:
             params.extend(categories)
 
         query = f'''
-        SELECT ad_id, title, content, image_path
+        SELECT ad_id, title, content, image_path, video_path
         FROM advertisements
         WHERE {' AND '.join(conditions)}
         ORDER BY RAND()
@@ -364,65 +654,114 @@ class FaceRecognitionAdSystem:
 
         return ad
 
-    def display_ad(self, ad_info, member_id):
-        '''顯示廣告'''
+    def display_ad(self, ad_info, member_id, appeared_at=None):
+        '''顯示廣告；appeared_at 為人臉軌跡建立的時間，用於統計出現至上螢幕的延遲'''
         if not ad_info:
             print("沒有找到適合的廣告")
             return
 
-        ad_id, title, content, image_path = ad_info
+        ad_id, title, content, image_path, video_path = ad_info
+        media_path = image_path or video_path
 
-        # 記錄廣告顯示
-        cursor = self.db_connection.cursor()
-        query = '''INSERT INTO ad_display_log (member_id, ad_id) VALUES (%s, %s)'''
-        cursor.execute(query, (member_id, ad_id))
-        self.db_connection.commit()
-        cursor.close()
+        # 前一則廣告在此下架；曝光紀錄排入背景寫入，不阻塞辨識迴圈
+        with PROFILER.span('db_write'):
+            self.end_impression()
+
+        if self.ad_display:
+            # 快取中已是螢幕解析度的影像，切換只需複製與顯示
+            with PROFILER.span('ad_display'):
+                self.ad_display.show(ad_id, title, content, media_path)
+        else:
+            print(f"顯示廣告給會員 {member_id}:")
+            print(f"標題: {title}")
+            print(f"內容: {content}")
+            if media_path:
+                print(f"媒體: {media_path}")
 
-        # 在這裡實作廣告顯示邏輯
-        print(f"顯示廣告給會員 {member_id}:")
-        print(f"標題: {title}")
-        print(f"內容: {content}")
-        if image_path and os.path.exists(image_path):
-            print(f"圖片: {image_path}")
+        # 曝光時間自畫面實際切換後起算
+        self.current_impression = Impression(member_id=member_id, ad_id=ad_id)
+        if appeared_at is not None:
+            AD_FACE_TO_SCREEN.observe(time.monotonic() - appeared_at)
 
     def run(self):
         '''主運行迴圈'''
         print("系統啟動中...")
+        # 設定 FACE_PROFILE=1 時定期印出各階段耗時
+        PROFILER.configure(emit=print)
+        self.start_metrics()
 
         while True:
-            ret, frame = self.camera.read()
+            self.sync_face_data()
+
+            ret, frame = self.frame_pool.read(self.camera)
             if not ret:
                 break
 
+            FRAMES_CAPTURED.inc(device='ad-camera')
+
             # 人臉辨識
-            face_locations, face_names = self.recognize_face(frame)
+            face_locations, face_names, face_distances, face_encodings = self.recognize_face(frame)
+            FRAMES_PROCESSED.inc(device='ad-camera')
+            record_recognitions(face_names)
+            observations = []
+            for (top, right, bottom, left), name, distance, encoding in zip(
+                face_locations, face_names, face_distances, face_encodings
+            ):
+                payload = None
+                if name == 'Unknown' and self.unknown_store is not None:
+                    # 只傳切片（不複製）：未知事件在繪製前處理，需要保留時才由 store 寫入縮圖
+                    payload = (encoding, frame[top:bottom, left:right])
+                observations.append(((top, right, bottom, left), name, distance, payload))
+            events = self.tracker.update(observations)
+
+            # 確認為未知的訪客在影格被繪製或覆寫前加入分群
+            for event in events:
+                if event.unknown and self.unknown_store is not None and event.payload is not None:
+                    self.unknown_store.add(*event.payload)
+
+            # 軌跡一出現領先的已知身分就預先決定廣告，不等投票確認
+            if self.ad_prefetcher:
+                for track_id, name in self.tracker.leaders().items():
+                    if name in self.member_data:
+                        self.ad_prefetcher.speculate(track_id, self.member_data[name])
 
             # 繪製辨識結果
             for (top, right, bottom, left), name in zip(face_locations, face_names):
-                # 放大座標（因為之前縮小了）
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-
-                # 繪製方框
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-
-                # 顯示名字
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
-                font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(frame, name, (left + 6, bottom - 6), font, 1.0, (255, 255, 255), 1)
-
-                # 如果辨識到已知會員，推播廣告
-                if name != "Unknown" and name in self.member_data:
-                    member_id = self.member_data[name]
-                    member_info, purchase_history = self.get_member_preferences(member_id)
-                    ad = self.get_targeted_ad(member_id, member_info, purchase_history)
-                    self.display_ad(ad, member_id)
-
-                    # 暫停一段時間避免重複觸發
-                    time.sleep(5)
+                with PROFILER.span('draw'):
+                    # 繪製方框
+                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+
+                    # 顯示名字
+                    cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
+                    font = cv2.FONT_HERSHEY_DUPLEX
+                    cv2.putText(frame, name, (left + 6, bottom - 6), font, 1.0, (255, 255, 255), 1)
+
+            # 軌跡確認為已知會員時推播廣告，同一軌跡只觸發一次
+            for event in events:
+                if event.unknown or event.name not in self.member_data:
+                    continue
+                member_id = self.member_data[event.name]
+                speculation = None
+                if self.ad_prefetcher:
+                    speculation = self.ad_prefetcher.commit(event.track_id, member_id)
+                if speculation is not None:
+                    ad = speculation.result
+                else:
+                    with PROFILER.span('ad_select'):
+                        ad = self.decide_ad(self.db_connection, member_id)
+                self.display_ad(ad, member_id, appeared_at=event.started)
+
+            # 領先身分改變或軌跡消失的預先決定即捨棄
+            if self.ad_prefetcher:
+                self.ad_prefetcher.retain(self.tracker.leaders())
+
+            PROFILER.tick()
+            PROFILER.maybe_report()
+
+            # 影片廣告由背景執行緒解碼，這裡只顯示已到時間的影格
+            if self.ad_display:
+                with PROFILER.span('ad_video'):
+                    self.ad_display.tick()
 
             # 顯示影像
             cv2.imshow('Face Recognition Ad System', frame)
@@ -431,10 +770,43 @@ class FaceRecognitionAdSystem:
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
+        PROFILER.maybe_report(force=True)
+        print(f"影格緩衝區配置次數: capture={self.frame_pool.allocations} "
+              f"scratch={self.scratch.allocations} (讀取 {self.frame_pool.reads} 張)")
         self.cleanup()
 
+    def start_metrics(self):
+        '''依設定開啟 Prometheus /metrics 端點'''
+        port = self.config['metrics']['port']
+        if not port:
+            return
+        GALLERY_SIZE.set_function(lambda: len(self.known_face_encodings))
+        QUEUE_DEPTH.set_function(
+            lambda: self.impression_writer.pending if self.impression_writer else 0, queue='ad_log'
+        )
+        try:
+            self.metrics_server = start_metrics_server(port)
+            print(f"指標端點已啟動: http://localhost:{self.metrics_server.port}/metrics")
+        except OSError as exc:
+            print(f"無法啟動指標端點: {exc}")
+
     def cleanup(self):
         '''清理資源'''
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.unknown_store is not None:
+            self.unknown_store.flush()
+        self.end_impression()
+        if self.ad_prefetcher:
+            self.ad_prefetcher.close()
+            print(f"預先決定廣告: {self.ad_prefetcher.summary()}")
+        if self.ad_display:
+            print(f"廣告媒體快取: {self.ad_display.cache.summary()}")
+            self.ad_display.close()
+        if self.impression_writer:
+            self.impression_writer.close()
+            print(f"曝光紀錄: 寫入 {self.impression_writer.written} 筆，"
+                  f"暫存 {self.impression_writer.spooled} 筆")
         if self.camera:
             self.camera.release()
         cv2.destroyAllWindows()
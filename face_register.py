@@ -9,12 +9,13 @@
 import cv2
 import face_recognition
 import mysql.connector
-import json
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from PIL import Image, ImageTk
 import numpy as np
 
+from faceencodings import insert_encodings
+
 class FaceRegisterTool:
     def __init__(self):
         self.root = tk.Tk()
@@ -150,24 +151,23 @@ class FaceRegisterTool:
 
         # 取得人臉編碼
         face_encoding = face_encodings[0]
-        encoding_str = json.dumps(face_encoding.tolist())
 
         # 儲存到資料庫
         try:
             cursor = self.db_connection.cursor()
             query = '''
-                INSERT INTO members (name, email, gender, age_group, face_encoding) 
-                VALUES (%s, %s, %s, %s, %s)
+                INSERT INTO members (name, email, gender, age_group)
+                VALUES (%s, %s, %s, %s)
             '''
             cursor.execute(query, (
                 self.name_var.get().strip(),
                 self.email_var.get().strip() if self.email_var.get().strip() else None,
                 self.gender_var.get() if self.gender_var.get() else None,
-                self.age_group_var.get() if self.age_group_var.get() else None,
-                encoding_str
+                self.age_group_var.get() if self.age_group_var.get() else None
             ))
-            self.db_connection.commit()
             member_id = cursor.lastrowid
+            insert_encodings(cursor, member_id, [face_encoding])
+            self.db_connection.commit()
             cursor.close()
 
             messagebox.showinfo("成功", f"會員 {self.name_var.get()} 註冊成功！\n會員ID: {member_id}")
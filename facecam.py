@@ -46,6 +46,21 @@ except ImportError as exc:  # pragma: no cover - 執行環境缺套件時才觸
         "facecam.py 需要 face_recognition 套件，請先安裝：pip install face-recognition"
     ) from exc
 
+from facecrop import DEFAULT_CROP_MARGIN, detection_frame, encode_crops, scale_location
+from facegallery import SharedGallery, TemplateGallery
+from facequality import QualityGate, QualityThresholds
+from facemetrics import (
+    FRAMES_CAPTURED,
+    FRAMES_DROPPED,
+    FRAMES_PROCESSED,
+    GALLERY_SIZE,
+    record_recognitions,
+    start_metrics_server,
+)
+from faceprof import PROFILER
+from framepool import FrameBufferPool, ScratchBuffers
+from framerec import ReplayCapture, is_replay_source, open_replay
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -68,10 +83,22 @@ class RecognizedFace:
 class KnownFacesStore:
     """管理已知人臉編碼的輔助類別。"""
 
-    def __init__(self, tolerance: float = 0.6) -> None:
+    def __init__(self, tolerance: float = 0.6, max_exemplars: int = 0, shortlist: int = 3) -> None:
+        """初始化資料庫。
+
+        Args:
+            tolerance: 辨識容忍度。
+            max_exemplars: 大於 0 時改用身分樣板比對，每人最多保留的代表樣本數。
+            shortlist: 身分樣板粗篩後保留的候選人數。
+        """
+
         self.tolerance = tolerance
-        self.encodings: List[np.ndarray] = []
+        self.encodings: Sequence[np.ndarray] = []
         self.labels: List[str] = []
+        self.shared_gallery: Optional[SharedGallery] = None
+        self.templates: Optional[TemplateGallery] = None
+        if max_exemplars > 0:
+            self.templates = TemplateGallery(max_exemplars=max_exemplars, shortlist=shortlist)
 
     # ------------------------------------------------------------------
     def load_from_csv(self, csv_path: Path) -> None:
@@ -86,12 +113,47 @@ class KnownFacesStore:
                 self.encodings.append(encoding)
                 self.labels.append(row["label"])
         LOGGER.info("載入 %d 筆已知人臉資料", len(self.labels))
+        self._rebuild_templates()
+
+    # ------------------------------------------------------------------
+    def attach_shared_gallery(self, gallery_path: Path) -> None:
+        """改為唯讀映射 :mod:`facegallery` 發佈的共用資料，不再各自解析 CSV。"""
+
+        gallery = SharedGallery(gallery_path)
+        if not gallery.attach():
+            raise FileNotFoundError(f"找不到共用人臉資料: {gallery_path}")
+        self.shared_gallery = gallery
+        self.encodings = gallery.encodings
+        self.labels = gallery.labels
+        self._rebuild_templates()
+
+    # ------------------------------------------------------------------
+    def refresh(self) -> bool:
+        """共用資料有新世代時切換至新資料。"""
+
+        if self.shared_gallery is None or not self.shared_gallery.refresh():
+            return False
+        self.encodings = self.shared_gallery.encodings
+        self.labels = self.shared_gallery.labels
+        self._rebuild_templates()
+        LOGGER.info("切換至共用人臉資料世代 %d", self.shared_gallery.generation)
+        return True
+
+    # ------------------------------------------------------------------
+    def _rebuild_templates(self) -> None:
+        if self.templates is not None:
+            self.templates.build(self.encodings, self.labels)
 
     # ------------------------------------------------------------------
     def recognize(self, face_encoding: np.ndarray) -> RecognizedFace:
-        if not self.encodings:
+        if len(self.encodings) == 0:
             return RecognizedFace(name="Unknown", location=(0, 0, 0, 0), distance=1.0)
 
+        if self.templates is not None:
+            label, distance = self.templates.match(face_encoding)
+            name = label if label is not None and distance <= self.tolerance else "Unknown"
+            return RecognizedFace(name=name, location=(0, 0, 0, 0), distance=distance)
+
         distances = face_recognition.face_distance(self.encodings, face_encoding)
         best_index = int(np.argmin(distances))
         name = "Unknown"
@@ -110,37 +172,101 @@ class FaceRecognitionCamera:
         scale: float = 0.25,
         model: str = "hog",
         frame_skip: int = 1,
+        crop_margin: Optional[float] = DEFAULT_CROP_MARGIN,
+        quality_gate: Optional[QualityGate] = None,
     ) -> None:
         self.encodings_store = encodings_store
         self.scale = max(0.1, min(scale, 1.0))
         self.model = model
         self.frame_skip = max(1, int(frame_skip))
+        # 編碼改在原始解析度的裁切區域上計算；None 時沿用縮圖編碼
+        self.crop_margin = crop_margin
+        # 編碼前略過模糊、過小、逆光或側臉的人臉
+        self.quality_gate = quality_gate
+        # 即時迴圈重複使用的縮放／RGB／標註緩衝區
+        self.scratch = ScratchBuffers("facecam")
 
     # ------------------------------------------------------------------
     def recognize_frame(self, frame: np.ndarray) -> List[RecognizedFace]:
         """對單張影格執行人臉辨識。"""
 
-        small_frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        with PROFILER.span("preprocess"):
+            if self.crop_margin is None:
+                small_frame = self.prepare_frame(frame, scratch=self.scratch)
+            else:
+                small_frame = detection_frame(frame, self.scale, self.model, self.scratch)
+        with PROFILER.span("detect"):
+            face_locations = face_recognition.face_locations(small_frame, model=self.model)
+        return self.recognize_locations(frame, face_locations, small_frame)
 
-        face_locations = face_recognition.face_locations(rgb_small_frame, model=self.model)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+    # ------------------------------------------------------------------
+    def _passing_quality(
+        self,
+        frame: np.ndarray,
+        face_locations: Sequence[Tuple[int, int, int, int]],
+    ) -> List[Tuple[int, int, int, int]]:
+        """保留通過品質篩選的縮圖座標。"""
+
+        if self.quality_gate is None or not face_locations:
+            return list(face_locations)
+        full_locations = [scale_location(location, self.scale, frame.shape) for location in face_locations]
+        with PROFILER.span("quality"):
+            kept = self.quality_gate.filter_indices(frame, full_locations)
+        return [face_locations[index] for index in kept]
 
+    # ------------------------------------------------------------------
+    def prepare_frame(self, frame: np.ndarray, scratch: Optional[ScratchBuffers] = None) -> np.ndarray:
+        """縮放並轉為 RGB，供偵測（含批次偵測）使用。
+
+        提供 ``scratch`` 時寫入重複使用的緩衝區，回傳值在下一次呼叫時會被覆寫；
+        需要保留結果（例如批次累積）時不要傳入。
+        """
+
+        if scratch is None:
+            small_frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
+            return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        small_frame = scratch.resize("small", frame, self.scale)
+        return scratch.cvt_color("rgb_small", small_frame, cv2.COLOR_BGR2RGB)
+
+    # ------------------------------------------------------------------
+    def recognize_locations(
+        self,
+        frame: np.ndarray,
+        face_locations: Sequence[Tuple[int, int, int, int]],
+        rgb_small_frame: Optional[np.ndarray] = None,
+    ) -> List[RecognizedFace]:
+        """依縮圖上已偵測的人臉位置計算編碼並比對，位置會換算回原始尺寸。
+
+        未通過品質篩選的人臉不會編碼。編碼在原始解析度 ``frame`` 的裁切區域上計算；``crop_margin`` 為 ``None``
+        時沿用縮圖編碼，需同時提供 :meth:`prepare_frame` 產生的 ``rgb_small_frame``。
+        """
+
+        face_locations = self._passing_quality(frame, face_locations)
+        locations = [scale_location(location, self.scale, frame.shape) for location in face_locations]
+        with PROFILER.span("encode"):
+            if self.crop_margin is None:
+                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+            else:
+                face_encodings = encode_crops(frame, locations, self.crop_margin)
+        return self._match(locations, face_encodings)
+
+    # ------------------------------------------------------------------
+    def _match(
+        self,
+        locations: Sequence[Tuple[int, int, int, int]],
+        face_encodings: Sequence[np.ndarray],
+    ) -> List[RecognizedFace]:
+        """比對編碼，``locations`` 為原始解析度座標。"""
+
+        self.encodings_store.refresh()
         results: List[RecognizedFace] = []
-        for location, encoding in zip(face_locations, face_encodings):
-            recognized = self.encodings_store.recognize(encoding)
-            top, right, bottom, left = location
-            scale_factor = 1.0 / self.scale
-            scaled_location = (
-                int(top * scale_factor),
-                int(right * scale_factor),
-                int(bottom * scale_factor),
-                int(left * scale_factor),
-            )
+        for location, encoding in zip(locations, face_encodings):
+            with PROFILER.span("match"):
+                recognized = self.encodings_store.recognize(encoding)
             results.append(
                 RecognizedFace(
                     name=recognized.name,
-                    location=scaled_location,
+                    location=location,
                     distance=recognized.distance,
                 )
             )
@@ -184,15 +310,20 @@ class FaceRecognitionCamera:
             frame_height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
             writer = cv2.VideoWriter(str(output_path), fourcc, fps, (frame_width, frame_height))
 
+        device = str(video_source)
+        # 單執行緒迴圈：兩個緩衝區交替即可，影格讀入預先配置的陣列
+        pool = FrameBufferPool(count=2, name="facecam")
         frame_index = 0
         while True:
-            ret, frame = capture.read()
+            ret, frame = pool.read(capture)
             if not ret:
                 LOGGER.warning("攝影機回傳空影格，結束辨識")
                 break
 
             frame_index += 1
+            FRAMES_CAPTURED.inc(device=device)
             if frame_index % self.frame_skip != 0:
+                FRAMES_DROPPED.inc(device=device)
                 if display:
                     cv2.imshow(window_name, frame)
                     if cv2.waitKey(1) & 0xFF == ord("q"):
@@ -202,7 +333,12 @@ class FaceRecognitionCamera:
                 continue
 
             results = self.recognize_frame(frame)
-            annotated = self.draw_annotations(frame.copy(), results)
+            FRAMES_PROCESSED.inc(device=device)
+            record_recognitions(result.name for result in results)
+            with PROFILER.span("draw"):
+                annotated = self.draw_annotations(self.scratch.copy("overlay", frame), results)
+            PROFILER.tick()
+            PROFILER.maybe_report()
 
             for result in results:
                 LOGGER.debug("偵測到 %s (confidence=%.2f)", result.name, result.confidence)
@@ -220,6 +356,15 @@ class FaceRecognitionCamera:
             writer.release()
         if display:
             cv2.destroyWindow(window_name)
+        PROFILER.maybe_report(force=True)
+        if self.quality_gate is not None:
+            LOGGER.info("人臉品質篩選: %s", self.quality_gate.summary())
+        LOGGER.info(
+            "影格緩衝區配置次數: capture=%d scratch=%d (讀取 %d 張)",
+            pool.allocations,
+            self.scratch.allocations,
+            pool.reads,
+        )
 
     # ------------------------------------------------------------------
     def recognize_image(self, image_path: Path) -> List[RecognizedFace]:
@@ -233,8 +378,10 @@ class FaceRecognitionCamera:
 
     # ------------------------------------------------------------------
     @staticmethod
-    def _create_capture(source: Union[int, str]) -> cv2.VideoCapture:
+    def _create_capture(source: Union[int, str]) -> Union[cv2.VideoCapture, ReplayCapture]:
         system = platform.system()
+        if is_replay_source(source):
+            return open_replay(source)  # type: ignore[arg-type]
         if isinstance(source, str) and not source.isdigit():
             LOGGER.info("使用 GStreamer 管線: %s", source)
             return cv2.VideoCapture(source, cv2.CAP_GSTREAMER)
@@ -257,15 +404,30 @@ class FaceRecognitionCamera:
 
 def build_argument_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="即時人臉辨識工具")
-    parser.add_argument("--encodings", required=True, help="facegen 產生的編碼 CSV 檔")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--encodings", help="facegen 產生的編碼 CSV 檔")
+    source_group.add_argument("--gallery", help="facegallery.py 發佈的共用人臉資料檔")
     parser.add_argument("--video-source", default="0", help="攝影機來源索引或 GStreamer 字串")
     parser.add_argument("--image", help="指定圖片檔案進行辨識")
     parser.add_argument("--scale", type=float, default=0.25, help="辨識前的影像縮放比例 (0~1)")
     parser.add_argument("--tolerance", type=float, default=0.6, help="辨識容忍度，值越小越嚴格")
+    parser.add_argument("--templates", type=int, default=0, help="每人代表樣本數上限，大於 0 時啟用身分樣板比對")
     parser.add_argument("--model", choices=["hog", "cnn"], default="hog", help="人臉偵測模型")
     parser.add_argument("--frame-skip", type=int, default=1, help="處理時跳過的影格數，可降低運算負擔")
+    parser.add_argument(
+        "--crop-margin",
+        type=float,
+        default=DEFAULT_CROP_MARGIN,
+        help="編碼時自原始影格裁切的外擴比例，負值表示改用縮圖編碼",
+    )
+    parser.add_argument("--no-quality-gate", action="store_true", help="停用編碼前的人臉品質篩選")
+    parser.add_argument("--min-face-size", type=int, default=48, help="人臉短邊最小像素（原始解析度）")
+    parser.add_argument("--min-sharpness", type=float, default=40.0, help="Laplacian 變異數下限，低於此值視為模糊")
+    parser.add_argument("--max-yaw", type=float, default=0.45, help="左右轉頭程度上限，0 為正臉")
     parser.add_argument("--output", help="將辨識結果錄製為影片檔")
     parser.add_argument("--no-display", action="store_true", help="不顯示影像（適合遠端或無螢幕環境）")
+    parser.add_argument("--profile", action="store_true", help="啟用各階段耗時量測並定期輸出 [MON] 記錄")
+    parser.add_argument("--metrics-port", type=int, default=0, help="開啟 Prometheus /metrics 端點的連接埠，0 表示停用")
     parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
     return parser
 
@@ -275,15 +437,31 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     args = parser.parse_args(argv)
 
     logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
-
-    store = KnownFacesStore(tolerance=args.tolerance)
-    store.load_from_csv(Path(args.encodings))
+    if args.profile:
+        PROFILER.configure(enabled=True)
+
+    store = KnownFacesStore(tolerance=args.tolerance, max_exemplars=args.templates)
+    if args.gallery:
+        store.attach_shared_gallery(Path(args.gallery))
+    else:
+        store.load_from_csv(Path(args.encodings))
+
+    quality_gate: Optional[QualityGate] = None
+    if not args.no_quality_gate:
+        thresholds = QualityThresholds(
+            min_size=args.min_face_size,
+            min_sharpness=args.min_sharpness,
+            max_yaw=args.max_yaw,
+        )
+        quality_gate = QualityGate(thresholds)
 
     engine = FaceRecognitionCamera(
         encodings_store=store,
         scale=args.scale,
         model=args.model,
         frame_skip=args.frame_skip,
+        crop_margin=args.crop_margin if args.crop_margin >= 0 else None,
+        quality_gate=quality_gate,
     )
 
     if args.image:
@@ -295,13 +473,22 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
                 print(f"{result.name}\tconfidence={result.confidence:.2f}")
         return 0
 
+    metrics_server = None
+    if args.metrics_port:
+        GALLERY_SIZE.set_function(lambda: len(store.labels))
+        metrics_server = start_metrics_server(args.metrics_port)
+
     output_path = Path(args.output) if args.output else None
-    engine.run_camera(
-        video_source=args.video_source,
-        window_name="Face Recognition",
-        display=not args.no_display,
-        output_path=output_path,
-    )
+    try:
+        engine.run_camera(
+            video_source=args.video_source,
+            window_name="Face Recognition",
+            display=not args.no_display,
+            output_path=output_path,
+        )
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
     return 0
 
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""facecrop.py - 低解析度偵測、原始解析度裁切編碼
+
+原本的流程將整張縮小後的影格轉為 RGB，偵測與編碼都在同一張低解析度
+影像上進行；小臉在 1/4 縮圖上只剩十幾個像素，特徵點與編碼品質都會下降。
+
+本模組將兩者分開：
+
+* 偵測：HOG 只需要灰階，直接在縮小後的灰階影格上執行，省去整張 RGB 轉換。
+* 編碼：依偵測框自原始解析度影格裁切（外擴 ``margin`` 比例），
+  只將裁切區域轉為 RGB 後計算特徵點與編碼。
+
+CNN 偵測器仍使用 RGB 縮圖（含 :mod:`facebatch` 批次偵測）。
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+from framepool import ScratchBuffers
+
+Location = Tuple[int, int, int, int]
+DEFAULT_CROP_MARGIN = 0.25
+
+
+def detection_frame(frame: np.ndarray, scale: float, model: str, scratch: Optional[ScratchBuffers] = None) -> np.ndarray:
+    """產生偵測用的縮圖：HOG 為灰階，CNN 為 RGB。"""
+
+    scratch = scratch or ScratchBuffers("detect")
+    small_frame = scratch.resize("small", frame, scale)
+    if model == "hog":
+        return scratch.cvt_color("gray_small", small_frame, cv2.COLOR_BGR2GRAY, channels=1)
+    return scratch.cvt_color("rgb_small", small_frame, cv2.COLOR_BGR2RGB)
+
+
+def scale_location(location: Location, scale: float, frame_shape: Sequence[int]) -> Location:
+    """將縮圖上的偵測框換算回原始解析度，並限制在影格範圍內。"""
+
+    height, width = frame_shape[:2]
+    factor = 1.0 / scale
+    top, right, bottom, left = location
+    return (
+        max(0, int(top * factor)),
+        min(width, int(right * factor)),
+        min(height, int(bottom * factor)),
+        max(0, int(left * factor)),
+    )
+
+
+def crop_bounds(location: Location, frame_shape: Sequence[int], margin: float = DEFAULT_CROP_MARGIN) -> Location:
+    """依偵測框外擴 ``margin``（相對於框的邊長）後的裁切範圍 (top, right, bottom, left)。"""
+
+    height, width = frame_shape[:2]
+    top, right, bottom, left = location
+    pad_y = int((bottom - top) * margin)
+    pad_x = int((right - left) * margin)
+    return (
+        max(0, top - pad_y),
+        min(width, right + pad_x),
+        min(height, bottom + pad_y),
+        max(0, left - pad_x),
+    )
+
+
+def encode_crops(
+    frame: np.ndarray,
+    locations: Sequence[Location],
+    margin: float = DEFAULT_CROP_MARGIN,
+) -> List[np.ndarray]:
+    """在原始解析度的裁切區域上計算人臉編碼。
+
+    Args:
+        frame: 原始解析度的 BGR 影格。
+        locations: 原始解析度座標的偵測框。
+        margin: 裁切時外擴的比例，讓特徵點模型看得到完整臉部輪廓。
+    """
+
+    encodings: List[np.ndarray] = []
+    for location in locations:
+        crop_top, crop_right, crop_bottom, crop_left = crop_bounds(location, frame.shape, margin)
+        rgb_crop = cv2.cvtColor(frame[crop_top:crop_bottom, crop_left:crop_right], cv2.COLOR_BGR2RGB)
+        top, right, bottom, left = location
+        relative = (top - crop_top, right - crop_left, bottom - crop_top, left - crop_left)
+        encodings.extend(face_recognition.face_encodings(rgb_crop, [relative]))
+    return encodings
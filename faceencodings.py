@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""faceencodings.py - 以二進位欄位儲存人臉編碼
+
+``members.face_encoding`` 原本以 TEXT 儲存 ``json.dumps(list)``，載入時
+每筆都要 ``json.loads`` 再轉成 ``np.array``，每位會員也只能有一筆編碼。
+本模組改用獨立的 ``face_encodings`` 資料表：
+
+* ``encoding`` 為 ``VARBINARY(512)``，內容是 128 維 little-endian float32。
+* ``model_version`` 標記產生編碼的模型，換模型時新舊編碼可以並存。
+* 每位會員可有多筆編碼（不同角度、不同時期的照片）。
+
+載入時以單一查詢取回所有編碼，串接後用 ``np.frombuffer`` 一次解碼為
+``(N, 128)`` 矩陣。
+
+執行期間以 :class:`GallerySync` 增量同步：依 ``members.updated_at`` 與
+``face_encodings.encoding_id`` 兩個水位只查詢變動的會員，將新增、更新與
+停用 (``is_active``) 套用到記憶體中的人臉庫，不必重新載入整張表。
+
+既有資料以 ``migrate`` 子命令轉移（同時補上 ``members.updated_at`` 欄位）::
+
+    # 預覽需要轉移的筆數
+    python faceencodings.py migrate --config config.json --dry-run
+
+    # 轉移並清空舊的 JSON 欄位
+    python faceencodings.py migrate --config config.json --clear-json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+ENCODING_DIM = 128
+ENCODING_BYTES = ENCODING_DIM * 4
+ENCODING_DTYPE = "<f4"
+# face_recognition 預設的 dlib ResNet 模型
+DEFAULT_MODEL_VERSION = "dlib_resnet_v1"
+
+FACE_ENCODINGS_DDL = """
+CREATE TABLE IF NOT EXISTS face_encodings (
+    encoding_id INT PRIMARY KEY AUTO_INCREMENT,
+    member_id INT NOT NULL,
+    model_version VARCHAR(64) NOT NULL DEFAULT 'dlib_resnet_v1',
+    encoding VARBINARY(512) NOT NULL,
+    source VARCHAR(20) DEFAULT 'register',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (member_id) REFERENCES members(member_id) ON DELETE CASCADE,
+    INDEX idx_model_member (model_version, member_id)
+)
+"""
+
+INSERT_ENCODING_SQL = (
+    "INSERT INTO face_encodings (member_id, model_version, encoding, source) VALUES (%s, %s, %s, %s)"
+)
+
+LOAD_GALLERY_SQL = (
+    "SELECT m.member_id, m.name, e.encoding FROM face_encodings e "
+    "JOIN members m ON m.member_id = e.member_id "
+    "WHERE m.is_active = TRUE AND e.model_version = %s "
+    "ORDER BY e.member_id, e.encoding_id"
+)
+
+COUNT_GALLERY_SQL = (
+    "SELECT COUNT(*) FROM face_encodings e JOIN members m ON m.member_id = e.member_id "
+    "WHERE m.is_active = TRUE AND e.model_version = %s"
+)
+DEFAULT_FETCH_SIZE = 1024
+# 增量同步時往回重查的範圍，涵蓋晚於較新資料才提交的交易
+DEFAULT_SYNC_OVERLAP_SECONDS = 60
+DEFAULT_ENCODING_ID_OVERLAP = 1000
+
+
+def pack_encoding(encoding: Sequence[float]) -> bytes:
+    """將 128 維編碼轉為 float32 位元組。"""
+
+    vector = np.asarray(encoding, dtype=ENCODING_DTYPE).reshape(-1)
+    if vector.shape[0] != ENCODING_DIM:
+        raise ValueError(f"編碼維度應為 {ENCODING_DIM}，實際為 {vector.shape[0]}")
+    return vector.tobytes()
+
+
+def unpack_encodings(blobs: Sequence[bytes]) -> np.ndarray:
+    """將多筆位元組一次解碼為 ``(N, 128)`` float32 矩陣。"""
+
+    if not blobs:
+        return np.empty((0, ENCODING_DIM), dtype=np.float32)
+    data = b"".join(bytes(blob) for blob in blobs)
+    return np.frombuffer(data, dtype=ENCODING_DTYPE).reshape(len(blobs), ENCODING_DIM)
+
+
+def insert_encodings(
+    cursor,
+    member_id: int,
+    encodings: Iterable[Sequence[float]],
+    model_version: str = DEFAULT_MODEL_VERSION,
+    source: str = "register",
+) -> int:
+    """寫入一位會員的一或多筆編碼，回傳筆數；交易由呼叫端提交。"""
+
+    rows = [(member_id, model_version, pack_encoding(encoding), source) for encoding in encodings]
+    if rows:
+        cursor.executemany(INSERT_ENCODING_SQL, rows)
+    return len(rows)
+
+
+def load_gallery(
+    connection,
+    model_version: str = DEFAULT_MODEL_VERSION,
+    fetch_size: int = DEFAULT_FETCH_SIZE,
+) -> Tuple[np.ndarray, List[str], List[int]]:
+    """以單一查詢串流載入所有啟用會員的編碼。
+
+    先以 ``COUNT(*)`` 預先配置 ``(N, 128)`` 矩陣，再以不緩衝的游標每次
+    ``fetchmany(fetch_size)`` 筆直接解碼寫入矩陣，用戶端同時只保留一批
+    原始資料，大型人臉庫啟動時的記憶體高峰不隨會員數成長。
+
+    Returns:
+        ``(encodings, names, member_ids)``；``encodings`` 為 ``(N, 128)`` 矩陣，
+        同一位會員有多筆編碼時會出現多列。
+    """
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(COUNT_GALLERY_SQL, (model_version,))
+        expected = int(cursor.fetchall()[0][0] or 0)
+    finally:
+        cursor.close()
+
+    matrix = np.empty((expected, ENCODING_DIM), dtype=np.float32)
+    names: List[str] = []
+    member_ids: List[int] = []
+    filled = 0
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(LOAD_GALLERY_SQL, (model_version,))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            if filled + len(rows) > matrix.shape[0]:
+                # 計數後才新增的編碼：擴充矩陣而不是失敗
+                grown = np.empty((filled + len(rows), ENCODING_DIM), dtype=np.float32)
+                grown[:filled] = matrix[:filled]
+                matrix = grown
+            matrix[filled : filled + len(rows)] = unpack_encodings([row[2] for row in rows])
+            filled += len(rows)
+            member_ids.extend(int(row[0]) for row in rows)
+            names.extend(row[1] for row in rows)
+    finally:
+        cursor.close()
+    if filled < matrix.shape[0]:
+        matrix = matrix[:filled]
+    LOGGER.debug("載入 %d 筆編碼（預先配置 %d 筆）", filled, expected)
+    return matrix, names, member_ids
+
+
+MEMBERS_UPDATED_AT_DDL = (
+    "ALTER TABLE members ADD COLUMN updated_at TIMESTAMP NOT NULL "
+    "DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, ADD INDEX idx_updated (updated_at)"
+)
+
+
+def ensure_table(connection) -> None:
+    """建立 ``face_encodings`` 並為舊版 ``members`` 補上 ``updated_at``。"""
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(FACE_ENCODINGS_DDL)
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'members' AND COLUMN_NAME = 'updated_at'"
+        )
+        if not cursor.fetchall()[0][0]:
+            cursor.execute(MEMBERS_UPDATED_AT_DDL)
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+# ----------------------------------------------------------------------
+# 增量同步
+# ----------------------------------------------------------------------
+
+@dataclass
+class GalleryChanges:
+    """一次同步查到的變動；``upserts`` 為會員編號對應 (姓名, 編碼矩陣)。"""
+
+    upserts: Dict[int, Tuple[str, np.ndarray]] = field(default_factory=dict)
+    removed: Set[int] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.upserts or self.removed)
+
+    @property
+    def affected(self) -> Set[int]:
+        return set(self.upserts) | self.removed
+
+
+def apply_gallery_changes(
+    encodings: Sequence[np.ndarray],
+    names: Sequence[str],
+    member_ids: Sequence[int],
+    changes: GalleryChanges,
+) -> Tuple[List[np.ndarray], List[str], List[int]]:
+    """移除受影響會員的舊編碼，再附加更新後的編碼。"""
+
+    affected = changes.affected
+    kept = [index for index, member_id in enumerate(member_ids) if member_id not in affected]
+    new_encodings = [encodings[index] for index in kept]
+    new_names = [names[index] for index in kept]
+    new_ids = [member_ids[index] for index in kept]
+    for member_id, (name, matrix) in changes.upserts.items():
+        new_encodings.extend(matrix)
+        new_names.extend([name] * len(matrix))
+        new_ids.extend([member_id] * len(matrix))
+    return new_encodings, new_names, new_ids
+
+
+class GallerySync:
+    """以水位輪詢 ``members`` 與 ``face_encodings`` 的變動。
+
+    * ``members.updated_at`` - 新增會員、修改姓名或停用時由 MySQL 自動更新。
+    * ``face_encodings.encoding_id`` - 既有會員新增編碼時遞增。
+
+    ``updated_at`` 在陳述式執行時而非提交時寫入，自動遞增的 ``encoding_id``
+    也可能晚於較大的編號才提交；只查詢水位之後的資料會永久漏掉這些較晚提交的
+    變動。因此每次輪詢都往回重查 ``overlap_seconds`` 秒與 ``encoding_id_overlap``
+    個編號，並略過上次已處理過的相同列（會員與其 ``updated_at`` 相同、相同的
+    ``encoding_id``）；提交延遲超過重查範圍的變動仍會漏掉。直接 ``DELETE`` 的
+    會員不會被察覺，應以 ``is_active = FALSE`` 停用。
+    """
+
+    def __init__(
+        self,
+        connection,
+        model_version: str = DEFAULT_MODEL_VERSION,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+        overlap_seconds: float = DEFAULT_SYNC_OVERLAP_SECONDS,
+        encoding_id_overlap: int = DEFAULT_ENCODING_ID_OVERLAP,
+    ) -> None:
+        self.connection = connection
+        self.model_version = model_version
+        self.fetch_size = fetch_size
+        self.overlap_seconds = max(0.0, float(overlap_seconds))
+        self.encoding_id_overlap = max(0, int(encoding_id_overlap))
+        self.member_watermark = None
+        self.encoding_watermark = 0
+        # 上次重查範圍內已處理過的會員（對應當時的 updated_at）與編碼編號
+        self._seen_members: Dict[int, Any] = {}
+        self._seen_encodings: Set[int] = set()
+
+    def _query(self, query: str, params: Sequence = ()) -> List[Tuple]:
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, tuple(params))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _snapshot_watermarks(self):
+        member_rows = self._query("SELECT MAX(updated_at) FROM members")
+        encoding_rows = self._query("SELECT COALESCE(MAX(encoding_id), 0) FROM face_encodings")
+        return member_rows[0][0], int(encoding_rows[0][0] or 0)
+
+    def load(self) -> Tuple[np.ndarray, List[str], List[int]]:
+        """完整載入一次並記錄水位；水位先於資料讀取，期間的變動會在下次輪詢補上。"""
+
+        # 結束目前的讀取交易，否則 REPEATABLE READ 會一直看到舊快照
+        self.connection.commit()
+        self.member_watermark, self.encoding_watermark = self._snapshot_watermarks()
+        return load_gallery(self.connection, self.model_version, self.fetch_size)
+
+    def poll(self) -> GalleryChanges:
+        """查詢上次水位之後的變動。"""
+
+        self.connection.commit()
+        member_watermark, encoding_watermark = self._snapshot_watermarks()
+        changes = GalleryChanges()
+
+        active: Set[int] = set()
+        newest = self.member_watermark
+        seen_members: Dict[int, Any] = {}
+        if self.member_watermark is not None:
+            for member_id, is_active, updated_at in self._query(
+                "SELECT member_id, is_active, updated_at FROM members "
+                "WHERE updated_at >= %s - INTERVAL %s SECOND",
+                (self.member_watermark, self.overlap_seconds),
+            ):
+                member_id = int(member_id)
+                seen_members[member_id] = updated_at
+                if self._seen_members.get(member_id) == updated_at:
+                    continue
+                (active if is_active else changes.removed).add(member_id)
+                newest = max(newest, updated_at)
+        seen_encodings: Set[int] = set()
+        for encoding_id, member_id in self._query(
+            "SELECT encoding_id, member_id FROM face_encodings WHERE encoding_id > %s AND model_version = %s",
+            (max(0, self.encoding_watermark - self.encoding_id_overlap), self.model_version),
+        ):
+            seen_encodings.add(int(encoding_id))
+            if int(encoding_id) not in self._seen_encodings and int(member_id) not in changes.removed:
+                active.add(int(member_id))
+
+        if active:
+            placeholders = ", ".join(["%s"] * len(active))
+            rows = self._query(
+                "SELECT m.member_id, m.name, e.encoding FROM face_encodings e "
+                "JOIN members m ON m.member_id = e.member_id "
+                f"WHERE m.is_active = TRUE AND e.model_version = %s AND m.member_id IN ({placeholders}) "
+                "ORDER BY e.member_id, e.encoding_id",
+                [self.model_version, *active],
+            )
+            grouped: Dict[int, Tuple[str, List[bytes]]] = {}
+            for member_id, name, blob in rows:
+                grouped.setdefault(int(member_id), (name, []))[1].append(blob)
+            for member_id, (name, blobs) in grouped.items():
+                changes.upserts[member_id] = (name, unpack_encodings(blobs))
+            # 已沒有此模型版本編碼的會員，一併自人臉庫移除
+            changes.removed.update(member_id for member_id in active if member_id not in grouped)
+
+        if self.member_watermark is None:
+            self.member_watermark = member_watermark
+        else:
+            self.member_watermark = newest
+        # 重查範圍外的列不會再出現，只需保留本次查到的
+        self._seen_members, self._seen_encodings = seen_members, seen_encodings
+        self.encoding_watermark = max(self.encoding_watermark, encoding_watermark, *seen_encodings)
+        return changes
+
+
+# ----------------------------------------------------------------------
+# 舊資料轉移
+# ----------------------------------------------------------------------
+
+def _parse_json_encoding(text) -> Optional[List[float]]:
+    try:
+        values = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != ENCODING_DIM:
+        return None
+    return values
+
+
+def migrate_json_encodings(
+    connection,
+    model_version: str = DEFAULT_MODEL_VERSION,
+    batch_size: int = 500,
+    clear_json: bool = False,
+    dry_run: bool = False,
+) -> Tuple[int, int]:
+    """將 ``members.face_encoding`` 的 JSON 編碼轉入 ``face_encodings``。
+
+    已有相同模型版本編碼的會員會略過，因此可以重複執行。
+
+    Returns:
+        ``(轉移筆數, 無法解析而略過的筆數)``。
+    """
+
+    if not dry_run:
+        ensure_table(connection)
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT m.member_id, m.face_encoding FROM members m "
+        "WHERE m.face_encoding IS NOT NULL AND m.face_encoding <> '' "
+        "AND NOT EXISTS (SELECT 1 FROM face_encodings e "
+        "WHERE e.member_id = m.member_id AND e.model_version = %s)",
+        (model_version,),
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    pending: List[Tuple[int, str, bytes, str]] = []
+    migrated_ids: List[int] = []
+    skipped = 0
+    for member_id, text in rows:
+        values = _parse_json_encoding(text)
+        if values is None:
+            skipped += 1
+            LOGGER.warning("會員 %s 的 face_encoding 不是有效的 %d 維 JSON，略過", member_id, ENCODING_DIM)
+            continue
+        pending.append((int(member_id), model_version, pack_encoding(values), "migrated"))
+        migrated_ids.append(int(member_id))
+
+    if dry_run:
+        return len(pending), skipped
+
+    cursor = connection.cursor()
+    try:
+        for start in range(0, len(pending), batch_size):
+            cursor.executemany(INSERT_ENCODING_SQL, pending[start : start + batch_size])
+            if clear_json:
+                batch_ids = migrated_ids[start : start + batch_size]
+                cursor.executemany(
+                    "UPDATE members SET face_encoding = NULL WHERE member_id = %s",
+                    [(member_id,) for member_id in batch_ids],
+                )
+            connection.commit()
+    finally:
+        cursor.close()
+    return len(pending), skipped
+
+
+# ----------------------------------------------------------------------
+# 命令列介面
+# ----------------------------------------------------------------------
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="人臉編碼資料表工具")
+    parser.add_argument("--config", default="config.json", help="含 database 區段的設定檔")
+    parser.add_argument("--model-version", default=DEFAULT_MODEL_VERSION, help="編碼模型版本標記")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="將 members.face_encoding 的 JSON 轉入 face_encodings")
+    migrate.add_argument("--batch-size", type=int, default=500, help="每次提交的筆數")
+    migrate.add_argument("--clear-json", action="store_true", help="轉移後清空 members.face_encoding")
+    migrate.add_argument("--dry-run", action="store_true", help="只計算筆數，不寫入")
+
+    subparsers.add_parser("stats", help="顯示各模型版本的編碼筆數")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    import mysql.connector
+
+    with Path(args.config).open("r", encoding="utf-8") as fp:
+        database_config = json.load(fp).get("database", {})
+    connection = mysql.connector.connect(**database_config)
+    try:
+        if args.command == "migrate":
+            migrated, skipped = migrate_json_encodings(
+                connection,
+                model_version=args.model_version,
+                batch_size=args.batch_size,
+                clear_json=args.clear_json,
+                dry_run=args.dry_run,
+            )
+            action = "可轉移" if args.dry_run else "已轉移"
+            print(f"{action} {migrated} 筆，無法解析 {skipped} 筆")
+            return 0
+
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT model_version, COUNT(*), COUNT(DISTINCT member_id) FROM face_encodings GROUP BY model_version"
+        )
+        for model_version, count, members in cursor.fetchall():
+            print(f"{model_version}\tencodings={count}\tmembers={members}")
+        cursor.close()
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
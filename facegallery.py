@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""facegallery.py - 多行程共用的人臉資料庫
+
+多個辨識行程各自解析 ``encodings.csv`` 時，每個行程都會持有一份完整的
+向量資料。本模組將編碼一次寫入記憶體映射檔（建議放在 ``/dev/shm``），
+各行程以唯讀方式映射同一個檔案，由作業系統的分頁快取共用，N 個行程
+只佔用一份資料的記憶體。
+
+檔案格式::
+
+    [header][padding][float32 向量 count x dim][UTF-8 JSON 標籤陣列]
+
+header 內含版本與世代編號 (generation)。發佈新資料時先寫入暫存檔再以
+``os.replace`` 原子替換，已映射舊檔的行程不受影響，並可透過
+:meth:`SharedGallery.refresh` 偵測新世代後重新映射。
+
+範例::
+
+    # 由 CSV 發佈共用資料
+    python facegallery.py publish --encodings encodings.csv
+
+    # 查看目前世代
+    python facegallery.py info
+
+    # 比較全量比對與身分樣板比對的準確率與吞吐量
+    python facegallery.py report --encodings encodings.csv --max-exemplars 5
+
+身分樣板 (:class:`TemplateGallery`) 將每位人員的多張註冊照片整理為一個
+中心向量與少量以最遠點取樣挑出的代表樣本。比對時先以中心向量做粗篩，
+再只對候選人員的代表樣本做精比對，避免照片多的人佔據大部分比對量。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from facegen import FaceEncodingGenerator
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"FGAL"
+LAYOUT_VERSION = 1
+# magic, layout 版本, 保留, 世代, 筆數, 維度, 向量位移, 標籤位移, 標籤長度
+HEADER = struct.Struct("<4sHHQIIQQQ")
+DATA_ALIGNMENT = 64
+
+
+def _default_gallery_path() -> Path:
+    shm_dir = Path("/dev/shm")
+    base_dir = shm_dir if shm_dir.is_dir() else Path(tempfile.gettempdir())
+    return base_dir / "face_gallery.bin"
+
+
+DEFAULT_GALLERY_PATH = _default_gallery_path()
+
+
+class GalleryFormatError(RuntimeError):
+    """共用資料檔格式不符。"""
+
+
+class GalleryPublisher:
+    """將人臉編碼寫入共用映射檔的發佈端。"""
+
+    def __init__(self, path: Path = DEFAULT_GALLERY_PATH) -> None:
+        self.path = Path(path).expanduser()
+
+    # ------------------------------------------------------------------
+    def publish(self, encodings: Sequence[np.ndarray], labels: Sequence[str]) -> int:
+        """寫入新世代並回傳世代編號。"""
+
+        if len(encodings) != len(labels):
+            raise ValueError("編碼與標籤數量不一致")
+
+        matrix = np.asarray(encodings, dtype=np.float32)
+        if matrix.size == 0:
+            matrix = np.zeros((0, 128), dtype=np.float32)
+        matrix = np.ascontiguousarray(matrix.reshape(len(labels), -1))
+        count, dim = matrix.shape
+        label_bytes = json.dumps(list(labels), ensure_ascii=False).encode("utf-8")
+
+        vectors_offset = _align(HEADER.size)
+        labels_offset = vectors_offset + matrix.nbytes
+        generation = self.current_generation() + 1
+        header = HEADER.pack(
+            MAGIC,
+            LAYOUT_VERSION,
+            0,
+            generation,
+            count,
+            dim,
+            vectors_offset,
+            labels_offset,
+            len(label_bytes),
+        )
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=self.path.name, dir=str(self.path.parent))
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(header)
+                fp.write(b"\0" * (vectors_offset - HEADER.size))
+                fp.write(matrix.tobytes())
+                fp.write(label_bytes)
+            os.chmod(tmp_name, 0o644)
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+        LOGGER.info("發佈共用人臉資料 世代=%d 筆數=%d 維度=%d -> %s", generation, count, dim, self.path)
+        return generation
+
+    def publish_csv(self, csv_path: Path) -> int:
+        """讀取 facegen 產生的 CSV 後發佈。"""
+
+        records = FaceEncodingGenerator.load_from_csv(csv_path)
+        encodings = [np.asarray(record.encoding, dtype=np.float32) for record in records]
+        return self.publish(encodings, [record.label for record in records])
+
+    def current_generation(self) -> int:
+        try:
+            with self.path.open("rb") as fp:
+                return read_header(fp.read(HEADER.size))["generation"]
+        except (OSError, GalleryFormatError):
+            return 0
+
+
+class SharedGallery:
+    """以唯讀方式映射共用人臉資料的讀取端。"""
+
+    def __init__(self, path: Path = DEFAULT_GALLERY_PATH, check_interval: float = 1.0) -> None:
+        """初始化讀取端。
+
+        Args:
+            path: 共用映射檔路徑。
+            check_interval: :meth:`refresh` 檢查新世代的最短間隔（秒）。
+        """
+
+        self.path = Path(path).expanduser()
+        self.check_interval = max(0.0, check_interval)
+        self.generation = 0
+        self.encodings: np.ndarray = np.zeros((0, 128), dtype=np.float32)
+        self.labels: List[str] = []
+        self._mmap: Optional[mmap.mmap] = None
+        self._file_id: Optional[tuple] = None
+        self._last_check = 0.0
+
+    # ------------------------------------------------------------------
+    def attach(self) -> bool:
+        """映射目前的檔案；檔案不存在時回傳 ``False``。"""
+
+        try:
+            with self.path.open("rb") as fp:
+                stat = os.fstat(fp.fileno())
+                if stat.st_size < HEADER.size:
+                    raise GalleryFormatError(f"共用資料檔過小: {self.path}")
+                mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            LOGGER.warning("找不到共用人臉資料 %s，請先執行 facegallery.py publish", self.path)
+            return False
+
+        header = read_header(mapped[: HEADER.size])
+        count, dim = header["count"], header["dim"]
+        label_start = header["labels_offset"]
+        label_end = label_start + header["labels_length"]
+        # 向量為 float32（4 位元組）
+        if header["vectors_offset"] + count * dim * 4 > label_start or label_end > len(mapped):
+            raise GalleryFormatError(f"共用資料檔內容不完整: {self.path}")
+        vectors = np.frombuffer(
+            mapped,
+            dtype=np.float32,
+            count=count * dim,
+            offset=header["vectors_offset"],
+        ).reshape(count, dim)
+        try:
+            labels = json.loads(mapped[label_start:label_end].decode("utf-8"))
+        except ValueError as exc:
+            raise GalleryFormatError(f"共用資料檔標籤損毀: {self.path}") from exc
+        if len(labels) != count:
+            raise GalleryFormatError(f"共用資料檔標籤數量不符: {self.path}")
+
+        # 舊的映射可能仍被其他陣列參照，交由垃圾回收釋放
+        self._mmap = mapped
+        self.encodings = vectors
+        self.labels = labels
+        self.generation = header["generation"]
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+        self._last_check = time.monotonic()
+        LOGGER.info("已映射共用人臉資料 世代=%d 筆數=%d", self.generation, count)
+        return True
+
+    def refresh(self, force: bool = False) -> bool:
+        """檢查是否有新世代，有則重新映射並回傳 ``True``。"""
+
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns) == self._file_id:
+            return False
+        previous = self.generation
+        try:
+            if not self.attach():
+                return False
+        except GalleryFormatError as exc:
+            # 保留目前的映射繼續辨識；記下此檔案避免每次檢查都重複警告
+            LOGGER.warning("共用人臉資料無法載入，沿用世代 %d: %s", self.generation, exc)
+            self._file_id = (stat.st_ino, stat.st_mtime_ns)
+            return False
+        return self.generation != previous
+
+    def close(self) -> None:
+        self.encodings = np.zeros((0, 128), dtype=np.float32)
+        self.labels = []
+        self._mmap = None
+        self._file_id = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+
+class TemplateGallery:
+    """以身分為單位的兩階段比對樣板。"""
+
+    def __init__(self, max_exemplars: int = 5, shortlist: int = 3, centroid: str = "mean") -> None:
+        """初始化樣板。
+
+        Args:
+            max_exemplars: 每位人員最多保留的代表樣本數。
+            shortlist: 粗篩後保留做精比對的人員數。
+            centroid: 中心向量計算方式，``"mean"`` 或 ``"medoid"``。
+        """
+
+        if centroid not in {"mean", "medoid"}:
+            raise ValueError(f"不支援的中心向量計算方式: {centroid}")
+        self.max_exemplars = max(1, int(max_exemplars))
+        self.shortlist = max(1, int(shortlist))
+        self.centroid = centroid
+        self.labels: List[str] = []
+        self.centroids = np.zeros((0, 128), dtype=np.float32)
+        self.exemplars = np.zeros((0, 128), dtype=np.float32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    def build(self, encodings: Sequence[np.ndarray], labels: Sequence[str]) -> "TemplateGallery":
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(len(labels), -1) if len(labels) else None
+        grouped: Dict[str, List[int]] = {}
+        for index, label in enumerate(labels):
+            grouped.setdefault(label, []).append(index)
+
+        centroids: List[np.ndarray] = []
+        exemplars: List[np.ndarray] = []
+        offsets = [0]
+        for label, indices in grouped.items():
+            vectors = matrix[indices]
+            mean = vectors.mean(axis=0)
+            # 以最接近平均的樣本作為起點，代表樣本必為真實照片
+            start = int(np.argmin(np.linalg.norm(vectors - mean, axis=1)))
+            if self.centroid == "medoid":
+                pairwise = np.linalg.norm(vectors[:, None, :] - vectors[None, :, :], axis=2)
+                start = int(np.argmin(pairwise.sum(axis=1)))
+                centre = vectors[start]
+            else:
+                centre = mean
+            chosen = farthest_point_sample(vectors, self.max_exemplars, start)
+            centroids.append(centre)
+            exemplars.extend(vectors[chosen])
+            offsets.append(offsets[-1] + len(chosen))
+
+        self.labels = list(grouped)
+        dim = matrix.shape[1] if matrix is not None else 128
+        self.centroids = np.asarray(centroids, dtype=np.float32).reshape(len(self.labels), dim)
+        self.exemplars = np.asarray(exemplars, dtype=np.float32).reshape(offsets[-1], dim)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        LOGGER.info(
+            "建立身分樣板：%d 位人員、%d 筆原始樣本、%d 筆代表樣本",
+            len(self.labels),
+            len(labels),
+            len(self.exemplars),
+        )
+        return self
+
+    # ------------------------------------------------------------------
+    def match(self, encoding: np.ndarray) -> Tuple[Optional[str], float]:
+        """回傳最接近的人員與距離；樣板為空時回傳 ``(None, 1.0)``。"""
+
+        if not self.labels:
+            return None, 1.0
+        coarse = np.linalg.norm(self.centroids - encoding, axis=1)
+        if len(coarse) > self.shortlist:
+            candidates = np.argpartition(coarse, self.shortlist - 1)[: self.shortlist]
+        else:
+            candidates = np.arange(len(coarse))
+
+        best_label: Optional[str] = None
+        best_distance = float("inf")
+        for candidate in candidates:
+            start, end = self._offsets[candidate], self._offsets[candidate + 1]
+            distance = float(np.linalg.norm(self.exemplars[start:end] - encoding, axis=1).min())
+            if distance < best_distance:
+                best_label, best_distance = self.labels[candidate], distance
+        return best_label, best_distance
+
+    @property
+    def rows_per_query(self) -> float:
+        """每次比對平均掃描的向量數（中心向量 + 候選人員的代表樣本）。"""
+
+        if not self.labels:
+            return 0.0
+        mean_exemplars = len(self.exemplars) / len(self.labels)
+        return len(self.centroids) + min(self.shortlist, len(self.labels)) * mean_exemplars
+
+
+# ----------------------------------------------------------------------
+# 工具函式
+# ----------------------------------------------------------------------
+
+def farthest_point_sample(vectors: np.ndarray, count: int, start: int = 0) -> List[int]:
+    """以最遠點取樣挑出彼此差異最大的樣本索引。"""
+
+    chosen = [start]
+    min_distance = np.linalg.norm(vectors - vectors[start], axis=1)
+    while len(chosen) < min(count, len(vectors)):
+        candidate = int(np.argmax(min_distance))
+        if min_distance[candidate] <= 0:
+            break
+        chosen.append(candidate)
+        min_distance = np.minimum(min_distance, np.linalg.norm(vectors - vectors[candidate], axis=1))
+    return chosen
+
+
+def template_report(
+    encodings: Sequence[np.ndarray],
+    labels: Sequence[str],
+    tolerance: float = 0.6,
+    max_exemplars: int = 5,
+    shortlist: int = 3,
+    repeat: int = 3,
+) -> Dict[str, Dict[str, float]]:
+    """以每人保留一張照片作為查詢，比較全量比對與樣板比對。
+
+    只有兩張以上照片的人員會被挑出查詢樣本，其餘樣本組成資料庫。
+    """
+
+    matrix = np.asarray(encodings, dtype=np.float32).reshape(len(labels), -1)
+    counts = Counter(labels)
+    held_out: Dict[str, int] = {}
+    for index, label in enumerate(labels):
+        if counts[label] > 1 and label not in held_out:
+            held_out[label] = index
+    query_indices = sorted(held_out.values())
+    query_set = set(query_indices)
+    gallery_indices = [index for index in range(len(labels)) if index not in query_set]
+    if not query_indices:
+        raise ValueError("需要至少一位擁有兩張以上照片的人員才能產生報告")
+
+    gallery = matrix[gallery_indices]
+    gallery_labels = [labels[index] for index in gallery_indices]
+    queries = matrix[query_indices]
+    expected = [labels[index] for index in query_indices]
+
+    def brute_force(query: np.ndarray) -> Tuple[Optional[str], float]:
+        distances = np.linalg.norm(gallery - query, axis=1)
+        best = int(np.argmin(distances))
+        return gallery_labels[best], float(distances[best])
+
+    templates = TemplateGallery(max_exemplars=max_exemplars, shortlist=shortlist).build(gallery, gallery_labels)
+    methods = {
+        "full": (brute_force, float(len(gallery))),
+        "templates": (templates.match, templates.rows_per_query),
+    }
+
+    report: Dict[str, Dict[str, float]] = {}
+    for name, (matcher, rows) in methods.items():
+        correct = 0
+        start = time.perf_counter()
+        for _ in range(max(1, repeat)):
+            correct = 0
+            for query, label in zip(queries, expected):
+                predicted, distance = matcher(query)
+                correct += int(predicted == label and distance <= tolerance)
+        elapsed = time.perf_counter() - start
+        total = len(queries) * max(1, repeat)
+        report[name] = {
+            "queries": float(len(queries)),
+            "rows_per_query": rows,
+            "recall": correct / len(queries),
+            "queries_per_sec": total / elapsed if elapsed > 0 else 0.0,
+        }
+    return report
+
+
+def format_report(report: Dict[str, Dict[str, float]]) -> str:
+    lines = [
+        "| method | rows/query | recall@tol | queries/s |",
+        "| --- | --- | --- | --- |",
+    ]
+    for name, values in report.items():
+        lines.append(
+            f"| {name} | {values['rows_per_query']:.1f} | {values['recall']:.3f} | {values['queries_per_sec']:.0f} |"
+        )
+    return "\n".join(lines)
+
+
+def _align(offset: int) -> int:
+    return (offset + DATA_ALIGNMENT - 1) // DATA_ALIGNMENT * DATA_ALIGNMENT
+
+
+def read_header(raw: bytes) -> dict:
+    if len(raw) < HEADER.size:
+        raise GalleryFormatError("共用資料檔標頭不完整")
+    magic, version, _, generation, count, dim, vectors_offset, labels_offset, labels_length = HEADER.unpack(
+        raw[: HEADER.size]
+    )
+    if magic != MAGIC:
+        raise GalleryFormatError("不是有效的共用人臉資料檔")
+    if version != LAYOUT_VERSION:
+        raise GalleryFormatError(f"不支援的共用資料格式版本: {version}")
+    return {
+        "generation": generation,
+        "count": count,
+        "dim": dim,
+        "vectors_offset": vectors_offset,
+        "labels_offset": labels_offset,
+        "labels_length": labels_length,
+    }
+
+
+# ----------------------------------------------------------------------
+# 命令列介面
+# ----------------------------------------------------------------------
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="共用人臉資料發佈工具")
+    parser.add_argument("--gallery", default=str(DEFAULT_GALLERY_PATH), help="共用映射檔路徑")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish", help="由 CSV 發佈新世代")
+    publish.add_argument("--encodings", default="encodings.csv", help="facegen 產生的編碼 CSV 檔")
+    publish.add_argument("--watch", type=float, help="每隔指定秒數檢查 CSV，有變更時重新發佈")
+
+    subparsers.add_parser("info", help="顯示目前世代資訊")
+
+    report = subparsers.add_parser("report", help="比較全量比對與身分樣板的準確率與吞吐量")
+    report.add_argument("--encodings", default="encodings.csv", help="facegen 產生的編碼 CSV 檔")
+    report.add_argument("--tolerance", type=float, default=0.6, help="辨識容忍度")
+    report.add_argument("--max-exemplars", type=int, default=5, help="每位人員的代表樣本數上限")
+    report.add_argument("--shortlist", type=int, default=3, help="粗篩後保留的候選人數")
+    report.add_argument("--repeat", type=int, default=3, help="量測吞吐量時的重複次數")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    gallery_path = Path(args.gallery)
+    if args.command == "report":
+        records = FaceEncodingGenerator.load_from_csv(Path(args.encodings))
+        result = template_report(
+            [record.encoding for record in records],
+            [record.label for record in records],
+            tolerance=args.tolerance,
+            max_exemplars=args.max_exemplars,
+            shortlist=args.shortlist,
+            repeat=args.repeat,
+        )
+        print(format_report(result))
+        return 0
+
+    if args.command == "info":
+        gallery = SharedGallery(gallery_path)
+        if not gallery.attach():
+            return 1
+        print(f"generation={gallery.generation} count={len(gallery)} dim={gallery.encodings.shape[1]}")
+        return 0
+
+    publisher = GalleryPublisher(gallery_path)
+    csv_path = Path(args.encodings)
+    publisher.publish_csv(csv_path)
+    if not args.watch:
+        return 0
+
+    last_mtime = csv_path.stat().st_mtime_ns
+    while True:  # pragma: no cover - 常駐模式
+        time.sleep(args.watch)
+        mtime = csv_path.stat().st_mtime_ns
+        if mtime != last_mtime:
+            last_mtime = mtime
+            publisher.publish_csv(csv_path)
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
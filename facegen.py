@@ -30,7 +30,7 @@ import json
 import logging
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Iterator, List, Optional, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 try:
     import face_recognition
@@ -39,8 +39,12 @@ except ImportError as exc:  # pragma: no cover - 環境未安裝套件時才會
         "facegen.py 需要 face_recognition 套件，請先安裝：pip install face-recognition"
     ) from exc
 
+from facebatch import BatchFaceDetector
+
 LOGGER = logging.getLogger(__name__)
 SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+# 批次處理資料夾時，依尺寸分組暫存的圖片最多為批次大小的幾倍
+PENDING_BATCHES = 4
 
 
 @dataclass
@@ -66,6 +70,7 @@ class FaceEncodingGenerator:
         upsample_times: int = 1,
         num_jitters: int = 1,
         allow_multiple_faces: bool = False,
+        batch_size: int = 1,
     ) -> None:
         """初始化編碼器。
 
@@ -74,12 +79,14 @@ class FaceEncodingGenerator:
             upsample_times: 偵測人臉時影像上採樣次數。
             num_jitters: 人臉編碼抖動次數，可提升精準度但增加運算量。
             allow_multiple_faces: 是否在單張圖片上儲存多張人臉編碼。
+            batch_size: 使用 CNN 模型處理資料夾時，每批次偵測的圖片數。
         """
 
         self.model = model
         self.upsample_times = max(0, int(upsample_times))
         self.num_jitters = max(1, int(num_jitters))
         self.allow_multiple_faces = allow_multiple_faces
+        self.batch_size = max(1, int(batch_size))
 
     # ------------------------------------------------------------------
     # 影像處理邏輯
@@ -99,6 +106,16 @@ class FaceEncodingGenerator:
             number_of_times_to_upsample=self.upsample_times,
             model=self.model,
         )
+        return self.encode_faces(image, image_path, face_locations, label=label)
+
+    def encode_faces(
+        self,
+        image,
+        image_path: Path,
+        face_locations: Sequence,
+        label: Optional[str] = None,
+    ) -> List[FaceEncodingRecord]:
+        """依已偵測的人臉位置產生編碼紀錄。"""
 
         if not face_locations:
             LOGGER.warning("未在圖片 %s 偵測到人臉", image_path)
@@ -141,14 +158,82 @@ class FaceEncodingGenerator:
             raise FileNotFoundError(f"資料夾不存在: {directory}")
 
         pattern = "**/*" if recursive else "*"
-        for path in sorted(directory.glob(pattern)):
-            if not path.is_file() or path.suffix.lower() not in SUPPORTED_EXTENSIONS:
-                continue
+        paths = [
+            path
+            for path in sorted(directory.glob(pattern))
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        ]
 
+        if self.model == "cnn" and self.batch_size > 1:
+            yield from self._process_paths_batched(paths, label_from_parent)
+            return
+
+        for path in paths:
             label = path.parent.name if label_from_parent else path.stem
             for record in self.process_image(path, label=label):
                 yield record
 
+    def _process_paths_batched(
+        self,
+        paths: Sequence[Path],
+        label_from_parent: bool,
+    ) -> Iterator[FaceEncodingRecord]:
+        """以 CNN 批次偵測處理多張圖片，編碼仍逐張計算。
+
+        只有相同尺寸的圖片會合併成一批，避免每張都補零到批次中最大的尺寸；
+        暫存的圖片超過 ``batch_size * PENDING_BATCHES`` 張時先送出張數最多的
+        一組，因此輸出順序可能與檔名順序不同。無法讀取的圖片記錄後略過。
+        """
+
+        detector = BatchFaceDetector(batch_size=self.batch_size, upsample_times=self.upsample_times)
+        groups: Dict[Tuple[int, ...], List[Tuple[Path, Any]]] = {}
+        pending = 0
+        for path in paths:
+            path = path.expanduser().resolve()
+            try:
+                image = face_recognition.load_image_file(str(path))
+            except Exception as exc:
+                LOGGER.warning("無法讀取圖片 %s: %s", path, exc)
+                continue
+            shape = tuple(image.shape)
+            groups.setdefault(shape, []).append((path, image))
+            pending += 1
+            if len(groups[shape]) < self.batch_size and pending <= self.batch_size * PENDING_BATCHES:
+                continue
+            if len(groups[shape]) < self.batch_size:
+                shape = max(groups, key=lambda key: len(groups[key]))
+            group = groups.pop(shape)
+            pending -= len(group)
+            yield from self._encode_group(detector, group, label_from_parent)
+
+        for group in groups.values():
+            yield from self._encode_group(detector, group, label_from_parent)
+
+    def _encode_group(
+        self,
+        detector: BatchFaceDetector,
+        group: Sequence[Tuple[Path, Any]],
+        label_from_parent: bool,
+    ) -> Iterator[FaceEncodingRecord]:
+        """偵測並編碼一組相同尺寸的圖片；批次失敗時改為逐張偵測。"""
+
+        try:
+            batch_locations: List[Optional[Sequence]] = list(detector.detect_many([image for _, image in group]))
+        except Exception:
+            LOGGER.exception("批次偵測 %d 張圖片失敗，改為逐張偵測", len(group))
+            batch_locations = [None] * len(group)
+
+        for (path, image), locations in zip(group, batch_locations):
+            label = path.parent.name if label_from_parent else path.stem
+            try:
+                if locations is None:
+                    locations = detector.detect_many([image])[0]
+                records = self.encode_faces(image, path, locations, label=label)
+            except Exception:
+                LOGGER.exception("處理圖片 %s 失敗", path)
+                continue
+            yield from records
+
     def generate_from_path(
         self,
         input_path: Path,
@@ -249,6 +334,7 @@ def build_argument_parser() -> argparse.ArgumentParser:
     parser.add_argument("--upsample", type=int, default=1, help="偵測人臉時的上採樣次數")
     parser.add_argument("--jitters", type=int, default=1, help="產生人臉編碼時的抖動次數")
     parser.add_argument("--allow-multi", action="store_true", help="允許單張圖片儲存多張人臉")
+    parser.add_argument("--batch-size", type=int, default=1, help="CNN 模型處理資料夾時的批次偵測張數")
     parser.add_argument("--recursive", action="store_true", help="遞迴處理子資料夾")
     parser.add_argument("--append", action="store_true", help="以附加模式寫入 CSV")
     parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO 或 DEBUG")
@@ -266,6 +352,7 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         upsample_times=args.upsample,
         num_jitters=args.jitters,
         allow_multiple_faces=args.allow_multi,
+        batch_size=args.batch_size,
     )
 
     input_path = Path(args.input)
@@ -21,7 +21,7 @@ import logging
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 
 import cv2
 import face_recognition
@@ -37,6 +37,7 @@ else:  # pragma: no cover - 測試環境無法驗證
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from faceencodings import insert_encodings
 from facegen import FaceEncodingGenerator, FaceEncodingRecord
 
 LOGGER = logging.getLogger(__name__)
@@ -87,29 +88,21 @@ class DatabaseManager:
             self.connection.close()
             self.connection = None
 
-    def insert_member(self, member: MemberInfo, encoding: FaceEncodingRecord) -> Optional[int]:
+    def insert_member(self, member: MemberInfo, encodings: Sequence[FaceEncodingRecord]) -> Optional[int]:
+        """新增會員並將各筆編碼寫入 ``face_encodings``。"""
+
         if not self.connection:
             return None
         cursor = self.connection.cursor()
-        query = (
-            "INSERT INTO members (name, gender, age_group, email, face_encoding) "
-            "VALUES (%s, %s, %s, %s, %s)"
-        )
-        encoding_json = encoding.to_csv_row()[2]
-        cursor.execute(
-            query,
-            (
-                member.name,
-                member.gender,
-                member.age_group,
-                member.email,
-                encoding_json,
-            ),
-        )
-        self.connection.commit()
-        member_id = cursor.lastrowid
-        cursor.close()
-        return int(member_id)
+        query = "INSERT INTO members (name, gender, age_group, email) VALUES (%s, %s, %s, %s)"
+        try:
+            cursor.execute(query, (member.name, member.gender, member.age_group, member.email))
+            member_id = int(cursor.lastrowid)
+            insert_encodings(cursor, member_id, [record.encoding for record in encodings])
+            self.connection.commit()
+        finally:
+            cursor.close()
+        return member_id
 
 
 class FaceDatasetManager:
@@ -120,11 +113,11 @@ class FaceDatasetManager:
         self.csv_path = csv_path
         self.dataset_dir.mkdir(parents=True, exist_ok=True)
 
-    def save_face_image(self, label: str, frame: cv2.Mat) -> Path:
+    def save_face_image(self, label: str, frame: cv2.Mat, suffix: str = "") -> Path:
         person_dir = self.dataset_dir / label
         person_dir.mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = person_dir / f"{timestamp}.jpg"
+        filename = person_dir / f"{timestamp}{suffix}.jpg"
         cv2.imwrite(str(filename), frame)
         return filename
 
@@ -138,6 +131,36 @@ class FaceDatasetManager:
         return sorted({rec.label for rec in records})
 
 
+def enroll_member(
+    member: MemberInfo,
+    samples: Sequence[Tuple[cv2.Mat, Sequence[float]]],
+    dataset_manager: FaceDatasetManager,
+    db_manager: Optional[DatabaseManager] = None,
+) -> Tuple[List[FaceEncodingRecord], Optional[int]]:
+    """註冊會員：儲存影像、附加編碼至 CSV，並寫入資料庫（若已連線）。
+
+    Args:
+        member: 會員資料。
+        samples: (人臉影像, 編碼) 列表，每一筆都會寫入資料庫。
+        dataset_manager: 本地資料集。
+        db_manager: 資料庫；未提供或未連線時僅儲存於本地。
+
+    Returns:
+        ``(records, member_id)``；本地模式時 ``member_id`` 為 ``None``。
+    """
+
+    records: List[FaceEncodingRecord] = []
+    for index, (image, encoding) in enumerate(samples):
+        suffix = f"_{index:02d}" if len(samples) > 1 else ""
+        image_path = dataset_manager.save_face_image(member.name, image, suffix=suffix)
+        records.append(FaceEncodingRecord(label=member.name, file_path=str(image_path), encoding=list(encoding)))
+    if not records:
+        return records, None
+    FaceEncodingGenerator.save_to_csv(records, dataset_manager.csv_path, append=True)
+    member_id = db_manager.insert_member(member, records) if db_manager else None
+    return records, member_id
+
+
 class FaceRegistrationApp:
     """Tkinter 人臉註冊應用程式。"""
 
@@ -285,10 +308,6 @@ class FaceRegistrationApp:
         face_encodings = face_recognition.face_encodings(rgb_frame, known_face_locations=face_locations)
         encoding_vector = face_encodings[0]
 
-        image_path = self.dataset_manager.save_face_image(name, self.current_frame)
-        record = FaceEncodingRecord(label=name, file_path=str(image_path), encoding=encoding_vector.tolist())
-        self.dataset_manager.append_encoding(record)
-
         member = MemberInfo(
             name=name,
             gender=self.gender_var.get() or None,
@@ -296,7 +315,12 @@ class FaceRegistrationApp:
             email=self.email_var.get() or None,
         )
 
-        member_id = self.db_manager.insert_member(member, record) if self.db_manager else None
+        _, member_id = enroll_member(
+            member,
+            [(self.current_frame, encoding_vector.tolist())],
+            self.dataset_manager,
+            self.db_manager,
+        )
 
         if member_id is not None:
             message = f"會員 {name} 註冊成功！ID: {member_id}"
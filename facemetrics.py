@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""facemetrics.py - 邊緣節點的 Prometheus 指標端點
+
+長時間執行的程式（``rollcall_edge.py``、``facecam.py``、
+``face_recognition_ad_system.py``）可在本機開啟 HTTP ``/metrics``，
+以 Prometheus 文字格式輸出下列指標供監控系統抓取：
+
+* 擷取／處理／丟棄的影格數（依攝影機區分）
+* 各階段延遲直方圖（來自 :mod:`faceprof` 的區段）
+* 人臉資料庫筆數、辨識命中與未知人臉次數
+* 資料庫／MQTT 等佇列深度
+* SoC 溫度與降頻狀態（與 ``git/tests/cam_stable.py`` 共用讀取函式）
+
+只使用標準函式庫，不需安裝 ``prometheus_client``。
+
+使用方式::
+
+    from facemetrics import FRAMES_CAPTURED, start_metrics_server
+
+    server = start_metrics_server(9108)
+    FRAMES_CAPTURED.inc(device="cam0")
+    ...
+    server.stop()
+
+    curl http://localhost:9108/metrics
+"""
+
+from __future__ import annotations
+
+import abc
+import logging
+import os
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = Tuple[str, ...]
+
+
+# ----------------------------------------------------------------------
+# 系統監控工具（cam_stable.py 亦使用）
+# ----------------------------------------------------------------------
+
+def read_soc_temp_c() -> Optional[float]:
+    """讀取 SoC 溫度（攝氏），優先使用 vcgencmd，其次 /sys/class/thermal。"""
+
+    try:
+        out = subprocess.check_output(["vcgencmd", "measure_temp"], text=True).strip()
+        # e.g. temp=45.2'C
+        if "temp=" in out:
+            return float(out.split("temp=")[1].split("'")[0])
+    except Exception:
+        pass
+    try:
+        for path in ("/sys/class/thermal/thermal_zone0/temp", "/sys/class/thermal/thermal_zone1/temp"):
+            if os.path.exists(path):
+                with open(path) as handle:
+                    value = float(handle.read().strip())
+                # 部分系統以千分之一度回報
+                return value / (1000.0 if value > 200 else 1.0)
+    except Exception:
+        pass
+    return None
+
+
+def read_throttled() -> Optional[str]:
+    """回傳 ``vcgencmd get_throttled`` 的原始輸出；0x0 表示未曾降頻或欠壓。"""
+
+    try:
+        return subprocess.check_output(["vcgencmd", "get_throttled"], text=True).strip()
+    except Exception:
+        return None
+
+
+def parse_throttled(value: Optional[str]) -> Optional[int]:
+    """將 ``throttled=0x50005`` 轉為整數位元旗標。"""
+
+    if not value:
+        return None
+    try:
+        return int(value.split("=")[-1].strip(), 16)
+    except ValueError:
+        return None
+
+
+def read_cpu_mem_usage() -> Tuple[Optional[float], Optional[float]]:
+    """回傳 (CPU%, 記憶體%)；優先用 psutil，未安裝時改讀 /proc。"""
+
+    try:
+        import psutil
+
+        return psutil.cpu_percent(interval=0.1), psutil.virtual_memory().percent
+    except Exception:
+        pass
+
+    def read_stat() -> Tuple[float, float]:
+        with open("/proc/stat") as handle:
+            for line in handle:
+                if line.startswith("cpu "):
+                    parts = [float(x) for x in line.split()[1:]]
+                    return parts[3] + parts[4], sum(parts)  # idle + iowait
+        return 0.0, 0.0
+
+    try:
+        idle1, total1 = read_stat()
+        time.sleep(0.1)
+        idle2, total2 = read_stat()
+        total = total2 - total1
+        cpu: Optional[float] = 0.0 if total == 0 else (1.0 - (idle2 - idle1) / total) * 100.0
+    except Exception:
+        cpu = None
+    try:
+        info: Dict[str, float] = {}
+        with open("/proc/meminfo") as handle:
+            for line in handle:
+                key, value, *_ = line.replace("kB", "").split(":")
+                info[key.strip()] = float(value.strip())
+        mem: Optional[float] = 100.0 * (1.0 - info.get("MemAvailable", 0) / info.get("MemTotal", 1))
+    except Exception:
+        mem = None
+    return cpu, mem
+
+
+# ----------------------------------------------------------------------
+# 指標型別
+# ----------------------------------------------------------------------
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """回傳 ``(名稱, 標籤字串, 數值)``，由各指標型別實作。"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不減的計數器。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("計數器不可遞減")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(_Metric):
+    """可增可減的量測值，亦可綁定在抓取時才計算的函式。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], Optional[float]]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], Optional[float]], **labels: str) -> None:
+        """每次抓取時呼叫 ``function`` 取值，回傳 None 時略過該筆。"""
+
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def value(self, **labels: str) -> Optional[float]:
+        key = self._key(labels)
+        with self._lock:
+            function = self._functions.get(key)
+            if function is None:
+                return self._values.get(key)
+        return function()
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                result = function()
+            except Exception as exc:  # pragma: no cover - 單一指標失敗不影響整體輸出
+                LOGGER.debug("指標 %s 取值失敗: %s", self.name, exc)
+                result = None
+            if result is None:
+                values.pop(key, None)
+            else:
+                values[key] = float(result)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """累積式分桶直方圖。"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+                self._sums[key] = 0.0
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] += value
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            snapshot = [(key, list(counts), self._sums[key]) for key, counts in sorted(self._counts.items())]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            base = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", base, total
+            yield f"{self.name}_count", base, cumulative
+
+
+class MetricsRegistry:
+    """收集指標並輸出 Prometheus 文字格式。"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"指標 {metric.name} 已以不同型別或標籤註冊")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+# HTTP 端點
+# ----------------------------------------------------------------------
+
+class MetricsServer:
+    """在背景執行緒提供 ``/metrics`` 的 HTTP 伺服器。"""
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        port: int = DEFAULT_METRICS_PORT,
+        host: str = "0.0.0.0",
+        on_stop: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """初始化伺服器。
+
+        Args:
+            registry: 要輸出的指標集合。
+            port: 監聽埠號，0 表示由系統指派。
+            host: 監聽位址。
+            on_stop: :meth:`stop` 時呼叫的清理函式（例如移除 profiler 觀察者）。
+        """
+
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.on_stop = on_stop
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsServer":
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server 介面
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:  # noqa: A002 - 覆寫預設的 stderr 輸出
+                LOGGER.debug("metrics %s - %s", self.address_string(), format % args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        LOGGER.info("指標端點已啟動：http://%s:%d/metrics", self.host, self.port)
+        return self
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._server = None
+        self._thread = None
+        if self.on_stop is not None:
+            self.on_stop()
+
+
+# ----------------------------------------------------------------------
+# 共用指標
+# ----------------------------------------------------------------------
+
+REGISTRY = MetricsRegistry()
+
+FRAMES_CAPTURED = REGISTRY.counter("face_frames_captured_total", "攝影機擷取的影格數", ("device",))
+FRAMES_PROCESSED = REGISTRY.counter("face_frames_processed_total", "完成辨識的影格數", ("device",))
+FRAMES_DROPPED = REGISTRY.counter("face_frames_dropped_total", "未經辨識即被捨棄的影格數", ("device",))
+STAGE_LATENCY = REGISTRY.histogram("face_stage_latency_seconds", "辨識流程各階段耗時", ("stage",))
+GALLERY_SIZE = REGISTRY.gauge("face_gallery_size", "已載入的人臉編碼筆數")
+RECOGNITIONS = REGISTRY.counter("face_recognitions_total", "辨識結果次數（hit 為已知人員、unknown 為未知）", ("result",))
+QUEUE_DEPTH = REGISTRY.gauge("face_queue_depth", "待處理佇列長度", ("queue",))
+SOC_TEMPERATURE = REGISTRY.gauge("face_soc_temperature_celsius", "SoC 溫度（攝氏）")
+SOC_THROTTLED = REGISTRY.gauge("face_soc_throttled_flags", "vcgencmd get_throttled 位元旗標，0 表示正常")
+QUALITY_REJECTS = REGISTRY.counter(
+    "face_quality_rejected_total", "品質不足而略過編碼的人臉數（依原因）", ("reason",)
+)
+FRAME_ALLOCATIONS = REGISTRY.counter(
+    "face_frame_buffer_allocations_total", "影格與暫存緩衝區的配置次數，穩定運作後應不再增加", ("site",)
+)
+AD_LOG_ROWS = REGISTRY.counter(
+    "face_ad_log_rows_total", "廣告曝光紀錄筆數（written 寫入資料庫、spooled 暫存本地、dropped 遺失）", ("result",)
+)
+AD_SWITCH_LATENCY = REGISTRY.histogram("face_ad_switch_seconds", "切換廣告畫面（取出快取並顯示）的耗時")
+AD_MEDIA_CACHE = REGISTRY.counter("face_ad_media_cache_total", "廣告媒體快取查詢次數（hit／miss）", ("result",))
+AD_VIDEO_FRAMES = REGISTRY.counter(
+    "face_ad_video_frames_total", "廣告影片影格數（shown 已顯示、dropped 落後而丟棄）", ("result",)
+)
+AD_VIDEO_DECODE_LATENCY = REGISTRY.histogram(
+    "face_ad_video_decode_seconds", "廣告影片單一影格的解碼耗時（依解碼後端）", ("backend",)
+)
+AD_PREFETCH = REGISTRY.counter(
+    "face_ad_prefetch_total", "預先決定廣告的結果（hit 確認時已備妥、miss 需同步查詢、discarded 身分未確認）", ("result",)
+)
+AD_FACE_TO_SCREEN = REGISTRY.histogram(
+    "face_ad_face_to_screen_seconds",
+    "人臉出現（軌跡建立）至廣告顯示於畫面的耗時",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+
+SOC_TEMPERATURE.set_function(read_soc_temp_c)
+SOC_THROTTLED.set_function(lambda: parse_throttled(read_throttled()))
+
+
+def record_recognitions(names: Iterable[str], unknown_label: str = "Unknown") -> None:
+    """依辨識出的名稱累計命中與未知次數。"""
+
+    hits = unknown = 0
+    for name in names:
+        if name == unknown_label:
+            unknown += 1
+        else:
+            hits += 1
+    if hits:
+        RECOGNITIONS.inc(hits, result="hit")
+    if unknown:
+        RECOGNITIONS.inc(unknown, result="unknown")
+
+
+def start_metrics_server(
+    port: int = DEFAULT_METRICS_PORT,
+    host: str = "0.0.0.0",
+    registry: Optional[MetricsRegistry] = None,
+    profiler=None,
+) -> MetricsServer:
+    """啟動 ``/metrics`` 端點，並將 :mod:`faceprof` 的區段耗時導入延遲直方圖。
+
+    直方圖註冊於 ``registry``（預設為 :data:`REGISTRY`，即 :data:`STAGE_LATENCY`）；
+    伺服器停止時會移除 profiler 上的觀察者。
+    """
+
+    if profiler is None:
+        from faceprof import PROFILER as profiler
+    registry = registry or REGISTRY
+    stage_latency = registry.histogram(STAGE_LATENCY.name, STAGE_LATENCY.documentation, STAGE_LATENCY.labelnames)
+
+    def observe_stage(stage: str, seconds: float) -> None:
+        stage_latency.observe(seconds, stage=stage)
+
+    profiler.add_observer(observe_stage)
+    server = MetricsServer(registry, port=port, host=host, on_stop=lambda: profiler.remove_observer(observe_stage))
+    try:
+        return server.start()
+    except Exception:
+        profiler.remove_observer(observe_stage)
+        raise
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""faceprof.py - 辨識流程的輕量效能量測
+
+在偵測、編碼、比對、繪製與資料庫寫入等階段包上具名區段 (span)，
+以單調時鐘計時並累積每個階段最近的樣本，定期輸出與
+``git/tests/cam_stable.py`` 相同風格的 ``[MON]`` 記錄行，可由
+``git/tests/ci_summary.py`` 解析::
+
+    [MON] ELAPSED=60.0s FPS=9.8 FRAMES=588 detect_p50=31.2ms detect_p95=40.1ms detect_p99=52.7ms ...
+
+停用時 :func:`span` 只回傳共用的空物件，熱路徑上只多一次屬性判斷。
+
+使用方式::
+
+    from faceprof import PROFILER
+
+    with PROFILER.span("detect"):
+        locations = face_recognition.face_locations(rgb_small)
+    PROFILER.tick()          # 每處理完一張影格呼叫一次
+    PROFILER.maybe_report()  # 到達間隔時輸出 [MON] 記錄
+
+環境變數 ``FACE_PROFILE=1`` 啟用量測，``FACE_PROFILE_INTERVAL`` 設定
+輸出間隔（秒，預設 60）。
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 2048
+DEFAULT_INTERVAL = 60.0
+
+
+class StageHistogram:
+    """保留最近樣本以計算百分位數的階段統計。"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW) -> None:
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        """回傳最近樣本的第 q 百分位數（秒），採最近秩法。"""
+
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": float(self.count),
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class _Span:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._profiler.record(self._name, time.perf_counter() - self._start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """收集各階段耗時並定期輸出 ``[MON]`` 記錄行。"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        interval: float = DEFAULT_INTERVAL,
+        window: int = DEFAULT_WINDOW,
+        emit: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.enabled = enabled
+        self.interval = interval
+        self.window = window
+        self.emit = emit or LOGGER.info
+        self.stages: Dict[str, StageHistogram] = {}
+        self.observers: List[Callable[[str, float], None]] = []
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_report = self._started
+        self._frames_at_report = 0
+
+    # ------------------------------------------------------------------
+    def span(self, name: str):
+        """回傳計時用的 context manager；停用時回傳空物件。"""
+
+        if not self.enabled and not self.observers:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = StageHistogram(self.window)
+            histogram.add(seconds)
+        for observer in self.observers:
+            observer(name, seconds)
+
+    def add_observer(self, observer: Callable[[str, float], None]) -> None:
+        """登錄每筆區段耗時的接收者（例如 :mod:`facemetrics` 的直方圖）；
+        即使未啟用 ``[MON]`` 輸出，登錄後區段也會開始計時。"""
+
+        if observer not in self.observers:
+            self.observers.append(observer)
+
+    def remove_observer(self, observer: Callable[[str, float], None]) -> None:
+        """移除 :meth:`add_observer` 登錄的接收者；未登錄時不做任何事。"""
+
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def tick(self, frames: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.frames += frames
+
+    # ------------------------------------------------------------------
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self.stages.items()}
+
+    def format_line(self, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            elapsed = now - self._started
+            window = now - self._last_report
+            frames = self.frames - self._frames_at_report
+            fields = [
+                f"ELAPSED={elapsed:.1f}s",
+                f"FPS={frames / window if window > 0 else 0.0:.1f}",
+                f"FRAMES={self.frames}",
+            ]
+            for name in sorted(self.stages):
+                histogram = self.stages[name]
+                for q in (50, 95, 99):
+                    fields.append(f"{name}_p{q}={histogram.percentile(q) * 1000.0:.1f}ms")
+        return "[MON] " + " ".join(fields)
+
+    def maybe_report(self, force: bool = False) -> Optional[str]:
+        """到達輸出間隔時輸出並回傳 ``[MON]`` 記錄行。"""
+
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return None
+        line = self.format_line(now)
+        with self._lock:
+            self._last_report = now
+            self._frames_at_report = self.frames
+        self.emit(line)
+        return line
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self.frames = 0
+            self._started = self._last_report = time.monotonic()
+            self._frames_at_report = 0
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        interval: Optional[float] = None,
+        emit: Optional[Callable[[str], None]] = None,
+    ) -> "Profiler":
+        if enabled is not None:
+            self.enabled = enabled
+        if interval is not None:
+            self.interval = interval
+        if emit is not None:
+            self.emit = emit
+        return self
+
+
+def profiled(name: str, profiler: Optional[Profiler] = None) -> Callable:
+    """將整個函式包成一個區段的裝飾器。"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            active = profiler or PROFILER
+            if not active.enabled and not active.observers:
+                return func(*args, **kwargs)
+            with active.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _env_flag(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_interval(value: Optional[str]) -> float:
+    try:
+        return float(value) if value else DEFAULT_INTERVAL
+    except ValueError:
+        return DEFAULT_INTERVAL
+
+
+PROFILER = Profiler(
+    enabled=_env_flag(os.getenv("FACE_PROFILE")),
+    interval=_env_interval(os.getenv("FACE_PROFILE_INTERVAL")),
+)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""facequality.py - 編碼前的人臉品質篩選
+
+模糊、過小、逆光或側臉的人臉幾乎不可能比對成功，卻一樣要花費編碼時間，
+還會被計為未知人員。本模組在偵測與編碼之間加入快速的品質檢查：
+
+* ``size`` - 偵測框短邊（原始解析度像素）過小。
+* ``blur`` - 臉部灰階影像縮放至固定寬度後的 Laplacian 變異數過低。
+* ``dark``／``bright`` - 平均亮度過低或過高。
+* ``contrast`` - 亮度標準差過低（逆光或過曝時常見）。
+* ``yaw`` - 以 5 點特徵點估計的左右轉頭程度過大。
+
+未通過的人臉直接略過，不計算編碼也不列入結果；下一張影格會重新偵測，
+等同延後到品質較好的影格再辨識。各原因的次數會累計在
+:attr:`QualityGate.counts` 並匯出為 ``face_quality_rejected_total``。
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, fields
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+from facemetrics import QUALITY_REJECTS
+
+Location = Tuple[int, int, int, int]
+# 模糊度量前先將臉部縮放至固定寬度，門檻才不受人臉大小影響
+BLUR_SAMPLE_WIDTH = 64
+
+
+@dataclass
+class QualityThresholds:
+    """品質門檻；設為 ``None`` 表示不檢查該項目。"""
+
+    min_size: Optional[int] = 48
+    min_sharpness: Optional[float] = 40.0
+    min_brightness: Optional[float] = 40.0
+    max_brightness: Optional[float] = 220.0
+    min_contrast: Optional[float] = 18.0
+    # 鼻尖相對兩眼中點的水平偏移除以兩眼距離，正臉約為 0
+    max_yaw: Optional[float] = 0.45
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "QualityThresholds":
+        """讀取設定檔 ``quality`` 區段，未列出的項目沿用預設值。"""
+
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in config.items() if key in names})
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Laplacian 變異數，數值越低越模糊。"""
+
+    height, width = gray.shape[:2]
+    if width > BLUR_SAMPLE_WIDTH:
+        size = (BLUR_SAMPLE_WIDTH, max(1, int(round(height * BLUR_SAMPLE_WIDTH / width))))
+        gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def estimate_yaw(landmarks: Mapping[str, Sequence[Tuple[int, int]]]) -> Optional[float]:
+    """由 5 點特徵點估計左右轉頭程度（0 為正臉，約 0.5 以上接近側臉）。"""
+
+    try:
+        left_eye = landmarks["left_eye"]
+        right_eye = landmarks["right_eye"]
+        nose_x = landmarks["nose_tip"][0][0]
+    except (KeyError, IndexError):
+        return None
+    left_x = sum(point[0] for point in left_eye) / len(left_eye)
+    right_x = sum(point[0] for point in right_eye) / len(right_eye)
+    eye_distance = abs(right_x - left_x)
+    if eye_distance < 1:
+        return None
+    return abs(nose_x - (left_x + right_x) / 2.0) / eye_distance
+
+
+class QualityGate:
+    """在編碼前篩掉不堪用的人臉，並依原因累計次數。"""
+
+    def __init__(self, thresholds: Optional[QualityThresholds] = None) -> None:
+        self.thresholds = thresholds or QualityThresholds()
+        self.counts: Dict[str, int] = {}
+        self.accepted = 0
+        self._lock = threading.Lock()
+
+    def check(self, frame: np.ndarray, location: Location) -> Optional[str]:
+        """回傳未通過的原因，通過時回傳 ``None``。``location`` 為原始解析度座標。"""
+
+        limits = self.thresholds
+        top, right, bottom, left = location
+        if limits.min_size is not None and min(bottom - top, right - left) < limits.min_size:
+            return "size"
+        face = frame[top:bottom, left:right]
+        if face.size == 0:
+            return "size"
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        mean, stddev = cv2.meanStdDev(gray)
+        brightness = float(mean[0][0])
+        if limits.min_brightness is not None and brightness < limits.min_brightness:
+            return "dark"
+        if limits.max_brightness is not None and brightness > limits.max_brightness:
+            return "bright"
+        if limits.min_contrast is not None and float(stddev[0][0]) < limits.min_contrast:
+            return "contrast"
+        if limits.min_sharpness is not None and laplacian_variance(gray) < limits.min_sharpness:
+            return "blur"
+        if limits.max_yaw is not None and face.ndim == 3:
+            rgb_face = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
+            height, width = rgb_face.shape[:2]
+            landmarks = face_recognition.face_landmarks(rgb_face, [(0, width, height, 0)], model="small")
+            yaw = estimate_yaw(landmarks[0]) if landmarks else None
+            if yaw is not None and yaw > limits.max_yaw:
+                return "yaw"
+        return None
+
+    def filter_indices(self, frame: np.ndarray, locations: Sequence[Location]) -> List[int]:
+        """回傳通過檢查的人臉索引，並累計各原因的略過次數。"""
+
+        kept: List[int] = []
+        for index, location in enumerate(locations):
+            reason = self.check(frame, location)
+            if reason is None:
+                kept.append(index)
+            else:
+                self._reject(reason)
+        with self._lock:
+            self.accepted += len(kept)
+        return kept
+
+    def filter(self, frame: np.ndarray, locations: Sequence[Location]) -> List[Location]:
+        return [locations[index] for index in self.filter_indices(frame, locations)]
+
+    def _reject(self, reason: str) -> None:
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+        QUALITY_REJECTS.inc(reason=reason)
+
+    def summary(self) -> str:
+        with self._lock:
+            rejected = " ".join(f"{reason}={count}" for reason, count in sorted(self.counts.items()))
+            return f"accepted={self.accepted} {rejected}".strip()
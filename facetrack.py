@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""facetrack.py - 以人臉軌跡累積投票決定身分
+
+單張影格的比對結果不穩定：同一個人在連續影格中可能偶爾被比對成別人，
+陌生人則每張影格都會被計為一次未知。本模組以偵測框的重疊程度 (IoU)
+將連續影格的人臉串成軌跡，每條軌跡保留最近 ``window`` 次的比對結果，
+某個身分累積 ``votes`` 票後才確認，且每條軌跡只產生一次事件：
+
+* ``confirmed`` - 確認為已知人員，用於點名、MQTT 與廣告推播。
+* ``unknown`` - 確認為未知人員，未知人數只累加一次。
+
+軌跡超過 ``max_age`` 秒未再出現即結束，之後重新出現會建立新軌跡。
+尚未確認的軌跡可由 :meth:`IdentityTracker.leaders` 取得目前領先的已知身分，
+供呼叫端在確認前預先準備（例如查詢廣告）；事件的 ``started`` 為軌跡建立時間。
+觀測值可附帶任意 ``payload``（例如未知人臉的編碼與縮圖），事件帶出的是
+觸發事件那筆觀測的 payload（未附帶時為 ``None``），因此 payload 可以直接
+引用本次影格的緩衝區，不必為了之後的影格先行複製。
+"""
+
+from __future__ import annotations
+
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+Location = Tuple[int, int, int, int]
+UNKNOWN_LABEL = "Unknown"
+
+
+@dataclass
+class TrackEvent:
+    """軌跡確認事件；``distance`` 為得票身分的平均距離，``started`` 為軌跡建立時間。"""
+
+    kind: str
+    track_id: int
+    name: str
+    distance: float
+    payload: Any = None
+    started: Optional[float] = None
+
+    @property
+    def unknown(self) -> bool:
+        return self.kind == "unknown"
+
+    @property
+    def confidence(self) -> float:
+        return min(1.0, max(0.0, 1.0 - self.distance))
+
+
+@dataclass
+class _Track:
+    track_id: int
+    location: Location
+    last_seen: float
+    votes: Deque[Tuple[str, float]]
+    confirmed: Optional[str] = None
+    unknown_reported: bool = False
+    payload: Any = None
+    started: float = 0.0
+
+
+def iou(first: Location, second: Location) -> float:
+    """兩個 (top, right, bottom, left) 偵測框的交集比聯集。"""
+
+    top = max(first[0], second[0])
+    right = min(first[1], second[1])
+    bottom = min(first[2], second[2])
+    left = max(first[3], second[3])
+    if right <= left or bottom <= top:
+        return 0.0
+    intersection = (right - left) * (bottom - top)
+    area_first = (first[1] - first[3]) * (first[2] - first[0])
+    area_second = (second[1] - second[3]) * (second[2] - second[0])
+    union = area_first + area_second - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class IdentityTracker:
+    """單一攝影機的人臉軌跡與身分投票。"""
+
+    def __init__(
+        self,
+        votes: int = 3,
+        window: int = 5,
+        iou_threshold: float = 0.3,
+        max_age: float = 1.0,
+        unknown_label: str = UNKNOWN_LABEL,
+    ) -> None:
+        self.votes = max(1, votes)
+        self.window = max(self.votes, window)
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.unknown_label = unknown_label
+        self.tracks: Dict[int, _Track] = {}
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "IdentityTracker":
+        """依設定檔 ``tracking`` 區段建立。"""
+
+        return cls(
+            votes=int(config.get("votes", 3)),
+            window=int(config.get("window", 5)),
+            iou_threshold=float(config.get("iou", 0.3)),
+            max_age=float(config.get("max_age", 1.0)),
+        )
+
+    def update(
+        self,
+        observations: Iterable[Sequence[Any]],
+        now: Optional[float] = None,
+    ) -> List[TrackEvent]:
+        """加入一張影格的 (偵測框, 比對名稱, 距離[, payload])，回傳本次新確認的事件。"""
+
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        observations = list(observations)
+
+        # 依 IoU 由高至低貪婪配對既有軌跡
+        pairs = sorted(
+            (
+                (iou(track.location, location), track_id, index)
+                for track_id, track in self.tracks.items()
+                for index, (location, *_) in enumerate(observations)
+            ),
+            reverse=True,
+        )
+        assigned: Dict[int, int] = {}
+        used_tracks = set()
+        for overlap, track_id, index in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if track_id in used_tracks or index in assigned:
+                continue
+            assigned[index] = track_id
+            used_tracks.add(track_id)
+
+        events: List[TrackEvent] = []
+        for index, (location, name, distance, *payload) in enumerate(observations):
+            track_id = assigned.get(index)
+            if track_id is None:
+                track_id = next(self._ids)
+                self.tracks[track_id] = _Track(track_id, location, now, deque(maxlen=self.window), started=now)
+            track = self.tracks[track_id]
+            track.location = location
+            track.last_seen = now
+            track.votes.append((name, float(distance)))
+            track.payload = payload[0] if payload else None
+            event = self._decide(track)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def leaders(self) -> Dict[int, str]:
+        """尚未確認的軌跡目前得票最多的已知身分（領先者為未知的軌跡不列入）。"""
+
+        leaders = {}
+        for track_id, track in self.tracks.items():
+            if track.confirmed is not None or not track.votes:
+                continue
+            name, _ = self._leader(track)
+            if name != self.unknown_label:
+                leaders[track_id] = name
+        return leaders
+
+    @staticmethod
+    def _leader(track: _Track) -> Tuple[str, List[float]]:
+        tally: Dict[str, List[float]] = {}
+        for name, distance in track.votes:
+            tally.setdefault(name, []).append(distance)
+        return max(tally.items(), key=lambda item: (len(item[1]), -sum(item[1])))
+
+    def _decide(self, track: _Track) -> Optional[TrackEvent]:
+        if track.confirmed is not None:
+            return None
+        name, distances = self._leader(track)
+        if len(distances) < self.votes:
+            return None
+        distance = sum(distances) / len(distances)
+        if name == self.unknown_label:
+            if track.unknown_reported:
+                return None
+            track.unknown_reported = True
+            return TrackEvent("unknown", track.track_id, name, distance, track.payload, track.started)
+        track.confirmed = name
+        return TrackEvent("confirmed", track.track_id, name, distance, track.payload, track.started)
+
+    def _expire(self, now: float) -> None:
+        expired = [track_id for track_id, track in self.tracks.items() if now - track.last_seen > self.max_age]
+        for track_id in expired:
+            del self.tracks[track_id]
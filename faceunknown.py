@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""faceunknown.py - 未知訪客的人臉分群
+
+辨識結果為 ``Unknown`` 的人臉原本直接丟棄；零售場域中反覆出現的陌生
+訪客很有價值。本模組將未知人臉的編碼以領袖分群 (leader clustering)
+線上歸類：新編碼與最近群中心的距離小於 ``radius`` 時併入該群並更新
+中心，否則建立新群。每群保留少量代表編碼與縮圖，可在之後透過
+:func:`faceme.enroll_member` 直接升級為會員，不需要再請對方到攝影機前註冊。
+
+資料夾結構::
+
+    unknown_faces/
+        clusters.json            各群中繼資料（中心、次數、首次／最近出現時間）
+        0007/encodings.npy       代表編碼 (float32)
+        0007/thumb_00.jpg        縮圖
+
+群數超過 ``max_clusters`` 時淘汰最久未出現的群 (LRU)。
+
+使用方式::
+
+    # 列出出現次數最多的未知訪客
+    python faceunknown.py list --store unknown_faces
+
+    # 將第 7 群升級為會員
+    python faceunknown.py promote --store unknown_faces --cluster 7 --name 王小明 --gender 男
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = Path("unknown_faces")
+METADATA_FILE = "clusters.json"
+# 同一群的判定距離，略小於辨識容忍度以免把不同人併在一起
+DEFAULT_RADIUS = 0.5
+# 與既有代表編碼距離超過此值才保留為新的代表
+EXEMPLAR_SPREAD = 0.2
+THUMBNAIL_SIZE = 96
+
+
+@dataclass
+class UnknownCluster:
+    cluster_id: int
+    centroid: np.ndarray
+    count: int
+    first_seen: float
+    last_seen: float
+    exemplars: List[np.ndarray] = field(default_factory=list)
+    thumbnails: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "cluster_id": self.cluster_id,
+            "centroid": [round(float(value), 6) for value in self.centroid],
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "thumbnails": self.thumbnails,
+        }
+
+
+class UnknownFaceStore:
+    """有上限、存於磁碟的未知人臉分群。"""
+
+    def __init__(
+        self,
+        store_dir: Path = DEFAULT_STORE_DIR,
+        radius: float = DEFAULT_RADIUS,
+        max_clusters: int = 500,
+        max_exemplars: int = 5,
+        max_thumbnails: int = 3,
+        flush_interval: float = 30.0,
+    ) -> None:
+        self.store_dir = Path(store_dir).expanduser()
+        self.radius = radius
+        self.max_clusters = max(1, max_clusters)
+        self.max_exemplars = max(1, max_exemplars)
+        self.max_thumbnails = max_thumbnails
+        self.flush_interval = flush_interval
+        # 依最近出現時間排序，最前面為最久未出現
+        self.clusters: "OrderedDict[int, UnknownCluster]" = OrderedDict()
+        self._next_id = 1
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_ids: List[int] = []
+        self._dirty: set = set()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "UnknownFaceStore":
+        """依設定檔 ``unknowns`` 區段建立。"""
+
+        return cls(
+            store_dir=Path(config.get("dir", DEFAULT_STORE_DIR)),
+            radius=float(config.get("radius", DEFAULT_RADIUS)),
+            max_clusters=int(config.get("max_clusters", 500)),
+            max_exemplars=int(config.get("max_exemplars", 5)),
+            max_thumbnails=int(config.get("max_thumbnails", 3)),
+        )
+
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def add(self, encoding: Sequence[float], thumbnail: Optional[np.ndarray] = None, now: Optional[float] = None) -> int:
+        """加入一筆未知人臉編碼，回傳所屬的群編號。
+
+        ``thumbnail`` 只在本次呼叫內讀取並寫入磁碟，可直接傳入影格的切片（view）。
+        """
+
+        vector = np.asarray(encoding, dtype=np.float32)
+        now = time.time() if now is None else now
+        with self._lock:
+            cluster = self._nearest(vector)
+            if cluster is None:
+                cluster = UnknownCluster(self._next_id, vector.copy(), 0, now, now)
+                self._next_id += 1
+                self.clusters[cluster.cluster_id] = cluster
+                self._evict()
+            cluster.count += 1
+            cluster.last_seen = now
+            # 中心以累計平均更新
+            cluster.centroid += (vector - cluster.centroid) / cluster.count
+            self.clusters.move_to_end(cluster.cluster_id)
+            self._centroids = None
+            if self._accepts_exemplar(cluster, vector):
+                cluster.exemplars.append(vector.copy())
+                if thumbnail is not None and len(cluster.thumbnails) < self.max_thumbnails:
+                    self._save_thumbnail(cluster, thumbnail, len(cluster.exemplars) - 1)
+            self._dirty.add(cluster.cluster_id)
+            should_flush = time.monotonic() - self._last_flush >= self.flush_interval
+        if should_flush:
+            self.flush()
+        return cluster.cluster_id
+
+    def wants_thumbnail(self, encoding: Sequence[float]) -> bool:
+        """此編碼加入後是否會保留縮圖；影格緩衝區會被重複使用的呼叫端可據此只在需要時複製臉部影像。"""
+
+        if self.max_thumbnails <= 0:
+            return False
+        vector = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            cluster = self._nearest(vector)
+            if cluster is None:
+                return True
+            return len(cluster.thumbnails) < self.max_thumbnails and self._accepts_exemplar(cluster, vector)
+
+    def _accepts_exemplar(self, cluster: UnknownCluster, vector: np.ndarray) -> bool:
+        return len(cluster.exemplars) < self.max_exemplars and all(
+            float(np.linalg.norm(vector - exemplar)) > EXEMPLAR_SPREAD for exemplar in cluster.exemplars
+        )
+
+    def _nearest(self, vector: np.ndarray) -> Optional[UnknownCluster]:
+        if not self.clusters:
+            return None
+        if self._centroids is None:
+            self._centroid_ids = list(self.clusters)
+            self._centroids = np.stack([self.clusters[cluster_id].centroid for cluster_id in self._centroid_ids])
+        distances = np.linalg.norm(self._centroids - vector, axis=1)
+        best = int(np.argmin(distances))
+        if float(distances[best]) > self.radius:
+            return None
+        return self.clusters[self._centroid_ids[best]]
+
+    def _evict(self) -> None:
+        while len(self.clusters) > self.max_clusters:
+            cluster_id, _ = self.clusters.popitem(last=False)
+            self._dirty.discard(cluster_id)
+            shutil.rmtree(self._cluster_dir(cluster_id), ignore_errors=True)
+            LOGGER.debug("淘汰最久未出現的未知人臉群 %d", cluster_id)
+
+    def _cluster_dir(self, cluster_id: int) -> Path:
+        return self.store_dir / f"{cluster_id:04d}"
+
+    def _save_thumbnail(self, cluster: UnknownCluster, thumbnail: np.ndarray, index: int) -> None:
+        height, width = thumbnail.shape[:2]
+        scale = THUMBNAIL_SIZE / max(height, width, 1)
+        if scale < 1.0:
+            thumbnail = cv2.resize(thumbnail, (max(1, int(width * scale)), max(1, int(height * scale))))
+        directory = self._cluster_dir(cluster.cluster_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        # 以代表編碼的索引命名，升級時可對應回同一張臉
+        name = f"thumb_{index:02d}.jpg"
+        cv2.imwrite(str(directory / name), thumbnail)
+        cluster.thumbnails.append(name)
+
+    # ------------------------------------------------------------------
+    def ranked(self, min_count: int = 1) -> List[UnknownCluster]:
+        """依出現次數由多至少列出。"""
+
+        with self._lock:
+            clusters = [cluster for cluster in self.clusters.values() if cluster.count >= min_count]
+        return sorted(clusters, key=lambda cluster: (-cluster.count, -cluster.last_seen))
+
+    def thumbnail_paths(self, cluster_id: int) -> List[Path]:
+        cluster = self.clusters[cluster_id]
+        return [self._cluster_dir(cluster_id) / name for name in cluster.thumbnails]
+
+    def remove(self, cluster_id: int) -> None:
+        with self._lock:
+            self.clusters.pop(cluster_id, None)
+            self._centroids = None
+            self._dirty.discard(cluster_id)
+        shutil.rmtree(self._cluster_dir(cluster_id), ignore_errors=True)
+        self.flush()
+
+    def promote(self, cluster_id: int, member, dataset_manager, db_manager=None) -> Optional[int]:
+        """將一群未知人臉升級為會員，沿用 :func:`faceme.enroll_member` 的註冊流程。
+
+        代表編碼寫入 ``encodings.csv``（與資料庫），縮圖存入資料集，
+        完成後自未知人臉庫移除該群。回傳會員編號（本地模式為 ``None``）。
+        """
+
+        from faceme import enroll_member  # 註冊介面依賴 tkinter，升級時才載入
+
+        if cluster_id not in self.clusters:
+            raise KeyError(f"找不到未知人臉群 {cluster_id}")
+        cluster = self.clusters[cluster_id]
+        directory = self._cluster_dir(cluster_id)
+        samples = []
+        for index, exemplar in enumerate(cluster.exemplars):
+            name = f"thumb_{index:02d}.jpg"
+            image = cv2.imread(str(directory / name)) if name in cluster.thumbnails else None
+            if image is None:
+                image = np.zeros((THUMBNAIL_SIZE, THUMBNAIL_SIZE, 3), dtype=np.uint8)
+            samples.append((image, exemplar.tolist()))
+        _, member_id = enroll_member(member, samples, dataset_manager, db_manager)
+        LOGGER.info("未知人臉群 %d 升級為會員 %s（%d 筆編碼）", cluster_id, member.name, len(samples))
+        self.remove(cluster_id)
+        return member_id
+
+    # ------------------------------------------------------------------
+    def flush(self) -> None:
+        """將中繼資料與變動過的代表編碼寫入磁碟。"""
+
+        with self._lock:
+            dirty = [self.clusters[cluster_id] for cluster_id in self._dirty if cluster_id in self.clusters]
+            self._dirty.clear()
+            metadata = {
+                "next_id": self._next_id,
+                "clusters": [cluster.to_dict() for cluster in self.clusters.values()],
+            }
+            exemplars = {cluster.cluster_id: np.stack(cluster.exemplars) for cluster in dirty if cluster.exemplars}
+            self._last_flush = time.monotonic()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        for cluster_id, matrix in exemplars.items():
+            directory = self._cluster_dir(cluster_id)
+            directory.mkdir(parents=True, exist_ok=True)
+            np.save(directory / "encodings.npy", matrix.astype(np.float32))
+        # 先寫暫存檔再原子替換，中斷時不會留下損毀的中繼資料
+        fd, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            json.dump(metadata, fp, ensure_ascii=False)
+        os.replace(temp_path, self.store_dir / METADATA_FILE)
+
+    def load(self) -> None:
+        path = self.store_dir / METADATA_FILE
+        if not path.exists():
+            return
+        with path.open("r", encoding="utf-8") as fp:
+            metadata = json.load(fp)
+        self._next_id = int(metadata.get("next_id", 1))
+        entries = sorted(metadata.get("clusters", []), key=lambda entry: entry["last_seen"])
+        for entry in entries:
+            cluster_id = int(entry["cluster_id"])
+            exemplar_path = self._cluster_dir(cluster_id) / "encodings.npy"
+            exemplars = list(np.load(exemplar_path)) if exemplar_path.exists() else []
+            self.clusters[cluster_id] = UnknownCluster(
+                cluster_id=cluster_id,
+                centroid=np.asarray(entry["centroid"], dtype=np.float32),
+                count=int(entry["count"]),
+                first_seen=float(entry["first_seen"]),
+                last_seen=float(entry["last_seen"]),
+                exemplars=exemplars,
+                thumbnails=list(entry.get("thumbnails", [])),
+            )
+        LOGGER.info("載入 %d 群未知人臉", len(self.clusters))
+
+
+# ----------------------------------------------------------------------
+# 命令列介面
+# ----------------------------------------------------------------------
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="未知訪客人臉分群管理")
+    parser.add_argument("--store", default=str(DEFAULT_STORE_DIR), help="未知人臉資料夾")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    listing = subparsers.add_parser("list", help="依出現次數列出未知人臉群")
+    listing.add_argument("--min-count", type=int, default=1, help="最少出現次數")
+    listing.add_argument("--limit", type=int, default=20, help="列出筆數")
+
+    promote = subparsers.add_parser("promote", help="將未知人臉群升級為會員")
+    promote.add_argument("--cluster", type=int, required=True, help="群編號")
+    promote.add_argument("--name", required=True, help="會員姓名")
+    promote.add_argument("--gender", help="性別")
+    promote.add_argument("--age-group", help="年齡層")
+    promote.add_argument("--email", help="電子郵件")
+    promote.add_argument("--config", default="config.json", help="資料庫設定檔")
+    promote.add_argument("--dataset", default="dataset", help="影像資料集資料夾")
+    promote.add_argument("--encodings", default="encodings.csv", help="人臉編碼 CSV")
+
+    remove = subparsers.add_parser("remove", help="刪除未知人臉群")
+    remove.add_argument("--cluster", type=int, required=True, help="群編號")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+    store = UnknownFaceStore(Path(args.store))
+
+    if args.command == "list":
+        for cluster in store.ranked(args.min_count)[: args.limit]:
+            seen = time.strftime("%Y-%m-%d %H:%M", time.localtime(cluster.last_seen))
+            thumbnails = ",".join(str(path) for path in store.thumbnail_paths(cluster.cluster_id))
+            print(f"{cluster.cluster_id}\tcount={cluster.count}\tlast_seen={seen}\t{thumbnails}")
+        return 0
+
+    if args.command == "remove":
+        store.remove(args.cluster)
+        return 0
+
+    from faceme import DatabaseManager, FaceDatasetManager, MemberInfo
+
+    member = MemberInfo(name=args.name, gender=args.gender, age_group=args.age_group, email=args.email)
+    db_manager = DatabaseManager(Path(args.config))
+    db_manager.connect()
+    try:
+        member_id = store.promote(
+            args.cluster,
+            member,
+            FaceDatasetManager(Path(args.dataset), Path(args.encodings)),
+            db_manager,
+        )
+    finally:
+        db_manager.close()
+    print(f"已升級為會員 {args.name}" + (f"（ID: {member_id}）" if member_id is not None else "（本地模式）"))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
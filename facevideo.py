@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""facevideo.py - 離線影片人臉分析
+
+針對錄影檔（例如門市整日監視畫面）進行離線人臉辨識。與 :mod:`facecam`
+逐格處理即時串流不同，本模組依時間戳記取樣影格：
+
+* 取樣間隔內的影格只呼叫 ``grab()``，不做 ``retrieve()`` 色彩轉換
+* 取樣間隔較長時直接以 ``CAP_PROP_POS_MSEC`` 跳轉，略過整段解碼
+* 長影片切成多個片段，以多個行程平行處理
+* 輸出每位人員的出現時間軸（首次出現、最後出現、停留時間）
+
+範例::
+
+    # 每秒取樣一張，切成 10 分鐘片段並以 4 個行程處理
+    python facevideo.py --encodings encodings.csv --video store.mp4 --workers 4
+
+    # 將時間軸輸出為 JSON
+    python facevideo.py --encodings encodings.csv --video store.mp4 --output timeline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from facebatch import BatchFaceDetector
+from facecam import FaceRecognitionCamera, KnownFacesStore, RecognizedFace
+from facequality import QualityGate, QualityThresholds
+
+LOGGER = logging.getLogger(__name__)
+
+# 取樣間隔超過此值時改用跳轉而非逐格 grab()
+DEFAULT_SEEK_THRESHOLD_MS = 2000.0
+
+
+@dataclass
+class VideoSegment:
+    """影片中的一段時間區間（毫秒）。"""
+
+    index: int
+    start_ms: float
+    end_ms: float
+
+
+@dataclass
+class Sighting:
+    """單一取樣影格中辨識到的人員。"""
+
+    timestamp: float
+    name: str
+    distance: float
+
+
+@dataclass
+class Appearance:
+    """某位人員一次連續出現的區間（秒）。"""
+
+    name: str
+    first_seen: float
+    last_seen: float
+    sightings: int = 1
+    best_distance: float = 1.0
+
+    @property
+    def dwell(self) -> float:
+        """停留時間（秒）。"""
+
+        return max(0.0, self.last_seen - self.first_seen)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["dwell"] = round(self.dwell, 3)
+        return data
+
+
+@dataclass
+class SegmentResult:
+    """單一片段的處理結果。"""
+
+    segment: VideoSegment
+    sightings: List[Sighting] = field(default_factory=list)
+    sampled_frames: int = 0
+    unknown_faces: int = 0
+    quality_rejected: Dict[str, int] = field(default_factory=dict)
+
+
+class VideoFaceAnalyzer:
+    """以時間取樣方式分析錄影檔的工具類別。"""
+
+    def __init__(
+        self,
+        encodings_store: KnownFacesStore,
+        scale: float = 0.25,
+        model: str = "hog",
+        sample_interval: float = 1.0,
+        segment_seconds: float = 600.0,
+        max_gap: Optional[float] = None,
+        seek_threshold_ms: float = DEFAULT_SEEK_THRESHOLD_MS,
+        batch_size: int = 1,
+        quality_thresholds: Optional[QualityThresholds] = None,
+    ) -> None:
+        """初始化分析器。
+
+        Args:
+            encodings_store: 已載入編碼的 :class:`facecam.KnownFacesStore`。
+            scale: 辨識前的影像縮放比例。
+            model: 人臉偵測模型，`"hog"` 或 `"cnn"`。
+            sample_interval: 取樣間隔（秒）。
+            segment_seconds: 平行處理時每個片段的長度（秒）。
+            max_gap: 同一人兩次取樣相隔超過此秒數即視為不同次出現，
+                預設為取樣間隔的三倍。
+            seek_threshold_ms: 取樣間隔大於此值時改用跳轉。
+            batch_size: 使用 CNN 模型時，每批次偵測的取樣影格數。
+            quality_thresholds: 編碼前的人臉品質篩選門檻，``None`` 表示不篩選。
+        """
+
+        self.encodings_store = encodings_store
+        self.scale = scale
+        self.model = model
+        self.sample_interval = max(0.04, float(sample_interval))
+        self.segment_seconds = max(self.sample_interval, float(segment_seconds))
+        self.max_gap = float(max_gap) if max_gap else self.sample_interval * 3
+        self.seek_threshold_ms = seek_threshold_ms
+        self.batch_size = max(1, int(batch_size))
+        self.quality_thresholds = quality_thresholds
+
+    # ------------------------------------------------------------------
+    def plan_segments(self, duration_ms: float) -> List[VideoSegment]:
+        """依影片長度切割處理片段。"""
+
+        segment_ms = self.segment_seconds * 1000.0
+        segments: List[VideoSegment] = []
+        start = 0.0
+        while start < duration_ms:
+            end = min(duration_ms, start + segment_ms)
+            segments.append(VideoSegment(index=len(segments), start_ms=start, end_ms=end))
+            start = end
+        return segments
+
+    # ------------------------------------------------------------------
+    def analyze(self, video_path: Path, workers: int = 1) -> List[Appearance]:
+        """分析整支影片並回傳依首次出現時間排序的時間軸。"""
+
+        results = self.analyze_segments(video_path, workers=workers)
+        sightings = [sighting for result in results for sighting in result.sightings]
+        sampled = sum(result.sampled_frames for result in results)
+        unknown = sum(result.unknown_faces for result in results)
+        LOGGER.info("共取樣 %d 張影格，辨識 %d 筆，未知人臉 %d 次", sampled, len(sightings), unknown)
+        if self.quality_thresholds is not None:
+            rejected: Dict[str, int] = {}
+            for result in results:
+                for reason, count in result.quality_rejected.items():
+                    rejected[reason] = rejected.get(reason, 0) + count
+            LOGGER.info(
+                "人臉品質篩選略過: %s",
+                " ".join(f"{reason}={count}" for reason, count in sorted(rejected.items())) or "0",
+            )
+        return build_timeline(sightings, self.max_gap)
+
+    # ------------------------------------------------------------------
+    def analyze_segments(self, video_path: Path, workers: int = 1) -> List[SegmentResult]:
+        video_path = video_path.expanduser().resolve()
+        if not video_path.exists():
+            raise FileNotFoundError(f"找不到影片檔案: {video_path}")
+
+        duration_ms = probe_duration_ms(video_path)
+        if duration_ms <= 0:
+            raise RuntimeError(f"無法取得影片長度: {video_path}")
+
+        segments = self.plan_segments(duration_ms)
+        workers = max(1, min(int(workers), len(segments)))
+        LOGGER.info(
+            "影片長度 %.1f 秒，切為 %d 個片段，使用 %d 個行程",
+            duration_ms / 1000.0,
+            len(segments),
+            workers,
+        )
+
+        if workers == 1:
+            return [self.process_segment(video_path, segment) for segment in segments]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.process_segment, video_path, segment) for segment in segments]
+            return [future.result() for future in futures]
+
+    # ------------------------------------------------------------------
+    def process_segment(self, video_path: Path, segment: VideoSegment) -> SegmentResult:
+        """處理單一片段；會在子行程中執行，因此自行開啟影片與建立品質篩選。"""
+
+        quality_gate: Optional[QualityGate] = None
+        if self.quality_thresholds is not None:
+            quality_gate = QualityGate(self.quality_thresholds)
+        engine = FaceRecognitionCamera(
+            encodings_store=self.encodings_store,
+            scale=self.scale,
+            model=self.model,
+            quality_gate=quality_gate,
+        )
+        detector: Optional[BatchFaceDetector] = None
+        if self.model == "cnn" and self.batch_size > 1:
+            detector = BatchFaceDetector(batch_size=self.batch_size)
+
+        result = SegmentResult(segment=segment)
+        capture = cv2.VideoCapture(str(video_path))
+        if not capture.isOpened():
+            raise RuntimeError(f"無法開啟影片: {video_path}")
+
+        # 批次中保留原始影格，編碼仍在原始解析度的裁切區域上計算
+        pending: List[Tuple[float, np.ndarray, np.ndarray]] = []
+        try:
+            for timestamp_ms, frame in self._sample_frames(capture, segment):
+                result.sampled_frames += 1
+                if detector is None:
+                    self._collect(result, timestamp_ms, engine.recognize_frame(frame))
+                    continue
+                pending.append((timestamp_ms, frame, engine.prepare_frame(frame)))
+                if len(pending) >= detector.batch_size:
+                    self._flush_batch(engine, detector, pending, result)
+            if detector is not None:
+                self._flush_batch(engine, detector, pending, result)
+        finally:
+            capture.release()
+        if quality_gate is not None:
+            result.quality_rejected = dict(quality_gate.counts)
+
+        LOGGER.debug(
+            "片段 %d (%.1fs~%.1fs) 取樣 %d 張",
+            segment.index,
+            segment.start_ms / 1000.0,
+            segment.end_ms / 1000.0,
+            result.sampled_frames,
+        )
+        return result
+
+    # ------------------------------------------------------------------
+    def _flush_batch(
+        self,
+        engine: FaceRecognitionCamera,
+        detector: BatchFaceDetector,
+        pending: List[Tuple[float, np.ndarray, np.ndarray]],
+        result: SegmentResult,
+    ) -> None:
+        if not pending:
+            return
+        locations = detector.detect_many([rgb_small for _, _, rgb_small in pending])
+        for (timestamp_ms, frame, rgb_small), face_locations in zip(pending, locations):
+            self._collect(result, timestamp_ms, engine.recognize_locations(frame, face_locations, rgb_small))
+        pending.clear()
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _collect(result: SegmentResult, timestamp_ms: float, faces: Iterable[RecognizedFace]) -> None:
+        for face in faces:
+            if face.name == "Unknown":
+                result.unknown_faces += 1
+                continue
+            result.sightings.append(
+                Sighting(timestamp=timestamp_ms / 1000.0, name=face.name, distance=face.distance)
+            )
+
+    # ------------------------------------------------------------------
+    def _sample_frames(self, capture: cv2.VideoCapture, segment: VideoSegment) -> Iterable[Tuple[float, np.ndarray]]:
+        """依時間戳記取樣影格，未取樣的影格只 grab 不 retrieve。"""
+
+        interval_ms = self.sample_interval * 1000.0
+        use_seek = interval_ms >= self.seek_threshold_ms
+        next_sample = segment.start_ms
+        last_seek: Optional[float] = None
+        capture.set(cv2.CAP_PROP_POS_MSEC, segment.start_ms)
+
+        while next_sample < segment.end_ms:
+            # 每個取樣點只跳轉一次，落在前一個關鍵影格時改以 grab() 前進
+            if use_seek and last_seek != next_sample:
+                capture.set(cv2.CAP_PROP_POS_MSEC, next_sample)
+                last_seek = next_sample
+            if not capture.grab():
+                break
+            position = capture.get(cv2.CAP_PROP_POS_MSEC)
+            if position >= segment.end_ms:
+                break
+            if position + 1e-3 < next_sample:
+                continue
+
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            yield position, frame
+            # 若解碼落後（例如跳轉落在關鍵影格之後），以實際位置為準
+            next_sample = max(next_sample + interval_ms, position + interval_ms)
+
+
+# ----------------------------------------------------------------------
+# 時間軸整理
+# ----------------------------------------------------------------------
+
+def build_timeline(sightings: Iterable[Sighting], max_gap: float) -> List[Appearance]:
+    """將散落的取樣結果合併為每位人員的出現區間。"""
+
+    per_person: Dict[str, List[Sighting]] = {}
+    for sighting in sightings:
+        per_person.setdefault(sighting.name, []).append(sighting)
+
+    timeline: List[Appearance] = []
+    for name, items in per_person.items():
+        items.sort(key=lambda item: item.timestamp)
+        current: Optional[Appearance] = None
+        for item in items:
+            if current is not None and item.timestamp - current.last_seen <= max_gap:
+                current.last_seen = item.timestamp
+                current.sightings += 1
+                current.best_distance = min(current.best_distance, item.distance)
+                continue
+            current = Appearance(
+                name=name,
+                first_seen=item.timestamp,
+                last_seen=item.timestamp,
+                best_distance=item.distance,
+            )
+            timeline.append(current)
+
+    timeline.sort(key=lambda appearance: (appearance.first_seen, appearance.name))
+    return timeline
+
+
+def probe_duration_ms(video_path: Path) -> float:
+    """以影格數與 FPS 推算影片長度（毫秒）。"""
+
+    capture = cv2.VideoCapture(str(video_path))
+    try:
+        if not capture.isOpened():
+            return 0.0
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+        if fps <= 0 or frame_count <= 0:
+            return 0.0
+        return frame_count / fps * 1000.0
+    finally:
+        capture.release()
+
+
+def save_timeline(timeline: Sequence[Appearance], output_path: Path) -> None:
+    """依副檔名輸出為 JSON 或 CSV。"""
+
+    output_path = output_path.expanduser().resolve()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    rows = [appearance.to_dict() for appearance in timeline]
+
+    if output_path.suffix.lower() == ".json":
+        with output_path.open("w", encoding="utf-8") as fp:
+            json.dump(rows, fp, ensure_ascii=False, indent=2)
+    else:
+        headers = ["name", "first_seen", "last_seen", "dwell", "sightings", "best_distance"]
+        with output_path.open("w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=headers)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({key: row[key] for key in headers})
+    LOGGER.info("已將 %d 筆時間軸資料寫入 %s", len(rows), output_path)
+
+
+# ----------------------------------------------------------------------
+# 命令列處理
+# ----------------------------------------------------------------------
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="離線影片人臉分析工具")
+    parser.add_argument("--encodings", required=True, help="facegen 產生的編碼 CSV 檔")
+    parser.add_argument("--video", required=True, help="要分析的影片檔案")
+    parser.add_argument("--interval", type=float, default=1.0, help="取樣間隔（秒）")
+    parser.add_argument("--segment", type=float, default=600.0, help="平行處理的片段長度（秒）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="平行處理的行程數")
+    parser.add_argument("--gap", type=float, help="視為同一次出現的最大間隔（秒），預設為取樣間隔三倍")
+    parser.add_argument("--scale", type=float, default=0.25, help="辨識前的影像縮放比例 (0~1)")
+    parser.add_argument("--tolerance", type=float, default=0.6, help="辨識容忍度，值越小越嚴格")
+    parser.add_argument("--templates", type=int, default=0, help="每人代表樣本數上限，大於 0 時啟用身分樣板比對")
+    parser.add_argument("--model", choices=["hog", "cnn"], default="hog", help="人臉偵測模型")
+    parser.add_argument("--batch-size", type=int, default=8, help="CNN 模型的批次偵測影格數")
+    parser.add_argument("--no-quality-gate", action="store_true", help="停用編碼前的人臉品質篩選")
+    parser.add_argument("--min-face-size", type=int, default=48, help="人臉短邊最小像素（原始解析度）")
+    parser.add_argument("--min-sharpness", type=float, default=40.0, help="Laplacian 變異數下限，低於此值視為模糊")
+    parser.add_argument("--max-yaw", type=float, default=0.45, help="左右轉頭程度上限，0 為正臉")
+    parser.add_argument("--output", help="時間軸輸出檔（.json 或 .csv）")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    store = KnownFacesStore(tolerance=args.tolerance, max_exemplars=args.templates)
+    store.load_from_csv(Path(args.encodings))
+
+    quality_thresholds: Optional[QualityThresholds] = None
+    if not args.no_quality_gate:
+        quality_thresholds = QualityThresholds(
+            min_size=args.min_face_size,
+            min_sharpness=args.min_sharpness,
+            max_yaw=args.max_yaw,
+        )
+
+    analyzer = VideoFaceAnalyzer(
+        encodings_store=store,
+        scale=args.scale,
+        model=args.model,
+        sample_interval=args.interval,
+        segment_seconds=args.segment,
+        max_gap=args.gap,
+        batch_size=args.batch_size,
+        quality_thresholds=quality_thresholds,
+    )
+    timeline = analyzer.analyze(Path(args.video), workers=args.workers)
+
+    if args.output:
+        save_timeline(timeline, Path(args.output))
+    if not timeline:
+        print("影片中未辨識到任何已知人員")
+    for appearance in timeline:
+        print(
+            f"{appearance.name}\tfirst={appearance.first_seen:.1f}s\t"
+            f"last={appearance.last_seen:.1f}s\tdwell={appearance.dwell:.1f}s"
+        )
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""framepool.py - 影格緩衝區重複使用
+
+擷取迴圈每張影格都會配置新的陣列：``capture.read()`` 回傳的影格、
+``cv2.resize``／``cv2.cvtColor`` 的輸出，以及繪製標註前的 ``frame.copy()``。
+本模組預先配置緩衝區並透過 OpenCV 的 ``image=``／``dst=`` 參數寫入，
+穩定運作後熱迴圈不再配置記憶體。
+
+* :class:`FrameBufferPool` - 擷取影格的環狀緩衝區，交給 ``capture.read(image=buf)``。
+* :class:`ScratchBuffers` - 依名稱保留的縮放／色彩轉換／標註輸出緩衝區。
+
+兩者都會累計實際配置次數（並匯出至 ``/metrics`` 的
+``face_frame_buffer_allocations_total``），可用來確認穩定狀態下不再配置。
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from facemetrics import FRAME_ALLOCATIONS
+
+
+class FrameBufferPool:
+    """擷取影格的環狀緩衝區。
+
+    :meth:`acquire` 依序取出下一個緩衝區，並略過呼叫端標示為使用中的
+    緩衝區（例如最新影格與辨識中的影格），因此擷取執行緒不會覆寫其他
+    執行緒正在讀取的影格。第一次擷取時依影格尺寸配置，尺寸改變時重新配置。
+    """
+
+    def __init__(self, count: int = 4, name: str = "capture") -> None:
+        self.count = max(2, count)
+        self.name = name
+        self.allocations = 0
+        self.reads = 0
+        self._buffers: List[np.ndarray] = []
+        self._next = 0
+
+    def acquire(self, busy: Iterable[Optional[np.ndarray]] = ()) -> Optional[np.ndarray]:
+        """取出下一個可寫入的緩衝區；尚未得知影格尺寸時回傳 ``None``。"""
+
+        if not self._buffers:
+            return None
+        busy_ids = {id(buffer) for buffer in busy if buffer is not None}
+        for offset in range(len(self._buffers)):
+            index = (self._next + offset) % len(self._buffers)
+            buffer = self._buffers[index]
+            if id(buffer) not in busy_ids:
+                self._next = (index + 1) % len(self._buffers)
+                return buffer
+        # 所有緩衝區都在使用中：交由擷取來源自行配置
+        return None
+
+    def read(self, capture, busy: Iterable[Optional[np.ndarray]] = ()) -> Tuple[bool, Optional[np.ndarray]]:
+        """以 ``capture.read(image=buf)`` 讀入緩衝區。"""
+
+        buffer = self.acquire(busy)
+        if buffer is None:
+            ret, frame = capture.read()
+        else:
+            ret, frame = capture.read(image=buffer)
+        if not ret or frame is None:
+            return False, None
+        self.reads += 1
+        if frame is not buffer:
+            # 第一張影格、尺寸改變或來源不支援 image= 時由來源配置
+            self._count_allocation()
+            self._adopt(frame)
+        return True, frame
+
+    def _adopt(self, frame: np.ndarray) -> None:
+        if self._buffers and self._buffers[0].shape == frame.shape:
+            # 來源未寫入指定緩衝區，改用它回傳的陣列取代該位置
+            self._buffers[(self._next - 1) % len(self._buffers)] = frame
+            return
+        self._buffers = [frame] + [np.empty_like(frame) for _ in range(self.count - 1)]
+        self._count_allocation(self.count - 1)
+        self._next = 1
+
+    def _count_allocation(self, amount: int = 1) -> None:
+        if amount <= 0:
+            return
+        self.allocations += amount
+        FRAME_ALLOCATIONS.inc(amount, site=self.name)
+
+    def stats(self) -> Dict[str, int]:
+        return {"reads": self.reads, "allocations": self.allocations, "buffers": len(self._buffers)}
+
+
+class ScratchBuffers:
+    """依名稱保留的暫存輸出緩衝區（``cv2.resize``／``cv2.cvtColor`` 的 ``dst=``）。
+
+    同一個實例不可跨執行緒共用；多執行緒時以 :meth:`for_thread` 取得
+    各執行緒專屬的實例。
+    """
+
+    def __init__(self, name: str = "scratch") -> None:
+        self.name = name
+        self.allocations = 0
+        self._buffers: Dict[str, np.ndarray] = {}
+
+    def get(self, key: str, shape: Tuple[int, ...], dtype=None) -> np.ndarray:
+        dtype = np.dtype(np.uint8 if dtype is None else dtype)
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+            self.allocations += 1
+            FRAME_ALLOCATIONS.inc(site=self.name)
+        return buffer
+
+    def resize(self, key: str, frame: np.ndarray, scale: float) -> np.ndarray:
+        """等比例縮放至重複使用的緩衝區。"""
+
+        if scale == 1.0:
+            return frame
+        height, width = frame.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        dst = self.get(key, (size[1], size[0]) + tuple(frame.shape[2:]), frame.dtype)
+        return cv2.resize(frame, size, dst=dst)
+
+    def cvt_color(self, key: str, frame: np.ndarray, code: int, channels: int = 3) -> np.ndarray:
+        """色彩轉換至重複使用的緩衝區；``channels=1`` 表示輸出灰階。"""
+
+        shape = frame.shape[:2] if channels == 1 else frame.shape[:2] + (channels,)
+        dst = self.get(key, shape, frame.dtype)
+        return cv2.cvtColor(frame, code, dst=dst)
+
+    def copy(self, key: str, frame: np.ndarray) -> np.ndarray:
+        """複製至重複使用的標註底圖，取代 ``frame.copy()``。"""
+
+        dst = self.get(key, frame.shape, frame.dtype)
+        np.copyto(dst, frame)
+        return dst
+
+    @classmethod
+    def for_thread(cls, local: threading.local, name: str = "scratch") -> "ScratchBuffers":
+        scratch = getattr(local, "scratch", None)
+        if scratch is None:
+            scratch = local.scratch = cls(name)
+        return scratch
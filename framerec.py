@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""framerec.py - 影格錄製與重播
+
+將 ``cv2.VideoCapture`` 擷取的原始影格與時間戳記錄成單一檔案，之後可在
+沒有攝影機的機器（例如 CI）上以相同順序重播，讓辨識吞吐量的量測結果
+可以重現。
+
+檔案格式::
+
+    [header 64 bytes]
+    [record header][影格資料] ... 依序附加
+    [index: 每張影格 (位移, 長度, 時間戳)]
+
+影格可存為原始 BGR 位元組，或以 JPEG 壓縮節省空間。索引位於檔尾，
+讀取端以 ``mmap`` 映射整個檔案，依索引隨機存取影格而不需整檔載入；
+檔頭（編碼與影格尺寸）在第一張影格寫入時即完成，錄製中斷而沒有索引時，
+讀取端仍能解碼影格，只需逐筆掃描 record header 重建索引。
+
+使用方式::
+
+    # 錄製 30 秒（JPEG 壓縮）
+    python framerec.py record --source 0 --output door.frec --seconds 30 --codec jpeg
+
+    # 查看錄製內容
+    python framerec.py info door.frec
+
+    # 以最快速度重播並量測讀取吞吐量
+    python framerec.py play door.frec --pacing fast
+
+    # 作為辨識程式的攝影機來源
+    python facecam.py --encodings encodings.csv --video-source "replay:door.frec?pacing=fast"
+
+重播來源字串為 ``replay:<路徑>`` 或直接指定 ``.frec`` 檔，可加上
+``pacing=realtime|fast``、``speed=<倍率>``、``loop=1`` 等查詢參數。
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs
+
+import cv2
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"FREC"
+LAYOUT_VERSION = 1
+CODECS = {"raw": 0, "jpeg": 1}
+# magic, 版本, 編碼, 寬, 高, 通道數, 保留, 影格數, 索引位移, 錄製 FPS
+HEADER = struct.Struct("<4sHHIIHHQQd")
+HEADER_SIZE = 64
+# 影格數與索引位移在檔頭中的位置；關閉時只回填這兩個欄位
+COUNT_OFFSET = struct.calcsize("<4sHHIIHH")
+TRAILER = struct.Struct("<QQ")
+# 每筆影格前的 record header：資料長度, 時間戳（秒，自第一張影格起算）
+RECORD = struct.Struct("<Id")
+# 索引：資料位移, 資料長度, 時間戳
+INDEX_ENTRY = struct.Struct("<QId")
+REPLAY_SUFFIX = ".frec"
+REPLAY_PREFIX = "replay:"
+
+
+class RecordingFormatError(RuntimeError):
+    """錄製檔格式不符。"""
+
+
+# ----------------------------------------------------------------------
+# 錄製
+# ----------------------------------------------------------------------
+
+class FrameRecorder:
+    """將影格依序附加寫入錄製檔。"""
+
+    def __init__(
+        self,
+        path: Path,
+        codec: str = "raw",
+        quality: int = 90,
+        fps: float = 0.0,
+        buffer_size: int = 4 * 1024 * 1024,
+    ) -> None:
+        """初始化錄製器。
+
+        Args:
+            path: 輸出檔路徑。
+            codec: ``"raw"`` 保留原始位元組，``"jpeg"`` 以 JPEG 壓縮。
+            quality: JPEG 品質 (1~100)。
+            fps: 寫入檔頭的錄製 FPS，僅供參考。
+            buffer_size: 寫入緩衝區大小，影格累積成區塊後才寫入磁碟。
+        """
+
+        if codec not in CODECS:
+            raise ValueError(f"不支援的編碼方式: {codec}")
+        self.path = Path(path).expanduser()
+        self.codec = codec
+        self.quality = max(1, min(100, int(quality)))
+        self.fps = float(fps)
+        self.shape: Optional[Tuple[int, int, int]] = None
+        self.index: List[Tuple[int, int, float]] = []
+        self._first_timestamp: Optional[float] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: Optional[BinaryIO] = open(self.path, "wb", buffering=buffer_size)
+        self._header_written = False
+        self._offset = HEADER_SIZE
+
+    def __enter__(self) -> "FrameRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> None:
+        """寫入一張影格；``timestamp`` 預設為呼叫時的單調時鐘。"""
+
+        if self._file is None:
+            raise RuntimeError("錄製檔已關閉")
+        shape = tuple(frame.shape) if len(frame.shape) == 3 else tuple(frame.shape) + (1,)
+        if self.shape is None:
+            self.shape = shape  # type: ignore[assignment]
+            self._write_header()
+        elif shape != self.shape:
+            raise ValueError(f"影格尺寸 {shape} 與錄製檔 {self.shape} 不同")
+
+        now = time.monotonic() if timestamp is None else float(timestamp)
+        if self._first_timestamp is None:
+            self._first_timestamp = now
+        relative = now - self._first_timestamp
+
+        payload = self._encode(frame)
+        self._file.write(RECORD.pack(len(payload), relative))
+        self._file.write(payload)
+        self.index.append((self._offset + RECORD.size, len(payload), relative))
+        self._offset += RECORD.size + len(payload)
+
+    def _encode(self, frame: np.ndarray) -> bytes:
+        if self.codec == "jpeg":
+            ok, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            if not ok:
+                raise RuntimeError("JPEG 編碼失敗")
+            return encoded.tobytes()
+        return frame.tobytes()
+
+    def _write_header(self) -> None:
+        """寫入完整檔頭；影格數與索引位移先填 0，由 :meth:`close` 回填。"""
+
+        height, width, channels = self.shape or (0, 0, 0)
+        header = HEADER.pack(MAGIC, LAYOUT_VERSION, CODECS[self.codec], width, height, channels, 0, 0, 0, self.fps)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+        self._header_written = True
+
+    def close(self) -> None:
+        """寫入索引並回填檔頭的影格數與索引位移。"""
+
+        if self._file is None:
+            return
+        if not self._header_written:
+            self._write_header()
+        index_offset = self._offset
+        for entry in self.index:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.seek(COUNT_OFFSET)
+        self._file.write(TRAILER.pack(len(self.index), index_offset))
+        self._file.close()
+        self._file = None
+        LOGGER.info("錄製完成：%d 張影格 -> %s", len(self.index), self.path)
+
+
+def record_capture(
+    capture: cv2.VideoCapture,
+    path: Path,
+    seconds: Optional[float] = None,
+    max_frames: Optional[int] = None,
+    codec: str = "raw",
+    quality: int = 90,
+) -> int:
+    """自擷取來源錄製至時間或張數上限，回傳錄製張數。"""
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    started = time.monotonic()
+    with FrameRecorder(path, codec=codec, quality=quality, fps=fps) as recorder:
+        while True:
+            if seconds is not None and time.monotonic() - started >= seconds:
+                break
+            if max_frames is not None and len(recorder) >= max_frames:
+                break
+            ret, frame = capture.read()
+            if not ret:
+                break
+            recorder.write(frame)
+        return len(recorder)
+
+
+# ----------------------------------------------------------------------
+# 讀取
+# ----------------------------------------------------------------------
+
+class FrameRecording:
+    """以 mmap 讀取錄製檔。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path).expanduser()
+        with self.path.open("rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise RecordingFormatError(f"錄製檔過小: {self.path}")
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, codec, width, height, channels, _, count, index_offset, fps = HEADER.unpack_from(self._mmap, 0)
+        if magic not in (MAGIC, b"\0\0\0\0"):
+            raise RecordingFormatError(f"不是有效的錄製檔: {self.path}")
+        if magic == MAGIC and version != LAYOUT_VERSION:
+            raise RecordingFormatError(f"不支援的錄製檔版本: {version}")
+        self.codec = {value: name for name, value in CODECS.items()}.get(codec, "raw")
+        self.width, self.height, self.channels = width, height, channels
+        self.fps = fps
+
+        if magic == MAGIC and index_offset:
+            self._index_offset = index_offset
+            self._count = count
+            self._entries: Optional[List[Tuple[int, int, float]]] = None
+        else:
+            # 錄製中斷：檔頭與索引未寫入，逐筆掃描重建
+            self._index_offset = 0
+            self._entries = self._scan(size)
+            self._count = len(self._entries)
+            LOGGER.warning("錄製檔 %s 沒有索引，已掃描重建 %d 張影格", self.path, self._count)
+
+    def _scan(self, size: int) -> List[Tuple[int, int, float]]:
+        entries: List[Tuple[int, int, float]] = []
+        offset = HEADER_SIZE
+        while offset + RECORD.size <= size:
+            length, timestamp = RECORD.unpack_from(self._mmap, offset)
+            start = offset + RECORD.size
+            if length == 0 or start + length > size:
+                break
+            entries.append((start, length, timestamp))
+            offset = start + length
+        return entries
+
+    def __len__(self) -> int:
+        return self._count
+
+    def entry(self, position: int) -> Tuple[int, int, float]:
+        """回傳第 ``position`` 張影格的 (位移, 長度, 時間戳)。"""
+
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        if self._entries is not None:
+            return self._entries[position]
+        return INDEX_ENTRY.unpack_from(self._mmap, self._index_offset + position * INDEX_ENTRY.size)
+
+    def timestamp(self, position: int) -> float:
+        return self.entry(position)[2]
+
+    @property
+    def duration(self) -> float:
+        return self.timestamp(self._count - 1) if self._count else 0.0
+
+    def payload(self, position: int) -> memoryview:
+        """回傳影格原始資料（零複製的唯讀視圖）。"""
+
+        offset, length, _ = self.entry(position)
+        return memoryview(self._mmap)[offset : offset + length]
+
+    def frame(self, position: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """解碼第 ``position`` 張影格；提供 ``out`` 時寫入該緩衝區。"""
+
+        data = self.payload(position)
+        if self.codec == "jpeg":
+            decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+            if decoded is None:
+                raise RecordingFormatError(f"第 {position} 張影格解碼失敗")
+        else:
+            shape = (self.height, self.width) if self.channels == 1 else (self.height, self.width, self.channels)
+            decoded = np.frombuffer(data, dtype=np.uint8).reshape(shape)
+        if out is not None and out.shape == decoded.shape:
+            np.copyto(out, decoded)
+            return out
+        # 原始格式的視圖指向唯讀映射，複製後才能在上面繪製標註
+        return decoded.copy() if self.codec == "raw" else decoded
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+# ----------------------------------------------------------------------
+# 重播來源
+# ----------------------------------------------------------------------
+
+class ReplayCapture:
+    """與 ``cv2.VideoCapture`` 相容的重播來源。
+
+    ``pacing="realtime"`` 依錄製時間戳（除以 ``speed``）送出影格，行為與
+    實體攝影機相同；``pacing="fast"`` 不等待，用於量測最大吞吐量。
+    """
+
+    def __init__(self, path: Path, pacing: str = "realtime", speed: float = 1.0, loop: bool = False) -> None:
+        if pacing not in {"realtime", "fast"}:
+            raise ValueError(f"不支援的播放節奏: {pacing}")
+        self.pacing = pacing
+        self.speed = max(1e-6, float(speed))
+        self.loop = loop
+        self.recording: Optional[FrameRecording] = FrameRecording(path)
+        self.position = 0
+        self.frames_delivered = 0
+        self._grabbed: Optional[int] = None
+        self._started: Optional[float] = None
+        self._base_timestamp = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def isOpened(self) -> bool:  # noqa: N802 - 與 cv2.VideoCapture 相同介面
+        return self.recording is not None and len(self.recording) > 0
+
+    def grab(self) -> bool:
+        with self._lock:
+            if self.recording is None:
+                return False
+            if self.position >= len(self.recording):
+                if not self.loop or len(self.recording) == 0:
+                    return False
+                self.position = 0
+                self._started = None
+            position = self.position
+            self.position += 1
+        self._wait_until(position)
+        self._grabbed = position
+        return True
+
+    def retrieve(self, image: Optional[np.ndarray] = None, flag: int = 0) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._grabbed is None or self.recording is None:
+            return False, None
+        frame = self.recording.frame(self._grabbed, out=image)
+        self.frames_delivered += 1
+        return True, frame
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def _wait_until(self, position: int) -> None:
+        if self.pacing == "fast" or self.recording is None:
+            return
+        timestamp = self.recording.timestamp(position)
+        if self._started is None:
+            self._started = time.monotonic()
+            self._base_timestamp = timestamp
+            return
+        due = self._started + (timestamp - self._base_timestamp) / self.speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    # ------------------------------------------------------------------
+    def get(self, prop_id: int) -> float:
+        recording = self.recording
+        if recording is None:
+            return 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(recording.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(recording.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            if recording.fps:
+                return recording.fps
+            return (len(recording) - 1) / recording.duration if recording.duration > 0 else 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(recording))
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            return recording.timestamp(max(0, self.position - 1)) * 1000.0 if len(recording) else 0.0
+        return 0.0
+
+    def set(self, prop_id: int, value: float) -> bool:
+        # 解析度與 FPS 由錄製檔決定，只支援跳轉
+        if self.recording is None or prop_id != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        with self._lock:
+            self.position = max(0, min(int(value), len(self.recording)))
+            self._started = None
+        return True
+
+    def release(self) -> None:
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+
+
+def is_replay_source(source: Union[int, str, None]) -> bool:
+    if not isinstance(source, str):
+        return False
+    path = source.split("?", 1)[0]
+    return source.startswith(REPLAY_PREFIX) or path.lower().endswith(REPLAY_SUFFIX)
+
+
+def open_replay(source: str) -> ReplayCapture:
+    """解析 ``replay:<路徑>?pacing=fast&speed=2&loop=1`` 並開啟重播來源。"""
+
+    spec = source[len(REPLAY_PREFIX) :] if source.startswith(REPLAY_PREFIX) else source
+    path, _, query = spec.partition("?")
+    options = {key: values[-1] for key, values in parse_qs(query).items()}
+    LOGGER.info("使用錄製檔重播: %s (%s)", path, options or "realtime")
+    return ReplayCapture(
+        Path(path),
+        pacing=options.get("pacing", "realtime"),
+        speed=float(options.get("speed", 1.0)),
+        loop=options.get("loop", "0").lower() in {"1", "true", "yes"},
+    )
+
+
+def open_capture(source: Union[int, str]) -> Union[cv2.VideoCapture, ReplayCapture]:
+    """開啟攝影機、影片或錄製檔來源。"""
+
+    if is_replay_source(source):
+        return open_replay(source)  # type: ignore[arg-type]
+    return cv2.VideoCapture(source)
+
+
+# ----------------------------------------------------------------------
+# 命令列介面
+# ----------------------------------------------------------------------
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="影格錄製與重播工具")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="自攝影機或影片錄製")
+    record.add_argument("--source", default="0", help="攝影機索引、影片檔或 GStreamer 字串")
+    record.add_argument("--output", required=True, help="輸出錄製檔 (.frec)")
+    record.add_argument("--seconds", type=float, help="錄製秒數")
+    record.add_argument("--frames", type=int, help="錄製張數")
+    record.add_argument("--codec", choices=sorted(CODECS), default="raw", help="影格儲存方式")
+    record.add_argument("--quality", type=int, default=90, help="JPEG 品質")
+    record.add_argument("--width", type=int, help="攝影機寬度")
+    record.add_argument("--height", type=int, help="攝影機高度")
+
+    info = subparsers.add_parser("info", help="顯示錄製檔資訊")
+    info.add_argument("recording", help="錄製檔路徑")
+
+    play = subparsers.add_parser("play", help="重播錄製檔並量測讀取吞吐量")
+    play.add_argument("recording", help="錄製檔路徑")
+    play.add_argument("--pacing", choices=["realtime", "fast"], default="realtime", help="播放節奏")
+    play.add_argument("--speed", type=float, default=1.0, help="realtime 模式的播放倍率")
+    play.add_argument("--show", action="store_true", help="顯示影像")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    if args.command == "record":
+        if args.seconds is None and args.frames is None:
+            parser.error("請指定 --seconds 或 --frames")
+        source: Union[int, str] = int(args.source) if args.source.isdigit() else args.source
+        capture = cv2.VideoCapture(source)
+        if not capture.isOpened():
+            LOGGER.error("無法開啟來源: %s", args.source)
+            return 1
+        if args.width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+        if args.height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+        try:
+            count = record_capture(capture, Path(args.output), args.seconds, args.frames, args.codec, args.quality)
+        finally:
+            capture.release()
+        print(f"frames={count} output={args.output}")
+        return 0 if count else 1
+
+    if args.command == "info":
+        recording = FrameRecording(Path(args.recording))
+        size_mb = recording.path.stat().st_size / 1e6
+        print(
+            f"frames={len(recording)} size={recording.width}x{recording.height}x{recording.channels} "
+            f"codec={recording.codec} duration={recording.duration:.2f}s fps={recording.fps:.1f} file={size_mb:.1f}MB"
+        )
+        recording.close()
+        return 0
+
+    capture = ReplayCapture(Path(args.recording), pacing=args.pacing, speed=args.speed)
+    started = time.perf_counter()
+    frames = 0
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames += 1
+        if args.show:
+            cv2.imshow("Replay", frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+    elapsed = time.perf_counter() - started
+    capture.release()
+    if args.show:
+        cv2.destroyAllWindows()
+    print(f"frames={frames} elapsed={elapsed:.2f}s fps={frames / elapsed if elapsed > 0 else 0.0:.1f}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
@@ -1,4 +1,4 @@
-import os, cv2, time, logging, numpy as np, pathlib, subprocess
+import os, sys, cv2, time, logging, numpy as np, pathlib
 
 duration = int(os.getenv("DURATION_SEC", "1800"))        # 預設 30 分鐘
 log_dir = pathlib.Path(os.getenv("LOG_DIR","logs")); log_dir.mkdir(parents=True, exist_ok=True)
@@ -9,74 +9,10 @@ cam_idx = int(os.getenv("CAMERA_INDEX","0"))             # Pi 要接實體相機
 monitor_iv = int(os.getenv("MONITOR_INTERVAL_SEC","60")) # 每 60 秒記錄一次系統健檢
 
 # --------- 系統監控工具 ---------
-def read_soc_temp_c():
-    # 1) vcgencmd (Raspberry Pi)
-    try:
-        out = subprocess.check_output(["vcgencmd","measure_temp"], text=True).strip()
-        # e.g. temp=45.2'C
-        if "temp=" in out:
-            val = out.split("temp=")[1].split("'")[0]
-            return float(val)
-    except Exception:
-        pass
-    # 2) /sys/class/thermal/
-    try:
-        for p in ["/sys/class/thermal/thermal_zone0/temp",
-                  "/sys/class/thermal/thermal_zone1/temp"]:
-            if os.path.exists(p):
-                with open(p) as f:
-                    v = f.read().strip()
-                    # some systems report in millidegree
-                    val = float(v) / (1000.0 if float(v) > 200 else 1.0)
-                    return val
-    except Exception:
-        pass
-    return None
-
-def read_throttled():
-    # Pi: 0x0 means OK，非零代表曾發生降頻/欠壓等
-    try:
-        out = subprocess.check_output(["vcgencmd","get_throttled"], text=True).strip()
-        # e.g. throttled=0x0
-        return out
-    except Exception:
-        return None
-
-def read_cpu_mem_usage():
-    # 優先用 psutil；若未安裝則用 /proc
-    try:
-        import psutil
-        cpu = psutil.cpu_percent(interval=0.1)
-        mem = psutil.virtual_memory().percent
-        return cpu, mem
-    except Exception:
-        # /proc/stat 簡易估算 CPU
-        try:
-            def read_stat():
-                with open("/proc/stat") as f:
-                    for line in f:
-                        if line.startswith("cpu "):
-                            parts = [float(x) for x in line.split()[1:]]
-                            idle = parts[3] + parts[4]  # idle + iowait
-                            total = sum(parts)
-                            return idle, total
-                return 0.0, 0.0
-            idle1, total1 = read_stat(); time.sleep(0.1); idle2, total2 = read_stat()
-            idle = idle2 - idle1; total = total2 - total1
-            cpu = 0.0 if total == 0 else (1.0 - idle/total) * 100.0
-        except Exception:
-            cpu = None
-        # Mem
-        try:
-            with open("/proc/meminfo") as f:
-                info = {}
-                for line in f:
-                    k,v,*_ = line.replace("kB","").split(":")
-                    info[k.strip()] = float(v.strip())
-            mem = 100.0 * (1.0 - info.get("MemAvailable",0)/info.get("MemTotal",1))
-        except Exception:
-            mem = None
-        return cpu, mem
+# 與 /metrics 端點共用同一份 SoC 溫度／降頻／CPU 讀取函式
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from facemetrics import read_cpu_mem_usage, read_soc_temp_c, read_throttled
+from framerec import open_replay
 
 last_mon = 0.0
 def monitor_tick(frames, start_time):
@@ -94,6 +30,10 @@ def monitor_tick(frames, start_time):
 # --------- 影像擷取與穩定度測試 ---------
 src = 0 if cam_idx>=0 else os.getenv("TEST_VIDEO","")
 cap = cv2.VideoCapture(src) if src!="" or cam_idx>=0 else None
+# 無相機但有錄製檔：以錄製檔循環重播取代合成雜訊（REPLAY_PACING=fast 量測最大讀取速度）
+recording = os.getenv("TEST_RECORDING","")
+if (cap is None or not cap.isOpened()) and recording:
+    cap = open_replay(f"{recording}?pacing={os.getenv('REPLAY_PACING','realtime')}&loop=1")
 
 start=time.time(); frames=0
 def report_final(frames, start):
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # tests/ci_summary.py
 # Parse logs in ./logs and write a Markdown summary to $GITHUB_STEP_SUMMARY
-import os, re, statistics, sys, pathlib, io
+import os, re, statistics, sys, pathlib, io, json, random, glob
 
 LOG_DIR = pathlib.Path("logs")
 summary_path = os.environ.get("GITHUB_STEP_SUMMARY")
@@ -78,6 +78,19 @@ def parse_pi_monitor(lines):
             out[key] = m.group(1)
     return out
 
+def parse_stage_latency(lines):
+    # Parse last [MON] line with per-stage percentiles, e.g. "detect_p95=40.1ms"
+    last = None
+    for ln in lines:
+        if "[MON]" in ln and "_p50=" in ln:
+            last = ln
+    if not last:
+        return None
+    stages = {}
+    for name, q, val in re.findall(r"([A-Za-z_]+)_p(50|95|99)=([0-9]*\.?[0-9]+)ms", last):
+        stages.setdefault(name, {})["p" + q] = float(val)
+    return stages or None
+
 def md_table(headers, rows):
     md = "| " + " | ".join(headers) + " |\n"
     md += "| " + " | ".join("---" for _ in headers) + " |\n"
@@ -85,6 +98,114 @@ def md_table(headers, rows):
         md += "| " + " | ".join(str(x) for x in r) + " |\n"
     return md
 
+# ---------- Benchmark regression (bench/recognition_bench.py JSON) ----------
+# metric -> (higher is better?, env var for max relative regression, default)
+BENCH_METRICS = {
+    "throughput": (True, "THRESH_BENCH_THROUGHPUT_DROP", "0.05"),
+    "p95_ms": (False, "THRESH_BENCH_P95_INCREASE", "0.10"),
+    "peak_rss_mb": (False, "THRESH_BENCH_RSS_INCREASE", "0.10"),
+}
+BENCH_BOOTSTRAP = int(os.environ.get("BENCH_BOOTSTRAP", "2000"))
+BENCH_CONFIDENCE = float(os.environ.get("BENCH_CONFIDENCE", "0.95"))
+# peak RSS is one sample per run, so a bootstrap CI says nothing; compare medians
+# against the fixed tolerance instead (also used whenever either side has too few samples)
+BENCH_FIXED_TOLERANCE = {"peak_rss_mb"}
+BENCH_MIN_SAMPLES = int(os.environ.get("BENCH_MIN_SAMPLES", "3"))
+
+def load_bench_runs(paths):
+    runs = []
+    for p in paths:
+        try:
+            runs.append(json.loads(pathlib.Path(p).read_text(encoding="utf-8")))
+        except Exception:
+            pass
+    return runs
+
+def collect_bench_samples(runs):
+    # {benchmark key: {metric: [samples across all repeats of all runs]}}
+    samples = {}
+    for run in runs:
+        for key, bench in (run.get("benchmarks") or {}).items():
+            if bench.get("skipped"):
+                continue
+            metrics = samples.setdefault(key, {})
+            for metric in ("throughput", "p95_ms"):
+                metrics.setdefault(metric, []).extend(float(v) for v in bench.get(metric, []))
+        if run.get("peak_rss_mb") is not None:
+            samples.setdefault("process", {}).setdefault("peak_rss_mb", []).append(float(run["peak_rss_mb"]))
+    return samples
+
+def bootstrap_ratio_ci(base, cur, n=BENCH_BOOTSTRAP, confidence=BENCH_CONFIDENCE, seed=0):
+    # CI of median(cur)/median(base) - 1 by resampling both sides with replacement
+    rng = random.Random(seed)
+    ratios = []
+    for _ in range(max(1, n)):
+        b = statistics.median(rng.choices(base, k=len(base)))
+        c = statistics.median(rng.choices(cur, k=len(cur)))
+        if b > 0:
+            ratios.append(c / b - 1.0)
+    if not ratios:
+        return (0.0, 0.0)
+    ratios.sort()
+    alpha = (1.0 - confidence) / 2.0
+    lo = ratios[int(alpha * (len(ratios) - 1))]
+    hi = ratios[int(round((1.0 - alpha) * (len(ratios) - 1)))]
+    return (lo, hi)
+
+def compare_bench(baseline_runs, current_runs):
+    """Compare median of current runs with baseline; a metric regresses only when
+    the whole bootstrap CI is on the bad side and the median change exceeds the threshold.
+    Metrics in BENCH_FIXED_TOLERANCE, or with fewer than BENCH_MIN_SAMPLES samples on
+    either side, regress when the median change alone exceeds the threshold (ci is None)."""
+    base = collect_bench_samples(baseline_runs)
+    cur = collect_bench_samples(current_runs)
+    rows = []
+    for key in sorted(set(base) & set(cur)):
+        for metric, (higher_better, env, default) in BENCH_METRICS.items():
+            b, c = base[key].get(metric) or [], cur[key].get(metric) or []
+            if not b or not c:
+                continue
+            b_med, c_med = statistics.median(b), statistics.median(c)
+            change = c_med / b_med - 1.0 if b_med > 0 else 0.0
+            limit = float(os.environ.get(env, default))
+            if metric in BENCH_FIXED_TOLERANCE or min(len(b), len(c)) < BENCH_MIN_SAMPLES:
+                ci = None
+                lo = hi = change
+            else:
+                ci = lo, hi = bootstrap_ratio_ci(b, c)
+            if higher_better:
+                regressed = hi < 0 and change < -limit
+                improved = lo > 0 and change > limit
+            else:
+                regressed = lo > 0 and change > limit
+                improved = hi < 0 and change < -limit
+            rows.append({"benchmark": key, "metric": metric, "baseline": b_med, "current": c_med,
+                         "change": change, "ci": ci, "limit": limit,
+                         "status": "regressed" if regressed else ("improved" if improved else "ok")})
+    return rows
+
+def bench_diff_md(rows):
+    icons = {"regressed": "❌ regressed", "improved": "🚀 improved", "ok": "✅ ok"}
+    return md_table(["benchmark","metric","baseline","current","Δ",f"{BENCH_CONFIDENCE*100:.0f}% CI","status"], [
+        [r["benchmark"], r["metric"], f'{r["baseline"]:.3f}', f'{r["current"]:.3f}', f'{r["change"]*100:+.1f}%',
+         f'[{r["ci"][0]*100:+.1f}%, {r["ci"][1]*100:+.1f}%]' if r["ci"] else f'n/a (±{r["limit"]*100:.0f}%)',
+         icons[r["status"]]] for r in rows
+    ])
+
+def bench_paths():
+    # BENCH_RESULTS: glob of current runs; BENCH_BASELINE: baseline JSON (glob allowed)
+    current = sorted(glob.glob(os.environ.get("BENCH_RESULTS", str(LOG_DIR/"bench*.json"))))
+    baseline = sorted(glob.glob(os.environ.get("BENCH_BASELINE", "bench/baseline*.json")))
+    return baseline, current
+
+def missing_baseline_message(baseline_files, current_files):
+    # benchmark results without a baseline used to skip the gate silently
+    if current_files and not baseline_files:
+        pattern = os.environ.get("BENCH_BASELINE", "bench/baseline*.json")
+        return (f"Benchmark baseline missing: no files match BENCH_BASELINE={pattern} "
+                f"({len(current_files)} result file(s) not compared); "
+                "run `make bench-baseline` on the CI runner and commit bench/baseline.json")
+    return None
 
 
 # ---------- Thresholds & gating (can be overridden by env) ----------
@@ -121,6 +242,12 @@ def main():
         parts.append(md_table(["key","val","key","val","key","val"], rows))
         if mon:
             parts.append(f"- Last monitor: `TEMP={mon.get('TEMP','?')}C`, `CPU%={mon.get('CPU%','?')}`, `MEM%={mon.get('MEM%','?')}`, `THR={mon.get('THR','?')}`, `FPS={mon.get('FPS','?')}`")
+        stages = parse_stage_latency(lines)
+        if stages:
+            parts.append("")
+            parts.append(md_table(["stage","p50(ms)","p95(ms)","p99(ms)"], [
+                [name, f'{v.get("p50",0):.1f}', f'{v.get("p95",0):.1f}', f'{v.get("p99",0):.1f}'] for name, v in sorted(stages.items())
+            ]))
         parts.append("")
 
     # id_test.log
@@ -141,6 +268,22 @@ def main():
             parts.append(md_table(["samples","avg(s)","p95(s)","min(s)","max(s)"], [[lat["count"], f'{lat["avg"]:.3f}', f'{lat["p95"]:.3f}', f'{lat["min"]:.3f}', f'{lat["max"]:.3f}']]))
             parts.append("")
 
+    # benchmark JSON vs baseline
+    baseline_files, current_files = bench_paths()
+    bench_rows = []
+    missing_baseline = missing_baseline_message(baseline_files, current_files)
+    if missing_baseline:
+        print(f"WARNING: {missing_baseline}", file=sys.stderr)
+        parts.append("## ⚠️ Benchmark vs Baseline")
+        parts.append(f"**{missing_baseline}**")
+        parts.append("")
+    if baseline_files and current_files:
+        bench_rows = compare_bench(load_bench_runs(baseline_files), load_bench_runs(current_files))
+        if bench_rows:
+            parts.append(f"## Benchmark vs Baseline ({len(current_files)} run(s) vs {len(baseline_files)})")
+            parts.append(bench_diff_md(bench_rows))
+            parts.append("")
+
     # e2e.log
     e2e_p = LOG_DIR/"e2e.log"
     if e2e_p.exists():
@@ -182,6 +325,13 @@ def main():
         if e.get("heartbeats", 0) < MIN_E2E_HEARTBEATS:
             failures.append(f"E2E heartbeats {e.get('heartbeats',0)} < MIN_E2E_HEARTBEATS {MIN_E2E_HEARTBEATS}")
 
+    # Gate benchmark regressions (a missing baseline fails unless explicitly allowed)
+    if missing_baseline and os.environ.get("BENCH_ALLOW_MISSING_BASELINE", "0") != "1":
+        failures.append(missing_baseline)
+    for r in bench_rows:
+        if r["status"] == "regressed":
+            failures.append(f"Benchmark {r['benchmark']} {r['metric']} {r['change']*100:+.1f}% (limit {r['limit']*100:.0f}%)")
+
     # Add final status section
     parts.append("## Build Gate")
     parts.append(md_table(["Metric","Threshold","Status"], [
@@ -190,27 +340,28 @@ def main():
         ["Accuracy ACC", f">= {MIN_ACC}", badge(not id_p.exists() or (parse_acc(read_lines(id_p)) or 0) >= MIN_ACC)],
         ["API p95 (s)", f"<= {MAX_API_P95}", badge(not api_p.exists() or (parse_api_latency(read_lines(api_p)) or {}).get("p95",0) <= MAX_API_P95)],
         ["E2E heartbeats", f">= {MIN_E2E_HEARTBEATS}", badge(not e2e_p.exists() or (parse_e2e(read_lines(e2e_p)) or {}).get("heartbeats",0) >= MIN_E2E_HEARTBEATS)],
+        ["Benchmark regressions", "none", badge(not missing_baseline and not any(r["status"] == "regressed" for r in bench_rows))],
     ]))
     parts.append("")
 
     md = "\n".join(parts) if parts else "No logs found."
 
-    # If any gating failures, exit 1 to fail the workflow
+    if summary_path:
+        with open(summary_path, "a", encoding="utf-8") as f:
+            f.write(md+"\n")
+    else:
+        print(md)
+
+    # If any gating failures, exit 1 to fail the workflow (after the tables above are written)
     if failures:
-        fail_md = "**❌ FAILED GATES:**\\n- " + "\\n- ".join(failures)
+        fail_md = "**❌ FAILED GATES:**\n- " + "\n- ".join(failures)
         if summary_path:
             with open(summary_path, "a", encoding="utf-8") as f:
-                f.write(fail_md + "\\n")
+                f.write(fail_md + "\n")
         else:
             print(fail_md)
         # ensure non-zero exit
         sys.exit(1)
 
-    if summary_path:
-        with open(summary_path, "a", encoding="utf-8") as f:
-            f.write(md+"\n")
-    else:
-        print(md)
-
 if __name__ == "__main__":
     main()
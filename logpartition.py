@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""logpartition.py - 紀錄表的月分割區、每日彙總與保留期限
+
+``attendance_log`` 與 ``ad_display_log`` 只增不減，``ad_performance`` 檢視表
+每次都要對整張 ``ad_display_log`` 做 ``GROUP BY``。本模組提供：
+
+* 月分割區：兩張紀錄表以 ``PARTITION BY RANGE (UNIX_TIMESTAMP(...))``
+  每月一個分割區，並保留 ``pmax`` 承接未來資料。:func:`ensure_partitions`
+  會預先切出之後 ``months_ahead`` 個月的分割區。
+* 每日彙總：``ad_display_daily`` 與 ``attendance_daily`` 以
+  ``rollup_state`` 記錄的日期為水位，每次只重算水位前 ``late_days`` 天之後
+  的資料；``ad_performance`` 改讀彙總表。紀錄可能晚到（曝光在下一則廣告
+  顯示時才寫入、資料庫中斷後自本地暫存補寫），因此另記錄已彙總的最大
+  ``log_id``，之後新增的紀錄若屬於更早的日期，會自該日起重算。
+* 保留期限：超過保留月數的分割區以 ``DROP PARTITION`` 直接移除，不需
+  長時間鎖表的 ``DELETE``；尚未彙總、或結束未滿 ``late_days`` 天仍可能
+  收到晚到紀錄的月份不會被移除。
+
+MySQL 的分割表不支援外鍵，且主鍵必須包含分割欄位，因此兩張表改以
+``(log_id, 時間欄位)`` 為主鍵並移除外鍵；會員一律以 ``is_active`` 停用。
+
+使用方式::
+
+    # 既有資料庫轉為分割表（一次性，會重建資料表）
+    python logpartition.py convert --config config.json
+
+    # 排程執行（例如每 15 分鐘）：切分割區、更新彙總、移除過期分割區
+    python logpartition.py maintain --config config.json
+
+    python logpartition.py status --config config.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+LOGGER = logging.getLogger(__name__)
+
+# 分割的資料表與其時間欄位
+PARTITIONED_TABLES: Dict[str, str] = {
+    "ad_display_log": "display_time",
+    "attendance_log": "captured_at",
+}
+MAX_PARTITION = "pmax"
+DEFAULT_MONTHS_AHEAD = 2
+DEFAULT_RETENTION_MONTHS = 13
+# 每次重算水位前幾天的彙總，涵蓋晚提交的交易與補寫的暫存紀錄
+DEFAULT_LATE_DAYS = 2
+_PARTITION_PATTERN = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+# ----------------------------------------------------------------------
+# 分割區
+# ----------------------------------------------------------------------
+
+def add_months(month: date, count: int) -> date:
+    """回傳 ``month`` 所在月份加上 ``count`` 個月後的月初。"""
+
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_clause(month: date) -> str:
+    upper = add_months(month, 1)
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))"
+
+
+def partition_by_clause(column: str, first_month: date, last_month: date) -> str:
+    """``first_month`` 至 ``last_month`` 每月一個分割區，再加上 ``pmax``。"""
+
+    clauses = []
+    month = date(first_month.year, first_month.month, 1)
+    while month <= last_month:
+        clauses.append(partition_clause(month))
+        month = add_months(month, 1)
+    clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    return f"PARTITION BY RANGE (UNIX_TIMESTAMP({column})) (\n    " + ",\n    ".join(clauses) + "\n)"
+
+
+def table_exists(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    return bool(cursor.fetchall()[0][0])
+
+
+def existing_partitions(cursor, table: str) -> List[str]:
+    cursor.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_partitions(cursor, table: str, today: date, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> List[str]:
+    """自 ``pmax`` 切出至 ``today`` 之後 ``months_ahead`` 個月的分割區，回傳新增的名稱。"""
+
+    names = existing_partitions(cursor, table)
+    if MAX_PARTITION not in names:
+        LOGGER.warning("%s 尚未轉為分割表，請先執行 logpartition.py convert", table)
+        return []
+    months = [month for month in map(partition_month, names) if month is not None]
+    current = date(today.year, today.month, 1)
+    first = add_months(max(months), 1) if months else current
+    last = add_months(current, months_ahead)
+    new_months = []
+    month = first
+    while month <= last:
+        new_months.append(month)
+        month = add_months(month, 1)
+    if not new_months:
+        return []
+    clauses = [partition_clause(month) for month in new_months]
+    clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(clauses)})")
+    created = [partition_name(month) for month in new_months]
+    LOGGER.info("%s 新增分割區 %s", table, ", ".join(created))
+    return created
+
+
+def expired_partitions(names: Sequence[str], today: date, retention_months: int) -> List[str]:
+    """整個月份早於保留期限的分割區（保留本月與之前 ``retention_months`` 個月）。"""
+
+    cutoff = add_months(date(today.year, today.month, 1), -retention_months)
+    return [name for name in names if (month := partition_month(name)) is not None and month < cutoff]
+
+
+def drop_expired_partitions(
+    cursor,
+    table: str,
+    today: date,
+    retention_months: int,
+    rolled_up_until: Optional[date] = None,
+) -> List[str]:
+    """移除過期分割區；``rolled_up_until`` 之後才結束的月份尚未彙總，不會移除。"""
+
+    expired = expired_partitions(existing_partitions(cursor, table), today, retention_months)
+    if rolled_up_until is not None:
+        pending = [name for name in expired if add_months(partition_month(name), 1) > rolled_up_until]
+        if pending:
+            LOGGER.warning("%s 的分割區 %s 尚未彙總，暫不移除", table, ", ".join(pending))
+            expired = [name for name in expired if name not in pending]
+    if expired:
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+        LOGGER.info("%s 移除過期分割區 %s", table, ", ".join(expired))
+    return expired
+
+
+def convert_table(cursor, table: str, today: date, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> None:
+    """將既有的紀錄表轉為月分割表：移除外鍵、主鍵加入時間欄位後重新分割。"""
+
+    column = PARTITIONED_TABLES[table]
+    if MAX_PARTITION in existing_partitions(cursor, table):
+        LOGGER.info("%s 已是分割表", table)
+        return
+    cursor.execute(
+        "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    for (constraint,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+    cursor.execute(
+        f"ALTER TABLE {table} MODIFY {column} TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        f"DROP PRIMARY KEY, ADD PRIMARY KEY (log_id, {column})"
+    )
+    cursor.execute(f"SELECT MIN({column}) FROM {table}")
+    oldest = cursor.fetchall()[0][0]
+    first = oldest.date() if isinstance(oldest, datetime) else today
+    cursor.execute(
+        f"ALTER TABLE {table} " + partition_by_clause(column, first, add_months(date(today.year, today.month, 1), months_ahead))
+    )
+    LOGGER.info("%s 已轉為月分割表", table)
+
+
+# ----------------------------------------------------------------------
+# 每日彙總
+# ----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Rollup:
+    """以來源表時間欄位為水位、可重算最後一天的每日彙總。"""
+
+    name: str
+    source: str
+    ddl: str
+    date_column: str
+    insert_sql: str
+
+
+ROLLUP_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup_name VARCHAR(64) PRIMARY KEY,
+    last_day DATE NOT NULL,
+    last_log_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+"""
+# 舊版 rollup_state 沒有 last_log_id；補上後第一次執行會完整重算
+ROLLUP_STATE_LOG_ID_DDL = "ALTER TABLE rollup_state ADD COLUMN last_log_id BIGINT NOT NULL DEFAULT 0 AFTER last_day"
+
+ROLLUPS: Dict[str, Rollup] = {
+    "ad_display_daily": Rollup(
+        name="ad_display_daily",
+        source="ad_display_log",
+        date_column="display_date",
+        ddl="""
+CREATE TABLE IF NOT EXISTS ad_display_daily (
+    display_date DATE NOT NULL,
+    ad_id INT NOT NULL,
+    display_count INT NOT NULL,
+    unique_viewers INT NOT NULL,
+    duration_total BIGINT NOT NULL DEFAULT 0,
+    duration_samples INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (display_date, ad_id),
+    INDEX idx_ad_date (ad_id, display_date)
+)
+""",
+        insert_sql=(
+            "INSERT INTO ad_display_daily "
+            "(display_date, ad_id, display_count, unique_viewers, duration_total, duration_samples) "
+            "SELECT DATE(display_time), ad_id, COUNT(*), COUNT(DISTINCT member_id), "
+            "COALESCE(SUM(display_duration), 0), COUNT(display_duration) "
+            "FROM ad_display_log WHERE display_time >= %s AND ad_id IS NOT NULL "
+            "GROUP BY DATE(display_time), ad_id"
+        ),
+    ),
+    "attendance_daily": Rollup(
+        name="attendance_daily",
+        source="attendance_log",
+        date_column="attendance_date",
+        ddl="""
+CREATE TABLE IF NOT EXISTS attendance_daily (
+    attendance_date DATE NOT NULL,
+    device_id VARCHAR(100) NOT NULL DEFAULT '',
+    name VARCHAR(100) NOT NULL,
+    member_id INT NULL,
+    check_ins INT NOT NULL,
+    first_seen TIMESTAMP NULL,
+    last_seen TIMESTAMP NULL,
+    avg_confidence FLOAT,
+    PRIMARY KEY (attendance_date, device_id, name),
+    INDEX idx_member_date (member_id, attendance_date)
+)
+""",
+        insert_sql=(
+            "INSERT INTO attendance_daily "
+            "(attendance_date, device_id, name, member_id, check_ins, first_seen, last_seen, avg_confidence) "
+            "SELECT DATE(captured_at), COALESCE(device_id, ''), name, MAX(member_id), COUNT(*), "
+            "MIN(captured_at), MAX(captured_at), AVG(confidence) "
+            "FROM attendance_log WHERE captured_at >= %s "
+            "GROUP BY DATE(captured_at), COALESCE(device_id, ''), name"
+        ),
+    ),
+}
+
+
+def rollup_watermark(cursor, name: str) -> Optional[date]:
+    cursor.execute("SELECT last_day FROM rollup_state WHERE rollup_name = %s", (name,))
+    rows = cursor.fetchall()
+    return rows[0][0] if rows else None
+
+
+def ensure_rollup_state(cursor) -> None:
+    cursor.execute(ROLLUP_STATE_DDL)
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'rollup_state' AND COLUMN_NAME = 'last_log_id'"
+    )
+    if not cursor.fetchall()[0][0]:
+        cursor.execute(ROLLUP_STATE_LOG_ID_DDL)
+
+
+def refresh_rollup(cursor, rollup: Rollup, today: date, late_days: int = DEFAULT_LATE_DAYS) -> date:
+    """重算彙總並回傳重算的起始日。
+
+    起始日為水位前 ``late_days`` 天；上次之後新增的紀錄（``log_id`` 較大）若
+    有更早的時間，則自該日起重算，晚到的紀錄因此不會漏掉。首次執行時自
+    來源表最早的日期開始。時間欄位的範圍條件讓 MySQL 只讀取相關的分割區。
+    """
+
+    column = PARTITIONED_TABLES[rollup.source]
+    cursor.execute("SELECT last_day, last_log_id FROM rollup_state WHERE rollup_name = %s", (rollup.name,))
+    rows = cursor.fetchall()
+    cursor.execute(f"SELECT MAX(log_id) FROM {rollup.source}")
+    max_log_id = cursor.fetchall()[0][0] or 0
+    if rows:
+        last_day, last_log_id = rows[0]
+        start = last_day - timedelta(days=late_days)
+        cursor.execute(f"SELECT MIN({column}) FROM {rollup.source} WHERE log_id > %s", (last_log_id,))
+    else:
+        start = today
+        cursor.execute(f"SELECT MIN({column}) FROM {rollup.source}")
+    oldest = cursor.fetchall()[0][0]
+    if isinstance(oldest, datetime) and oldest.date() < start:
+        if rows:
+            LOGGER.info("%s 有晚到的紀錄（%s），自該日起重算", rollup.source, oldest.date())
+        start = oldest.date()
+    cursor.execute(f"DELETE FROM {rollup.name} WHERE {rollup.date_column} >= %s", (start,))
+    cursor.execute(rollup.insert_sql, (datetime.combine(start, datetime.min.time()),))
+    cursor.execute(
+        "INSERT INTO rollup_state (rollup_name, last_day, last_log_id) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE last_day = VALUES(last_day), last_log_id = VALUES(last_log_id)",
+        (rollup.name, today, max_log_id),
+    )
+    return start
+
+
+# ----------------------------------------------------------------------
+# 排程入口
+# ----------------------------------------------------------------------
+
+def maintain(
+    connection,
+    today: Optional[date] = None,
+    retention: Optional[Mapping] = None,
+    drop_expired: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    """切分割區、更新彙總並移除過期分割區；每張表各自提交，不存在的紀錄表略過。"""
+
+    today = today or date.today()
+    retention = retention or {}
+    months_ahead = int(retention.get("months_ahead", DEFAULT_MONTHS_AHEAD))
+    late_days = int(retention.get("late_days", DEFAULT_LATE_DAYS))
+    report: Dict[str, Dict[str, Any]] = {}
+    cursor = connection.cursor()
+    try:
+        ensure_rollup_state(cursor)
+        for rollup in ROLLUPS.values():
+            cursor.execute(rollup.ddl)
+        connection.commit()
+
+        for rollup in ROLLUPS.values():
+            table = rollup.source
+            if not table_exists(cursor, table):
+                LOGGER.info("資料表 %s 不存在，略過", table)
+                continue
+            created = ensure_partitions(cursor, table, today, months_ahead)
+            start = refresh_rollup(cursor, rollup, today, late_days)
+            connection.commit()
+            dropped: List[str] = []
+            if drop_expired:
+                months = int(retention.get(f"{table}_months", DEFAULT_RETENTION_MONTHS))
+                # 結束未滿 late_days 天的月份仍可能收到晚到紀錄，暫不移除
+                rolled_up_until = min(start, today - timedelta(days=late_days))
+                dropped = drop_expired_partitions(cursor, table, today, months, rolled_up_until=rolled_up_until)
+                connection.commit()
+            report[table] = {"created": created, "dropped": dropped, "rollup_from": start}
+    finally:
+        cursor.close()
+    return report
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="紀錄表分割區、每日彙總與保留期限維護")
+    parser.add_argument("--config", default="config.json", help="含 database 與 retention 區段的設定檔")
+    parser.add_argument("--log-level", default="INFO", help="記錄器等級，例如 INFO、DEBUG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("convert", help="將既有的紀錄表轉為月分割表（會重建資料表）")
+    maintain_parser = subparsers.add_parser("maintain", help="切分割區、更新彙總並移除過期分割區")
+    maintain_parser.add_argument("--no-retention", action="store_true", help="只切分割區與更新彙總")
+    subparsers.add_parser("status", help="列出各紀錄表的分割區與彙總水位")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    import mysql.connector
+
+    with Path(args.config).open("r", encoding="utf-8") as fp:
+        config = json.load(fp)
+    retention = config.get("retention", {})
+    connection = mysql.connector.connect(**config.get("database", {}))
+    try:
+        if args.command == "convert":
+            cursor = connection.cursor()
+            for table in PARTITIONED_TABLES:
+                convert_table(cursor, table, date.today(), int(retention.get("months_ahead", DEFAULT_MONTHS_AHEAD)))
+            cursor.close()
+            return 0
+        if args.command == "maintain":
+            report = maintain(connection, retention=retention, drop_expired=not args.no_retention)
+            for table, changes in report.items():
+                print(
+                    f"{table}\tcreated={','.join(changes['created']) or '-'}\t"
+                    f"dropped={','.join(changes['dropped']) or '-'}\trollup_from={changes['rollup_from']}"
+                )
+            return 0
+
+        cursor = connection.cursor()
+        for rollup in ROLLUPS.values():
+            names = existing_partitions(cursor, rollup.source)
+            try:
+                watermark = rollup_watermark(cursor, rollup.name)
+            except mysql.connector.Error:
+                watermark = None
+            print(f"{rollup.source}\tpartitions={len(names)}\t{names[0] if names else '-'}..{names[-1] if names else '-'}")
+            print(f"{rollup.name}\tlast_day={watermark or '-'}")
+        cursor.close()
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":  # pragma: no cover - 命令列執行點
+    raise SystemExit(main())
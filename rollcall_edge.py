@@ -11,10 +11,12 @@ from __future__ import annotations
 import argparse
 import json
 import logging
+import queue
+import threading
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import cv2
 import face_recognition
@@ -36,7 +38,27 @@ else:  # pragma: no cover
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from facebatch import BatchFaceDetector
+from facecrop import DEFAULT_CROP_MARGIN, detection_frame, encode_crops, scale_location
+from facegallery import SharedGallery, TemplateGallery
+from facequality import QualityGate, QualityThresholds
 from facegen import FaceEncodingGenerator
+from facemetrics import (
+    FRAMES_CAPTURED,
+    FRAMES_DROPPED,
+    FRAMES_PROCESSED,
+    GALLERY_SIZE,
+    QUEUE_DEPTH,
+    MetricsServer,
+    record_recognitions,
+    start_metrics_server,
+)
+from faceprof import PROFILER
+from facetrack import IdentityTracker
+from faceunknown import UnknownFaceStore
+from framepool import FrameBufferPool, ScratchBuffers
+from framerec import open_capture
+from logpartition import ensure_partitions
 
 LOGGER = logging.getLogger(__name__)
 
@@ -49,6 +71,9 @@ class RecognizedFace:
     name: str
     location: Tuple[int, int, int, int]
     distance: float
+    # 保留未知人臉時附帶編碼與臉部縮圖，供未知訪客分群使用
+    encoding: Optional[np.ndarray] = None
+    thumbnail: Optional[np.ndarray] = None
 
     @property
     def confidence(self) -> float:
@@ -62,6 +87,7 @@ class AttendanceRecord:
     timestamp: datetime
     member_id: Optional[int] = None
     status: str = "present"
+    device_id: Optional[str] = None
 
     def to_payload(self) -> dict:
         return {
@@ -70,66 +96,189 @@ class AttendanceRecord:
             "timestamp": self.timestamp.isoformat(),
             "member_id": self.member_id,
             "status": self.status,
+            "device_id": self.device_id,
         }
 
 
+@dataclass
+class CameraSource:
+    """單一攝影機來源設定，``device_id`` 會寫入考勤紀錄與 MQTT。"""
+
+    device_id: str
+    source: Union[int, str] = 0
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[int] = None
+
+
+def parse_camera_sources(config: dict) -> List[CameraSource]:
+    """解析 ``camera.sources``；未設定時沿用單一 ``camera.index``。"""
+
+    camera_config = config.get("camera", {})
+    default_device_id = config.get("device", {}).get("id", "edge-node")
+    entries = camera_config.get("sources") or [{"index": camera_config.get("index", 0)}]
+
+    sources: List[CameraSource] = []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            entry = {"index": entry}
+        device_id = entry.get("device_id")
+        if not device_id:
+            device_id = default_device_id if len(entries) == 1 else f"{default_device_id}-cam{position}"
+        sources.append(
+            CameraSource(
+                device_id=device_id,
+                source=entry.get("source", entry.get("index", position)),
+                width=entry.get("width", camera_config.get("width")),
+                height=entry.get("height", camera_config.get("height")),
+                fps=entry.get("fps", camera_config.get("fps")),
+            )
+        )
+    return sources
+
+
 class FaceRecognitionEngine:
     """封裝人臉辨識流程，提供辨識與繪製標註功能。"""
 
-    def __init__(self, csv_path: Path, tolerance: float, model: str, scale: float) -> None:
+    def __init__(
+        self,
+        csv_path: Path,
+        tolerance: float,
+        model: str,
+        scale: float,
+        batch_detector: Optional[BatchFaceDetector] = None,
+        gallery_path: Optional[Path] = None,
+        max_exemplars: int = 0,
+        crop_margin: Optional[float] = DEFAULT_CROP_MARGIN,
+        quality_gate: Optional[QualityGate] = None,
+    ) -> None:
         self.csv_path = csv_path
+        self.max_exemplars = max_exemplars
+        self.templates: Optional[TemplateGallery] = None
+        # 指定共用資料檔時改為唯讀映射，多個行程共用同一份向量
+        self.shared_gallery = SharedGallery(gallery_path) if gallery_path else None
         self.tolerance = tolerance
         self.model = model
         self.scale = max(0.1, min(scale, 1.0))
-        self.known_encodings: List[np.ndarray] = []
+        # CNN 模型下可與其他攝影機共用批次偵測器
+        self.batch_detector = batch_detector if model == "cnn" else None
+        # 編碼改在原始解析度的裁切區域上計算；None 時沿用縮圖編碼
+        self.crop_margin = crop_margin
+        # 編碼前略過模糊、過小、逆光或側臉的人臉
+        self.quality_gate = quality_gate
+        self.keep_unknown_faces = False
+        # 回傳 False 時不複製該未知人臉的縮圖（例如未知人臉庫的該群已存滿）
+        self.wants_unknown_thumbnail: Optional[Callable[[np.ndarray], bool]] = None
+        self.known_encodings: Sequence[np.ndarray] = []
         self.known_labels: List[str] = []
+        # 多支攝影機的辨識執行緒共用同一份資料，重新載入時整批替換
+        self._gallery_lock = threading.Lock()
+        # 辨識執行緒各自保留縮放／RGB 緩衝區
+        self._scratch = threading.local()
         self._load_encodings()
 
     def _load_encodings(self) -> None:
-        self.known_encodings.clear()
-        self.known_labels.clear()
+        if self.shared_gallery is not None:
+            if self.shared_gallery.attach():
+                self._swap_gallery(self.shared_gallery.encodings, self.shared_gallery.labels)
+            return
+
+        encodings: List[np.ndarray] = []
+        labels: List[str] = []
         if not self.csv_path.exists():
             LOGGER.warning("找不到編碼檔 %s，請先使用 facegen.py 產生", self.csv_path)
-            return
-        records = FaceEncodingGenerator.load_from_csv(self.csv_path)
-        for record in records:
-            self.known_encodings.append(np.array(record.encoding, dtype="float32"))
-            self.known_labels.append(record.label)
-        LOGGER.info("載入 %d 筆已知人臉資料", len(self.known_labels))
-
-    def recognize(self, frame: np.ndarray) -> List[RecognizedFace]:
-        small_frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
-        rgb_small = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        locations = face_recognition.face_locations(rgb_small, model=self.model)
-        encodings = face_recognition.face_encodings(rgb_small, locations)
-        results: List[RecognizedFace] = []
-        for (top, right, bottom, left), encoding in zip(locations, encodings):
-            if not self.known_encodings:
-                name = "Unknown"
-                distance = 1.0
+        else:
+            records = FaceEncodingGenerator.load_from_csv(self.csv_path)
+            for record in records:
+                encodings.append(np.array(record.encoding, dtype="float32"))
+                labels.append(record.label)
+            LOGGER.info("載入 %d 筆已知人臉資料", len(labels))
+        self._swap_gallery(encodings, labels)
+
+    def _swap_gallery(self, encodings: Sequence[np.ndarray], labels: List[str]) -> None:
+        templates = self._build_templates(encodings, labels)
+        with self._gallery_lock:
+            self.known_encodings = encodings
+            self.known_labels = labels
+            self.templates = templates
+
+    def _build_templates(self, encodings: Sequence[np.ndarray], labels: List[str]) -> Optional[TemplateGallery]:
+        if self.max_exemplars <= 0:
+            return None
+        return TemplateGallery(max_exemplars=self.max_exemplars).build(encodings, labels)
+
+    def refresh_shared_gallery(self) -> bool:
+        """共用資料發佈新世代時切換，回傳是否有更新。"""
+
+        if self.shared_gallery is None:
+            return False
+        with self._gallery_lock:
+            updated = self.shared_gallery.refresh()
+        if updated:
+            self._swap_gallery(self.shared_gallery.encodings, self.shared_gallery.labels)
+            LOGGER.info("切換至共用人臉資料世代 %d", self.shared_gallery.generation)
+        return updated
+
+    def recognize(self, frame: np.ndarray, source: str = "default") -> List[RecognizedFace]:
+        scratch = ScratchBuffers.for_thread(self._scratch, "recognize")
+        crop_encoding = self.crop_margin is not None
+        with PROFILER.span("preprocess"):
+            if crop_encoding:
+                small = detection_frame(frame, self.scale, self.model, scratch)
             else:
-                distances = face_recognition.face_distance(self.known_encodings, encoding)
-                best_index = int(np.argmin(distances))
-                distance = float(distances[best_index])
-                name = self.known_labels[best_index] if distance <= self.tolerance else "Unknown"
-            scale_factor = 1.0 / self.scale
-            results.append(
-                RecognizedFace(
-                    name=name,
-                    distance=distance,
-                    location=(
-                        int(top * scale_factor),
-                        int(right * scale_factor),
-                        int(bottom * scale_factor),
-                        int(left * scale_factor),
-                    ),
-                )
-            )
+                small_frame = scratch.resize("small", frame, self.scale)
+                small = scratch.cvt_color("rgb_small", small_frame, cv2.COLOR_BGR2RGB)
+        with PROFILER.span("detect"):
+            if self.batch_detector is not None:
+                locations = self.batch_detector.detect(small, source=source)
+            else:
+                locations = face_recognition.face_locations(small, model=self.model)
+        full_locations = [scale_location(location, self.scale, frame.shape) for location in locations]
+        if self.quality_gate is not None and full_locations:
+            with PROFILER.span("quality"):
+                kept = self.quality_gate.filter_indices(frame, full_locations)
+            locations = [locations[index] for index in kept]
+            full_locations = [full_locations[index] for index in kept]
+        with PROFILER.span("encode"):
+            if crop_encoding:
+                encodings = encode_crops(frame, full_locations, self.crop_margin)
+            else:
+                encodings = face_recognition.face_encodings(small, locations)
+        self.refresh_shared_gallery()
+        with self._gallery_lock:
+            known_encodings, known_labels = self.known_encodings, self.known_labels
+            templates = self.templates
+        results: List[RecognizedFace] = []
+        for (top, right, bottom, left), encoding in zip(full_locations, encodings):
+            with PROFILER.span("match"):
+                if len(known_encodings) == 0:
+                    name = "Unknown"
+                    distance = 1.0
+                elif templates is not None:
+                    label, distance = templates.match(encoding)
+                    name = label if label is not None and distance <= self.tolerance else "Unknown"
+                else:
+                    distances = face_recognition.face_distance(known_encodings, encoding)
+                    best_index = int(np.argmin(distances))
+                    distance = float(distances[best_index])
+                    name = known_labels[best_index] if distance <= self.tolerance else "Unknown"
+            result = RecognizedFace(name=name, distance=distance, location=(top, right, bottom, left))
+            if name == "Unknown" and self.keep_unknown_faces:
+                result.encoding = encoding
+                # 影格緩衝區會被重複使用，縮圖需另外複製；只複製未知人臉庫會保留的
+                if self.wants_unknown_thumbnail is None or self.wants_unknown_thumbnail(encoding):
+                    result.thumbnail = frame[top:bottom, left:right].copy()
+            results.append(result)
         return results
 
     @staticmethod
-    def draw(frame: np.ndarray, results: Iterable[RecognizedFace]) -> np.ndarray:
-        annotated = frame.copy()
+    def draw(
+        frame: np.ndarray,
+        results: Iterable[RecognizedFace],
+        scratch: Optional[ScratchBuffers] = None,
+    ) -> np.ndarray:
+        # 提供 scratch 時在重複使用的底圖上繪製，不另外複製影格
+        annotated = scratch.copy("overlay", frame) if scratch is not None else frame.copy()
         for result in results:
             top, right, bottom, left = result.location
             cv2.rectangle(annotated, (left, top), (right, bottom), (0, 128, 255), 2)
@@ -185,17 +334,23 @@ class DatabaseManager:
         cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS attendance_log (
-                log_id INT PRIMARY KEY AUTO_INCREMENT,
+                log_id INT AUTO_INCREMENT,
                 member_id INT NULL,
                 name VARCHAR(100) NOT NULL,
                 confidence FLOAT,
                 status VARCHAR(20) DEFAULT 'present',
                 device_id VARCHAR(100),
-                captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (member_id) REFERENCES members(member_id) ON DELETE SET NULL
+                captured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (log_id, captured_at),
+                INDEX idx_member_time (member_id, captured_at)
+            )
+            PARTITION BY RANGE (UNIX_TIMESTAMP(captured_at)) (
+                PARTITION pmax VALUES LESS THAN MAXVALUE
             )
             """
         )
+        # 依月分割，之後由 logpartition.py maintain 維護與移除過期月份
+        ensure_partitions(cursor, "attendance_log", date.today())
         self.connection.commit()
         cursor.close()
 
@@ -213,6 +368,10 @@ class DatabaseManager:
     def log_attendance(self, record: AttendanceRecord) -> None:
         if not self.connection:
             return
+        with PROFILER.span("db_write"):
+            self._insert_attendance(record)
+
+    def _insert_attendance(self, record: AttendanceRecord) -> None:
         cursor = self.connection.cursor()
         query = (
             "INSERT INTO attendance_log (member_id, name, confidence, status, device_id) "
@@ -225,7 +384,7 @@ class DatabaseManager:
                 record.name,
                 record.confidence,
                 record.status,
-                self.device_id,
+                record.device_id or self.device_id,
             ),
         )
         self.connection.commit()
@@ -239,6 +398,8 @@ class MQTTClient:
         self.config = config
         self.client: Optional[mqtt.Client] = None  # type: ignore[type-arg]
         self.topic = config.get("mqtt", {}).get("topic", "face_ad_system/attendance")
+        self.pending = 0
+        self._pending_lock = threading.Lock()
 
     def connect(self) -> None:
         if mqtt is None:
@@ -249,6 +410,7 @@ class MQTTClient:
             LOGGER.info("未設定 MQTT 參數，跳過")
             return
         self.client = mqtt.Client()
+        self.client.on_publish = self._on_publish
         if username := mqtt_config.get("username"):
             self.client.username_pw_set(username, mqtt_config.get("password"))
         try:
@@ -264,9 +426,21 @@ class MQTTClient:
             return
         payload = json.dumps(record.to_payload())
         try:
-            self.client.publish(self.topic, payload, qos=1)
+            info = self.client.publish(self.topic, payload, qos=1)
         except Exception as exc:  # pragma: no cover
             LOGGER.error("MQTT 發佈失敗: %s", exc)
+            return
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # 未排入送出佇列的訊息不會收到 PUBACK，不列入待確認數
+            LOGGER.error("MQTT 發佈失敗: %s", mqtt.error_string(info.rc))
+            return
+        with self._pending_lock:
+            self.pending += 1
+
+    def _on_publish(self, client, userdata, mid, *args) -> None:
+        # QoS 1 收到 PUBACK 後才算送達，未確認的訊息數即為 MQTT 佇列深度
+        with self._pending_lock:
+            self.pending = max(0, self.pending - 1)
 
     def close(self) -> None:
         if self.client:
@@ -275,6 +449,164 @@ class MQTTClient:
             self.client = None
 
 
+class CameraStream:
+    """單一攝影機的擷取執行緒，只保留最新影格供辨識與預覽使用。"""
+
+    def __init__(self, source: CameraSource, frame_skip: int = 1) -> None:
+        self.source = source
+        self.frame_skip = max(1, frame_skip)
+        self.capture: Optional[cv2.VideoCapture] = None
+        self.last_results: List[RecognizedFace] = []
+        self.dropped = 0
+        # 最新影格與辨識中影格不會被覆寫，其餘緩衝區供預覽繪製期間緩衝
+        self.pool = FrameBufferPool(count=4, name=f"capture-{source.device_id}")
+        self.preview_scratch = ScratchBuffers(f"preview-{source.device_id}")
+        self._lock = threading.Lock()
+        self._latest: Optional[np.ndarray] = None
+        self._processing: Optional[np.ndarray] = None
+        self._sequence = 0
+        self._consumed = 0
+        self._in_flight = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def device_id(self) -> str:
+        return self.source.device_id
+
+    def open(self) -> bool:
+        capture = open_capture(self.source.source)
+        if not capture.isOpened():
+            LOGGER.error("無法開啟攝影機 %s (%s)", self.device_id, self.source.source)
+            return False
+        if self.source.width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.source.width)
+        if self.source.height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.source.height)
+        if self.source.fps:
+            capture.set(cv2.CAP_PROP_FPS, self.source.fps)
+        self.capture = capture
+        return True
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.device_id}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set() and self.capture is not None:
+            with self._lock:
+                busy = (self._latest, self._processing)
+            ret, frame = self.pool.read(self.capture, busy=busy)
+            if not ret:
+                self._stop.wait(0.05)
+                continue
+            with self._lock:
+                self._latest = frame
+                self._sequence += 1
+            FRAMES_CAPTURED.inc(device=self.device_id)
+
+    def latest_frame(self) -> Optional[np.ndarray]:
+        with self._lock:
+            return self._latest
+
+    def take_for_recognition(self) -> Optional[np.ndarray]:
+        """取出最新影格交給辨識；同一時間每支攝影機最多一張在處理中。"""
+
+        with self._lock:
+            if self._in_flight or self._latest is None:
+                return None
+            if self._sequence - self._consumed < self.frame_skip:
+                return None
+            skipped = max(0, self._sequence - self._consumed - 1)
+            self.dropped += skipped
+            self._consumed = self._sequence
+            self._in_flight = True
+            frame = self._processing = self._latest
+        if skipped:
+            FRAMES_DROPPED.inc(skipped, device=self.device_id)
+        return frame
+
+    def finish_recognition(self, results: List[RecognizedFace]) -> None:
+        with self._lock:
+            self.last_results = results
+            self._in_flight = False
+            self._processing = None
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class RecognitionWorkerPool:
+    """多支攝影機共用的辨識執行緒池。
+
+    各執行緒以輪詢順序向攝影機取影格，且每支攝影機同時只會有一張影格
+    在處理中，因此忙碌的攝影機不會佔滿所有執行緒而餓死其他攝影機。
+    辨識結果放入佇列，由 GUI 主執行緒寫入資料庫與 MQTT。
+    """
+
+    def __init__(
+        self,
+        engine: FaceRecognitionEngine,
+        streams: Sequence[CameraStream],
+        workers: int,
+    ) -> None:
+        self.engine = engine
+        self.streams = list(streams)
+        self.results: "queue.Queue[Tuple[CameraStream, List[RecognizedFace]]]" = queue.Queue()
+        self._workers = max(1, workers)
+        self._next_index = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for index in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f"recognizer-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads.clear()
+
+    def _next_job(self) -> Optional[Tuple[CameraStream, np.ndarray]]:
+        with self._lock:
+            count = len(self.streams)
+            for offset in range(count):
+                index = (self._next_index + offset) % count
+                stream = self.streams[index]
+                frame = stream.take_for_recognition()
+                if frame is not None:
+                    self._next_index = (index + 1) % count
+                    return stream, frame
+        return None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            job = self._next_job()
+            if job is None:
+                self._stop.wait(0.005)
+                continue
+            stream, frame = job
+            try:
+                results = self.engine.recognize(frame, source=stream.device_id)
+            except Exception as exc:  # pragma: no cover - 單張影格錯誤不中斷其他攝影機
+                LOGGER.error("攝影機 %s 辨識失敗: %s", stream.device_id, exc)
+                results = []
+            stream.finish_recognition(results)
+            FRAMES_PROCESSED.inc(device=stream.device_id)
+            PROFILER.tick()
+            self.results.put((stream, results))
+
+
 class RollCallEdgeApp:
     """結合 GUI 與人臉辨識的點名系統。"""
 
@@ -287,32 +619,93 @@ class RollCallEdgeApp:
         scale: float = 0.25,
         frame_skip: int = 2,
         cooldown: int = 30,
+        workers: Optional[int] = None,
+        gallery_path: Optional[Path] = None,
+        max_exemplars: int = 0,
+        metrics_port: Optional[int] = None,
+        crop_margin: Optional[float] = DEFAULT_CROP_MARGIN,
     ) -> None:
         logging.basicConfig(level=logging.INFO)
         self.config = self._load_config(config_path)
+        self.camera_sources = parse_camera_sources(self.config)
 
         self.db_manager = DatabaseManager(self.config)
         self.db_manager.connect()
         self.mqtt_client = MQTTClient(self.config)
         self.mqtt_client.connect()
 
-        self.engine = FaceRecognitionEngine(encodings_csv, tolerance, model, scale)
+        # 多支攝影機搭配 CNN 模型時，以批次偵測合併各攝影機的影格
+        self.batch_detector: Optional[BatchFaceDetector] = None
+        if model == "cnn" and len(self.camera_sources) > 1:
+            self.batch_detector = BatchFaceDetector(batch_size=len(self.camera_sources), max_wait=0.03)
+        self.engine = FaceRecognitionEngine(
+            encodings_csv,
+            tolerance,
+            model,
+            scale,
+            batch_detector=self.batch_detector,
+            gallery_path=gallery_path,
+            max_exemplars=max_exemplars,
+            crop_margin=crop_margin,
+            quality_gate=self._build_quality_gate(),
+        )
         self.frame_skip = max(1, frame_skip)
         self.cooldown = timedelta(seconds=max(1, cooldown))
         self.last_seen: Dict[str, datetime] = {}
+        # 每支攝影機各自追蹤人臉軌跡，累積足夠票數才點名或計為未知
+        self.trackers: Dict[str, IdentityTracker] = {}
+        # 設定檔 unknowns.enabled 時將確認為未知的訪客分群保存
+        self.unknown_store: Optional[UnknownFaceStore] = None
+        unknown_config = self.config.get("unknowns", {})
+        if unknown_config.get("enabled"):
+            self.unknown_store = UnknownFaceStore.from_config(unknown_config)
+            self.engine.keep_unknown_faces = True
+            self.engine.wants_unknown_thumbnail = self.unknown_store.wants_thumbnail
         self.recognized_count = 0
         self.unknown_count = 0
 
-        self.camera = self._open_camera()
-        self.frame_index = 0
+        self.streams = self._open_cameras()
+        self.worker_pool = RecognitionWorkerPool(
+            self.engine,
+            self.streams,
+            workers=workers or max(1, len(self.streams)),
+        )
+        self.metrics_server = self._start_metrics(metrics_port)
 
         self.root = tk.Tk()
         self.root.title("智慧點名系統")
         self.root.geometry("1200x720")
 
         self._build_gui()
+        for stream in self.streams:
+            stream.start()
+        self.worker_pool.start()
         self._update_loop()
 
+    # ------------------------------------------------------------------
+    def _start_metrics(self, port: Optional[int]) -> Optional[MetricsServer]:
+        if port is None:
+            port = self.config.get("metrics", {}).get("port")
+        if not port:
+            return None
+        GALLERY_SIZE.set_function(lambda: len(self.engine.known_labels))
+        QUEUE_DEPTH.set_function(self.worker_pool.results.qsize, queue="results")
+        QUEUE_DEPTH.set_function(lambda: self.mqtt_client.pending, queue="mqtt")
+        try:
+            return start_metrics_server(int(port), host=self.config.get("metrics", {}).get("host", "0.0.0.0"))
+        except OSError as exc:
+            LOGGER.error("無法啟動指標端點 (port %s): %s", port, exc)
+            return None
+
+    # ------------------------------------------------------------------
+    def _build_quality_gate(self) -> Optional[QualityGate]:
+        """依設定檔 ``quality`` 區段建立品質篩選，``enabled: false`` 時停用。"""
+
+        quality_config = self.config.get("quality", {})
+        if not quality_config.get("enabled", True):
+            return None
+        return QualityGate(QualityThresholds.from_config(quality_config))
+
     # ------------------------------------------------------------------
     def _load_config(self, path: Path) -> dict:
         if not path.exists():
@@ -322,19 +715,18 @@ class RollCallEdgeApp:
             return json.load(fp)
 
     # ------------------------------------------------------------------
-    def _open_camera(self) -> cv2.VideoCapture:
-        camera_config = self.config.get("camera", {})
-        capture = cv2.VideoCapture(camera_config.get("index", 0))
-        if capture.isOpened():
-            if width := camera_config.get("width"):
-                capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-            if height := camera_config.get("height"):
-                capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-            if fps := camera_config.get("fps"):
-                capture.set(cv2.CAP_PROP_FPS, fps)
-        else:
-            messagebox.showerror("攝影機錯誤", "無法開啟攝影機，請確認裝置連線")
-        return capture
+    def _open_cameras(self) -> List[CameraStream]:
+        streams: List[CameraStream] = []
+        failed: List[str] = []
+        for source in self.camera_sources:
+            stream = CameraStream(source, frame_skip=self.frame_skip)
+            if stream.open():
+                streams.append(stream)
+            else:
+                failed.append(source.device_id)
+        if failed:
+            messagebox.showerror("攝影機錯誤", f"無法開啟攝影機 {', '.join(failed)}，請確認裝置連線")
+        return streams
 
     # ------------------------------------------------------------------
     def _build_gui(self) -> None:
@@ -344,8 +736,12 @@ class RollCallEdgeApp:
 
         preview_frame = ttk.LabelFrame(self.root, text="即時畫面", padding=10)
         preview_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-        self.video_label = ttk.Label(preview_frame)
-        self.video_label.pack(fill="both", expand=True)
+        self.preview_columns = 1 if len(self.streams) <= 1 else 2
+        self.video_labels: Dict[str, ttk.Label] = {}
+        for position, stream in enumerate(self.streams):
+            label = ttk.Label(preview_frame, text=stream.device_id, compound="top")
+            label.grid(row=position // self.preview_columns, column=position % self.preview_columns, sticky="nsew")
+            self.video_labels[stream.device_id] = label
 
         side_frame = ttk.Frame(self.root, padding=10)
         side_frame.grid(row=0, column=1, sticky="nsew")
@@ -360,11 +756,11 @@ class RollCallEdgeApp:
 
         log_frame = ttk.LabelFrame(side_frame, text="點名記錄", padding=10)
         log_frame.grid(row=1, column=0, sticky="nsew", pady=10)
-        columns = ("time", "name", "confidence", "status")
+        columns = ("time", "device", "name", "confidence", "status")
         self.tree = ttk.Treeview(log_frame, columns=columns, show="headings", height=15)
-        for col, label in zip(columns, ("時間", "姓名", "信心度", "狀態")):
+        for col, label in zip(columns, ("時間", "攝影機", "姓名", "信心度", "狀態")):
             self.tree.heading(col, text=label)
-            self.tree.column(col, width=120, anchor="center")
+            self.tree.column(col, width=100, anchor="center")
         scrollbar = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.tree.yview)
         self.tree.configure(yscrollcommand=scrollbar.set)
         self.tree.pack(side=tk.LEFT, fill="both", expand=True)
@@ -400,40 +796,66 @@ class RollCallEdgeApp:
 
     # ------------------------------------------------------------------
     def _update_loop(self) -> None:
-        if self.camera and self.camera.isOpened():
-            ret, frame = self.camera.read()
-            if ret:
-                self.frame_index += 1
-                if self.frame_index % self.frame_skip == 0:
-                    results = self.engine.recognize(frame)
-                    self._handle_recognition(results)
-                    annotated = FaceRecognitionEngine.draw(frame, results)
-                else:
-                    annotated = frame
-                image = Image.fromarray(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB))
-                photo = ImageTk.PhotoImage(image=image)
-                self.video_label.configure(image=photo)
-                self.video_label.image = photo
+        # 資料庫與 MQTT 連線不具執行緒安全性，辨識結果統一在主執行緒處理
+        while True:
+            try:
+                stream, results = self.worker_pool.results.get_nowait()
+            except queue.Empty:
+                break
+            self._handle_recognition(results, device_id=stream.device_id)
+
+        for stream in self.streams:
+            frame = stream.latest_frame()
+            if frame is None:
+                continue
+            scratch = stream.preview_scratch
+            with PROFILER.span("draw"):
+                annotated = FaceRecognitionEngine.draw(frame, stream.last_results, scratch=scratch)
+            if self.preview_columns > 1:
+                annotated = scratch.resize("preview", annotated, 0.5)
+            image = Image.fromarray(scratch.cvt_color("preview_rgb", annotated, cv2.COLOR_BGR2RGB))
+            photo = ImageTk.PhotoImage(image=image)
+            label = self.video_labels[stream.device_id]
+            label.configure(image=photo)
+            label.image = photo
+        PROFILER.maybe_report()
         self.root.after(30, self._update_loop)
 
     # ------------------------------------------------------------------
-    def _handle_recognition(self, results: Iterable[RecognizedFace]) -> None:
+    def _handle_recognition(self, results: Iterable[RecognizedFace], device_id: Optional[str] = None) -> None:
+        results = list(results)
+        record_recognitions(result.name for result in results)
+        tracker = self.trackers.get(device_id or "")
+        if tracker is None:
+            tracker = self.trackers[device_id or ""] = IdentityTracker.from_config(self.config.get("tracking", {}))
+        events = tracker.update(
+            (
+                result.location,
+                result.name,
+                result.distance,
+                (result.encoding, result.thumbnail) if result.encoding is not None else None,
+            )
+            for result in results
+        )
         now = datetime.now()
-        for result in results:
-            if result.name == "Unknown":
+        for event in events:
+            if event.unknown:
                 self.unknown_count += 1
+                if self.unknown_store is not None and event.payload is not None:
+                    self.unknown_store.add(*event.payload)
                 continue
-            last_seen = self.last_seen.get(result.name)
+            last_seen = self.last_seen.get(event.name)
             if last_seen and now - last_seen < self.cooldown:
                 continue
-            member_id = self.db_manager.resolve_member_id(result.name)
+            member_id = self.db_manager.resolve_member_id(event.name)
             record = AttendanceRecord(
-                name=result.name,
-                confidence=result.confidence,
+                name=event.name,
+                confidence=event.confidence,
                 timestamp=now,
                 member_id=member_id,
+                device_id=device_id,
             )
-            self.last_seen[result.name] = now
+            self.last_seen[event.name] = now
             self.recognized_count += 1
             self._append_record(record)
             self.db_manager.log_attendance(record)
@@ -447,6 +869,7 @@ class RollCallEdgeApp:
             0,
             values=(
                 record.timestamp.strftime("%H:%M:%S"),
+                record.device_id or self.db_manager.device_id,
                 record.name,
                 f"{record.confidence*100:.1f}%",
                 record.status,
@@ -455,8 +878,25 @@ class RollCallEdgeApp:
 
     # ------------------------------------------------------------------
     def quit(self) -> None:
-        if self.camera and self.camera.isOpened():
-            self.camera.release()
+        self.worker_pool.stop()
+        for stream in self.streams:
+            stream.stop()
+            LOGGER.info(
+                "攝影機 %s 影格緩衝區配置次數: capture=%d preview=%d (讀取 %d 張)",
+                stream.device_id,
+                stream.pool.allocations,
+                stream.preview_scratch.allocations,
+                stream.pool.reads,
+            )
+        if self.batch_detector is not None:
+            self.batch_detector.close()
+        if self.engine.quality_gate is not None:
+            LOGGER.info("人臉品質篩選: %s", self.engine.quality_gate.summary())
+        if self.unknown_store is not None:
+            self.unknown_store.flush()
+        PROFILER.maybe_report(force=True)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         self.db_manager.close()
         self.mqtt_client.close()
         self.root.destroy()
@@ -471,11 +911,22 @@ def build_argument_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="邊緣點名系統")
     parser.add_argument("--config", default=str(DEFAULT_CONFIG_PATH), help="系統設定檔")
     parser.add_argument("--encodings", default=str(ENCODINGS_CSV), help="人臉編碼 CSV")
+    parser.add_argument("--gallery", help="facegallery.py 發佈的共用人臉資料檔（指定時不讀取 CSV）")
+    parser.add_argument("--templates", type=int, default=0, help="每人代表樣本數上限，大於 0 時啟用身分樣板比對")
     parser.add_argument("--tolerance", type=float, default=0.6, help="人臉辨識容忍度")
     parser.add_argument("--model", choices=["hog", "cnn"], default="hog", help="人臉偵測模型")
     parser.add_argument("--scale", type=float, default=0.25, help="影像縮放比例")
     parser.add_argument("--frame-skip", type=int, default=2, help="辨識時跳過的影格數")
     parser.add_argument("--cooldown", type=int, default=30, help="同一人員再次點名的冷卻時間（秒）")
+    parser.add_argument("--workers", type=int, help="辨識執行緒數量，預設與攝影機數量相同")
+    parser.add_argument(
+        "--crop-margin",
+        type=float,
+        default=DEFAULT_CROP_MARGIN,
+        help="編碼時自原始影格裁切的外擴比例，負值表示改用縮圖編碼",
+    )
+    parser.add_argument("--profile", action="store_true", help="啟用各階段耗時量測並定期輸出 [MON] 記錄")
+    parser.add_argument("--metrics-port", type=int, help="Prometheus /metrics 連接埠，0 表示停用（預設讀取設定檔 metrics.port）")
     return parser
 
 
@@ -484,6 +935,8 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.INFO)
+    if args.profile:
+        PROFILER.configure(enabled=True)
 
     app = RollCallEdgeApp(
         config_path=Path(args.config),
@@ -493,6 +946,11 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         scale=args.scale,
         frame_skip=args.frame_skip,
         cooldown=args.cooldown,
+        workers=args.workers,
+        gallery_path=Path(args.gallery) if args.gallery else None,
+        max_exemplars=args.templates,
+        metrics_port=args.metrics_port,
+        crop_margin=args.crop_margin if args.crop_margin >= 0 else None,
     )
     app.run()
     return 0
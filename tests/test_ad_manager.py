@@ -0,0 +1,295 @@
+import queue
+import sys
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+for _name in ('tkinter', 'tkinter.ttk', 'tkinter.messagebox', 'tkinter.filedialog', 'cv2'):
+    _install_stub(_name, MagicMock())
+_install_stub('PIL', MagicMock())
+_install_stub('PIL.Image', MagicMock())
+mysql_connector = MagicMock()
+mysql_package = ModuleType('mysql')
+mysql_package.connector = mysql_connector
+_install_stub('mysql', mysql_package)
+_install_stub('mysql.connector', mysql_connector)
+
+from admedia import IngestResult
+from ad_manager import AdManagerTool, build_ad_list_query, ensure_listing_schema
+
+
+def _row(ad_id, priority, created, title='ad', active=True):
+    return (ad_id, title, 'food', 'ALL', 'ALL', active, None, None, priority, created)
+
+
+class _Tree:
+    def __init__(self):
+        self.order = []
+        self.values = {}
+
+    def insert(self, parent, index, iid, image, values):
+        self.order.insert(len(self.order) if index == 'end' else index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.order.remove(iid)
+
+    def item(self, iid, image, values):
+        self.values[iid] = values
+
+    def get_children(self):
+        return tuple(self.order)
+
+
+class _Var:
+    def __init__(self, value=''):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class _Text:
+    def __init__(self, value=''):
+        self.value = value
+        self.state = 'normal'
+
+    def get(self, start, end):
+        return self.value + '\n'
+
+    def configure(self, state):
+        self.state = state
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query, params):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def _tool(rows, has_more=False):
+    tool = AdManagerTool.__new__(AdManagerTool)
+    tool.ad_tree = _Tree()
+    tool.filters = {}
+    tool.row_keys = {}
+    tool.thumbnail_image = lambda image_path, video_path: ''
+    for row in rows:
+        tool.insert_row(row)
+    tool.page_cursor = tool.row_key(rows[-1]) if rows else None
+    tool.has_more_pages = has_more
+    return tool
+
+
+def test_list_query_applies_filters_and_keyset_cursor():
+    cursor_key = (5, datetime(2024, 6, 1), 42)
+    query, params = build_ad_list_query({'category': 'food', 'is_active': True}, after=cursor_key, limit=50)
+
+    assert "target_category = %s" in query and "is_active = %s" in query
+    assert "OFFSET" not in query
+    assert "(priority < %s OR (priority = %s AND (created_date < %s OR (created_date = %s AND ad_id < %s))))" in query
+    assert params == ('food', True, 5, 5, datetime(2024, 6, 1), datetime(2024, 6, 1), 42, 50)
+
+
+def test_list_query_without_filters_has_no_where_clause():
+    query, params = build_ad_list_query({})
+
+    assert "WHERE" not in query
+    assert params == (100,)
+
+
+def test_refresh_row_moves_only_the_saved_row():
+    day = datetime(2024, 6, 1)
+    tool = _tool([_row(3, 9, day), _row(2, 5, day), _row(1, 1, day)])
+    tool.db_connection = MagicMock()
+    tool.db_connection.cursor.return_value = _Cursor([_row(1, 7, day, title='renamed')])
+
+    tool.refresh_row(1)
+
+    assert tool.ad_tree.order == ['3', '1', '2']
+    assert tool.ad_tree.values['1'][1] == 'renamed'
+
+
+def test_refresh_row_removes_rows_outside_filter_and_defers_unloaded_pages():
+    day = datetime(2024, 6, 1)
+    tool = _tool([_row(3, 9, day), _row(2, 5, day)], has_more=True)
+    tool.db_connection = MagicMock()
+
+    tool.db_connection.cursor.return_value = _Cursor([])
+    tool.refresh_row(3)
+    assert tool.ad_tree.order == ['2']
+
+    # 新廣告排在尚未載入的頁面，等捲動時才出現
+    tool.db_connection.cursor.return_value = _Cursor([_row(4, 1, day)])
+    tool.refresh_row(4)
+    assert tool.ad_tree.order == ['2']
+
+
+def test_list_query_orders_by_the_indexed_columns():
+    # ORDER BY 與 keyset 條件必須是 idx_listing (priority, created_date, ad_id) 的原始欄位，
+    # 包在運算式中 MySQL 便無法沿索引讀取
+    query, _ = build_ad_list_query({}, after=(5, datetime(2024, 6, 1), 42))
+
+    assert "ORDER BY priority DESC, created_date DESC, ad_id DESC" in query
+    assert "COALESCE" not in query and "IFNULL" not in query
+
+
+class _SchemaCursor(_Cursor):
+    def __init__(self, nullable, has_index):
+        super().__init__([])
+        self.nullable = nullable
+        self.has_index = has_index
+
+    def execute(self, query, params=()):
+        self.executed.append(query)
+        if "information_schema.columns" in query:
+            self.rows = [(column,) for column in self.nullable]
+        elif "information_schema.statistics" in query:
+            self.rows = [(1 if self.has_index else 0,)]
+
+
+def test_listing_schema_backfills_nulls_before_making_columns_not_null():
+    cursor = _SchemaCursor(['priority', 'created_date'], has_index=True)
+
+    assert ensure_listing_schema(cursor)
+
+    statements = cursor.executed
+    assert statements.index("UPDATE advertisements SET priority = 1 WHERE priority IS NULL") < \
+        statements.index("ALTER TABLE advertisements MODIFY priority INT NOT NULL DEFAULT 1")
+    assert any("MODIFY created_date TIMESTAMP NOT NULL" in statement for statement in statements)
+    assert not any("ADD INDEX" in statement for statement in statements)
+
+
+def test_listing_schema_is_unchanged_when_already_migrated():
+    cursor = _SchemaCursor([], has_index=True)
+
+    assert not ensure_listing_schema(cursor)
+    assert not any(statement.startswith(("UPDATE", "ALTER")) for statement in cursor.executed)
+
+    cursor = _SchemaCursor([], has_index=False)
+    assert ensure_listing_schema(cursor)
+    assert cursor.executed[-1] == "ALTER TABLE advertisements ADD INDEX idx_listing (priority, created_date, ad_id)"
+
+
+def test_scrolling_schedules_only_one_page_load():
+    day = datetime(2024, 6, 1)
+    tool = _tool([_row(2, 5, day)], has_more=True)
+    tool.loading_page = False
+    tool.ad_scrollbar = MagicMock()
+    tool.root = MagicMock()
+    tool.db_connection = MagicMock()
+    tool.db_connection.cursor.return_value = _Cursor([_row(1, 1, day)])
+
+    tool.on_tree_scroll('0.5', '0.95')
+    tool.on_tree_scroll('0.5', '0.97')
+
+    tool.root.after_idle.assert_called_once_with(tool.load_next_page)
+    assert tool.loading_page
+
+    tool.load_next_page()
+
+    assert not tool.loading_page
+    assert tool.ad_tree.order == ['2', '1']
+    assert not tool.has_more_pages
+
+
+def _form_tool(ad_id=7):
+    tool = AdManagerTool.__new__(AdManagerTool)
+    tool.current_ad_id = ad_id
+    tool.title_var = _Var('Summer sale')
+    tool.content_text = _Text('50% off')
+    tool.category_var = _Var('food')
+    tool.target_gender_var = _Var('ALL')
+    tool.target_age_var = _Var('')
+    tool.priority_var = _Var(5)
+    tool.image_path_var = _Var('/home/pi/big.jpg')
+    tool.video_path_var = _Var('')
+    tool.start_date_var = _Var('')
+    tool.end_date_var = _Var('')
+    tool.is_active_var = _Var(True)
+    tool.ingest_status_var = _Var()
+    tool.ingest_progress = {}
+    tool.form_widgets = [MagicMock(), MagicMock()]
+    tool.ingestor = MagicMock()
+    tool.ingestor.is_ingested.return_value = False
+    tool.ingest_worker = MagicMock()
+    tool.ingest_worker.events = queue.Queue()
+    tool.ingest_worker.submit.return_value = 1
+    tool.ingest_job = None
+    tool.ingest_form = None
+    tool.root = MagicMock()
+    tool.db_connection = MagicMock()
+    tool.db_connection.cursor.return_value = _Cursor([])
+    tool.refresh_row = MagicMock()
+    return tool
+
+
+def test_save_writes_the_form_as_it_was_when_saved():
+    tool = _form_tool(ad_id=7)
+
+    tool.save_advertisement()
+
+    tool.ingest_worker.submit.assert_called_once_with(['/home/pi/big.jpg'])
+    assert all(widget.state.call_args.args == (['disabled'],) for widget in tool.form_widgets)
+    assert tool.content_text.state != 'normal'
+
+    # 轉檔期間選了另一筆廣告：表單停用，不會被載入
+    tool.on_select(None)
+    # 即使表單變數被改動，寫入的仍是儲存當下的內容
+    tool.current_ad_id = 9
+    tool.title_var.set('Other ad')
+    tool.ingest_worker.events.put(('progress', 1, 0.5, 'transcoding'))
+    tool.poll_ingest()
+    assert tool.ingest_job == 1
+    tool.db_connection.cursor.assert_not_called()
+
+    result = IngestResult('/home/pi/big.jpg', 'advertisements/images/abc.jpg', None, 'abc', False)
+    tool.ingest_worker.events.put(('done', 1, [result]))
+    tool.poll_ingest()
+
+    (query, params), = tool.db_connection.cursor.return_value.executed
+    assert query.strip().startswith('UPDATE')
+    assert params[0] == 'Summer sale'
+    assert params[6] == 'advertisements/images/abc.jpg'
+    assert params[-1] == 7
+    assert tool.image_path_var.get() == 'advertisements/images/abc.jpg'
+    assert tool.ingest_job is None
+    assert all(widget.state.call_args.args == (['!disabled'],) for widget in tool.form_widgets)
+    tool.refresh_row.assert_called_once_with(7)
+
+
+def test_failed_ingest_reenables_the_form_without_writing():
+    tool = _form_tool(ad_id=None)
+
+    tool.save_advertisement()
+    tool.ingest_worker.events.put(('error', 1, 'ffmpeg failed'))
+    tool.poll_ingest()
+
+    assert tool.ingest_job is None
+    assert all(widget.state.call_args.args == (['!disabled'],) for widget in tool.form_widgets)
+    tool.db_connection.cursor.assert_not_called()
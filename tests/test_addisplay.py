@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('PIL', MagicMock())
+_install_stub('PIL.Image', MagicMock())
+_install_stub('PIL.ImageDraw', MagicMock())
+_install_stub('PIL.ImageFont', MagicMock())
+try:
+    import numpy as np
+except ImportError:
+    np = ModuleType('numpy')
+    np.bool_ = bool
+    np.isscalar = lambda value: isinstance(value, (int, float, bool))
+    _install_stub('numpy', np)
+
+import cv2
+
+from addisplay import MediaCache, fit_to_screen
+
+# 縮放需要真正的 OpenCV 與 numpy
+requires_opencv = pytest.mark.skipif(
+    isinstance(cv2, MagicMock) or not hasattr(np, "zeros"), reason="需要 OpenCV 與 numpy"
+)
+
+
+def _image(nbytes):
+    return SimpleNamespace(nbytes=nbytes)
+
+
+def test_media_cache_evicts_least_recently_used_by_bytes():
+    cache = MediaCache((1920, 1080), max_bytes=300)
+    cache.put("a.jpg", _image(100))
+    cache.put("b.jpg", _image(100))
+    cache.put("c.jpg", _image(100))
+
+    assert cache.get("a.jpg") is not None
+    cache.put("d.jpg", _image(100))
+
+    assert "b.jpg" not in cache
+    assert all(key in cache for key in ("a.jpg", "c.jpg", "d.jpg"))
+    assert cache.bytes == 300
+    assert (cache.hits, cache.evictions) == (1, 1)
+    assert cache.get("b.jpg") is None
+    assert cache.misses == 1
+
+
+def test_media_cache_rejects_images_larger_than_limit():
+    cache = MediaCache((640, 480), max_bytes=50)
+    cache.put("huge.jpg", _image(100))
+
+    assert len(cache) == 0
+    assert cache.bytes == 0
+
+
+@requires_opencv
+def test_fit_to_screen_letterboxes_to_exact_size():
+    image = np.full((100, 400, 3), 255, dtype=np.uint8)
+
+    fitted = fit_to_screen(image, 320, 240)
+
+    assert fitted.shape == (240, 320, 3)
+    # 寬圖等比例縮成 320x80，上下補黑
+    assert fitted[0, 160].tolist() == [0, 0, 0]
+    assert fitted[120, 160].tolist() == [255, 255, 255]
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from adlog import Impression, ImpressionWriter, build_insert
+
+
+class _FakeConnection:
+    def __init__(self, log, fail=False):
+        self.log = log
+        self.fail = fail
+
+    def cursor(self):
+        connection = self
+
+        class _Cursor:
+            def execute(self, query, params):
+                if connection.fail:
+                    raise RuntimeError("database unavailable")
+                connection.log.append((query, list(params)))
+
+            def close(self):
+                pass
+
+        return _Cursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_impression_records_measured_duration():
+    impression = Impression(member_id=1, ad_id=7, started=100.0)
+
+    impression.finish(now=112.6)
+
+    assert impression.display_duration == 13
+    assert Impression.from_json(impression.to_json()).to_row() == impression.to_row()
+
+
+def test_build_insert_uses_one_multi_row_statement():
+    query, params = build_insert([Impression(1, 7, "2024-01-01 00:00:00", display_duration=3)] * 3)
+
+    assert query.count("(%s, %s, %s, %s, %s)") == 3
+    assert params[:5] == [1, 7, "2024-01-01 00:00:00", "main_screen", 3]
+    assert len(params) == 15
+
+
+def test_writer_batches_impressions(tmp_path):
+    log = []
+    writer = ImpressionWriter(lambda: _FakeConnection(log), batch_size=3, flush_interval=60, spool_path=tmp_path / "spool.jsonl")
+    writer.start()
+    for ad_id in range(5):
+        writer.submit(Impression(1, ad_id, display_duration=2))
+    writer.close()
+
+    assert [len(params) // 5 for _, params in log] == [3, 2]
+    assert writer.written == 5
+    assert not (tmp_path / "spool.jsonl").exists()
+
+
+def test_writer_spools_during_outage_and_replays(tmp_path):
+    log = []
+    spool = tmp_path / "spool.jsonl"
+    connection = _FakeConnection(log, fail=True)
+    writer = ImpressionWriter(lambda: connection, batch_size=2, spool_path=spool, retry_interval=0)
+    writer.start()
+    writer.submit(Impression(1, 1, display_duration=4))
+    writer.submit(Impression(2, 2, display_duration=5))
+    writer.close()
+
+    assert writer.spooled == 2
+    assert len(spool.read_text(encoding="utf-8").splitlines()) == 2
+
+    connection.fail = False
+    writer = ImpressionWriter(lambda: connection, batch_size=2, spool_path=spool, retry_interval=0)
+    writer.start()
+    writer.submit(Impression(3, 3, display_duration=6))
+    writer.close()
+
+    assert [params[1::5] for _, params in log] == [[1, 2], [3]]
+    assert not spool.exists()
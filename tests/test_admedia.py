@@ -0,0 +1,151 @@
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+try:
+    import PIL.Image  # noqa: F401
+except ImportError:
+    _install_stub('PIL', MagicMock())
+    _install_stub('PIL.Image', MagicMock())
+
+from PIL import Image
+
+import admedia
+from admedia import IngestWorker, MediaIngestor, parse_progress, transcode_command
+
+requires_pillow = pytest.mark.skipif(isinstance(Image, MagicMock), reason="需要 Pillow")
+
+
+@pytest.fixture
+def unreadable_video(monkeypatch):
+    fake_cv2 = MagicMock()
+    fake_cv2.VideoCapture.return_value.read.return_value = (False, None)
+    monkeypatch.setattr(admedia, "cv2", fake_cv2)
+
+
+def _ingestor(tmp_path, **kwargs):
+    return MediaIngestor(
+        str(tmp_path / "images"), str(tmp_path / "videos"), str(tmp_path / "thumbs"),
+        screen_size=(320, 180), **kwargs
+    )
+
+
+def test_transcode_command_caps_resolution_and_targets_h264():
+    command = transcode_command("in.mov", "out.mp4", 1920, 1080, ffmpeg="/usr/bin/ffmpeg")
+
+    assert command[0] == "/usr/bin/ffmpeg"
+    assert command[command.index("-vf") + 1].startswith("scale='min(1920,iw)':'min(1080,ih)'")
+    assert command[command.index("-c:v") + 1] == "libx264"
+    assert command[command.index("-pix_fmt") + 1] == "yuv420p"
+    assert command[-1] == "out.mp4"
+
+
+def test_parse_progress_reads_out_time():
+    assert parse_progress("out_time_us=5000000\n", 10.0) == 0.5
+    assert parse_progress("out_time_us=N/A", 10.0) is None
+    assert parse_progress("frame=12", 10.0) is None
+    assert parse_progress("out_time_us=99000000", 10.0) == 1.0
+
+
+def test_video_without_ffmpeg_is_copied_and_deduplicated(tmp_path, unreadable_video):
+    source = tmp_path / "clip.MOV"
+    source.write_bytes(b"fake video")
+    copy = tmp_path / "copy.mov"
+    copy.write_bytes(b"fake video")
+    ingestor = _ingestor(tmp_path)
+    ingestor.ffmpeg = None
+
+    first = ingestor.ingest(str(source))
+    second = ingestor.ingest(str(copy))
+
+    assert Path(first.path).read_bytes() == b"fake video"
+    assert Path(first.path).suffix == ".mov"
+    assert ingestor.is_ingested(first.path)
+    assert not ingestor.is_ingested(str(source))
+    assert (first.reused, second.reused) == (False, True)
+    assert second.path == first.path
+
+
+def test_ffmpeg_stderr_does_not_block_progress_reading(tmp_path, monkeypatch):
+    # 假 ffmpeg：先寫出超過管線緩衝區的 stderr，再輸出進度後失敗
+    fake_ffmpeg = tmp_path / "ffmpeg"
+    fake_ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "sys.stderr.write('x' * 262144 + '\\nbroken input\\n')\n"
+        "sys.stderr.flush()\n"
+        "print('out_time_us=5000000', flush=True)\n"
+        "sys.exit(1)\n"
+    )
+    fake_ffmpeg.chmod(0o755)
+    monkeypatch.setattr(admedia, "video_duration", lambda path: 10.0)
+    ingestor = _ingestor(tmp_path, ffmpeg=str(fake_ffmpeg))
+    destination = tmp_path / "videos" / "out.mp4"
+    progress = []
+    errors = []
+
+    def transcode():
+        try:
+            ingestor._transcode_video("clip.mov", destination, lambda fraction, message: progress.append(fraction))
+        except RuntimeError as exc:
+            errors.append(str(exc))
+
+    thread = threading.Thread(target=transcode, daemon=True)
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert progress == [0.45]
+    assert errors and errors[0].endswith("broken input")
+    assert not destination.exists()
+
+
+@requires_pillow
+def test_image_is_downscaled_and_thumbnailed(tmp_path):
+    source = tmp_path / "big.png"
+    Image.new("RGB", (1280, 1280), (200, 10, 10)).save(source)
+    ingestor = _ingestor(tmp_path)
+
+    result = ingestor.ingest(str(source))
+
+    with Image.open(result.path) as image:
+        assert image.format == "JPEG"
+        assert image.size == (180, 180)
+    with Image.open(result.thumbnail) as thumbnail:
+        assert max(thumbnail.size) <= 96
+    assert ingestor.thumbnail_for(result.path) == result.thumbnail
+
+
+def test_worker_reports_progress_and_results(tmp_path, unreadable_video):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"video bytes")
+    ingestor = _ingestor(tmp_path)
+    ingestor.ffmpeg = None
+    worker = IngestWorker(ingestor)
+    try:
+        job = worker.submit([str(source), str(tmp_path / "notes.txt")])
+        events = []
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and (not events or events[-1][0] == "progress"):
+            events.append(worker.events.get(timeout=5))
+    finally:
+        worker.close()
+
+    assert all(event[1] == job for event in events)
+    assert any(event[0] == "progress" for event in events)
+    assert events[-1][0] == "error"
+    assert "notes.txt" in events[-1][2]
@@ -0,0 +1,157 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from adprefetch import AdPrefetcher
+
+
+class _Connection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _prefetcher(decide=None, **kwargs):
+    connections = []
+
+    def _connect():
+        connections.append(_Connection())
+        return connections[-1]
+
+    prepared = []
+    prefetcher = AdPrefetcher(
+        _connect,
+        decide or (lambda connection, member_id: ("ad", member_id)),
+        prepare=prepared.append,
+        **kwargs
+    )
+    return prefetcher, connections, prepared
+
+
+def test_commit_returns_prefetched_ad_and_prepares_media():
+    prefetcher, connections, prepared = _prefetcher()
+    try:
+        prefetcher.speculate(1, 42)
+        assert prefetcher.speculate(1, 42) is prefetcher.speculations[1]
+
+        speculation = prefetcher.commit(1, 42)
+    finally:
+        prefetcher.close()
+
+    assert speculation.result == ("ad", 42)
+    assert prepared == [("ad", 42)]
+    assert len(connections) == 1 and connections[0].closed
+    assert (prefetcher.hits, prefetcher.misses, prefetcher.discarded) == (1, 0, 0)
+
+
+def test_mismatched_identity_and_lost_tracks_are_discarded():
+    prefetcher, _, _ = _prefetcher()
+    try:
+        prefetcher.speculate(1, 42)
+        prefetcher.speculate(1, 7)  # 領先身分改變
+        prefetcher.speculate(2, 8)
+        prefetcher.retain({1})  # 軌跡 2 消失
+
+        assert prefetcher.commit(1, 99) is None
+        assert prefetcher.commit(3, 5) is None
+    finally:
+        prefetcher.close()
+
+    assert prefetcher.speculations == {}
+    assert (prefetcher.hits, prefetcher.misses, prefetcher.discarded) == (0, 2, 3)
+
+
+def test_slow_or_failed_decisions_fall_back_to_synchronous_lookup():
+    release = threading.Event()
+
+    def _decide(connection, member_id):
+        if member_id == 1:
+            release.wait(5)
+            return "late"
+        raise RuntimeError("connection lost")
+
+    prefetcher, connections, _ = _prefetcher(_decide)
+    try:
+        prefetcher.speculate(1, 1)
+        started = time.monotonic()
+        assert prefetcher.commit(1, 1) is None
+        # 不等待尚未完成的查詢
+        assert time.monotonic() - started < 0.5
+        release.set()
+
+        prefetcher.speculate(2, 2)
+        prefetcher.speculations[2].future.exception(timeout=5)
+        assert prefetcher.commit(2, 2) is None
+    finally:
+        release.set()
+        prefetcher.close()
+
+    assert prefetcher.misses == 2
+    assert connections[0].closed
+
+
+def test_running_decision_is_reused_instead_of_queued_again():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def _decide(connection, member_id):
+        calls.append(member_id)
+        started.set()
+        release.wait(5)
+        return ("ad", member_id)
+
+    prefetcher, _, _ = _prefetcher(_decide)
+    try:
+        prefetcher.speculate(1, 42)
+        assert started.wait(5)
+        running = prefetcher.speculations[1].future
+
+        # 確認時尚未完成：立即改走同步查詢，但保留執行中的查詢
+        assert prefetcher.commit(1, 42) is None
+        assert prefetcher.running == {42: running}
+
+        # 同一會員以新軌跡再次出現，沿用原本的查詢而不重新排隊
+        prefetcher.speculate(2, 42)
+        assert prefetcher.speculations[2].future is running
+        assert prefetcher.running == {}
+
+        release.set()
+        running.result(timeout=5)
+        speculation = prefetcher.commit(2, 42)
+    finally:
+        release.set()
+        prefetcher.close()
+
+    assert speculation.result == ("ad", 42)
+    assert calls == [42]
+    assert (prefetcher.hits, prefetcher.misses) == (1, 1)
+
+
+def test_running_decision_for_a_lost_track_is_reused_and_finished_ones_dropped():
+    release = threading.Event()
+    prefetcher, _, _ = _prefetcher(lambda connection, member_id: release.wait(5) and ("ad", member_id))
+    try:
+        prefetcher.speculate(1, 42)
+        prefetcher.speculate(2, 7)  # 排在 42 之後，尚未開始
+        queued = prefetcher.speculations[2].future
+        while not prefetcher.speculations[1].future.running():
+            time.sleep(0.001)
+
+        prefetcher.retain(())
+        assert queued.cancelled()
+        assert list(prefetcher.running) == [42]
+
+        release.set()
+        prefetcher.running[42].result(timeout=5)
+        prefetcher.retain(())
+        assert prefetcher.running == {}
+    finally:
+        release.set()
+        prefetcher.close()
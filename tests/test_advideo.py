@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('PIL', MagicMock())
+_install_stub('PIL.Image', MagicMock())
+_install_stub('PIL.ImageDraw', MagicMock())
+_install_stub('PIL.ImageFont', MagicMock())
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    _install_stub('numpy', ModuleType('numpy'))
+
+import advideo
+from advideo import VideoPlayback, gstreamer_pipeline
+
+
+def _playback(frames, fps=10.0):
+    playback = VideoPlayback("ad.mp4", (320, 240), queue_size=len(frames) or 1)
+    playback.fps = fps
+    for index, frame in enumerate(frames):
+        playback.frames.put((index / fps, frame))
+    return playback
+
+
+def test_gstreamer_pipeline_scales_to_screen_and_quotes_path():
+    pipeline = gstreamer_pipeline('/ads/my "ad".mp4', 1920, 1080)
+
+    assert pipeline.startswith('filesrc location="/ads/my \\"ad\\".mp4" ! decodebin')
+    assert "width=1920,height=1080,pixel-aspect-ratio=1/1" in pipeline
+    assert pipeline.endswith("sync=false")
+
+
+def test_gstreamer_available_reads_build_information(monkeypatch):
+    fake_cv2 = MagicMock()
+    fake_cv2.getBuildInformation.return_value = "  Video I/O:\n    GStreamer:                   YES (1.18.4)\n"
+    monkeypatch.setattr(advideo, "cv2", fake_cv2)
+    monkeypatch.setattr(advideo, "_GSTREAMER_AVAILABLE", None)
+
+    assert advideo.gstreamer_available() is True
+
+
+def test_next_frame_waits_for_presentation_time():
+    playback = _playback(["f0", "f1"])
+
+    assert playback.next_frame(now=100.0) == "f0"
+    assert playback.next_frame(now=100.05) is None
+    assert playback.next_frame(now=100.1) == "f1"
+    assert (playback.shown, playback.dropped) == (2, 0)
+
+
+def test_next_frame_drops_late_frames_but_keeps_latest():
+    playback = _playback(["f0", "f1", "f2", "f3"])
+
+    assert playback.next_frame(now=0.0) == "f0"
+    # 主迴圈停頓 0.35 秒：f1、f2 已落後超過一個影格間隔
+    assert playback.next_frame(now=0.35) == "f3"
+    assert (playback.shown, playback.dropped) == (2, 2)
+
+
+def test_late_frame_is_shown_when_queue_is_empty():
+    playback = _playback(["f0", "f1"])
+
+    assert playback.next_frame(now=0.0) == "f0"
+    assert playback.next_frame(now=1.0) == "f1"
+    assert playback.dropped == 0
+    assert playback.next_frame(now=1.1) is None
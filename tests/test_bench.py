@@ -0,0 +1,78 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('face_recognition', MagicMock())
+numpy_module = ModuleType('numpy')
+numpy_module.bool_ = bool
+numpy_module.isscalar = lambda value: isinstance(value, (int, float, bool))
+_install_stub('numpy', numpy_module)
+
+pil_package = ModuleType('PIL')
+pil_package.Image = MagicMock()
+pil_package.ImageTk = MagicMock()
+_install_stub('PIL', pil_package)
+_install_stub('PIL.Image', pil_package.Image)
+_install_stub('PIL.ImageTk', pil_package.ImageTk)
+_install_stub('tkinter', MagicMock())
+_install_stub('tkinter.ttk', MagicMock())
+
+from bench.recognition_bench import bench_log_attendance, measure, percentile
+from bench.synthetic import attendance_sqlite
+from rollcall_edge import AttendanceRecord, DatabaseManager
+
+
+def test_measure_keeps_one_sample_per_repeat():
+    calls = []
+
+    def run_once():
+        calls.append(1)
+        return 10, [0.001] * 9 + [0.010]
+
+    result = measure("match.batched", 1000, "queries/s", 3, run_once)
+
+    assert len(calls) == 3
+    assert result.key == "match.batched/1000"
+    assert len(result.throughput) == 3
+    assert result.p50_ms == [1.0, 1.0, 1.0]
+    assert result.p95_ms == [10.0, 10.0, 10.0]
+    assert set(result.to_dict()) >= {"throughput", "p95_ms", "peak_rss_mb", "unit"}
+
+
+def test_percentile_nearest_rank():
+    assert percentile([3.0, 1.0, 2.0, 4.0], 50) == 2.0
+    assert percentile([3.0, 1.0, 2.0, 4.0], 95) == 4.0
+    assert percentile([], 95) == 0.0
+
+
+def test_log_attendance_writes_to_sqlite_stand_in(tmp_path):
+    manager = DatabaseManager({"device": {"id": "door1"}})
+    manager.connection = attendance_sqlite(str(tmp_path / "attendance.sqlite3"))
+    manager.log_attendance(
+        AttendanceRecord(name="Alice", confidence=0.9, timestamp=datetime(2024, 1, 1), member_id=7)
+    )
+
+    cursor = manager.connection.cursor()
+    cursor.execute("SELECT member_id, name, status, device_id FROM attendance_log")
+    assert cursor.fetchall() == [(7, "Alice", "present", "door1")]
+
+
+def test_log_attendance_benchmark_reports_rows(tmp_path):
+    result = bench_log_attendance(tmp_path, records=20, repeat=2)
+
+    assert result.skipped is None
+    assert result.key == "db.log_attendance/0"
+    assert len(result.throughput) == 2
+    assert all(value > 0 for value in result.throughput)
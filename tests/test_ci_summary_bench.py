@@ -0,0 +1,108 @@
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _load_ci_summary():
+    spec = importlib.util.spec_from_file_location("ci_summary", PROJECT_ROOT / "git" / "tests" / "ci_summary.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run(throughput, p95_ms, rss):
+    return {
+        "schema": 1,
+        "peak_rss_mb": rss,
+        "benchmarks": {
+            "match.batched/1000": {"throughput": throughput, "p95_ms": p95_ms},
+            "match.hnsw/1000": {"skipped": "hnswlib not installed", "throughput": [], "p95_ms": []},
+        },
+    }
+
+
+def _status(rows, metric):
+    return {row["metric"]: row["status"] for row in rows}[metric]
+
+
+def test_noise_within_tolerance_is_not_a_regression():
+    ci_summary = _load_ci_summary()
+    baseline = [_run([1000, 1010, 990, 1005, 995], [2.0, 2.1, 1.9, 2.0, 2.05], 120.0)]
+    current = [_run([995, 1003, 985, 1012, 990], [2.02, 2.1, 1.95, 2.0, 2.0], 121.0)]
+
+    rows = ci_summary.compare_bench(baseline, current)
+
+    assert {row["benchmark"] for row in rows} == {"match.batched/1000", "process"}
+    assert all(row["status"] == "ok" for row in rows)
+
+
+def test_significant_slowdown_fails_gate():
+    ci_summary = _load_ci_summary()
+    baseline = [_run([1000, 1010, 990, 1005, 995], [2.0, 2.1, 1.9, 2.0, 2.05], 120.0)]
+    current = [
+        _run([700, 710, 690, 705, 695], [3.0, 3.1, 2.9, 3.0, 3.05], 150.0),
+        _run([702, 698, 711, 689, 700], [3.0, 3.0, 2.95, 3.1, 3.0], 151.0),
+    ]
+
+    rows = ci_summary.compare_bench(baseline, current)
+
+    assert _status(rows, "throughput") == "regressed"
+    assert _status(rows, "p95_ms") == "regressed"
+    assert _status(rows, "peak_rss_mb") == "regressed"
+    table = ci_summary.bench_diff_md(rows)
+    assert "| match.batched/1000 | throughput |" in table
+    assert "-30.0%" in table
+
+
+def test_speedup_reported_as_improvement():
+    ci_summary = _load_ci_summary()
+    baseline = [_run([1000, 1010, 990], [2.0, 2.1, 1.9], 120.0)]
+    current = [_run([1500, 1490, 1510], [1.0, 1.1, 0.9], 120.0)]
+
+    rows = ci_summary.compare_bench(baseline, current)
+
+    assert _status(rows, "throughput") == "improved"
+    assert _status(rows, "p95_ms") == "improved"
+
+
+def test_peak_rss_uses_fixed_tolerance_instead_of_bootstrap():
+    ci_summary = _load_ci_summary()
+    baseline = [_run([1000, 1010, 990], [2.0, 2.1, 1.9], 120.0)]
+
+    within = ci_summary.compare_bench(baseline, [_run([1000, 1010, 990], [2.0, 2.1, 1.9], 130.0)])
+    over = ci_summary.compare_bench(baseline, [_run([1000, 1010, 990], [2.0, 2.1, 1.9], 135.0)])
+
+    rss = {row["metric"]: row for row in over}["peak_rss_mb"]
+    assert _status(within, "peak_rss_mb") == "ok"
+    assert rss["status"] == "regressed"
+    assert rss["ci"] is None
+    assert "n/a (±10%)" in ci_summary.bench_diff_md(over)
+    # throughput 仍以 bootstrap 信賴區間判定
+    assert {row["metric"]: row for row in over}["throughput"]["ci"] is not None
+
+
+def test_missing_baseline_fails_the_gate(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("GITHUB_STEP_SUMMARY", raising=False)
+    monkeypatch.delenv("BENCH_RESULTS", raising=False)
+    monkeypatch.delenv("BENCH_ALLOW_MISSING_BASELINE", raising=False)
+    monkeypatch.setenv("BENCH_BASELINE", str(tmp_path / "bench" / "baseline*.json"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    (tmp_path / "logs" / "bench.json").write_text(json.dumps(_run([1000], [2.0], 120.0)), encoding="utf-8")
+    ci_summary = _load_ci_summary()
+
+    with pytest.raises(SystemExit) as excinfo:
+        ci_summary.main()
+
+    captured = capsys.readouterr()
+    assert excinfo.value.code == 1
+    assert "Benchmark baseline missing" in captured.err
+    assert "FAILED GATES" in captured.out
+
+    monkeypatch.setenv("BENCH_ALLOW_MISSING_BASELINE", "1")
+    ci_summary.main()
+    assert "Benchmark baseline missing" in capsys.readouterr().err
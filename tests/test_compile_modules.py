@@ -10,6 +10,27 @@ MODULES = [
     "face_recognition_ad_system.py",
     "face_register.py",
     "ad_manager.py",
+    "facevideo.py",
+    "facebatch.py",
+    "facegallery.py",
+    "faceprof.py",
+    "facemetrics.py",
+    "bench/synthetic.py",
+    "bench/recognition_bench.py",
+    "bench/template_bench.py",
+    "framerec.py",
+    "framepool.py",
+    "facecrop.py",
+    "facequality.py",
+    "facetrack.py",
+    "faceunknown.py",
+    "faceencodings.py",
+    "adlog.py",
+    "logpartition.py",
+    "addisplay.py",
+    "advideo.py",
+    "admedia.py",
+    "adprefetch.py",
 ]
 
 
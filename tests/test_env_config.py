@@ -33,9 +33,13 @@ pil_image = MagicMock()
 pil_imagetk = MagicMock()
 pil_package.Image = pil_image
 pil_package.ImageTk = pil_imagetk
+pil_package.ImageDraw = MagicMock()
+pil_package.ImageFont = MagicMock()
 _install_stub('PIL', pil_package)
 _install_stub('PIL.Image', pil_image)
 _install_stub('PIL.ImageTk', pil_imagetk)
+_install_stub('PIL.ImageDraw', pil_package.ImageDraw)
+_install_stub('PIL.ImageFont', pil_package.ImageFont)
 
 tk_module = MagicMock()
 ttk_module = MagicMock()
@@ -126,3 +130,22 @@ FACE_AD_CAMERA_SOURCE=/dev/video1
     )
 
     assert system.config["camera"]["source"] == "/dev/video1"
+
+
+def test_tracking_env_overrides_build_tracker(monkeypatch, tmp_path):
+    system, _ = _build_system(
+        monkeypatch,
+        tmp_path,
+        """
+FACE_AD_TRACK_VOTES=2
+FACE_AD_TRACK_WINDOW=4
+FACE_AD_TRACK_IOU=0.5
+FACE_AD_TRACK_MAX_AGE=invalid
+"""
+    )
+
+    assert system.config["tracking"] == {"votes": 2, "window": 4, "iou": 0.5, "max_age": 1.0}
+    assert system.tracker.votes == 2
+    assert system.tracker.window == 4
+    assert system.tracker.iou_threshold == pytest.approx(0.5)
+    assert system.tracker.max_age == pytest.approx(1.0)
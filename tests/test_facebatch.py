@@ -0,0 +1,120 @@
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_HAS_DLIB = importlib.util.find_spec('dlib') is not None
+try:
+    import face_recognition  # noqa: F401
+except ImportError:
+    _HAS_DLIB = False
+    _install_stub('face_recognition', MagicMock())
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    _HAS_DLIB = False
+    _install_stub('numpy', ModuleType('numpy'))
+
+from facebatch import BatchFaceDetector, benchmark
+
+
+class FakeImage:
+    def __init__(self, ident: int, shape=(48, 64, 3)):
+        self.ident = ident
+        self.shape = shape
+
+
+def _fake_batch(images):
+    return [[(image.ident, image.ident + 1, image.ident + 2, image.ident + 3)] for image in images]
+
+
+def test_detect_many_splits_into_fixed_size_batches():
+    calls = []
+
+    def detect(images):
+        calls.append(len(images))
+        return _fake_batch(images)
+
+    detector = BatchFaceDetector(batch_size=4, detect_batch=detect)
+    results = detector.detect_many([FakeImage(i) for i in range(10)])
+
+    assert calls == [4, 4, 2]
+    assert [result[0][0] for result in results] == list(range(10))
+    assert detector.stats.mean_batch_size == 10 / 3
+
+
+def test_async_results_dispatched_back_to_sources():
+    detector = BatchFaceDetector(batch_size=4, max_wait=0.5, detect_batch=_fake_batch)
+    futures = {}
+    lock = threading.Lock()
+
+    def camera(source, offset):
+        for index in range(4):
+            future = detector.submit(FakeImage(offset + index), source=source)
+            with lock:
+                futures[(source, offset + index)] = future
+
+    with detector:
+        threads = [threading.Thread(target=camera, args=(f"cam{n}", n * 100)) for n in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for (source, ident), future in futures.items():
+            assert future.result(timeout=2)[0][0] == ident
+
+    assert detector.stats.images == 8
+    assert detector.stats.per_source == {"cam0": 4, "cam1": 4}
+
+
+def test_partial_batch_flushed_after_deadline():
+    detector = BatchFaceDetector(batch_size=8, max_wait=0.02, detect_batch=_fake_batch)
+    with detector:
+        future = detector.submit(FakeImage(7), source="cam0")
+        assert future.result(timeout=2) == [(7, 8, 9, 10)]
+    assert detector.stats.deadline_flushes == 1
+
+
+def test_benchmark_reports_throughput_and_mismatches():
+    # 替身只驗證回傳格式，不代表實際 CPU 上的效能
+    def detect_single(image):
+        return [(image.ident, 1, 1, 0)] if image.ident != 3 else []
+
+    def detect_batch(images):
+        return [[(image.ident, 1, 1, 0)] for image in images]
+
+    images = [FakeImage(i) for i in range(6)]
+    result = benchmark(images, batch_size=4, repeat=2, detect_single=detect_single, detect_batch=detect_batch)
+
+    assert set(result) == {"images", "batch_size", "per_frame_fps", "batched_fps", "speedup", "mismatched_images"}
+    assert result["images"] == 12
+    assert result["batch_size"] == 4
+    assert result["per_frame_fps"] > 0 and result["batched_fps"] > 0
+    assert result["mismatched_images"] == 1
+
+
+@pytest.mark.skipif(not _HAS_DLIB, reason="需要 face_recognition 與 dlib")
+def test_cnn_batched_and_per_frame_paths_agree_on_cpu():
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, size=(96, 128, 3), dtype=np.uint8) for _ in range(4)]
+    images[1][24:72, 40:88] = 200
+
+    result = benchmark(images, batch_size=4)
+
+    assert result["images"] == 4
+    assert result["mismatched_images"] == 0
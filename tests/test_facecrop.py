@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('face_recognition', MagicMock())
+_install_stub('numpy', ModuleType('numpy'))
+
+import facecrop
+from facecrop import crop_bounds, encode_crops, scale_location
+
+
+def test_scale_location_maps_back_to_full_resolution_and_clamps():
+    assert scale_location((10, 50, 40, 20), 0.25, (480, 640, 3)) == (40, 200, 160, 80)
+    assert scale_location((100, 170, 130, 150), 0.25, (480, 640, 3)) == (400, 640, 480, 600)
+
+
+def test_crop_bounds_adds_margin_inside_frame():
+    assert crop_bounds((100, 200, 180, 120), (480, 640, 3), margin=0.25) == (80, 220, 200, 100)
+    assert crop_bounds((0, 640, 60, 600), (480, 640, 3), margin=0.5) == (0, 640, 90, 580)
+
+
+def test_encode_crops_passes_location_relative_to_crop(monkeypatch):
+    recognizer = MagicMock()
+    recognizer.face_encodings.side_effect = lambda image, locations: ["encoding"]
+    monkeypatch.setattr(facecrop, "face_recognition", recognizer)
+    frame = MagicMock()
+    frame.shape = (480, 640, 3)
+
+    encodings = encode_crops(frame, [(100, 200, 180, 120)], margin=0.25)
+
+    assert encodings == ["encoding"]
+    frame.__getitem__.assert_called_once_with((slice(80, 200), slice(100, 220)))
+    assert recognizer.face_encodings.call_args[0][1] == [(20, 100, 100, 20)]
@@ -0,0 +1,254 @@
+import json
+import sys
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+try:
+    import numpy as np
+except ImportError:
+    np = ModuleType('numpy')
+    _install_stub('numpy', np)
+
+import faceencodings
+from faceencodings import (
+    ENCODING_BYTES,
+    GalleryChanges,
+    GallerySync,
+    _parse_json_encoding,
+    apply_gallery_changes,
+    load_gallery,
+    migrate_json_encodings,
+    pack_encoding,
+)
+
+requires_numpy = pytest.mark.skipif(not hasattr(np, "frombuffer"), reason="需要 numpy")
+
+
+class _FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.batches = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def executemany(self, query, rows):
+        self.batches.append((query, list(rows)))
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.cursors = []
+        self.rows = rows
+        self.commits = 0
+
+    def cursor(self):
+        cursor = _FakeCursor(self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_parse_json_encoding_rejects_placeholders():
+    assert _parse_json_encoding("encoded_face_id_1") is None
+    assert _parse_json_encoding(json.dumps([0.1, 0.2])) is None
+    assert _parse_json_encoding(None) is None
+    assert len(_parse_json_encoding(json.dumps([0.0] * 128))) == 128
+
+
+@requires_numpy
+def test_migrate_converts_json_rows_and_skips_invalid(monkeypatch):
+    monkeypatch.setattr(faceencodings, "ensure_table", lambda connection: None)
+    valid = json.dumps([0.5] * 128)
+    connection = _FakeConnection([(1, valid), (2, "encoded_face_id_2"), (3, valid)])
+
+    migrated, skipped = migrate_json_encodings(connection, batch_size=1, clear_json=True)
+
+    assert (migrated, skipped) == (2, 1)
+    writer = connection.cursors[-1]
+    inserts = [rows for query, rows in writer.batches if query.startswith("INSERT")]
+    clears = [rows for query, rows in writer.batches if query.startswith("UPDATE")]
+    assert [row[0] for batch in inserts for row in batch] == [1, 3]
+    assert all(len(row[2]) == ENCODING_BYTES for batch in inserts for row in batch)
+    assert clears == [[(1,)], [(3,)]]
+    assert connection.commits == 2
+
+
+class _ScriptedConnection:
+    """依查詢開頭回傳預先排好的結果。"""
+
+    def __init__(self):
+        self.responses = {}
+        self.queries = []
+
+    def cursor(self, buffered=True):
+        connection = self
+
+        class _Cursor:
+            def execute(self, query, params=None):
+                connection.queries.append((query, params, buffered))
+                self.rows = list(next(rows for prefix, rows in connection.responses.items() if query.startswith(prefix)))
+
+            def fetchall(self):
+                rows, self.rows = self.rows, []
+                return rows
+
+            def fetchmany(self, size):
+                rows, self.rows = self.rows[:size], self.rows[size:]
+                return rows
+
+            def close(self):
+                pass
+
+        return _Cursor()
+
+    def commit(self):
+        pass
+
+
+@requires_numpy
+def test_load_gallery_streams_chunks_into_one_matrix():
+    first = np.linspace(-1, 1, 128)
+    second = np.linspace(1, -1, 128)
+    connection = _ScriptedConnection()
+    connection.responses = {
+        # 計數後又新增一筆，矩陣需擴充
+        "SELECT COUNT(*)": [(2,)],
+        "SELECT m.member_id, m.name, e.encoding": [
+            (1, "Alex", pack_encoding(first)),
+            (1, "Alex", pack_encoding(second)),
+            (2, "Bella", pack_encoding(second)),
+        ],
+    }
+
+    encodings, names, member_ids = load_gallery(connection, "dlib_resnet_v1", fetch_size=2)
+
+    assert encodings.shape == (3, 128)
+    assert encodings.dtype == np.float32
+    assert np.allclose(encodings[0], first, atol=1e-6)
+    assert np.allclose(encodings[2], second, atol=1e-6)
+    assert names == ["Alex", "Alex", "Bella"]
+    assert member_ids == [1, 1, 2]
+    assert connection.queries[-1][1:] == (("dlib_resnet_v1",), False)
+
+
+@requires_numpy
+def test_load_gallery_trims_when_fewer_rows_arrive():
+    connection = _ScriptedConnection()
+    connection.responses = {
+        "SELECT COUNT(*)": [(5,)],
+        "SELECT m.member_id, m.name, e.encoding": [(1, "Alex", pack_encoding(np.ones(128)))],
+    }
+
+    encodings, names, _ = load_gallery(connection)
+
+    assert encodings.shape == (1, 128)
+    assert names == ["Alex"]
+
+
+def test_apply_gallery_changes_replaces_affected_members():
+    changes = GalleryChanges(upserts={2: ("Bella Lin", ["b2", "b3"]), 4: ("Dana", ["d1"])}, removed={3})
+
+    encodings, names, member_ids = apply_gallery_changes(
+        ["a1", "b1", "c1"], ["Alex", "Bella", "Charlie"], [1, 2, 3], changes
+    )
+
+    assert encodings == ["a1", "b2", "b3", "d1"]
+    assert names == ["Alex", "Bella Lin", "Bella Lin", "Dana"]
+    assert member_ids == [1, 2, 2, 4]
+    assert changes.affected == {2, 3, 4}
+    assert not GalleryChanges()
+
+
+@requires_numpy
+def test_gallery_sync_polls_members_and_encodings_by_watermark():
+    connection = _ScriptedConnection()
+    blob = pack_encoding(np.zeros(128))
+    connection.responses = {
+        "SELECT MAX(updated_at)": [(100,)],
+        "SELECT COALESCE(MAX(encoding_id)": [(10,)],
+        "SELECT COUNT(*)": [(1,)],
+        "SELECT m.member_id, m.name, e.encoding": [(1, "Alex", blob)],
+    }
+    sync = GallerySync(connection, overlap_seconds=30, encoding_id_overlap=5)
+    sync.load()
+    assert (sync.member_watermark, sync.encoding_watermark) == (100, 10)
+
+    connection.responses = {
+        "SELECT MAX(updated_at)": [(105,)],
+        "SELECT COALESCE(MAX(encoding_id)": [(12,)],
+        "SELECT member_id, is_active, updated_at": [(2, 0, 103), (5, 1, 105)],
+        "SELECT encoding_id, member_id": [(11, 1), (12, 2)],
+        "SELECT m.member_id, m.name, e.encoding": [(1, "Alex", blob), (1, "Alex", blob), (5, "Eve", blob)],
+    }
+    changes = sync.poll()
+
+    assert changes.removed == {2}
+    assert {member_id: len(matrix) for member_id, (_, matrix) in changes.upserts.items()} == {1: 2, 5: 1}
+    # 往回重查：時間水位減去重查秒數、編碼編號減去重查個數
+    member_query, member_params, _ = connection.queries[-3]
+    assert "updated_at >= %s - INTERVAL %s SECOND" in member_query
+    assert member_params == (100, 30.0)
+    assert connection.queries[-2][1] == (5, "dlib_resnet_v1")
+    assert (sync.member_watermark, sync.encoding_watermark) == (105, 12)
+
+    # 重查範圍內已處理過的列不再重複回報
+    assert not sync.poll()
+    assert connection.queries[-1][1] == (7, "dlib_resnet_v1")
+
+
+@requires_numpy
+def test_gallery_sync_picks_up_late_committed_changes():
+    connection = _ScriptedConnection()
+    blob = pack_encoding(np.zeros(128))
+    connection.responses = {
+        "SELECT MAX(updated_at)": [(100,)],
+        "SELECT COALESCE(MAX(encoding_id)": [(10,)],
+        "SELECT COUNT(*)": [(0,)],
+        "SELECT m.member_id, m.name, e.encoding": [],
+    }
+    sync = GallerySync(connection)
+    sync.load()
+
+    # 會員 5 於 110 改名並提交；會員 3 的停用在 108 執行、尚未提交
+    connection.responses.update({
+        "SELECT MAX(updated_at)": [(110,)],
+        "SELECT COALESCE(MAX(encoding_id)": [(12,)],
+        "SELECT member_id, is_active, updated_at": [(5, 1, 110)],
+        "SELECT encoding_id, member_id": [(12, 5)],
+        "SELECT m.member_id, m.name, e.encoding": [(5, "Eve", blob)],
+    })
+    assert set(sync.poll().upserts) == {5}
+    assert sync.member_watermark == 110
+
+    # 停用與編號 11 的編碼晚於水位才提交，時間戳記與編號都落在水位之前
+    connection.responses.update({
+        "SELECT member_id, is_active, updated_at": [(3, 0, 108), (5, 1, 110)],
+        "SELECT encoding_id, member_id": [(11, 7), (12, 5)],
+        "SELECT m.member_id, m.name, e.encoding": [(7, "Kai", blob)],
+    })
+    changes = sync.poll()
+
+    assert changes.removed == {3}
+    assert set(changes.upserts) == {7}
+    assert sync.member_watermark == 110
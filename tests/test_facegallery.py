@@ -0,0 +1,216 @@
+import logging
+import os
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('face_recognition', MagicMock())
+try:
+    import numpy as np
+except ImportError:
+    np = ModuleType('numpy')
+    _install_stub('numpy', np)
+
+from facegallery import (
+    HEADER,
+    GalleryPublisher,
+    SharedGallery,
+    TemplateGallery,
+    farthest_point_sample,
+    format_report,
+    template_report,
+)
+
+pytestmark = pytest.mark.skipif(not hasattr(np, "linalg"), reason="需要 numpy")
+
+
+def _gallery(identities=12, seed=0):
+    """每人 1～9 張照片；同一人樣本距離約 0.35，不同人約 1.0。"""
+
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(identities, 128))
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True) / np.sqrt(0.5)
+    counts = [1 + index % 9 for index in range(identities)]
+    encodings = np.repeat(centres, counts, axis=0)
+    encodings += rng.normal(scale=0.35 / np.sqrt(256), size=encodings.shape)
+    labels = [f"person_{index}" for index, count in enumerate(counts) for _ in range(count)]
+    return encodings.astype(np.float32), labels, centres.astype(np.float32)
+
+
+def test_farthest_point_sample_is_deterministic_and_capped():
+    vectors = np.random.default_rng(3).normal(size=(40, 8))
+
+    first = farthest_point_sample(vectors, 5, start=7)
+
+    assert first == farthest_point_sample(vectors, 5, start=7)
+    assert len(first) == 5
+    assert first[0] == 7
+    assert len(set(first)) == 5
+    assert sorted(farthest_point_sample(vectors[:3], 5)) == [0, 1, 2]
+
+
+def test_farthest_point_sample_stops_on_duplicates():
+    vectors = np.zeros((4, 8))
+
+    assert farthest_point_sample(vectors, 3) == [0]
+
+
+def test_farthest_point_sample_picks_the_outlier_second():
+    vectors = np.array([[0.0, 0.0], [0.1, 0.0], [5.0, 0.0], [0.0, 0.2]])
+
+    assert farthest_point_sample(vectors, 2) == [0, 2]
+
+
+def test_templates_keep_at_least_one_exemplar_per_member():
+    encodings, labels, _ = _gallery()
+
+    templates = TemplateGallery(max_exemplars=3).build(encodings, labels)
+
+    assert templates.labels == list(dict.fromkeys(labels))
+    sizes = np.diff(templates._offsets)
+    assert sizes.min() >= 1
+    assert sizes.max() <= 3
+    assert len(templates.exemplars) == sizes.sum()
+    assert templates.rows_per_query < len(encodings)
+
+
+@pytest.mark.parametrize("centroid", ["mean", "medoid"])
+def test_template_match_agrees_with_full_gallery(centroid):
+    encodings, labels, centres = _gallery()
+    templates = TemplateGallery(max_exemplars=3, shortlist=2, centroid=centroid).build(encodings, labels)
+    rng = np.random.default_rng(9)
+    queries = centres + rng.normal(scale=0.35 / np.sqrt(256), size=centres.shape).astype(np.float32)
+
+    for query in queries:
+        distances = np.linalg.norm(encodings - query, axis=1)
+        expected = labels[int(np.argmin(distances))]
+        label, distance = templates.match(query)
+        assert label == expected
+        # 代表樣本是全量資料的子集，距離不會比全量比對更近
+        assert distance >= float(distances.min()) - 1e-6
+        assert distance <= 0.6
+
+
+def test_empty_templates_match_nothing():
+    templates = TemplateGallery().build([], [])
+
+    assert templates.match(np.zeros(128, dtype=np.float32)) == (None, 1.0)
+    assert templates.rows_per_query == 0.0
+
+
+def test_template_report_holds_out_one_photo_per_multi_photo_member():
+    encodings, labels, _ = _gallery()
+    multi_photo = sum(1 for label in set(labels) if labels.count(label) > 1)
+
+    report = template_report(encodings, labels, max_exemplars=3, repeat=1)
+
+    assert set(report) == {"full", "templates"}
+    assert report["full"]["queries"] == multi_photo
+    assert report["full"]["rows_per_query"] == len(labels) - multi_photo
+    assert report["templates"]["rows_per_query"] < report["full"]["rows_per_query"]
+    assert report["full"]["recall"] == 1.0
+    assert report["templates"]["recall"] == 1.0
+
+    table = format_report(report).splitlines()
+    assert table[0] == "| method | rows/query | recall@tol | queries/s |"
+    assert table[2].startswith(f"| full | {len(labels) - multi_photo:.1f} | 1.000 |")
+    assert table[3].startswith("| templates |")
+
+
+def test_template_report_needs_a_multi_photo_member():
+    encodings, labels, _ = _gallery(identities=1)
+
+    with pytest.raises(ValueError):
+        template_report(encodings, labels)
+
+
+# ----------------------------------------------------------------------
+# 共用映射檔
+# ----------------------------------------------------------------------
+
+def test_publish_then_attach(tmp_path):
+    encodings, labels, _ = _gallery(identities=3)
+    path = tmp_path / "gallery.bin"
+
+    generation = GalleryPublisher(path).publish(list(encodings), labels)
+    gallery = SharedGallery(path)
+
+    assert generation == 1
+    assert gallery.attach()
+    assert gallery.generation == 1
+    assert gallery.labels == labels
+    assert np.array_equal(gallery.encodings, encodings)
+
+
+def test_attach_missing_file_returns_false(tmp_path):
+    assert not SharedGallery(tmp_path / "missing.bin").attach()
+
+
+def test_refresh_picks_up_a_republished_generation(tmp_path):
+    encodings, labels, _ = _gallery(identities=3)
+    path = tmp_path / "gallery.bin"
+    publisher = GalleryPublisher(path)
+    publisher.publish(list(encodings), labels)
+    gallery = SharedGallery(path, check_interval=0.0)
+    gallery.attach()
+    old_encodings = gallery.encodings
+
+    assert not gallery.refresh()
+    publisher.publish(list(encodings[:2]), labels[:2])
+
+    assert gallery.refresh()
+    assert gallery.generation == 2
+    assert gallery.labels == labels[:2]
+    assert np.array_equal(gallery.encodings, encodings[:2])
+    # 舊世代的陣列仍可讀取
+    assert np.array_equal(old_encodings, encodings)
+
+
+def _corrupt(path, keep):
+    raw = path.read_bytes()
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(raw[:keep])
+    os.replace(tmp, path)
+
+
+@pytest.mark.parametrize("keep", [HEADER.size - 1, HEADER.size + 64, -5])
+def test_corrupt_generation_keeps_the_current_gallery(tmp_path, caplog, keep):
+    encodings, labels, _ = _gallery(identities=3)
+    path = tmp_path / "gallery.bin"
+    publisher = GalleryPublisher(path)
+    publisher.publish(list(encodings), labels)
+    gallery = SharedGallery(path, check_interval=0.0)
+    gallery.attach()
+    publisher.publish(list(encodings[:1]), labels[:1])
+    _corrupt(path, keep)
+
+    with caplog.at_level(logging.WARNING, logger="facegallery"):
+        assert not gallery.refresh()
+
+    assert gallery.generation == 1
+    assert gallery.labels == labels
+    assert np.array_equal(gallery.encodings, encodings)
+    assert any("沿用世代 1" in record.getMessage() for record in caplog.records)
+
+    # 同一個損毀檔案不會在每次檢查時重複警告
+    caplog.clear()
+    assert not gallery.refresh()
+    assert not caplog.records
+
+    # 修復後重新發佈即可載入
+    publisher.publish(list(encodings[:1]), labels[:1])
+    gallery.refresh()
+    assert gallery.labels == labels[:1]
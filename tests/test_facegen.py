@@ -0,0 +1,142 @@
+import logging
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('face_recognition', MagicMock())
+_install_stub('numpy', ModuleType('numpy'))
+
+import facebatch
+import facegen
+from facegen import FaceEncodingGenerator
+
+
+class FakeImage:
+    def __init__(self, name: str, shape):
+        self.name = name
+        self.shape = shape
+
+
+class FakeEncoding:
+    def __init__(self, name: str):
+        self.name = name
+
+    def tolist(self):
+        return [self.name]
+
+
+def _dataset(tmp_path, sizes):
+    person = tmp_path / "alice"
+    person.mkdir()
+    for name in sizes:
+        (person / f"{name}.jpg").write_bytes(b"")
+    return tmp_path
+
+
+@pytest.fixture
+def fake_recognition(monkeypatch):
+    """依檔名決定圖片尺寸；``broken`` 開頭的檔案無法讀取。"""
+
+    fake = MagicMock()
+    batches = []
+
+    def load_image_file(path):
+        stem = Path(path).stem
+        if stem.startswith("broken"):
+            raise OSError("cannot identify image file")
+        return FakeImage(stem, sizes[stem])
+
+    def batch_face_locations(images, number_of_times_to_upsample=1, batch_size=128):
+        batches.append([(image.name, image.shape) for image in images])
+        return [[(0, 10, 10, 0)] for _ in images]
+
+    fake.load_image_file.side_effect = load_image_file
+    fake.batch_face_locations.side_effect = batch_face_locations
+    fake.face_encodings.side_effect = lambda image, known_face_locations, num_jitters: [FakeEncoding(image.name)]
+    monkeypatch.setattr(facegen, "face_recognition", fake)
+    monkeypatch.setattr(facebatch, "face_recognition", fake)
+    sizes = {}
+    return sizes, batches
+
+
+def test_batches_only_group_same_sized_images(tmp_path, fake_recognition):
+    sizes, batches = fake_recognition
+    sizes.update({
+        "a1": (480, 640, 3),
+        "b1": (1080, 1920, 3),
+        "a2": (480, 640, 3),
+        "b2": (1080, 1920, 3),
+        "c1": (300, 300, 3),
+    })
+    directory = _dataset(tmp_path, sizes)
+
+    generator = FaceEncodingGenerator(model="cnn", batch_size=2)
+    records = list(generator.process_directory(directory))
+
+    assert sorted(record.encoding[0] for record in records) == sorted(sizes)
+    assert {record.label for record in records} == {"alice"}
+    for batch in batches:
+        assert len({shape for _, shape in batch}) == 1
+    assert sorted(len(batch) for batch in batches) == [1, 2, 2]
+
+
+def test_pending_images_are_bounded(tmp_path, fake_recognition, monkeypatch):
+    sizes, batches = fake_recognition
+    sizes.update({f"img{index}": (100 + index, 100, 3) for index in range(6)})
+    directory = _dataset(tmp_path, sizes)
+    monkeypatch.setattr(facegen, "PENDING_BATCHES", 1)
+
+    records = FaceEncodingGenerator(model="cnn", batch_size=2).process_directory(directory)
+
+    next(records)
+    # 暫存超過 2 張時就先送出，不必等所有圖片讀完
+    assert facegen.face_recognition.load_image_file.call_count == 3
+    assert len(list(records)) == 5
+    assert len(batches) == 6
+
+
+def test_unreadable_image_is_logged_and_skipped(tmp_path, fake_recognition, caplog):
+    sizes, batches = fake_recognition
+    sizes.update({"a1": (480, 640, 3), "a2": (480, 640, 3)})
+    directory = _dataset(tmp_path, list(sizes) + ["broken"])
+
+    with caplog.at_level(logging.WARNING, logger="facegen"):
+        records = list(FaceEncodingGenerator(model="cnn", batch_size=4).process_directory(directory))
+
+    assert sorted(record.encoding[0] for record in records) == ["a1", "a2"]
+    assert any("broken.jpg" in record.getMessage() for record in caplog.records)
+
+
+def test_failed_batch_falls_back_to_single_images(tmp_path, fake_recognition, caplog):
+    sizes, _ = fake_recognition
+    sizes.update({"a1": (480, 640, 3), "a2": (480, 640, 3), "a3": (480, 640, 3)})
+    directory = _dataset(tmp_path, sizes)
+
+    def batch_face_locations(images, number_of_times_to_upsample=1, batch_size=128):
+        if len(images) > 1:
+            raise RuntimeError("out of memory")
+        if images[0].name == "a2":
+            raise RuntimeError("corrupt image")
+        return [[(0, 10, 10, 0)]]
+
+    facebatch.face_recognition.batch_face_locations.side_effect = batch_face_locations
+
+    with caplog.at_level(logging.WARNING, logger="facegen"):
+        records = list(FaceEncodingGenerator(model="cnn", batch_size=3).process_directory(directory))
+
+    assert sorted(record.encoding[0] for record in records) == ["a1", "a3"]
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("改為逐張偵測" in message for message in messages)
+    assert any("a2.jpg" in message for message in messages)
@@ -0,0 +1,90 @@
+import sys
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from facemetrics import MetricsRegistry, STAGE_LATENCY, _Metric, parse_throttled, start_metrics_server
+from faceprof import Profiler
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    frames = registry.counter("frames_total", "frames", ("device",))
+    temperature = registry.gauge("soc_temp", "temperature")
+    latency = registry.histogram("latency_seconds", "latency", ("stage",), buckets=(0.01, 0.1))
+
+    frames.inc(device="cam0")
+    frames.inc(2, device="cam0")
+    temperature.set_function(lambda: 51.5)
+    for value in (0.005, 0.05, 0.5):
+        latency.observe(value, stage="detect")
+
+    text = registry.render()
+
+    assert "# TYPE frames_total counter" in text
+    assert 'frames_total{device="cam0"} 3' in text
+    assert "soc_temp 51.5" in text
+    assert 'latency_seconds_bucket{stage="detect",le="0.01"} 1' in text
+    assert 'latency_seconds_bucket{stage="detect",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{stage="detect",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="detect"} 3' in text
+
+
+def test_gauge_function_returning_none_is_skipped():
+    registry = MetricsRegistry()
+    registry.gauge("soc_temp", "temperature").set_function(lambda: None)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE soc_temp gauge" in lines
+    assert not [line for line in lines if line.startswith("soc_temp ")]
+
+
+def test_parse_throttled_flags():
+    assert parse_throttled("throttled=0x50005") == 0x50005
+    assert parse_throttled("throttled=0x0") == 0
+    assert parse_throttled(None) is None
+
+
+def test_metrics_endpoint_serves_profiler_stages():
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "frames").inc()
+    profiler = Profiler(enabled=False)
+    server = start_metrics_server(0, host="127.0.0.1", registry=registry, profiler=profiler)
+    try:
+        with profiler.span("encode"):
+            pass
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=2) as response:
+            content_type = response.headers["Content-Type"]
+            body = response.read().decode("utf-8")
+    finally:
+        server.stop()
+
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert "frames_total 1" in body
+    # 階段直方圖註冊於傳入的 registry，而非全域 REGISTRY
+    assert "# TYPE face_stage_latency_seconds histogram" in body
+    assert 'face_stage_latency_seconds_count{stage="encode"} 1' in body
+    assert 'stage="encode"' not in "\n".join(STAGE_LATENCY.render())
+    assert profiler.observers == []
+
+
+def test_default_registry_uses_shared_stage_histogram():
+    profiler = Profiler(enabled=False)
+    server = start_metrics_server(0, host="127.0.0.1", profiler=profiler)
+    try:
+        with profiler.span("match"):
+            pass
+    finally:
+        server.stop()
+
+    assert 'face_stage_latency_seconds_count{stage="match"} 1' in "\n".join(STAGE_LATENCY.render())
+    assert profiler.observers == []
+
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("untyped_total", "untyped")
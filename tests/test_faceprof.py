@@ -0,0 +1,59 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from faceprof import Profiler, StageHistogram, _NULL_SPAN
+
+
+def _load_ci_summary():
+    spec = importlib.util.spec_from_file_location("ci_summary", PROJECT_ROOT / "git" / "tests" / "ci_summary.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_histogram_percentiles_use_nearest_rank():
+    histogram = StageHistogram()
+    for value in range(1, 101):
+        histogram.add(value / 1000.0)
+
+    assert histogram.percentile(50) == 0.050
+    assert histogram.percentile(95) == 0.095
+    assert histogram.percentile(99) == 0.099
+    assert histogram.summary()["count"] == 100
+
+
+def test_disabled_profiler_is_a_no_op():
+    profiler = Profiler(enabled=False)
+
+    with profiler.span("detect") as span:
+        pass
+    profiler.tick()
+
+    assert span is _NULL_SPAN
+    assert profiler.stages == {}
+    assert profiler.maybe_report(force=True) is None
+
+
+def test_mon_line_readable_by_ci_summary():
+    lines = []
+    profiler = Profiler(enabled=True, emit=lines.append)
+    for _ in range(3):
+        with profiler.span("detect"):
+            pass
+        profiler.record("db_write", 0.012)
+        profiler.tick()
+
+    line = profiler.maybe_report(force=True)
+    ci_summary = _load_ci_summary()
+
+    assert lines == [line]
+    assert line.startswith("[MON] ELAPSED=")
+    assert "FRAMES=3" in line
+    assert "FPS" in ci_summary.parse_pi_monitor(lines)
+    stages = ci_summary.parse_stage_latency(lines)
+    assert set(stages) == {"db_write", "detect"}
+    assert stages["db_write"] == {"p50": 12.0, "p95": 12.0, "p99": 12.0}
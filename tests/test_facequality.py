@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('face_recognition', MagicMock())
+_install_stub('numpy', ModuleType('numpy'))
+
+from facemetrics import QUALITY_REJECTS
+from facequality import QualityGate, QualityThresholds, estimate_yaw
+
+
+def test_estimate_yaw_frontal_and_profile():
+    frontal = {"left_eye": [(40, 50), (50, 50)], "right_eye": [(70, 50), (80, 50)], "nose_tip": [(60, 70)]}
+    turned = {"left_eye": [(40, 50), (50, 50)], "right_eye": [(70, 50), (80, 50)], "nose_tip": [(78, 70)]}
+
+    assert estimate_yaw(frontal) == 0.0
+    assert estimate_yaw(turned) == 0.6
+    assert estimate_yaw({"left_eye": [(40, 50)]}) is None
+
+
+def test_small_faces_are_rejected_before_touching_pixels():
+    gate = QualityGate(QualityThresholds(min_size=48))
+    frame = MagicMock()
+
+    assert gate.check(frame, (0, 30, 30, 0)) == "size"
+    frame.__getitem__.assert_not_called()
+
+
+def test_filter_counts_rejections_per_reason(monkeypatch):
+    gate = QualityGate()
+    reasons = {(0, 10, 10, 0): "size", (0, 100, 100, 0): None, (0, 200, 100, 100): "blur"}
+    monkeypatch.setattr(gate, "check", lambda frame, location: reasons[location])
+    before = QUALITY_REJECTS.value(reason="blur")
+
+    kept = gate.filter(None, list(reasons))
+
+    assert kept == [(0, 100, 100, 0)]
+    assert gate.counts == {"size": 1, "blur": 1}
+    assert gate.summary() == "accepted=1 blur=1 size=1"
+    assert QUALITY_REJECTS.value(reason="blur") == before + 1
+
+
+def test_thresholds_from_config_ignore_unknown_keys():
+    thresholds = QualityThresholds.from_config({"enabled": True, "min_size": 64, "max_yaw": None})
+
+    assert thresholds.min_size == 64
+    assert thresholds.max_yaw is None
+    assert thresholds.min_sharpness == 40.0
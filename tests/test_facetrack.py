@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from facetrack import IdentityTracker, iou
+
+BOX = (100, 200, 200, 100)
+MOVED = (105, 205, 205, 105)
+OTHER = (100, 500, 200, 400)
+
+
+def test_iou():
+    assert iou(BOX, BOX) == 1.0
+    assert iou(BOX, OTHER) == 0.0
+    assert 0.8 < iou(BOX, MOVED) < 0.9
+
+
+def test_identity_confirmed_once_after_enough_votes():
+    tracker = IdentityTracker(votes=3, window=5)
+    frames = [("Alice", 0.4), ("Bob", 0.55), ("Alice", 0.42), ("Alice", 0.38), ("Alice", 0.4), ("Alice", 0.4)]
+
+    events = []
+    for step, (name, distance) in enumerate(frames):
+        location = BOX if step % 2 == 0 else MOVED
+        events.extend(tracker.update([(location, name, distance)], now=step * 0.1))
+
+    assert [(event.kind, event.name) for event in events] == [("confirmed", "Alice")]
+    assert round(events[0].distance, 2) == 0.4
+
+
+def test_stranger_counted_once_per_track():
+    tracker = IdentityTracker(votes=2, max_age=0.5)
+    events = []
+    for step in range(10):
+        events.extend(tracker.update([(BOX, "Unknown", 0.8)], now=step * 0.1))
+    # 離開畫面超過 max_age 後重新出現，視為新的一條軌跡
+    for step in range(3):
+        events.extend(tracker.update([(BOX, "Unknown", 0.8)], now=5.0 + step * 0.1))
+
+    assert [event.kind for event in events] == ["unknown", "unknown"]
+    assert len({event.track_id for event in events}) == 2
+
+
+def test_faces_side_by_side_keep_separate_tracks():
+    tracker = IdentityTracker(votes=2)
+    events = []
+    for step in range(2):
+        events.extend(tracker.update([(BOX, "Alice", 0.4), (OTHER, "Bob", 0.45)], now=step * 0.1))
+
+    assert sorted(event.name for event in events) == ["Alice", "Bob"]
+    assert len(tracker.tracks) == 2
+
+
+def test_leaders_lists_unconfirmed_known_tracks_with_start_time():
+    tracker = IdentityTracker(votes=2, window=3)
+
+    tracker.update([(BOX, "Alice", 0.4), (OTHER, "Unknown", 0.9)], now=1.0)
+    assert list(tracker.leaders().values()) == ["Alice"]
+
+    events = tracker.update([(MOVED, "Alice", 0.4), (OTHER, "Unknown", 0.9)], now=1.2)
+    assert tracker.leaders() == {}
+    assert [(event.kind, event.started) for event in events] == [("confirmed", 1.0), ("unknown", 1.0)]
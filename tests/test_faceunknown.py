@@ -0,0 +1,139 @@
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+try:
+    import numpy as np
+except ImportError:
+    np = ModuleType('numpy')
+    _install_stub('numpy', np)
+
+from facetrack import IdentityTracker
+
+# 分群以向量運算實作，只在安裝 numpy 的環境執行
+requires_numpy = pytest.mark.skipif(not hasattr(np, "linalg"), reason="需要 numpy")
+
+
+def test_unknown_event_carries_latest_payload():
+    tracker = IdentityTracker(votes=2)
+    box = (100, 200, 200, 100)
+
+    first = tracker.update([(box, "Unknown", 0.8, "frame-1")], now=0.0)
+    second = tracker.update([(box, "Unknown", 0.8, "frame-2")], now=0.1)
+
+    assert first == []
+    assert [(event.kind, event.payload) for event in second] == [("unknown", "frame-2")]
+
+
+@requires_numpy
+def test_leader_clustering_groups_repeat_visitors_and_persists(tmp_path):
+    from faceunknown import UnknownFaceStore
+
+    rng = np.random.default_rng(0)
+    visitors = rng.normal(size=(2, 128)) * 0.09
+    store = UnknownFaceStore(tmp_path, radius=0.5)
+    ids = [store.add(visitors[index % 2] + rng.normal(scale=0.01, size=128), now=float(step)) for step, index in enumerate([0, 1, 0, 0, 1])]
+
+    assert ids == [1, 2, 1, 1, 2]
+    assert [(cluster.cluster_id, cluster.count) for cluster in store.ranked()] == [(1, 3), (2, 2)]
+
+    store.flush()
+    reloaded = UnknownFaceStore(tmp_path)
+    assert [(cluster.cluster_id, cluster.count) for cluster in reloaded.ranked()] == [(1, 3), (2, 2)]
+    assert len(reloaded.clusters[1].exemplars) >= 1
+
+
+@requires_numpy
+def test_least_recently_seen_cluster_is_evicted(tmp_path):
+    from faceunknown import UnknownFaceStore
+
+    store = UnknownFaceStore(tmp_path, radius=0.1, max_clusters=2)
+    vectors = np.eye(3, 128, dtype=np.float32)
+    store.add(vectors[0], now=1.0)
+    store.add(vectors[1], now=2.0)
+    store.add(vectors[0], now=3.0)
+    store.add(vectors[2], now=4.0)
+
+    assert sorted(store.clusters) == [1, 3]
+
+
+def test_unknown_event_payload_comes_from_the_triggering_observation():
+    tracker = IdentityTracker(votes=2)
+    box = (100, 200, 200, 100)
+
+    tracker.update([(box, "Unknown", 0.8, "frame-1")], now=0.0)
+    events = tracker.update([(box, "Unknown", 0.8)], now=0.1)
+
+    # 前一張影格的 payload 可能已被覆寫，不會帶到本次事件
+    assert [(event.kind, event.payload) for event in events] == [("unknown", None)]
+
+
+@requires_numpy
+def test_wants_thumbnail_only_while_the_cluster_keeps_samples(tmp_path):
+    from faceunknown import UnknownFaceStore
+
+    store = UnknownFaceStore(tmp_path, radius=0.5, max_thumbnails=1)
+    vector = np.eye(1, 128, dtype=np.float32)[0]
+
+    assert store.wants_thumbnail(vector)
+    store.add(vector, thumbnail=np.zeros((8, 8, 3), dtype=np.uint8), now=1.0)
+
+    assert store.clusters[1].thumbnails == ["thumb_00.jpg"]
+    # 同一群的縮圖已滿：不需要再複製臉部影像
+    assert not store.wants_thumbnail(vector + 0.3 / np.sqrt(128))
+    # 新訪客會建立新群並保留縮圖
+    assert store.wants_thumbnail(-vector)
+    assert not UnknownFaceStore(tmp_path / "none", max_thumbnails=0).wants_thumbnail(vector)
+
+
+@requires_numpy
+def test_promote_enrolls_exemplars_and_removes_the_cluster(tmp_path, monkeypatch):
+    from faceunknown import UnknownFaceStore
+
+    enrolled = []
+    faceme = ModuleType('faceme')
+
+    def enroll_member(member, samples, dataset_manager, db_manager=None):
+        enrolled.append((member, samples, dataset_manager, db_manager))
+        return [], 42
+
+    faceme.enroll_member = enroll_member
+    monkeypatch.setitem(sys.modules, 'faceme', faceme)
+
+    store = UnknownFaceStore(tmp_path, radius=0.5, max_thumbnails=0)
+    base = np.eye(2, 128, dtype=np.float32)
+    first = store.add(base[0], now=1.0)
+    store.add(base[0] + 0.3 / np.sqrt(128), now=2.0)
+    other = store.add(base[1], now=3.0)
+    store.flush()
+    member = MagicMock()
+    member.name = "王小明"
+
+    member_id = store.promote(first, member, dataset_manager="dataset", db_manager="db")
+
+    assert member_id == 42
+    (got_member, samples, dataset_manager, db_manager), = enrolled
+    assert (got_member, dataset_manager, db_manager) == (member, "dataset", "db")
+    assert len(samples) == 2
+    assert samples[0][1] == pytest.approx(base[0].tolist())
+    # 沒有縮圖的代表編碼以空白影像代替
+    assert samples[0][0].shape == (96, 96, 3)
+    assert list(store.clusters) == [other]
+    assert not (tmp_path / f"{first:04d}").exists()
+    assert [cluster.cluster_id for cluster in UnknownFaceStore(tmp_path).ranked()] == [other]
+
+    with pytest.raises(KeyError):
+        store.promote(first, member, dataset_manager="dataset")
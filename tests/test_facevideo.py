@@ -0,0 +1,173 @@
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('face_recognition', MagicMock())
+_install_stub('numpy', ModuleType('numpy'))
+
+import facecam
+from facecam import FaceRecognitionCamera, RecognizedFace
+from facevideo import SegmentResult, Sighting, VideoFaceAnalyzer, VideoSegment, build_timeline
+
+
+class FakeFrame:
+    def __init__(self, name, shape):
+        self.name = name
+        self.shape = shape
+
+
+class FakeDetector:
+    batch_size = 2
+
+    def __init__(self, locations):
+        self.locations = locations
+        self.batches = []
+
+    def detect_many(self, images):
+        self.batches.append([image.name for image in images])
+        return [self.locations[image.name] for image in images]
+
+
+def _batched_engine(monkeypatch, **kwargs):
+    store = MagicMock()
+    store.recognize.return_value = RecognizedFace(name="Alice", location=(0, 0, 0, 0), distance=0.3)
+    encoded = []
+
+    def encode_crops(frame, locations, margin):
+        encoded.append((frame.name, list(locations), margin))
+        return [object() for _ in locations]
+
+    monkeypatch.setattr(facecam, "encode_crops", encode_crops)
+    monkeypatch.setattr(facecam, "face_recognition", MagicMock())
+    return FaceRecognitionCamera(store, scale=0.5, model="cnn", **kwargs), encoded
+
+
+def test_plan_segments_covers_whole_video():
+    analyzer = VideoFaceAnalyzer(encodings_store=MagicMock(), segment_seconds=600)
+    segments = analyzer.plan_segments(25 * 60 * 1000)
+
+    assert [segment.index for segment in segments] == [0, 1, 2]
+    assert segments[0].start_ms == 0
+    assert segments[-1].end_ms == 25 * 60 * 1000
+    for previous, current in zip(segments, segments[1:]):
+        assert previous.end_ms == current.start_ms
+
+
+def test_build_timeline_splits_visits_on_gap():
+    sightings = [
+        Sighting(timestamp=12.0, name="Alice", distance=0.40),
+        Sighting(timestamp=10.0, name="Alice", distance=0.45),
+        Sighting(timestamp=11.0, name="Alice", distance=0.35),
+        Sighting(timestamp=60.0, name="Alice", distance=0.50),
+        Sighting(timestamp=5.0, name="Bob", distance=0.30),
+    ]
+
+    timeline = build_timeline(sightings, max_gap=3.0)
+
+    assert [(item.name, item.first_seen, item.last_seen) for item in timeline] == [
+        ("Bob", 5.0, 5.0),
+        ("Alice", 10.0, 12.0),
+        ("Alice", 60.0, 60.0),
+    ]
+    assert timeline[1].dwell == 2.0
+    assert timeline[1].sightings == 3
+    assert timeline[1].best_distance == 0.35
+
+
+def test_batched_cnn_path_encodes_full_resolution_crops(monkeypatch):
+    engine, encoded = _batched_engine(monkeypatch)
+    detector = FakeDetector({"small_a": [(10, 40, 40, 10)], "small_b": []})
+    pending = [
+        (1000.0, FakeFrame("full_a", (480, 640, 3)), FakeFrame("small_a", (240, 320, 3))),
+        (2000.0, FakeFrame("full_b", (480, 640, 3)), FakeFrame("small_b", (240, 320, 3))),
+    ]
+    result = SegmentResult(segment=VideoSegment(index=0, start_ms=0.0, end_ms=3000.0))
+
+    VideoFaceAnalyzer(encodings_store=engine.encodings_store, model="cnn")._flush_batch(
+        engine, detector, pending, result
+    )
+
+    # 偵測用縮圖，編碼在原始影格上以換算回原尺寸的座標裁切
+    assert detector.batches == [["small_a", "small_b"]]
+    assert encoded == [("full_a", [(20, 80, 80, 20)], engine.crop_margin), ("full_b", [], engine.crop_margin)]
+    facecam.face_recognition.face_encodings.assert_not_called()
+    assert [(sighting.timestamp, sighting.name) for sighting in result.sightings] == [(1.0, "Alice")]
+    assert pending == []
+
+
+class FakeGate:
+    """只讓指定縮圖中的第一張人臉通過。"""
+
+    def __init__(self):
+        self.checked = []
+        self.counts = {}
+
+    def filter_indices(self, frame, locations):
+        self.checked.append((frame.name, list(locations)))
+        self.counts["blur"] = self.counts.get("blur", 0) + max(0, len(locations) - 1)
+        return [0] if locations else []
+
+
+def test_batched_path_never_encodes_rejected_faces(monkeypatch):
+    gate = FakeGate()
+    engine, encoded = _batched_engine(monkeypatch, quality_gate=gate)
+    detector = FakeDetector({"small_a": [(10, 40, 40, 10), (50, 90, 90, 50), (100, 130, 130, 100)]})
+    pending = [(1000.0, FakeFrame("full_a", (480, 640, 3)), FakeFrame("small_a", (240, 320, 3)))]
+    result = SegmentResult(segment=VideoSegment(index=0, start_ms=0.0, end_ms=3000.0))
+
+    VideoFaceAnalyzer(encodings_store=engine.encodings_store, model="cnn")._flush_batch(
+        engine, detector, pending, result
+    )
+
+    # 品質檢查在原始解析度座標上進行，只有通過的人臉被編碼與比對
+    assert gate.checked == [("full_a", [(20, 80, 80, 20), (100, 180, 180, 100), (200, 260, 260, 200)])]
+    assert encoded == [("full_a", [(20, 80, 80, 20)], engine.crop_margin)]
+    assert engine.encodings_store.recognize.call_count == 1
+    assert len(result.sightings) == 1 and result.unknown_faces == 0
+
+
+def test_process_segment_builds_a_quality_gate_from_thresholds(monkeypatch):
+    import facevideo
+    from facequality import QualityThresholds
+
+    engines = []
+
+    class RecordingCamera:
+        def __init__(self, **kwargs):
+            engines.append(kwargs)
+
+    monkeypatch.setattr(facevideo, "FaceRecognitionCamera", RecordingCamera)
+    monkeypatch.setattr(facevideo, "cv2", MagicMock())
+    segment = VideoSegment(index=0, start_ms=0.0, end_ms=1000.0)
+    thresholds = QualityThresholds(min_size=64)
+
+    gated = VideoFaceAnalyzer(encodings_store=MagicMock(), quality_thresholds=thresholds)
+    monkeypatch.setattr(gated, "_sample_frames", lambda capture, segment: [])
+    result = gated.process_segment(Path("video.mp4"), segment)
+    ungated = VideoFaceAnalyzer(encodings_store=MagicMock())
+    monkeypatch.setattr(ungated, "_sample_frames", lambda capture, segment: [])
+    ungated.process_segment(Path("video.mp4"), segment)
+
+    assert engines[0]["quality_gate"].thresholds is thresholds
+    assert engines[1]["quality_gate"] is None
+    assert result.quality_rejected == {}
+
+
+def test_cli_enables_the_quality_gate_by_default():
+    from facevideo import build_argument_parser
+
+    parser = build_argument_parser()
+
+    assert not parser.parse_args(["--encodings", "e.csv", "--video", "v.mp4"]).no_quality_gate
+    assert parser.parse_args(["--encodings", "e.csv", "--video", "v.mp4", "--no-quality-gate"]).no_quality_gate
@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('numpy', ModuleType('numpy'))
+
+import framepool
+from framepool import FrameBufferPool
+
+
+class _Buffer:
+    def __init__(self, shape=(480, 640, 3)) -> None:
+        self.shape = shape
+
+
+class _Capture:
+    """模擬 cv2.VideoCapture：有提供 image= 時寫入該緩衝區，否則配置新陣列。"""
+
+    def __init__(self) -> None:
+        self.targets = []
+
+    def read(self, image=None):
+        self.targets.append(image)
+        return True, image if image is not None else _Buffer()
+
+
+def test_pool_reaches_zero_allocation_steady_state(monkeypatch):
+    monkeypatch.setattr(framepool, "np", SimpleNamespace(empty_like=lambda frame: _Buffer(frame.shape)))
+    pool = FrameBufferPool(count=3, name="test")
+    capture = _Capture()
+
+    frames = [pool.read(capture)[1] for _ in range(30)]
+
+    assert pool.allocations == 3
+    assert pool.stats()["reads"] == 30
+    assert capture.targets[0] is None
+    assert all(target is not None for target in capture.targets[1:])
+    assert len({id(frame) for frame in frames}) == 3
+
+
+def test_pool_skips_busy_buffers(monkeypatch):
+    monkeypatch.setattr(framepool, "np", SimpleNamespace(empty_like=lambda frame: _Buffer(frame.shape)))
+    pool = FrameBufferPool(count=3, name="test")
+    capture = _Capture()
+    _, latest = pool.read(capture)
+    _, processing = pool.read(capture)
+
+    for _ in range(10):
+        _, frame = pool.read(capture, busy=(latest, processing))
+        assert frame is not latest and frame is not processing
+    assert pool.allocations == 3
@@ -0,0 +1,119 @@
+import shutil
+import sys
+import time
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    _install_stub('numpy', ModuleType('numpy'))
+
+import numpy as np
+
+from framerec import FrameRecorder, FrameRecording, ReplayCapture, is_replay_source
+
+
+class _FakeFrame:
+    shape = (2, 3, 3)
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def tobytes(self) -> bytes:
+        return bytes([self.value]) * 18
+
+
+def _record(path, timestamps):
+    recorder = FrameRecorder(path)
+    for index, timestamp in enumerate(timestamps):
+        recorder.write(_FakeFrame(index), timestamp=timestamp)
+    return recorder
+
+
+def test_recording_round_trip_keeps_order_and_timestamps(tmp_path):
+    path = tmp_path / "door.frec"
+    _record(path, [10.0, 10.04, 10.08]).close()
+
+    recording = FrameRecording(path)
+
+    assert len(recording) == 3
+    assert (recording.width, recording.height, recording.channels) == (3, 2, 3)
+    assert [round(recording.timestamp(i), 3) for i in range(3)] == [0.0, 0.04, 0.08]
+    assert bytes(recording.payload(2)) == bytes([2]) * 18
+    recording.close()
+
+
+def test_unfinished_recording_is_recovered_by_scanning(tmp_path):
+    path = tmp_path / "door.frec"
+    recorder = _record(path, [0.0, 0.1])
+    recorder._file.flush()
+    partial = tmp_path / "partial.frec"
+    shutil.copy(path, partial)
+    recorder.close()
+
+    recording = FrameRecording(partial)
+
+    assert len(recording) == 2
+    assert bytes(recording.payload(1)) == bytes([1]) * 18
+    # 檔頭在第一張影格時已寫入，中斷的檔案仍知道編碼與尺寸
+    assert (recording.codec, recording.width, recording.height, recording.channels) == ("raw", 3, 2, 3)
+    recording.close()
+
+
+@pytest.mark.skipif(not hasattr(np, "frombuffer"), reason="需要 numpy")
+def test_unfinished_recording_frames_can_be_decoded(tmp_path):
+    path = tmp_path / "door.frec"
+    recorder = FrameRecorder(path)
+    for value in range(2):
+        recorder.write(np.full((2, 3, 3), value, dtype=np.uint8), timestamp=value * 0.1)
+    recorder._file.flush()
+    partial = tmp_path / "partial.frec"
+    shutil.copy(path, partial)
+    recorder.close()
+
+    recording = FrameRecording(partial)
+
+    frame = recording.frame(1)
+    assert frame.shape == (2, 3, 3)
+    assert frame.tolist() == np.full((2, 3, 3), 1, dtype=np.uint8).tolist()
+    recording.close()
+
+
+def test_replay_pacing(tmp_path, monkeypatch):
+    path = tmp_path / "door.frec"
+    _record(path, [0.0, 0.05, 0.1]).close()
+    monkeypatch.setattr(FrameRecording, "frame", lambda self, position, out=None: position)
+
+    fast = ReplayCapture(path, pacing="fast")
+    started = time.monotonic()
+    assert [fast.read()[1] for _ in range(3)] == [0, 1, 2]
+    assert time.monotonic() - started < 0.05
+    assert fast.read() == (False, None)
+    fast.release()
+
+    realtime = ReplayCapture(path, pacing="realtime", loop=True)
+    started = time.monotonic()
+    assert [realtime.read()[1] for _ in range(4)] == [0, 1, 2, 0]
+    assert time.monotonic() - started >= 0.09
+    realtime.release()
+
+
+def test_replay_source_detection():
+    assert is_replay_source("replay:/data/door.bin?pacing=fast")
+    assert is_replay_source("door.frec?loop=1")
+    assert not is_replay_source(0)
+    assert not is_replay_source("v4l2src ! videoconvert ! appsink")
@@ -0,0 +1,123 @@
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from logpartition import (
+    ROLLUPS,
+    add_months,
+    drop_expired_partitions,
+    ensure_partitions,
+    expired_partitions,
+    partition_by_clause,
+    refresh_rollup,
+)
+
+
+class _ScriptedCursor:
+    """依查詢開頭回傳結果，並記錄執行過的敘述。"""
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.statements = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+        self.rows = next((rows for prefix, rows in self.responses.items() if query.startswith(prefix)), [])
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2024, 11, 15), 2) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 1), -13) == date(2022, 12, 1)
+
+
+def test_partition_by_clause_lists_months_and_maxvalue():
+    clause = partition_by_clause("display_time", date(2024, 11, 20), date(2025, 1, 1))
+
+    assert clause.startswith("PARTITION BY RANGE (UNIX_TIMESTAMP(display_time))")
+    assert "PARTITION p202411 VALUES LESS THAN (UNIX_TIMESTAMP('2024-12-01 00:00:00'))" in clause
+    assert "PARTITION p202501 VALUES LESS THAN (UNIX_TIMESTAMP('2025-02-01 00:00:00'))" in clause
+    assert clause.rstrip(")\n").endswith("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+
+def test_ensure_partitions_splits_pmax_after_latest_month():
+    cursor = _ScriptedCursor({"SELECT PARTITION_NAME": [("p202405",), ("p202406",), ("pmax",)]})
+
+    created = ensure_partitions(cursor, "ad_display_log", date(2024, 6, 10), months_ahead=2)
+
+    assert created == ["p202407", "p202408"]
+    statement = cursor.statements[-1][0]
+    assert statement.startswith("ALTER TABLE ad_display_log REORGANIZE PARTITION pmax INTO (")
+    assert statement.endswith("PARTITION pmax VALUES LESS THAN MAXVALUE)")
+
+
+def test_ensure_partitions_skips_unpartitioned_tables():
+    cursor = _ScriptedCursor({"SELECT PARTITION_NAME": []})
+
+    assert ensure_partitions(cursor, "attendance_log", date(2024, 6, 10)) == []
+    assert len(cursor.statements) == 1
+
+
+def test_retention_keeps_partitions_not_yet_rolled_up():
+    names = ["p202301", "p202302", "p202303", "p202404", "pmax"]
+    assert expired_partitions(names, date(2024, 4, 2), retention_months=13) == ["p202301", "p202302"]
+
+    cursor = _ScriptedCursor({"SELECT PARTITION_NAME": [(name,) for name in names]})
+    dropped = drop_expired_partitions(cursor, "ad_display_log", date(2024, 4, 2), 13, rolled_up_until=date(2023, 2, 15))
+
+    assert dropped == ["p202301"]
+    assert cursor.statements[-1][0] == "ALTER TABLE ad_display_log DROP PARTITION p202301"
+
+
+def test_refresh_rollup_recomputes_trailing_window():
+    cursor = _ScriptedCursor({
+        "SELECT last_day, last_log_id FROM rollup_state": [(date(2024, 6, 9), 100)],
+        "SELECT MAX(log_id)": [(120,)],
+        "SELECT MIN(display_time)": [(datetime(2024, 6, 9, 8),)],
+    })
+
+    start = refresh_rollup(cursor, ROLLUPS["ad_display_daily"], date(2024, 6, 10), late_days=2)
+
+    assert start == date(2024, 6, 7)
+    queries = [query for query, _ in cursor.statements]
+    assert cursor.statements[2][1] == (100,)
+    assert queries[3] == "DELETE FROM ad_display_daily WHERE display_date >= %s"
+    assert queries[4].startswith("INSERT INTO ad_display_daily")
+    assert cursor.statements[4][1] == (datetime(2024, 6, 7),)
+    assert cursor.statements[5][1] == ("ad_display_daily", date(2024, 6, 10), 120)
+
+
+def test_refresh_rollup_picks_up_back_dated_rows_inserted_after_last_run():
+    # 上次彙總到 6/10（log_id 100），之後暫存補寫了一筆 5/28 的曝光紀錄
+    cursor = _ScriptedCursor({
+        "SELECT last_day, last_log_id FROM rollup_state": [(date(2024, 6, 10), 100)],
+        "SELECT MAX(log_id)": [(101,)],
+        "SELECT MIN(display_time)": [(datetime(2024, 5, 28, 21, 30),)],
+    })
+
+    start = refresh_rollup(cursor, ROLLUPS["ad_display_daily"], date(2024, 6, 11), late_days=2)
+
+    assert start == date(2024, 5, 28)
+    assert cursor.statements[3][1] == (date(2024, 5, 28),)
+    assert cursor.statements[5][1] == ("ad_display_daily", date(2024, 6, 11), 101)
+
+
+def test_partitions_within_late_window_are_kept():
+    names = ["p202404", "p202405", "pmax"]
+    cursor = _ScriptedCursor({"SELECT PARTITION_NAME": [(name,) for name in names]})
+
+    # 5 月結束才 1 天，晚到紀錄仍可能寫入 p202405
+    dropped = drop_expired_partitions(
+        cursor, "ad_display_log", date(2024, 6, 2), 0, rolled_up_until=date(2024, 6, 2) - timedelta(days=2)
+    )
+
+    assert dropped == ["p202404"]
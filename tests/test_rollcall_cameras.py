@@ -0,0 +1,119 @@
+import sys
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _install_stub(module_name: str, module):
+    if module_name not in sys.modules:
+        sys.modules[module_name] = module
+
+
+_install_stub('cv2', MagicMock())
+_install_stub('face_recognition', MagicMock())
+_install_stub('numpy', ModuleType('numpy'))
+
+pil_package = ModuleType('PIL')
+pil_package.Image = MagicMock()
+pil_package.ImageTk = MagicMock()
+_install_stub('PIL', pil_package)
+_install_stub('PIL.Image', pil_package.Image)
+_install_stub('PIL.ImageTk', pil_package.ImageTk)
+_install_stub('tkinter', MagicMock())
+_install_stub('tkinter.ttk', MagicMock())
+
+import rollcall_edge
+from rollcall_edge import (
+    AttendanceRecord,
+    CameraSource,
+    CameraStream,
+    MQTTClient,
+    RecognitionWorkerPool,
+    parse_camera_sources,
+)
+
+
+def _push(stream: CameraStream, frame) -> None:
+    with stream._lock:
+        stream._latest = frame
+        stream._sequence += 1
+
+
+def test_single_index_config_keeps_device_id():
+    sources = parse_camera_sources({"device": {"id": "door1"}, "camera": {"index": 2, "width": 800}})
+
+    assert sources == [CameraSource(device_id="door1", source=2, width=800)]
+
+
+def test_multiple_sources_get_device_ids():
+    config = {
+        "device": {"id": "door1"},
+        "camera": {
+            "width": 640,
+            "sources": [
+                {"device_id": "door1-left", "index": 0},
+                {"index": 1, "width": 1280},
+            ],
+        },
+    }
+
+    sources = parse_camera_sources(config)
+
+    assert [source.device_id for source in sources] == ["door1-left", "door1-cam1"]
+    assert [source.width for source in sources] == [640, 1280]
+
+
+def test_busy_camera_does_not_starve_others():
+    busy = CameraStream(CameraSource(device_id="busy"))
+    quiet = CameraStream(CameraSource(device_id="quiet"))
+    pool = RecognitionWorkerPool(engine=MagicMock(), streams=[busy, quiet], workers=2)
+
+    for index in range(10):
+        _push(busy, f"busy-{index}")
+    _push(quiet, "quiet-0")
+
+    first_stream, first_frame = pool._next_job()
+    second_stream, second_frame = pool._next_job()
+
+    assert (first_stream.device_id, first_frame) == ("busy", "busy-9")
+    assert (second_stream.device_id, second_frame) == ("quiet", "quiet-0")
+    assert busy.dropped == 9
+    # busy 仍有影格在處理中，新影格不會再佔用其他執行緒
+    _push(busy, "busy-10")
+    assert pool._next_job() is None
+
+    busy.finish_recognition([])
+    stream, frame = pool._next_job()
+    assert (stream.device_id, frame) == ("busy", "busy-10")
+
+
+def test_payload_carries_device_id():
+    record = AttendanceRecord(name="Alice", confidence=0.9, timestamp=MagicMock(), device_id="door1-left")
+    record.timestamp.isoformat.return_value = "2024-01-01T00:00:00"
+
+    assert record.to_payload()["device_id"] == "door1-left"
+
+
+def test_mqtt_pending_counts_only_queued_messages(monkeypatch):
+    fake_mqtt = MagicMock()
+    fake_mqtt.MQTT_ERR_SUCCESS = 0
+    fake_mqtt.error_string.return_value = "The client is not currently connected."
+    monkeypatch.setattr(rollcall_edge, "mqtt", fake_mqtt)
+    client = MQTTClient({})
+    client.client = MagicMock()
+    record = AttendanceRecord(name="Alice", confidence=0.9, timestamp=MagicMock())
+    record.timestamp.isoformat.return_value = "2024-01-01T00:00:00"
+
+    client.client.publish.return_value.rc = 4
+    client.publish_attendance(record)
+    assert client.pending == 0
+
+    client.client.publish.return_value.rc = 0
+    client.publish_attendance(record)
+    assert client.pending == 1
+
+    client._on_publish(client.client, None, 1)
+    assert client.pending == 0